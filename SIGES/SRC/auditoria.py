@@ -0,0 +1,350 @@
+"""Auditoría de los cambios de datos hechos desde los formularios.
+
+Cada alta, modificación o baja deja una entrada con quién, cuándo, la tabla,
+la clave del registro y las imágenes antes/después (JSON con tipos, como el
+diario de escritura diferida). Hay dos modos:
+
+- Diferido (el predeterminado): registrar() solo agrega la entrada a un búfer
+  en memoria y vuelve enseguida; un hilo de fondo la escribe por lotes, en una
+  sola transacción, en una base SQLite local (auditoria.db, WAL). Esa base es
+  de solo agregado (los triggers rechazan UPDATE y DELETE) y tiene índices por
+  registro y por fecha para el visor.
+- En la transacción: para las tablas del ajuste "tablas_auditoria_transaccional"
+  la entrada se inserta en la tabla SIGES_AUDITORIA del servidor con la misma
+  conexión del cambio, antes del commit (ver datos.py): o se guardan los dos,
+  o ninguno.
+"""
+import atexit
+import getpass
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import configuracion
+import dialecto
+import esquema
+from escritura_diferida import codificar, decodificar
+
+TAM_LOTE = 200
+INTERVALO = 1.0
+TABLA_SERVIDOR = "SIGES_AUDITORIA"
+_COLUMNAS = ("momento", "origen", "usuario", "sesion", "operacion", "tabla", "clave",
+             "valor_clave", "antes", "despues", "detalle")
+
+_DDL_MSSQL = f"""
+IF OBJECT_ID('{TABLA_SERVIDOR}') IS NULL
+BEGIN
+    CREATE TABLE {TABLA_SERVIDOR} (
+        id bigint IDENTITY PRIMARY KEY,
+        momento datetime2 NOT NULL,
+        origen nvarchar(300) NOT NULL,
+        usuario nvarchar(128),
+        sesion nvarchar(100),
+        operacion varchar(20) NOT NULL,
+        tabla nvarchar(128) NOT NULL,
+        clave nvarchar(128),
+        valor_clave nvarchar(400),
+        antes nvarchar(max),
+        despues nvarchar(max),
+        detalle nvarchar(400)
+    );
+    CREATE INDEX ix_siges_auditoria_registro ON {TABLA_SERVIDOR} (tabla, valor_clave, momento);
+    CREATE INDEX ix_siges_auditoria_momento ON {TABLA_SERVIDOR} (momento);
+END
+"""
+_DDL_SQLITE = f"""
+CREATE TABLE IF NOT EXISTS {TABLA_SERVIDOR} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    momento TEXT NOT NULL,
+    origen TEXT NOT NULL,
+    usuario TEXT,
+    sesion TEXT,
+    operacion TEXT NOT NULL,
+    tabla TEXT NOT NULL,
+    clave TEXT,
+    valor_clave TEXT,
+    antes TEXT,
+    despues TEXT,
+    detalle TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_siges_auditoria_registro ON {TABLA_SERVIDOR} (tabla, valor_clave, momento);
+CREATE INDEX IF NOT EXISTS ix_siges_auditoria_momento ON {TABLA_SERVIDOR} (momento);
+"""
+
+
+def usuario(quien: Optional[str] = None) -> str:
+    """Quién hace el cambio: `quien` (la identidad de la sesión, en modo servidor) o, si no se indica,
+    el usuario SQL del perfil o, con autenticación de Windows, el del sistema."""
+    if quien:
+        return quien
+    perfil = configuracion.perfil_activo()
+    if perfil.get("tipo") == "mssql" and perfil.get("autenticacion") == "sql":
+        return perfil["usuario"]
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "desconocido"
+
+
+def transaccional(tabla: str) -> bool:
+    return tabla in configuracion.ajuste("tablas_auditoria_transaccional")
+
+
+def entrada(origen: str, operacion: str, tabla: str, clave: Optional[str] = None, valor_clave=None,
+            antes: Optional[Dict] = None, despues: Optional[Dict] = None, sesion=None,
+            detalle: Optional[str] = None, quien: Optional[str] = None) -> Dict:
+    """Entrada de auditoría (los diccionarios se copian: el llamador puede seguir usándolos)."""
+    return {
+        "momento": datetime.now(), "origen": origen, "usuario": usuario(quien),
+        "sesion": None if sesion is None else str(sesion), "operacion": operacion, "tabla": tabla,
+        "clave": clave, "valor_clave": None if valor_clave is None else str(valor_clave),
+        "antes": dict(antes) if antes is not None else None,
+        "despues": dict(despues) if despues is not None else None,
+        "detalle": detalle,
+    }
+
+
+def _fila(datos: Dict, momento_texto: bool) -> tuple:
+    """Valores para el INSERT (imágenes codificadas en JSON)."""
+    momento = datos["momento"].isoformat(sep=" ") if momento_texto else datos["momento"]
+    return (momento, datos["origen"], datos["usuario"], datos["sesion"], datos["operacion"], datos["tabla"],
+            datos["clave"], datos["valor_clave"], codificar(datos["antes"]), codificar(datos["despues"]),
+            datos["detalle"])
+
+
+def _de_fila(fila) -> Dict:
+    resultado = dict(zip(("id",) + _COLUMNAS, fila))
+    resultado["antes"] = decodificar(resultado["antes"])
+    resultado["despues"] = decodificar(resultado["despues"])
+    if isinstance(resultado["momento"], datetime):
+        resultado["momento"] = resultado["momento"].isoformat(sep=" ")
+    return resultado
+
+
+# --- Auditoría en la transacción del cambio (servidor) -----------------------------
+
+_preparadas = set()
+_bloqueo_preparadas = threading.Lock()
+
+
+def preparar_servidor(conn):
+    """Crea la tabla de auditoría del servidor si no existe (una vez por origen y proceso)."""
+    dial = dialecto.dialecto(conn)
+    cursor = conn.cursor()
+    if dial == dialecto.SQLITE:
+        for sentencia in filter(str.strip, _DDL_SQLITE.split(";")):
+            cursor.execute(sentencia)
+    else:
+        cursor.execute(_DDL_MSSQL)
+    cursor.close()
+
+
+def en_transaccion(datos: Dict) -> Optional[Callable]:
+    """Función auditar(conn) para datos.py si la tabla se audita en la transacción, si no None."""
+    if not transaccional(datos["tabla"]):
+        return None
+
+    def auditar(conn):
+        with _bloqueo_preparadas:
+            pendiente = datos["origen"] not in _preparadas
+        if pendiente:
+            preparar_servidor(conn)
+            with _bloqueo_preparadas:
+                _preparadas.add(datos["origen"])
+        cursor = conn.cursor()
+        marcas = ", ".join("?" for _ in _COLUMNAS)
+        cursor.execute(f"INSERT INTO {TABLA_SERVIDOR} ({', '.join(_COLUMNAS)}) VALUES ({marcas})",
+                       _fila(datos, dialecto.dialecto(conn) == dialecto.SQLITE))
+        cursor.close()
+
+    return auditar
+
+
+def auditar_en(datos: Dict, registro: Optional["Auditoria"] = None) -> Tuple[Optional[Callable], Callable]:
+    """(auditar(conn), anotar()) para un cambio: en la transacción (tablas del ajuste) o en el búfer local.
+
+    datos.py llama a auditar(conn) antes del commit; anotar() se llama después
+    de confirmado el cambio. `registro`: la auditoría local (por omisión, la compartida).
+    """
+    auditar = en_transaccion(datos)
+    if auditar is None:
+        return None, lambda: (registro or compartida()).registrar(datos)
+    return auditar, lambda: None
+
+
+def consultar_servidor(conn, tabla: Optional[str] = None, valor_clave=None, desde: Optional[str] = None,
+                       hasta: Optional[str] = None, limite: int = 200) -> List[Dict]:
+    """Entradas de la tabla de auditoría del servidor, de la más reciente a la más antigua."""
+    dial = dialecto.dialecto(conn)
+    donde, parametros = _filtros(tabla, valor_clave, desde, hasta, dial)
+    cursor = conn.cursor()
+    cursor.execute(dialecto.select_top(TABLA_SERVIDOR, limite, dial, columnas=", ".join(("id",) + _COLUMNAS),
+                                       resto=f"{donde} ORDER BY momento DESC, id DESC"), parametros)
+    filas = [_de_fila(fila) for fila in cursor.fetchall()]
+    cursor.close()
+    return filas
+
+
+def _filtros(tabla, valor_clave, desde, hasta, dial, origen: Optional[str] = None):
+    """WHERE por registro y rango de fechas (desde/hasta: AAAA-MM-DD[ HH:MM:SS], hasta inclusive)."""
+    condiciones, parametros = [], []
+    for columna, valor in (("origen", origen), ("tabla", tabla)):
+        if valor:
+            condiciones.append(f"{columna} = ?")
+            parametros.append(valor)
+    if valor_clave not in (None, ""):
+        condiciones.append("valor_clave = ?")
+        parametros.append(str(valor_clave))
+    if desde:
+        condiciones.append("momento >= ?")
+        parametros.append(_momento(desde, dial))
+    if hasta:
+        # Solo la fecha: incluye todo ese día
+        condiciones.append("momento < ?" if len(hasta.strip()) == 10 else "momento <= ?")
+        parametros.append(_momento(hasta, dial, dia_siguiente=len(hasta.strip()) == 10))
+    return (" WHERE " + " AND ".join(condiciones)) if condiciones else "", tuple(parametros)
+
+
+def _momento(texto: str, dial: str, dia_siguiente: bool = False):
+    momento = datetime.fromisoformat(texto.strip())
+    if dia_siguiente:
+        momento += timedelta(days=1)
+    return momento.isoformat(sep=" ") if dial == dialecto.SQLITE else momento
+
+
+# --- Auditoría diferida (base local) -------------------------------------------------
+
+class Auditoria:
+    """Búfer en memoria y escritor por lotes a la base local de auditoría."""
+
+    def __init__(self, ruta: Optional[str] = None):
+        self.ruta = ruta or os.path.join(esquema.directorio_cache(), "auditoria.db")
+        self._bufer: List[Dict] = []
+        self._bloqueo = threading.Lock()
+        # Un solo escritor a la vez (el hilo de fondo o vaciar())
+        self._escritura = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.escritas = 0
+        conn = self._abrir()
+        conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS auditoria (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                momento TEXT NOT NULL,
+                origen TEXT NOT NULL,
+                usuario TEXT,
+                sesion TEXT,
+                operacion TEXT NOT NULL,
+                tabla TEXT NOT NULL,
+                clave TEXT,
+                valor_clave TEXT,
+                antes TEXT,
+                despues TEXT,
+                detalle TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_auditoria_registro ON auditoria (origen, tabla, valor_clave, momento);
+            CREATE INDEX IF NOT EXISTS ix_auditoria_momento ON auditoria (origen, momento);
+            CREATE TRIGGER IF NOT EXISTS auditoria_sin_modificar BEFORE UPDATE ON auditoria
+            BEGIN SELECT RAISE(ABORT, 'La auditoría es de solo agregado'); END;
+            CREATE TRIGGER IF NOT EXISTS auditoria_sin_eliminar BEFORE DELETE ON auditoria
+            BEGIN SELECT RAISE(ABORT, 'La auditoría es de solo agregado'); END;
+        """)
+        conn.close()
+
+    def _abrir(self):
+        return sqlite3.connect(self.ruta, timeout=10)
+
+    def registrar(self, datos: Dict):
+        """Agrega la entrada al búfer (no toca el disco)."""
+        with self._bloqueo:
+            self._bufer.append(datos)
+            lleno = len(self._bufer) >= TAM_LOTE
+        if lleno:
+            self._despertar.set()
+
+    def vaciar(self) -> int:
+        """Escribe lo que haya en el búfer en una sola transacción; devuelve las entradas escritas."""
+        with self._escritura:
+            with self._bloqueo:
+                lote, self._bufer = self._bufer, []
+            if not lote:
+                return 0
+            try:
+                conn = self._abrir()
+                try:
+                    with conn:
+                        conn.executemany(
+                            f"INSERT INTO auditoria ({', '.join(_COLUMNAS)}) VALUES ({', '.join('?' for _ in _COLUMNAS)})",
+                            [_fila(datos, momento_texto=True) for datos in lote]
+                        )
+                finally:
+                    conn.close()
+            except Exception:
+                # Vuelven al principio del búfer, en orden, para el próximo intento
+                with self._bloqueo:
+                    self._bufer[:0] = lote
+                raise
+            self.escritas += len(lote)
+            return len(lote)
+
+    def pendientes(self) -> int:
+        with self._bloqueo:
+            return len(self._bufer)
+
+    def iniciar(self, intervalo: float = INTERVALO):
+        """Hilo de fondo que vacía el búfer cada `intervalo` segundos (o al llenarse un lote)."""
+        if self._hilo and self._hilo.is_alive():
+            return
+
+        def bucle():
+            while True:
+                self._despertar.wait(intervalo)
+                self._despertar.clear()
+                try:
+                    self.vaciar()
+                except Exception as e:
+                    print("Error al escribir la auditoría:", e)
+
+        self._hilo = threading.Thread(target=bucle, daemon=True)
+        self._hilo.start()
+        # Lo que quede en el búfer se escribe al cerrar la aplicación
+        atexit.register(self.vaciar)
+
+    def consultar(self, origen: str, tabla: Optional[str] = None, valor_clave=None,
+                  desde: Optional[str] = None, hasta: Optional[str] = None, limite: int = 200) -> List[Dict]:
+        """Entradas del origen (por registro y/o rango de fechas), de la más reciente a la más antigua."""
+        self.vaciar()
+        donde, parametros = _filtros(tabla, valor_clave, desde, hasta, dialecto.SQLITE, origen=origen)
+        conn = self._abrir()
+        try:
+            filas = conn.execute(
+                f"SELECT id, {', '.join(_COLUMNAS)} FROM auditoria{donde} ORDER BY momento DESC, id DESC LIMIT ?",
+                parametros + (int(limite),)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [_de_fila(fila) for fila in filas]
+
+
+def cambios(datos: Dict) -> Dict[str, tuple]:
+    """{columna: (antes, después)} de las columnas que cambiaron en una entrada."""
+    antes, despues = datos["antes"] or {}, datos["despues"] or {}
+    columnas = list(despues) if despues else list(antes)
+    return {col: (antes.get(col), despues.get(col)) for col in columnas
+            if datos["operacion"] != "modificar" or antes.get(col) != despues.get(col)}
+
+
+_compartida: Optional[Auditoria] = None
+_bloqueo = threading.Lock()
+
+
+def compartida() -> Auditoria:
+    """Auditoría única para el proceso (un solo escritor de la base local)."""
+    global _compartida
+    with _bloqueo:
+        if _compartida is None:
+            _compartida = Auditoria()
+        return _compartida
@@ -0,0 +1,247 @@
+"""Banco de pruebas de rendimiento de SIGES.
+
+Uso:
+    python benchmark.py inicio [--repeticiones N]
+    python benchmark.py historial [--consultas N]
+    python benchmark.py render [--filas N] [--columnas N] [--paginas N]
+
+Si la variable SIGES_SQLITE no está definida, se crea una base SQLite
+sustituta temporal con datos sintéticos.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+def crear_bd_sustituta(ruta: str, tablas: int = 30, columnas: int = 8, filas: int = 2000):
+    """Crea una base SQLite con tablas sintéticas para las mediciones."""
+    import sqlite3
+    conn = sqlite3.connect(ruta)
+    for t in range(tablas):
+        definicion = ", ".join(
+            ["id INTEGER PRIMARY KEY"] + [f"campo_{c} VARCHAR(50)" for c in range(columnas - 1)]
+        )
+        conn.execute(f"CREATE TABLE IF NOT EXISTS tabla_{t:03d} ({definicion})")
+        marcadores = ", ".join(["?"] * columnas)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO tabla_{t:03d} VALUES ({marcadores})",
+            ([i] + [f"valor {i}-{c}" for c in range(columnas - 1)] for i in range(filas))
+        )
+    conn.commit()
+    conn.close()
+
+
+def preparar_entorno():
+    """Define SIGES_SQLITE y SIGES_CACHE_DIR si no fueron definidas."""
+    if not os.environ.get("SIGES_SQLITE"):
+        directorio = tempfile.mkdtemp(prefix="siges_bench_")
+        ruta = os.path.join(directorio, "sustituta.db")
+        crear_bd_sustituta(ruta)
+        os.environ["SIGES_SQLITE"] = ruta
+        os.environ.setdefault("SIGES_CACHE_DIR", directorio)
+    sys.path.insert(0, DIRECTORIO)
+
+
+def cronometrar(funcion, repeticiones: int) -> list:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def imprimir(nombre: str, tiempos: list):
+    print(f"{nombre:<40} mediana {statistics.median(tiempos) * 1000:9.1f} ms"
+          f"   máx {max(tiempos) * 1000:9.1f} ms")
+
+
+def importacion_en_frio(modulo: str) -> float:
+    """Tiempo de importación de un módulo en un intérprete nuevo."""
+    codigo = (
+        "import time; t = time.perf_counter(); "
+        f"import {modulo}; print(time.perf_counter() - t)"
+    )
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=DIRECTORIO,
+        capture_output=True, text=True, check=True
+    )
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def bench_inicio(args):
+    """Arranque: importación en frío, estructura desde servidor y desde caché."""
+    import esquema
+    from conexion_sql import ConexionSQL
+
+    importacion = {}
+    for modulo in ("crud", "main"):
+        try:
+            tiempos = [importacion_en_frio(modulo) for _ in range(args.repeticiones)]
+            imprimir(f"importar {modulo} (en frío)", tiempos)
+            importacion[modulo] = statistics.median(tiempos)
+        except subprocess.CalledProcessError as e:
+            print(f"importar {modulo}: no disponible ({e.stderr.strip().splitlines()[-1]})")
+
+    def desde_servidor():
+        conn = ConexionSQL.conectar()
+        tablas, estructura = esquema.cargar_estructura(conn)
+        conn.close()
+        esquema.guardar_cache(ConexionSQL.identificador(), tablas, estructura)
+
+    imprimir("estructura desde servidor", cronometrar(desde_servidor, args.repeticiones))
+    clave = ConexionSQL.identificador()
+    tiempos_cache = cronometrar(lambda: esquema.leer_cache(clave), args.repeticiones)
+    imprimir("estructura desde caché", tiempos_cache)
+
+    if "crud" not in importacion:
+        return
+    total = importacion["crud"] + statistics.median(tiempos_cache)
+    print(f"{'arranque en frío hasta lista de tablas':<40} {total * 1000:16.1f} ms"
+          f"   ({'OK' if total < 1 else 'supera'} objetivo de 1 s)")
+
+
+def bench_historial(args):
+    """Costo de registrar una consulta en el historial (lo que ve el hilo de la interfaz)."""
+    import historial
+    registro = historial.HistorialConsultas(ruta=os.path.join(tempfile.mkdtemp(), "historial.db"))
+    tiempos = []
+    for i in range(args.consultas):
+        inicio = time.perf_counter()
+        registro.registrar(f"SELECT * FROM tabla_000 WHERE id = {i}", 0.01, 1, origen="benchmark")
+        tiempos.append(time.perf_counter() - inicio)
+    imprimir("registrar (por consulta)", tiempos)
+    inicio = time.perf_counter()
+    registro.vaciar()
+    print(f"{'escritura en segundo plano (total)':<40} {(time.perf_counter() - inicio) * 1000:16.1f} ms")
+
+
+def _propiedades(control) -> dict:
+    """Propiedades asignadas a un control de Flet (las que viajan al cliente)."""
+    return {nombre: valor for nombre, (valor, _) in getattr(control, "_Control__attrs", {}).items()}
+
+
+def _recorrer(control):
+    yield control
+    for hijo in control._get_children():
+        yield from _recorrer(hijo)
+
+
+def medir_envio(raiz, anterior: dict):
+    """Controles y bytes que page.update() enviaría para `raiz` respecto de `anterior`.
+
+    `anterior` es la instantánea devuelta por la medición previa ({} para un
+    árbol nuevo, que se envía completo). Un control viaja si es nuevo o si
+    alguna de sus propiedades cambió; se cuentan solo las propiedades distintas.
+    Devuelve (controles, bytes, instantánea).
+    """
+    controles = enviados = 0
+    instantanea = {}
+    for control in _recorrer(raiz):
+        propiedades = _propiedades(control)
+        instantanea[id(control)] = (control, propiedades)
+        previo = anterior.get(id(control))
+        previas = previo[1] if previo and previo[0] is control else {}
+        distintas = {k: v for k, v in propiedades.items() if k not in previas or previas[k] != v}
+        if distintas or not previo:
+            controles += 1
+            enviados += len(json.dumps(distintas, default=str))
+    return controles, enviados, instantanea
+
+
+def bench_render(args):
+    """Árbol nuevo por carga frente a filas recicladas: memoria y controles enviados."""
+    import tracemalloc
+    try:
+        import flet as ft
+        import renderizador
+    except ImportError as e:
+        print(f"render: no disponible ({e})")
+        return
+
+    nombres = [f"campo_{c}" for c in range(args.columnas)]
+    paginas = [
+        [tuple(f"valor {p * args.filas // 2 + i}-{c}" for c in range(args.columnas)) for i in range(args.filas)]
+        for p in range(args.paginas)
+    ]
+
+    def arbol_nuevo(filas):
+        # Forma anterior: DataRow -> DataCell -> Container(tooltip) -> Text por celda
+        return [
+            ft.DataRow(cells=[
+                ft.DataCell(ft.Container(content=ft.Text(renderizador.texto_celda(v), size=12), tooltip=str(v)))
+                for v in fila
+            ]) for fila in filas
+        ]
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    for filas in paginas[1:]:
+        arbol_nuevo(filas)
+    tiempo_nuevo = time.perf_counter() - inicio
+    _, pico_nuevo = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Cada página reemplaza las filas: todos sus controles viajan completos
+    envios_nuevo = [medir_envio(ft.DataTable(columns=[], rows=arbol_nuevo(filas)), {})[:2] for filas in paginas[1:]]
+
+    tabla = ft.DataTable(columns=[])
+    grilla = renderizador.GrillaReciclable(tabla, tam_pool=args.filas)
+    grilla.mostrar(nombres, paginas[0])
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    for filas in paginas[1:]:
+        grilla.mostrar(nombres, filas)
+    tiempo_reciclado = time.perf_counter() - inicio
+    _, pico_reciclado = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Fuera del cronómetro: se repite la secuencia midiendo lo que cambia entre páginas
+    grilla.mostrar(nombres, paginas[0])
+    _, _, instantanea = medir_envio(tabla, {})
+    envios_reciclado = []
+    for filas in paginas[1:]:
+        grilla.mostrar(nombres, filas)
+        controles, enviados, instantanea = medir_envio(tabla, instantanea)
+        envios_reciclado.append((controles, enviados))
+
+    por_pagina = len(paginas) - 1 or 1
+
+    def promedio(envios, i):
+        return sum(envio[i] for envio in envios) // por_pagina
+
+    print(f"{'árbol nuevo por página':<40} {tiempo_nuevo / por_pagina * 1000:9.1f} ms"
+          f"   pico {pico_nuevo / 1024:9.0f} KB   controles enviados {promedio(envios_nuevo, 0)}"
+          f" ({promedio(envios_nuevo, 1) / 1024:.1f} KB)")
+    print(f"{'filas recicladas por página':<40} {tiempo_reciclado / por_pagina * 1000:9.1f} ms"
+          f"   pico {pico_reciclado / 1024:9.0f} KB   controles enviados {promedio(envios_reciclado, 0)}"
+          f" ({promedio(envios_reciclado, 1) / 1024:.1f} KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de SIGES")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("inicio", help="tiempo de arranque")
+    p.add_argument("--repeticiones", type=int, default=5)
+    p.set_defaults(funcion=bench_inicio)
+    p = sub.add_parser("historial", help="latencia agregada por el historial de consultas")
+    p.add_argument("--consultas", type=int, default=5000)
+    p.set_defaults(funcion=bench_historial)
+    p = sub.add_parser("render", help="asignaciones y controles enviados por página de la grilla")
+    p.add_argument("--filas", type=int, default=50)
+    p.add_argument("--columnas", type=int, default=12)
+    p.add_argument("--paginas", type=int, default=20)
+    p.set_defaults(funcion=bench_render)
+
+    args = parser.parse_args()
+    preparar_entorno()
+    args.funcion(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""Comparación de una tabla entre dos orígenes (dos perfiles/ambientes o dos tablas).
+
+Las filas se emparejan por la clave primaria. En lugar de traer las tablas,
+cada lado calcula en el servidor un resumen por rango de claves: cantidad de
+filas y suma de los hashes de las filas (HASHBYTES en SQL Server, una función
+registrada en la conexión en SQLite). Los rangos con el mismo resumen en los dos
+lados se descartan; los distintos se parten en subrangos (NTILE sobre la clave)
+y se vuelven a resumir, como en un árbol de Merkle, hasta que son lo bastante
+chicos para traer sus filas y compararlas. Solo viajan los resúmenes y las filas
+de los rangos con diferencias.
+
+Los dos lados deben ser del mismo motor (el hash de fila se arma distinto en
+cada uno) y la clave debe ser de una sola columna, sin valores repetidos ni
+nulos en ninguno de los dos lados (se verifica antes de comparar: una copia o
+tabla de carga puede no tener la clave declarada). Las columnas que solo existen
+en un lado, y las de tipos sin representación de texto estable (geography,
+timestamp, ...), no se comparan.
+
+Uso desde la línea de comandos:
+
+    python comparacion.py TABLA --perfil-a desarrollo --perfil-b produccion
+"""
+import argparse
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import dialecto
+import esquema
+import lob
+
+# Subrangos en que se parte un rango con diferencias
+PARTES = 16
+# Los rangos con hasta estas filas (en el lado mayor) se traen y se comparan fila a fila
+FILAS_HOJA = 256
+# Diferencias que se informan en detalle (el resto solo se cuenta)
+MAX_DIFERENCIAS = 1000
+# Tipos que no se comparan: sin texto estable, o distintos por naturaleza entre bases
+TIPOS_SIN_COMPARAR = {"geography", "geometry", "sql_variant", "timestamp", "rowversion"}
+_FECHAS = {"date", "time", "datetime", "datetime2", "smalldatetime", "datetimeoffset"}
+_TEXTOS = {"char", "varchar", "nchar", "nvarchar", "text", "ntext", "xml", "sysname"}
+
+
+def _hash_sqlite(texto) -> int:
+    """Entero de 40 bits con signo tomado del MD5 del texto (la suma de millones
+    de filas no desborda los enteros de 64 bits de SQLite)."""
+    return int.from_bytes(hashlib.md5(str(texto).encode("utf-8")).digest()[:5], "big", signed=True)
+
+
+def _preparar(conn):
+    """Registra la función de hash en las conexiones SQLite."""
+    real = conn
+    while hasattr(real, "conexion_real"):
+        real = real.conexion_real
+    if dialecto.dialecto(real) == dialecto.SQLITE:
+        real.create_function("siges_hash", 1, _hash_sqlite, deterministic=True)
+
+
+def _texto_columna(col: Dict, dial: str) -> str:
+    """Expresión con el valor de la columna como texto (los NULL como un carácter de control)."""
+    nombre, tipo = col["nombre"], col["tipo"].lower()
+    if dial == dialecto.SQLITE:
+        texto = f"hex({nombre})" if tipo in lob.TIPOS_BINARIOS else f"CAST({nombre} AS TEXT)"
+        return f"COALESCE({texto}, char(30))"
+    if tipo in _FECHAS:
+        texto = f"CONVERT(nvarchar(40), {nombre}, 126)"
+    elif tipo in ("float", "real"):
+        texto = f"CONVERT(nvarchar(40), {nombre}, 2)"
+    elif tipo in lob.TIPOS_BINARIOS:
+        texto = f"CONVERT(nvarchar(max), CAST({nombre} AS varbinary(max)), 1)"
+    elif tipo in _TEXTOS or lob.es_lob(col):
+        texto = f"CAST({nombre} AS nvarchar(max))"
+    else:
+        texto = f"CAST({nombre} AS nvarchar(100))"
+    return f"ISNULL({texto}, NCHAR(30))"
+
+
+class Lado:
+    """Una de las dos tablas comparadas, con su conexión abierta."""
+
+    def __init__(self, conn, tabla: str, clave: str, columnas: List[Dict]):
+        self.conn = conn
+        self.tabla = tabla
+        self.clave = clave
+        self.columnas = columnas
+        self.dial = dialecto.dialecto(conn)
+        self.consultas = 0
+        self.bytes = 0
+        separador = " || char(31) || " if self.dial == dialecto.SQLITE else " + NCHAR(31) + "
+        self.texto_fila = separador.join(_texto_columna(col, self.dial) for col in columnas)
+
+    def _ejecutar(self, sql: str, parametros: tuple) -> List[tuple]:
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(sql, parametros)
+            filas = [tuple(fila) for fila in cursor.fetchall()]
+        finally:
+            cursor.close()
+        self.consultas += 1
+        self.bytes += sum(_tamano(valor) for fila in filas for valor in fila)
+        return filas
+
+    def _rango(self, desde, hasta) -> Tuple[str, tuple]:
+        """WHERE del rango (desde, hasta]; None es sin límite."""
+        condiciones, parametros = [], []
+        if desde is not None:
+            condiciones.append(f"{self.clave} > ?")
+            parametros.append(desde)
+        if hasta is not None:
+            condiciones.append(f"{self.clave} <= ?")
+            parametros.append(hasta)
+        return (" WHERE " + " AND ".join(condiciones)) if condiciones else "", tuple(parametros)
+
+    def claves_invalidas(self) -> int:
+        """Filas cuya clave está repetida o es NULL (COUNT(*) frente a COUNT(DISTINCT clave))."""
+        fila = self._ejecutar(f"SELECT COUNT(*) - COUNT(DISTINCT {self.clave}) FROM {self.tabla}", ())[0]
+        return fila[0] or 0
+
+    def cortes(self, desde, hasta, partes: int) -> List:
+        """Claves que parten el rango en `partes` subrangos con la misma cantidad de filas."""
+        donde, parametros = self._rango(desde, hasta)
+        filas = self._ejecutar(
+            f"SELECT MAX({self.clave}) FROM (SELECT {self.clave}, NTILE({int(partes)}) "
+            f"OVER (ORDER BY {self.clave}) AS grupo FROM {self.tabla}{donde}) AS x "
+            f"GROUP BY grupo ORDER BY MAX({self.clave})",
+            parametros
+        )
+        # Sin repetir (una clave con muchas filas da el mismo máximo en varios grupos);
+        # el último máximo no es un corte: el último subrango llega hasta `hasta`
+        maximos = []
+        for fila in filas:
+            if not maximos or fila[0] != maximos[-1]:
+                maximos.append(fila[0])
+        return maximos[:-1]
+
+    def resumen(self, desde, hasta, cortes: List) -> Dict[int, tuple]:
+        """{subrango: (filas, hash1, hash2)} de los subrangos con filas."""
+        donde, parametros = self._rango(desde, hasta)
+        casos = " ".join(f"WHEN {self.clave} <= ? THEN {i}" for i in range(len(cortes)))
+        grupo = f"CASE {casos} ELSE {len(cortes)} END" if cortes else "0"
+        if self.dial == dialecto.SQLITE:
+            interna = f"SELECT {grupo} AS grupo, {self.texto_fila} AS h FROM {self.tabla}{donde}"
+            # Una sola llamada por fila a la función registrada (es lo que más cuesta)
+            partes = "SUM(siges_hash(h)), 0"
+        else:
+            interna = f"SELECT {grupo} AS grupo, HASHBYTES('MD5', {self.texto_fila}) AS h FROM {self.tabla}{donde}"
+            partes = ("SUM(CAST(CAST(SUBSTRING(h, 1, 4) AS int) AS bigint)), "
+                      "SUM(CAST(CAST(SUBSTRING(h, 5, 4) AS int) AS bigint))")
+        filas = self._ejecutar(
+            f"SELECT grupo, COUNT(*), {partes} FROM ({interna}) AS x GROUP BY grupo",
+            tuple(cortes) + parametros
+        )
+        return {fila[0]: tuple(fila[1:]) for fila in filas}
+
+    def filas(self, desde, hasta) -> Dict:
+        """Filas del rango por valor de clave."""
+        donde, parametros = self._rango(desde, hasta)
+        nombres = ", ".join(col["nombre"] for col in self.columnas)
+        indice = [col["nombre"] for col in self.columnas].index(self.clave)
+        return {fila[indice]: fila for fila in self._ejecutar(
+            f"SELECT {nombres} FROM {self.tabla}{donde}", parametros)}
+
+
+def _tamano(valor) -> int:
+    """Bytes aproximados de un valor recibido del servidor."""
+    if valor is None:
+        return 1
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, str):
+        return len(valor.encode("utf-8"))
+    return 8
+
+
+def _columnas(conn, tabla: str, columnas_esquema: Optional[List[Dict]]) -> List[Dict]:
+    if columnas_esquema is None:
+        columnas_esquema = esquema.cargar_estructura(conn)[1].get(tabla)
+    if not columnas_esquema:
+        raise ValueError(f"No existe la tabla {tabla}")
+    return columnas_esquema
+
+
+def comparar(conectar_a: Callable, tabla_a: str, conectar_b: Callable, tabla_b: Optional[str] = None,
+             columnas_a: Optional[List[Dict]] = None, columnas_b: Optional[List[Dict]] = None,
+             al_avanzar: Optional[Callable[[str], None]] = None) -> Dict:
+    """Compara tabla_a (en conectar_a) con tabla_b (en conectar_b; por omisión, la misma tabla).
+
+    Devuelve las claves que están solo en A o solo en B, las filas distintas
+    (con los valores de las columnas que cambian) y cuánto se transfirió."""
+    inicio = time.perf_counter()
+    tabla_b = tabla_b or tabla_a
+    conn_a = conn_b = None
+    try:
+        conn_a = conectar_a()
+        conn_b = conectar_b()
+        if dialecto.dialecto(conn_a) != dialecto.dialecto(conn_b):
+            raise ValueError("Solo se comparan tablas del mismo motor de base de datos")
+        columnas_a = _columnas(conn_a, tabla_a, columnas_a)
+        columnas_b = _columnas(conn_b, tabla_b, columnas_b)
+        clave = esquema.clave_primaria(columnas_a)
+        if len(clave) != 1:
+            raise ValueError(f"{tabla_a} tiene una clave primaria compuesta; solo se comparan claves de una columna")
+        clave = clave[0]
+        nombres_b = {col["nombre"] for col in columnas_b}
+        if clave not in nombres_b:
+            raise ValueError(f"{tabla_b} no tiene la columna clave {clave}")
+        comunes = [col for col in columnas_a if col["nombre"] in nombres_b
+                   and col["tipo"].lower() not in TIPOS_SIN_COMPARAR]
+        por_nombre_b = {col["nombre"]: col for col in columnas_b}
+        for conn in (conn_a, conn_b):
+            _preparar(conn)
+        a = Lado(conn_a, tabla_a, clave, comunes)
+        b = Lado(conn_b, tabla_b, clave, [por_nombre_b[col["nombre"]] for col in comunes])
+
+        resultado = {
+            "tabla_a": tabla_a, "tabla_b": tabla_b, "clave": clave,
+            "columnas": [col["nombre"] for col in comunes],
+            "solo_columnas_a": [col["nombre"] for col in columnas_a if col["nombre"] not in nombres_b],
+            "solo_columnas_b": sorted(nombres_b - {col["nombre"] for col in columnas_a}),
+            "solo_en_a": [], "solo_en_b": [], "distintas": [], "diferencias": 0,
+            "rangos": 0, "filas_traidas": 0,
+        }
+        # Las consultas de cada lado corren a la vez (una conexión por lado)
+        with ThreadPoolExecutor(max_workers=2) as ejecutor:
+            def ambos(metodo: str, *args):
+                futuro_a = ejecutor.submit(getattr(a, metodo), *args)
+                futuro_b = ejecutor.submit(getattr(b, metodo), *args)
+                return futuro_a.result(), futuro_b.result()
+
+            for lado, invalidas in zip((a, b), ambos("claves_invalidas")):
+                if invalidas:
+                    raise ValueError(f"{lado.tabla} tiene {invalidas} filas con la clave {clave} repetida o nula;"
+                                     " solo se comparan tablas con clave única")
+            total_a, total_b = ambos("resumen", None, None, [])
+            filas_a, filas_b = total_a.get(0, (0,))[0], total_b.get(0, (0,))[0]
+            resultado["filas_a"], resultado["filas_b"] = filas_a, filas_b
+            pendientes = [(None, None, filas_a, filas_b)] if total_a != total_b else []
+            while pendientes:
+                desde, hasta, filas_a, filas_b = pendientes.pop()
+                resultado["rangos"] += 1
+                if max(filas_a, filas_b) <= FILAS_HOJA:
+                    _comparar_filas(resultado, *ambos("filas", desde, hasta), comunes)
+                    if al_avanzar:
+                        al_avanzar(f"{resultado['diferencias']} diferencias, {len(pendientes)} rangos pendientes")
+                    continue
+                # Se parte según el lado con más filas en el rango
+                mayor = a if filas_a >= filas_b else b
+                cortes = mayor.cortes(desde, hasta, PARTES)
+                if not cortes:
+                    # El rango no se puede partir más: se compara fila a fila
+                    _comparar_filas(resultado, *ambos("filas", desde, hasta), comunes)
+                    continue
+                resumen_a, resumen_b = ambos("resumen", desde, hasta, cortes)
+                limites = [desde] + cortes + [hasta]
+                for i in range(len(cortes) + 1):
+                    parte_a, parte_b = resumen_a.get(i), resumen_b.get(i)
+                    if parte_a != parte_b:
+                        pendientes.append((limites[i], limites[i + 1],
+                                           parte_a[0] if parte_a else 0, parte_b[0] if parte_b else 0))
+        resultado["consultas"] = a.consultas + b.consultas
+        resultado["bytes"] = a.bytes + b.bytes
+        resultado["duracion_ms"] = (time.perf_counter() - inicio) * 1000
+        return resultado
+    finally:
+        for conn in (conn_a, conn_b):
+            if conn is not None:
+                conn.close()
+
+
+def _comparar_filas(resultado: Dict, filas_a: Dict, filas_b: Dict, columnas: List[Dict]):
+    resultado["filas_traidas"] += len(filas_a) + len(filas_b)
+
+    def anotar(lista: str, valor):
+        resultado["diferencias"] += 1
+        if resultado["diferencias"] <= MAX_DIFERENCIAS:
+            resultado[lista].append(valor)
+
+    for clave in sorted(filas_a.keys() - filas_b.keys(), key=repr):
+        anotar("solo_en_a", clave)
+    for clave in sorted(filas_b.keys() - filas_a.keys(), key=repr):
+        anotar("solo_en_b", clave)
+    for clave in sorted(filas_a.keys() & filas_b.keys(), key=repr):
+        fila_a, fila_b = filas_a[clave], filas_b[clave]
+        cambios = {col["nombre"]: (fila_a[i], fila_b[i])
+                   for i, col in enumerate(columnas) if fila_a[i] != fila_b[i]}
+        if cambios:
+            anotar("distintas", {"clave": clave, "columnas": cambios})
+
+
+def describir(resultado: Dict) -> str:
+    """Resumen de una línea de una comparación."""
+    if not resultado["diferencias"]:
+        estado = "sin diferencias"
+    else:
+        estado = (f"{resultado['diferencias']} diferencias (solo en A: {len(resultado['solo_en_a'])}, "
+                  f"solo en B: {len(resultado['solo_en_b'])}, distintas: {len(resultado['distintas'])})")
+        if resultado["diferencias"] > MAX_DIFERENCIAS:
+            estado += f"; se detallan las primeras {MAX_DIFERENCIAS}"
+    return (f"{resultado['tabla_a']} ({resultado['filas_a']} filas) vs {resultado['tabla_b']} "
+            f"({resultado['filas_b']} filas): {estado} - {resultado['consultas']} consultas, "
+            f"{resultado['filas_traidas']} filas y {lob.formato_tamano(resultado['bytes'])} transferidos "
+            f"en {resultado['duracion_ms']:.0f} ms")
+
+
+def main():
+    from conexion_sql import ConexionSQL
+    import configuracion
+
+    parser = argparse.ArgumentParser(description="Compara una tabla entre dos perfiles de conexión")
+    parser.add_argument("tabla")
+    parser.add_argument("--tabla-b", help="Tabla del lado B (por omisión, la misma)")
+    parser.add_argument("--perfil-a", default=None, help="Perfil del lado A (por omisión, el activo)")
+    parser.add_argument("--perfil-b", default=None, help="Perfil del lado B (por omisión, el activo)")
+    args = parser.parse_args()
+    perfil_a = args.perfil_a or configuracion.nombre_perfil_activo()
+    perfil_b = args.perfil_b or configuracion.nombre_perfil_activo()
+    resultado = comparar(lambda: ConexionSQL.conectar_perfil(perfil_a), args.tabla,
+                         lambda: ConexionSQL.conectar_perfil(perfil_b), args.tabla_b)
+    print(describir(resultado))
+    for clave in resultado["solo_en_a"]:
+        print(f"  solo en A: {clave}")
+    for clave in resultado["solo_en_b"]:
+        print(f"  solo en B: {clave}")
+    for fila in resultado["distintas"]:
+        cambios = ", ".join(f"{nombre}: {va!r} -> {vb!r}" for nombre, (va, vb) in fila["columnas"].items())
+        print(f"  distinta {fila['clave']}: {cambios}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,434 @@
-import pyodbc
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import configuracion
+import resiliencia
+
+
+class PoolSaturado(Exception):
+    """No se obtuvo una conexión del pool dentro del tiempo de espera."""
+
+
+class PoolDrenado(Exception):
+    """El pool se está vaciando (cambió el perfil): hay que pedir la conexión al pool nuevo."""
+
+
+class PoolConexiones:
+    """Pool de conexiones compartido por todas las sesiones del proceso.
+
+    Cuando no hay conexiones libres, las sesiones esperan su turno en ronda
+    (una conexión liberada pasa a la siguiente sesión con pedidos pendientes),
+    así un usuario con muchas consultas no acapara el pool. Si la espera supera
+    `espera_maxima` segundos o hay demasiados pedidos en cola, se rechaza el
+    pedido con PoolSaturado (control de admisión).
+
+    Una conexión que estuvo libre más de `validar_tras` segundos se prueba con
+    `validar` antes de prestarla; si el servidor la cortó, se reemplaza por una
+    nueva sin que la sesión lo note.
+    """
+
+    def __init__(self, crear, tamano: int = 10, espera_maxima: float = 5.0,
+                 max_en_espera: int = 200, max_en_espera_sesion: int = 10,
+                 validar=None, validar_tras: float = 30.0):
+        self._crear = crear
+        self._validar = validar
+        self.validar_tras = validar_tras
+        self.tamano = tamano
+        self.espera_maxima = espera_maxima
+        self.max_en_espera = max_en_espera
+        self.max_en_espera_sesion = max_en_espera_sesion
+        self._condicion = threading.Condition()
+        self._libres = []        # [(conexión, momento en que se liberó)]
+        self._abiertas = 0
+        self._esperas = {}       # sesión -> deque de turnos pendientes
+        self._ronda = deque()    # sesiones con turnos pendientes, en orden de atención
+        self.rechazos = 0
+        self.esperas_totales = 0
+        self.reconexiones = 0
+        self.drenando = False
+
+    def _en_espera(self) -> int:
+        return sum(len(turnos) for turnos in self._esperas.values())
+
+    def obtener(self, sesion=None):
+        """Devuelve una conexión libre (o nueva) para la sesión."""
+        revisar = None
+        with self._condicion:
+            if self.drenando:
+                raise PoolDrenado()
+            if not self._ronda and self._libres:
+                conexion, liberada = self._libres.pop()
+                if self._validar is None or time.monotonic() - liberada < self.validar_tras:
+                    return conexion
+                # Libre hace rato: se prueba fuera del bloqueo, conservando su lugar
+                revisar = conexion
+                turno = {"conexion": None, "crear": True}
+            elif not self._ronda and self._abiertas < self.tamano:
+                self._abiertas += 1
+                turno = {"conexion": None, "crear": True}
+            else:
+                pendientes = self._esperas.setdefault(sesion, deque())
+                if self._en_espera() >= self.max_en_espera or len(pendientes) >= self.max_en_espera_sesion:
+                    self.rechazos += 1
+                    raise PoolSaturado("Servidor ocupado: demasiadas consultas en espera")
+                turno = {"conexion": None, "crear": False}
+                pendientes.append(turno)
+                if sesion not in self._ronda:
+                    self._ronda.append(sesion)
+                self.esperas_totales += 1
+                limite = time.monotonic() + self.espera_maxima
+                while turno["conexion"] is None and not turno["crear"]:
+                    if turno.get("drenado"):
+                        raise PoolDrenado()
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        pendientes.remove(turno)
+                        if not pendientes:
+                            del self._esperas[sesion]
+                            self._ronda.remove(sesion)
+                        self.rechazos += 1
+                        raise PoolSaturado("Servidor ocupado: no hay conexiones disponibles")
+                    self._condicion.wait(restante)
+                if turno["conexion"] is not None:
+                    return turno["conexion"]
+
+        if revisar is not None:
+            try:
+                self._validar(revisar)
+                return revisar
+            except Exception:
+                # Cortada por el servidor (reinicio, red): se reemplaza
+                with self._condicion:
+                    self.reconexiones += 1
+                try:
+                    revisar.close()
+                except Exception:
+                    pass
+
+        # Hay un lugar reservado: la conexión se abre fuera del bloqueo
+        try:
+            conexion = self._crear()
+            if conexion is None:
+                raise ConnectionError("No se pudo establecer la conexión")
+            return conexion
+        except Exception:
+            with self._condicion:
+                self._abiertas -= 1
+                self._ceder_lugar()
+            raise
+
+    def devolver(self, conexion, descartar: bool = False):
+        """Devuelve una conexión al pool (o la cierra si quedó inutilizable)."""
+        if self.drenando:
+            descartar = True
+        if not descartar:
+            try:
+                conexion.rollback()  # no dejar transacciones abiertas entre sesiones
+            except Exception:
+                descartar = True
+        if descartar:
+            try:
+                conexion.close()
+            except Exception:
+                pass
+            with self._condicion:
+                self._abiertas -= 1
+                self._ceder_lugar()
+            return
+        with self._condicion:
+            turno = self._siguiente_turno()
+            if turno is not None:
+                turno["conexion"] = conexion
+                self._condicion.notify_all()
+            else:
+                self._libres.append((conexion, time.monotonic()))
+
+    def _siguiente_turno(self):
+        """Saca el primer turno de la próxima sesión en la ronda (con el bloqueo tomado)."""
+        if not self._ronda:
+            return None
+        sesion = self._ronda.popleft()
+        pendientes = self._esperas[sesion]
+        turno = pendientes.popleft()
+        if pendientes:
+            self._ronda.append(sesion)
+        else:
+            del self._esperas[sesion]
+        return turno
+
+    def _ceder_lugar(self):
+        """Un lugar quedó libre: el siguiente turno abre su propia conexión."""
+        if self._abiertas < self.tamano:
+            turno = self._siguiente_turno()
+            if turno is not None:
+                self._abiertas += 1
+                turno["crear"] = True
+                self._condicion.notify_all()
+
+    def estado(self) -> dict:
+        with self._condicion:
+            return {
+                "abiertas": self._abiertas,
+                "libres": len(self._libres),
+                "en_espera": self._en_espera(),
+                "esperas_totales": self.esperas_totales,
+                "rechazos": self.rechazos,
+                "reconexiones": self.reconexiones,
+            }
+
+    def drenar(self):
+        """Deja de prestar conexiones: los pedidos en espera se derivan al pool nuevo,
+        las libres se cierran ahora y las prestadas al devolverse."""
+        with self._condicion:
+            self.drenando = True
+            for pendientes in self._esperas.values():
+                for turno in pendientes:
+                    turno["drenado"] = True
+            self._esperas.clear()
+            self._ronda.clear()
+            self._condicion.notify_all()
+        self.cerrar()
+
+    def cerrar(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse."""
+        with self._condicion:
+            libres, self._libres = self._libres, []
+            self._abiertas -= len(libres)
+        for conexion, _ in libres:
+            try:
+                conexion.close()
+            except Exception:
+                pass
+
+
+class ConexionPrestada:
+    """Conexión tomada del pool: close() la devuelve en lugar de cerrarla."""
+
+    def __init__(self, pool: PoolConexiones, conexion):
+        self._pool = pool
+        self.conexion_real = conexion
+
+    def __getattr__(self, nombre):
+        return getattr(self.conexion_real, nombre)
+
+    def close(self):
+        if self.conexion_real is not None:
+            conexion, self.conexion_real = self.conexion_real, None
+            self._pool.devolver(conexion)
+
+    def descartar(self):
+        """Cierra la conexión en lugar de devolverla (quedó inutilizable)."""
+        if self.conexion_real is not None:
+            conexion, self.conexion_real = self.conexion_real, None
+            self._pool.devolver(conexion, descartar=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
 
 class ConexionSQL:
+    # Pool compartido del modo servidor (None: una conexión nueva por pedido)
+    _pool = None
+    # Funciones a avisar cuando cambia el perfil de conexión (una por sesión)
+    _avisos_perfil = []
+    # Cortacircuito del servidor actual: falla rápido mientras no responde
+    _circuito = resiliencia.Circuito()
+
+    @staticmethod
+    def activar_pool(tamano: int = None, espera_maxima: float = None, max_en_espera: int = None):
+        """Activa el pool compartido: conectar() pasa a prestar conexiones del pool.
+
+        Los valores no indicados se toman del perfil de conexión activo."""
+        perfil = configuracion.perfil_activo()
+        ConexionSQL._pool = PoolConexiones(
+            ConexionSQL._abrir,
+            tamano or perfil["pool_tamano"],
+            espera_maxima or perfil["pool_espera"],
+            max_en_espera if max_en_espera is not None else perfil["pool_max_en_espera"],
+            validar=ConexionSQL._validar,
+        )
+        return ConexionSQL._pool
+
+    @staticmethod
+    def pool():
+        return ConexionSQL._pool
+
+    @staticmethod
+    def cambiar_perfil(nombre: str, persistir: bool = True) -> dict:
+        """Activa otro perfil sin reiniciar: las conexiones nuevas usan el perfil
+        nuevo y, si hay pool, se crea uno nuevo y el anterior se drena.
+        Con persistir=False no se guarda como perfil activo en la configuración."""
+        perfil = configuracion.activar_perfil(nombre, persistir)
+        ConexionSQL._circuito = resiliencia.Circuito()
+        anterior = ConexionSQL._pool
+        if anterior is not None:
+            ConexionSQL.activar_pool()
+            anterior.drenar()
+        for aviso in list(ConexionSQL._avisos_perfil):
+            try:
+                aviso(nombre)
+            except Exception as e:
+                print("Error al aplicar el cambio de perfil:", e)
+        return perfil
+
+    @staticmethod
+    def al_cambiar_perfil(aviso):
+        ConexionSQL._avisos_perfil.append(aviso)
+
+    @staticmethod
+    def quitar_aviso(aviso):
+        if aviso in ConexionSQL._avisos_perfil:
+            ConexionSQL._avisos_perfil.remove(aviso)
+
+    @staticmethod
+    def circuito() -> resiliencia.Circuito:
+        return ConexionSQL._circuito
+
+    @staticmethod
+    def conectar(sesion=None):
+        """Devuelve una conexión; con el pool activo, una conexión prestada para la sesión.
+
+        Nunca devuelve None: si no se puede conectar lanza ErrorConexion (o
+        CircuitoAbierto mientras el servidor no responde)."""
+        while ConexionSQL._pool is not None:
+            pool = ConexionSQL._pool
+            try:
+                return ConexionPrestada(pool, pool.obtener(sesion))
+            except PoolDrenado:
+                continue  # cambió el perfil mientras se esperaba: se pide al pool nuevo
+        return ConexionSQL._abrir()
+
     @staticmethod
-    def conectar():
-        """Establece la conexión con SQL Server y devuelve el objeto conexión."""
+    def leer(funcion, sesion=None):
+        """Ejecuta funcion(conn) con reintentos ante fallas transitorias.
+
+        Solo para lecturas (idempotentes): en cada intento se usa otra
+        conexión y la que falló se descarta en lugar de volver al pool.
+        Las fallas al abrir la conexión ya se reintentaron en _abrir y no se
+        repiten aquí (los reintentos no se multiplican)."""
+        circuito = ConexionSQL._circuito
+
+        def intento():
+            circuito.verificar()
+            conn = ConexionSQL.conectar(sesion)
+            try:
+                resultado = funcion(conn)
+            except Exception as e:
+                if resiliencia.es_transitorio(e):
+                    if isinstance(conn, ConexionPrestada):
+                        conn.descartar()
+                    circuito.falla(e)
+                raise
+            finally:
+                conn.close()
+            circuito.exito()
+            return resultado
+
+        return resiliencia.reintentar(
+            intento, reintentable=lambda e: resiliencia.es_transitorio(e)
+            and not isinstance(e, resiliencia.ErrorConexion)
+        )
+
+    @staticmethod
+    def conectar_perfil(nombre: str):
+        """Conexión directa (fuera del pool) con otro perfil, p. ej. para comparar
+        tablas entre ambientes. Con SIGES_SQLITE, el perfil activo sigue siendo la
+        base sustituta, pero los demás perfiles se abren tal como están configurados."""
+        if nombre == configuracion.nombre_perfil_activo():
+            return ConexionSQL._abrir()
+        perfil = configuracion.actual()["perfiles"][nombre]
+        return resiliencia.reintentar(lambda: ConexionSQL._abrir_una_vez(perfil))
+
+    @staticmethod
+    def _validar(conexion):
+        """Prueba una conexión libre del pool (lanza si el servidor la cortó)."""
+        cursor = conexion.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _abrir():
+        """Abre una conexión nueva con reintentos y cortacircuito (ver resiliencia.py)."""
+        return resiliencia.reintentar(ConexionSQL._abrir_una_vez, circuito=ConexionSQL._circuito)
+
+    @staticmethod
+    def _abrir_una_vez(perfil: dict = None):
+        """Establece la conexión según el perfil indicado (o el activo) y devuelve el objeto conexión.
+
+        Si la variable de entorno SIGES_SQLITE apunta a un archivo, se usa esa
+        base SQLite local como sustituta del perfil activo (pruebas y benchmarks)."""
+        if perfil is None:
+            ruta_sqlite = os.environ.get("SIGES_SQLITE")
+            if ruta_sqlite:
+                return ConexionSQL._conectar_sqlite(ruta_sqlite)
+            perfil = configuracion.perfil_activo()
+        if perfil["tipo"] == "sqlite":
+            return ConexionSQL._conectar_sqlite(perfil["ruta"])
+
+        # Importación diferida: pyodbc solo se carga al abrir la primera conexión
+        import pyodbc
         try:
             connection = pyodbc.connect(
-                "Driver={SQL Server};"
-                "Server=PC-1BDIRINVES05;"
-                "Database=SIGETRATA;"
-                "Trusted_Connection=yes;"
+                configuracion.cadena_conexion(perfil), timeout=perfil["timeout_conexion"]
             )
+            if perfil["timeout_consulta"]:
+                connection.timeout = perfil["timeout_consulta"]
             print("Conexión exitosa a la base de datos.")
             return connection
         except pyodbc.Error as e:
             print("Error al conectar a la base de datos:", e)
-            return None  # Devuelve None si hay un error
+            raise resiliencia.ErrorConexion(f"No se pudo conectar a la base de datos: {e}") from e
+
+    @staticmethod
+    def _conectar_sqlite(ruta: str):
+        """Abre la base SQLite sustituta (se comparte entre hilos de la interfaz).
+
+        Con SIGES_FALLAS definida se usa el driver con inyección de fallas."""
+        import sqlite3
+        import driver_fallas
+        try:
+            if driver_fallas.activo():
+                return driver_fallas.conectar(ruta)
+            connection = sqlite3.connect(ruta, check_same_thread=False)
+            print("Conexión exitosa a la base de datos.")
+            return connection
+        except sqlite3.Error as e:
+            print("Error al conectar a la base de datos:", e)
+            raise resiliencia.ErrorConexion(f"No se pudo conectar a la base de datos: {e}") from e
+
+    @staticmethod
+    def identificador() -> str:
+        """Identifica el origen de datos actual (se usa como clave de caché)."""
+        ruta_sqlite = os.environ.get("SIGES_SQLITE")
+        if ruta_sqlite:
+            return f"sqlite:{os.path.abspath(ruta_sqlite)}"
+        perfil = configuracion.perfil_activo()
+        if perfil["tipo"] == "sqlite":
+            return f"sqlite:{os.path.abspath(perfil['ruta'])}"
+        return f"mssql:{perfil['servidor']}/{perfil['base']}"
+
+    @staticmethod
+    def dialecto() -> str:
+        """Dialecto del origen de datos actual sin conectar ("mssql" o "sqlite", como dialecto.py)."""
+        return ConexionSQL.identificador().split(":", 1)[0]
+
+    @staticmethod
+    def errores_driver() -> tuple:
+        """Clases de error de los drivers ya cargados (para usar en except)."""
+        errores = []
+        for modulo in ("pyodbc", "sqlite3"):
+            if modulo in sys.modules:
+                errores.append(sys.modules[modulo].Error)
+        return tuple(errores)
 
     @staticmethod
     def cerrar_conexion(connection):
@@ -27,5 +440,4 @@ class ConexionSQL:
 # Prueba de conexión
 if __name__ == "__main__":
     conn = ConexionSQL.conectar()
-    if conn:
-        ConexionSQL.cerrar_conexion(conn)
+    ConexionSQL.cerrar_conexion(conn)
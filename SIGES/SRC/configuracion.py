@@ -0,0 +1,350 @@
+"""Configuración persistente de SIGES: perfiles de conexión y ajustes de rendimiento.
+
+La configuración es un archivo JSON (SIGES_CONFIG, o configuracion.json en el
+directorio local de SIGES). Si no existe, se usan los valores predeterminados,
+que equivalen a la conexión fija anterior. Perfiles y ajustes se validan al
+cargar y al guardar.
+
+Uso:
+    python configuracion.py mostrar
+    python configuracion.py validar
+    python configuracion.py perfil NOMBRE campo=valor [campo=valor ...]
+    python configuracion.py activar NOMBRE
+    python configuracion.py ajuste campo=valor [campo=valor ...]
+"""
+import copy
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import esquema
+
+VERSION_CONFIG = 1
+
+PERFIL_PREDETERMINADO = {
+    "tipo": "mssql",                 # "mssql" o "sqlite"
+    "driver": "SQL Server",
+    "servidor": "PC-1BDIRINVES05",
+    "base": "SIGETRATA",
+    "autenticacion": "windows",      # "windows" (Trusted_Connection) o "sql"
+    "usuario": "",
+    "clave": "",                     # vacía: se toma de la variable SIGES_CLAVE
+    "ruta": "",                      # archivo de la base (solo tipo sqlite)
+    "pool_tamano": 10,
+    "pool_espera": 5.0,              # segundos de espera por una conexión del pool
+    "pool_max_en_espera": 200,
+    "timeout_conexion": 15,          # segundos para abrir la conexión
+    "timeout_consulta": 0,           # segundos por consulta (0: sin límite)
+    "tam_lote": 500,                 # filas por fetchmany al leer resultados
+    "tam_paquete": 0,                # Packet Size de TDS en bytes (0: el del driver)
+    "mars": False,                   # MARS_Connection
+}
+
+AJUSTES_PREDETERMINADOS = {
+    "tam_pagina_normal": 50,
+    "tam_pagina_grande": 25,          # tablas enormes: primera página más chica
+    "filas_carga_completa": 200,      # hasta aquí la grilla muestra la tabla entera
+    "filas_tabla_grande": 1_000_000,
+    "largo_celda": 50,                # caracteres visibles por celda
+    "filas_exportacion_directa": 50_000,  # a partir de aquí se exporta por lotes
+    "tam_lote_exportacion": 5000,
+    "edad_esquema_compartido": 60,    # segundos que una sesión reutiliza la estructura de otra
+    "intervalo_estadisticas": 300,    # refresco de filas/tamaño por tabla
+    "filas_muestra_perfil": 1_000_000,  # tablas mayores: el perfil se calcula sobre una muestra
+    "valores_frecuentes_perfil": 5,
+    # Tablas cuya auditoría se escribe en el servidor dentro de la misma transacción
+    # del cambio (las demás se auditan en diferido, en la base local)
+    "tablas_auditoria_transaccional": [],
+    # Consulta federada: máximo de filas que se traen de cada tabla del servidor
+    "filas_federada_servidor": 1_000_000,
+}
+
+# campo -> (tipo, mínimo, máximo); None = sin límite
+_REGLAS_PERFIL = {
+    "pool_tamano": (int, 1, 500),
+    "pool_espera": (float, 0.1, 600),
+    "pool_max_en_espera": (int, 0, 100_000),
+    "timeout_conexion": (int, 0, 600),
+    "timeout_consulta": (int, 0, 86_400),
+    "tam_lote": (int, 1, 1_000_000),
+    "tam_paquete": (int, 0, 32_767),
+}
+_REGLAS_AJUSTES = {
+    "tam_pagina_normal": (int, 1, 10_000),
+    "tam_pagina_grande": (int, 1, 10_000),
+    "filas_carga_completa": (int, 1, 100_000),
+    "filas_tabla_grande": (int, 1, None),
+    "largo_celda": (int, 5, 10_000),
+    "filas_exportacion_directa": (int, 0, None),
+    "tam_lote_exportacion": (int, 1, 1_000_000),
+    "edad_esquema_compartido": (int, 0, None),
+    "intervalo_estadisticas": (int, 10, None),
+    "filas_muestra_perfil": (int, 1000, None),
+    "valores_frecuentes_perfil": (int, 1, 100),
+    "filas_federada_servidor": (int, 1, None),
+}
+
+
+class ErrorConfiguracion(ValueError):
+    """Configuración inválida (el mensaje detalla los campos)."""
+
+
+def ruta_configuracion() -> str:
+    return os.environ.get("SIGES_CONFIG") or os.path.join(esquema.directorio_cache(), "configuracion.json")
+
+
+def _validar_campos(datos: Dict, reglas: Dict, prefijo: str) -> List[str]:
+    errores = []
+    for campo, (tipo, minimo, maximo) in reglas.items():
+        valor = datos.get(campo)
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) \
+                or (tipo is int and not isinstance(valor, int)):
+            errores.append(f"{prefijo}{campo}: se esperaba un número {'entero' if tipo is int else ''}".rstrip())
+            continue
+        if minimo is not None and valor < minimo or maximo is not None and valor > maximo:
+            rango = f"entre {minimo} y {maximo}" if maximo is not None else f"mayor o igual a {minimo}"
+            errores.append(f"{prefijo}{campo}: debe estar {rango}")
+    return errores
+
+
+def validar_perfil(perfil: Dict, nombre: str = "") -> List[str]:
+    """Lista de errores del perfil (vacía si es válido)."""
+    prefijo = f"perfil {nombre}: " if nombre else ""
+    errores = []
+    desconocidos = set(perfil) - set(PERFIL_PREDETERMINADO)
+    if desconocidos:
+        errores.append(f"{prefijo}campos desconocidos: {', '.join(sorted(desconocidos))}")
+    if perfil.get("tipo") not in ("mssql", "sqlite"):
+        errores.append(f"{prefijo}tipo: debe ser 'mssql' o 'sqlite'")
+    elif perfil["tipo"] == "sqlite":
+        if not perfil.get("ruta"):
+            errores.append(f"{prefijo}ruta: obligatoria para tipo sqlite")
+    else:
+        for campo in ("driver", "servidor", "base"):
+            if not perfil.get(campo):
+                errores.append(f"{prefijo}{campo}: obligatorio")
+        if perfil.get("autenticacion") not in ("windows", "sql"):
+            errores.append(f"{prefijo}autenticacion: debe ser 'windows' o 'sql'")
+        elif perfil["autenticacion"] == "sql" and not perfil.get("usuario"):
+            errores.append(f"{prefijo}usuario: obligatorio con autenticación sql")
+    if not isinstance(perfil.get("mars"), bool):
+        errores.append(f"{prefijo}mars: debe ser true o false")
+    errores.extend(_validar_campos(perfil, _REGLAS_PERFIL, prefijo))
+    paquete = perfil.get("tam_paquete")
+    if isinstance(paquete, int) and 0 < paquete < 512:
+        errores.append(f"{prefijo}tam_paquete: 0 o entre 512 y 32767")
+    return errores
+
+
+def validar(config: Dict) -> List[str]:
+    """Errores de una configuración completa."""
+    errores = []
+    perfiles = config.get("perfiles") or {}
+    if not perfiles:
+        errores.append("no hay perfiles definidos")
+    for nombre, perfil in perfiles.items():
+        errores.extend(validar_perfil(perfil, nombre))
+    if config.get("perfil_activo") not in perfiles:
+        errores.append(f"perfil_activo: no existe el perfil '{config.get('perfil_activo')}'")
+    ajustes = config.get("ajustes") or {}
+    desconocidos = set(ajustes) - set(AJUSTES_PREDETERMINADOS)
+    if desconocidos:
+        errores.append(f"ajustes desconocidos: {', '.join(sorted(desconocidos))}")
+    errores.extend(_validar_campos(ajustes, _REGLAS_AJUSTES, "ajuste "))
+    tablas = ajustes.get("tablas_auditoria_transaccional")
+    if not isinstance(tablas, list) or not all(isinstance(t, str) for t in tablas):
+        errores.append("ajuste tablas_auditoria_transaccional: debe ser una lista de nombres de tabla")
+    return errores
+
+
+def predeterminada() -> Dict:
+    return {
+        "version": VERSION_CONFIG,
+        "perfil_activo": "predeterminado",
+        "perfiles": {"predeterminado": dict(PERFIL_PREDETERMINADO)},
+        "ajustes": dict(AJUSTES_PREDETERMINADOS),
+    }
+
+
+def _completar(config: Dict) -> Dict:
+    """Agrega los campos que falten con sus valores predeterminados."""
+    completa = predeterminada()
+    completa["perfil_activo"] = config.get("perfil_activo", completa["perfil_activo"])
+    if config.get("perfiles"):
+        completa["perfiles"] = {
+            nombre: {**PERFIL_PREDETERMINADO, **perfil} for nombre, perfil in config["perfiles"].items()
+        }
+    completa["ajustes"].update(config.get("ajustes") or {})
+    return completa
+
+
+def cargar(ruta: Optional[str] = None) -> Dict:
+    """Lee y valida la configuración; sin archivo, devuelve la predeterminada."""
+    ruta = ruta or ruta_configuracion()
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+    except FileNotFoundError:
+        return predeterminada()
+    except (OSError, ValueError) as e:
+        raise ErrorConfiguracion(f"No se pudo leer {ruta}: {e}")
+    config = _completar(datos)
+    errores = validar(config)
+    if errores:
+        raise ErrorConfiguracion("Configuración inválida:\n  " + "\n  ".join(errores))
+    return config
+
+
+def guardar(config: Dict, ruta: Optional[str] = None):
+    """Valida y guarda la configuración (escritura atómica); pasa a ser la actual."""
+    global _actual
+    errores = validar(config)
+    if errores:
+        raise ErrorConfiguracion("Configuración inválida:\n  " + "\n  ".join(errores))
+    ruta = ruta or ruta_configuracion()
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({**config, "version": VERSION_CONFIG}, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, ruta)
+    with _bloqueo:
+        _actual = copy.deepcopy(config)
+
+
+# Configuración vigente del proceso (se lee una vez)
+_actual: Optional[Dict] = None
+_bloqueo = threading.Lock()
+
+
+def actual() -> Dict:
+    """Configuración vigente; si el archivo es inválido se avisa y se usan los predeterminados."""
+    global _actual
+    with _bloqueo:
+        if _actual is None:
+            try:
+                _actual = cargar()
+            except ErrorConfiguracion as e:
+                print(e)
+                _actual = predeterminada()
+        return _actual
+
+
+def perfil_activo() -> Dict:
+    config = actual()
+    return config["perfiles"][config["perfil_activo"]]
+
+
+def nombre_perfil_activo() -> str:
+    return actual()["perfil_activo"]
+
+
+def nombres_perfiles() -> List[str]:
+    return sorted(actual()["perfiles"])
+
+
+def ajuste(nombre: str):
+    return actual()["ajustes"][nombre]
+
+
+def activar_perfil(nombre: str, persistir: bool = True) -> Dict:
+    """Marca el perfil como activo y lo guarda; devuelve el perfil.
+
+    Con persistir=False el cambio vale solo para este proceso (el archivo no se toca).
+    """
+    global _actual
+    config = copy.deepcopy(actual())
+    if nombre not in config["perfiles"]:
+        raise ErrorConfiguracion(f"No existe el perfil '{nombre}'")
+    config["perfil_activo"] = nombre
+    if persistir:
+        guardar(config)
+    else:
+        with _bloqueo:
+            _actual = config
+    return config["perfiles"][nombre]
+
+
+def _valor_odbc(valor: str) -> str:
+    """Valor entre llaves para la cadena ODBC (; y = quedan dentro; } se duplica)."""
+    return "{" + str(valor).replace("}", "}}") + "}"
+
+
+def cadena_conexion(perfil: Dict) -> str:
+    """Cadena ODBC de un perfil de SQL Server."""
+    partes = [
+        f"Driver={{{perfil['driver']}}}",
+        f"Server={perfil['servidor']}",
+        f"Database={perfil['base']}",
+    ]
+    if perfil["autenticacion"] == "windows":
+        partes.append("Trusted_Connection=yes")
+    else:
+        partes.append(f"UID={_valor_odbc(perfil['usuario'])}")
+        partes.append(f"PWD={_valor_odbc(perfil['clave'] or os.environ.get('SIGES_CLAVE', ''))}")
+    if perfil["mars"]:
+        partes.append("MARS_Connection=yes")
+    if perfil["tam_paquete"]:
+        partes.append(f"Packet Size={perfil['tam_paquete']}")
+    return ";".join(partes) + ";"
+
+
+def _leer_valor(texto: str):
+    """Valor de la línea de comandos: JSON si se puede (números, true/false), si no texto."""
+    try:
+        return json.loads(texto)
+    except ValueError:
+        return texto
+
+
+def _asignaciones(pares: List[str]) -> Dict:
+    resultado = {}
+    for par in pares:
+        campo, separador, valor = par.partition("=")
+        if not separador:
+            raise ErrorConfiguracion(f"Se esperaba campo=valor: {par}")
+        resultado[campo.strip()] = _leer_valor(valor)
+    return resultado
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Configuración de SIGES")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("mostrar")
+    sub.add_parser("validar")
+    p = sub.add_parser("perfil", help="crea o modifica un perfil")
+    p.add_argument("nombre")
+    p.add_argument("campos", nargs="*")
+    p = sub.add_parser("activar")
+    p.add_argument("nombre")
+    p = sub.add_parser("ajuste")
+    p.add_argument("campos", nargs="+")
+    args = parser.parse_args()
+
+    try:
+        if args.comando == "validar":
+            cargar()
+            print(f"{ruta_configuracion()}: configuración válida")
+            return
+        config = copy.deepcopy(cargar())
+        if args.comando == "perfil":
+            base = config["perfiles"].get(args.nombre, PERFIL_PREDETERMINADO)
+            config["perfiles"][args.nombre] = {**base, **_asignaciones(args.campos)}
+            guardar(config)
+        elif args.comando == "activar":
+            config["perfil_activo"] = args.nombre
+            guardar(config)
+        elif args.comando == "ajuste":
+            config["ajustes"].update(_asignaciones(args.campos))
+            guardar(config)
+        visible = copy.deepcopy(config)
+        for perfil in visible["perfiles"].values():
+            if perfil.get("clave"):
+                perfil["clave"] = "****"
+        print(json.dumps(visible, indent=2, ensure_ascii=False))
+    except ErrorConfiguracion as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
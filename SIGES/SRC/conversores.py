@@ -0,0 +1,294 @@
+"""Conversores de valores por columna: formato para la grilla, para exportar y
+lectura (parseo) del texto ingresado en formularios.
+
+Los conversores se eligen una sola vez por columna a partir del tipo SQL
+(estructura_tablas) o, si no se conoce, del tipo Python de cursor.description.
+Luego se aplican columna por columna, sin revisar el tipo de cada celda.
+"""
+import decimal
+import math
+import re
+import uuid
+from datetime import date, datetime, time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+TEXTO_NULO = "NULL"
+
+# Tipo SQL (DATA_TYPE) -> familia de conversión
+TIPOS_SQL = {
+    "int": "entero", "bigint": "entero", "smallint": "entero", "tinyint": "entero", "integer": "entero",
+    "decimal": "decimal", "numeric": "decimal", "money": "decimal", "smallmoney": "decimal",
+    "float": "flotante", "real": "flotante", "double": "flotante",
+    "bit": "bit", "boolean": "bit",
+    "date": "fecha",
+    "datetime": "fechahora", "datetime2": "fechahora", "smalldatetime": "fechahora",
+    "datetimeoffset": "fechahora", "timestamp without time zone": "fechahora",
+    "time": "hora",
+    "binary": "binario", "varbinary": "binario", "image": "binario", "blob": "binario",
+    # timestamp es el rowversion de SQL Server; en SQLite esquema lo lee como datetime
+    "timestamp": "binario", "rowversion": "binario",
+    "uniqueidentifier": "guid",
+}
+
+# Tipo Python (cursor.description[i][1] en pyodbc) -> familia
+TIPOS_PYTHON = {
+    bool: "bit", int: "entero", float: "flotante", decimal.Decimal: "decimal",
+    datetime: "fechahora", date: "fecha", time: "hora",
+    bytes: "binario", bytearray: "binario", uuid.UUID: "guid", str: "texto",
+}
+
+_VERDADEROS = {"1", "true", "verdadero", "si", "sí", "s"}
+_FALSOS = {"0", "false", "falso", "no", "n"}
+
+# Solo dígitos ASCII: int()/Decimal()/float() aceptan además "1_000", "NaN" e "Infinity"
+_ENTERO = re.compile(r"-?[0-9]+")
+_DECIMAL = re.compile(r"-?[0-9]+(?:\.[0-9]+)?")
+_FLOTANTE = re.compile(r"-?[0-9]+(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+
+
+def familia(tipo_sql: Optional[str] = None, tipo_python=None) -> Optional[str]:
+    """Familia de conversión de una columna (None si no se puede determinar)."""
+    if tipo_sql:
+        return TIPOS_SQL.get(tipo_sql.lower(), "texto")
+    if tipo_python is not None:
+        return TIPOS_PYTHON.get(tipo_python)
+    return None
+
+
+# --- Formato para la grilla -------------------------------------------------
+
+def _vista_decimal(valor) -> str:
+    return format(valor, "f") if isinstance(valor, decimal.Decimal) else str(valor)
+
+
+def _vista_fechahora(valor) -> str:
+    return valor.strftime("%Y-%m-%d %H:%M:%S") if isinstance(valor, datetime) else str(valor)
+
+
+def _vista_fecha(valor) -> str:
+    return valor.strftime("%Y-%m-%d") if isinstance(valor, date) else str(valor)
+
+
+def _vista_binario(valor) -> str:
+    if not isinstance(valor, (bytes, bytearray)):
+        return str(valor)
+    prefijo = "0x" + bytes(valor[:16]).hex().upper()
+    return prefijo + (f"... ({len(valor)} bytes)" if len(valor) > 16 else "")
+
+
+def _vista_bit(valor) -> str:
+    return "Sí" if valor else "No"
+
+
+def _vista_guid(valor) -> str:
+    return str(valor).upper()
+
+
+# --- Formato para exportar ----------------------------------------------------
+
+def _exportar_binario(valor) -> str:
+    return "0x" + bytes(valor).hex().upper() if isinstance(valor, (bytes, bytearray)) else str(valor)
+
+
+def _exportar_fechahora(valor) -> str:
+    return valor.isoformat(sep=" ") if isinstance(valor, datetime) else str(valor)
+
+
+def _exportar_fecha(valor) -> str:
+    return valor.isoformat() if isinstance(valor, date) else str(valor)
+
+
+# --- Lectura del texto de formularios ----------------------------------------
+
+def _numero(texto: str) -> str:
+    """Acepta coma decimal ("12,5") además de punto."""
+    texto = texto.strip()
+    if "," in texto and "." not in texto:
+        texto = texto.replace(",", ".")
+    return texto
+
+
+def _parsear_decimal(texto: str):
+    numero = _numero(texto)
+    if not _DECIMAL.fullmatch(numero):
+        raise ValueError(f"'{texto}' no es un número decimal")
+    return decimal.Decimal(numero)
+
+
+def _parsear_bit(texto: str) -> bool:
+    valor = texto.strip().lower()
+    if valor in _VERDADEROS:
+        return True
+    if valor in _FALSOS:
+        return False
+    raise ValueError(f"'{texto}' no es un valor lógico (use 1/0 o Sí/No)")
+
+
+def _parsear_fecha(texto: str) -> date:
+    texto = texto.strip()
+    for formato in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"'{texto}' no es una fecha (AAAA-MM-DD o DD/MM/AAAA)")
+
+
+def _parsear_fechahora(texto: str) -> datetime:
+    texto = texto.strip()
+    try:
+        return datetime.fromisoformat(texto)
+    except ValueError:
+        pass
+    for formato in ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            pass
+    raise ValueError(f"'{texto}' no es una fecha y hora (AAAA-MM-DD HH:MM:SS)")
+
+
+def _parsear_hora(texto: str) -> time:
+    try:
+        return time.fromisoformat(texto.strip())
+    except ValueError:
+        raise ValueError(f"'{texto}' no es una hora (HH:MM:SS)")
+
+
+def _parsear_binario(texto: str) -> bytes:
+    texto = texto.strip()
+    if texto[:2].lower() == "0x":
+        texto = texto[2:]
+    try:
+        return bytes.fromhex(texto)
+    except ValueError:
+        raise ValueError("El valor binario debe escribirse en hexadecimal (0x...)")
+
+
+def _parsear_guid(texto: str) -> str:
+    try:
+        return str(uuid.UUID(texto.strip())).upper()
+    except ValueError:
+        raise ValueError(f"'{texto}' no es un identificador único válido")
+
+
+def _parsear_entero(texto: str) -> int:
+    if not _ENTERO.fullmatch(texto.strip()):
+        raise ValueError(f"'{texto}' no es un número entero")
+    return int(texto.strip())
+
+
+def _parsear_flotante(texto: str) -> float:
+    numero = _numero(texto)
+    valor = float(numero) if _FLOTANTE.fullmatch(numero) else math.nan
+    if not math.isfinite(valor):
+        raise ValueError(f"'{texto}' no es un número")
+    return valor
+
+
+# Registro de conversores por familia: (vista, exportación, parseo)
+REGISTRO: Dict[str, tuple] = {
+    "entero": (str, str, _parsear_entero),
+    "decimal": (_vista_decimal, _vista_decimal, _parsear_decimal),
+    "flotante": (str, str, _parsear_flotante),
+    "bit": (_vista_bit, lambda v: "1" if v else "0", _parsear_bit),
+    "fecha": (_vista_fecha, _exportar_fecha, _parsear_fecha),
+    "fechahora": (_vista_fechahora, _exportar_fechahora, _parsear_fechahora),
+    "hora": (str, str, _parsear_hora),
+    "binario": (_vista_binario, _exportar_binario, _parsear_binario),
+    "guid": (_vista_guid, _vista_guid, _parsear_guid),
+    "texto": (str, str, str),
+}
+
+
+def registrar(nombre_familia: str, vista: Callable, exportacion: Callable, parseo: Callable,
+              tipos_sql: Sequence[str] = ()):
+    """Agrega (o reemplaza) los conversores de una familia y sus tipos SQL."""
+    REGISTRO[nombre_familia] = (vista, exportacion, parseo)
+    for tipo in tipos_sql:
+        TIPOS_SQL[tipo.lower()] = nombre_familia
+
+
+def _familias(descripcion, columnas_esquema: Optional[List[Dict]]) -> List[Optional[str]]:
+    tipos_sql = {}
+    if columnas_esquema:
+        tipos_sql = {col["nombre"].lower(): col["tipo"] for col in columnas_esquema}
+    resultado = []
+    for col in descripcion:
+        nombre = (col[0] or "").lower()
+        resultado.append(familia(tipos_sql.get(nombre), col[1]))
+    return resultado
+
+
+def formateadores(descripcion, columnas_esquema: Optional[List[Dict]] = None,
+                  largo_maximo: int = 50, respaldo: Optional[Callable] = None) -> List[Callable]:
+    """Un formateador por columna para la grilla (NULL y truncado incluidos).
+
+    Las columnas de tipo desconocido (p. ej. SQLite sin esquema) usan `respaldo`.
+    """
+    resultado = []
+    for nombre_familia in _familias(descripcion, columnas_esquema):
+        if nombre_familia is None and respaldo:
+            resultado.append(respaldo)
+            continue
+        base = REGISTRO[nombre_familia or "texto"][0]
+
+        def formatear(valor, base=base):
+            if valor is None:
+                return TEXTO_NULO
+            texto = base(valor)
+            return texto[:largo_maximo] + "..." if len(texto) > largo_maximo else texto
+        resultado.append(formatear)
+    return resultado
+
+
+def formateadores_exportacion(descripcion, columnas_esquema: Optional[List[Dict]] = None) -> List[Callable]:
+    """Un formateador por columna para CSV (NULL como vacío, binarios en hexadecimal)."""
+    resultado = []
+    for nombre_familia in _familias(descripcion, columnas_esquema):
+        base = REGISTRO[nombre_familia or "texto"][1]
+        resultado.append(lambda valor, base=base: "" if valor is None else base(valor))
+    return resultado
+
+
+def formateadores_edicion(columnas_esquema: List[Dict]) -> List[Callable]:
+    """Formateadores para precargar los campos de un formulario (mismo orden que el esquema)."""
+    return formateadores_exportacion([(col["nombre"], None) for col in columnas_esquema], columnas_esquema)
+
+
+def formatear_columnas(filas: Sequence[Sequence], funciones: List[Callable]) -> List[List[str]]:
+    """Aplica cada formateador a su columna completa (resultado por columnas)."""
+    return [list(map(funcion, (fila[j] for fila in filas))) for j, funcion in enumerate(funciones)]
+
+
+def formatear_filas(filas: Sequence[Sequence], funciones: List[Callable]) -> List[tuple]:
+    """Como formatear_columnas pero devuelve filas (para escribir CSV)."""
+    return list(zip(*formatear_columnas(filas, funciones))) if filas else []
+
+
+def parsers(columnas_esquema: List[Dict]) -> Dict[str, Callable]:
+    """Un parser por columna del esquema: texto del formulario -> valor tipado."""
+    return {
+        col["nombre"]: REGISTRO[familia(col["tipo"]) or "texto"][2]
+        for col in columnas_esquema
+    }
+
+
+def convertir_registro(datos: Dict[str, str], parsers_columnas: Dict[str, Callable],
+                       texto_vacio: Iterable[str] = ()) -> Dict:
+    """Convierte los textos de un formulario; vacío = NULL. Lanza ValueError con el campo.
+
+    En las columnas de `texto_vacio` (texto NOT NULL) vacío es '' en lugar de NULL.
+    """
+    texto_vacio = set(texto_vacio)
+    resultado = {}
+    for columna, texto in datos.items():
+        if texto is None or texto.strip() == "":
+            resultado[columna] = texto if columna in texto_vacio and texto is not None else None
+            continue
+        parser = parsers_columnas.get(columna, str)
+        try:
+            resultado[columna] = parser(texto)
+        except ValueError as e:
+            raise ValueError(f"Campo {columna}: {e}")
+    return resultado
@@ -1,9 +1,25 @@
 import flet as ft
 from conexion_sql import ConexionSQL
-import pyodbc
-import csv
+import auditoria
+import configuracion
+import comparacion
+import conversores
+import datos as capa_datos
+import dialecto
+import escritura_diferida
+import esquema
+import estadisticas
+import formularios
+import lob
+import perfilado
+import proyecciones
+import referencias
+import relaciones
+import renderizador
+import resiliencia
+import threading
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 def main(page: ft.Page):
     # Configuración de la página
@@ -14,13 +30,40 @@ def main(page: ft.Page):
     page.scroll = ft.ScrollMode.AUTO
     page.padding = 0
 
+    # Quién usa esta sesión: en modo servidor la cuenta del proceso (o el usuario SQL
+    # del perfil) es la misma para todos, así que se anota la identidad de la sesión
+    def identidad_sesion() -> Optional[str]:
+        if ConexionSQL.pool() is None:
+            return None
+        cuenta = page.auth.user if getattr(page, "auth", None) else None
+        if cuenta:
+            for campo in ("login", "email", "name", "id"):
+                if cuenta.get(campo):
+                    return str(cuenta[campo])
+        return f"web {page.client_ip or 'sin IP'} ({page.session_id})"
+
     # Variables de estado
-    current_connection = None
     tablas_disponibles: List[str] = []
     estructura_tablas: Dict[str, List[Dict]] = {}
+    # Filas y tamaño aproximados por tabla (catálogo del servidor, refresco en segundo plano)
+    estadisticas_tablas = estadisticas.compartida(ConexionSQL.conectar, ConexionSQL.identificador())
+    # Opciones de las columnas con clave foránea (caché LRU compartida entre sesiones)
+    cache_referencias = referencias.compartida(ConexionSQL.conectar, ConexionSQL.identificador())
+    # Perfiles de tabla (agregados calculados en el servidor), guardados junto al esquema
+    cache_perfiles = perfilado.compartida(ConexionSQL.conectar, ConexionSQL.identificador())
+    # Columnas visibles, orden y anchos por tabla: solo esas columnas se piden al servidor
+    # (en modo servidor, por identidad de la sesión: la elección de un usuario no cambia la de otro)
+    columnas_visibles = proyecciones.compartidas(ConexionSQL.identificador(), identidad_sesion())
 
-    # Variables para formularios dinámicos
-    form_fields = []  
+    # Formularios de alta/modificación: plantilla compilada por tabla y la que está en pantalla
+    plantillas = formularios.Plantillas(page, lambda col, valor: campo_referencia(col, valor))
+    plantilla_actual: formularios.Plantilla = None
+    # Registro en edición (modificar/eliminar): clave original y versión leída
+    edicion: Dict = {}
+    # Altas y modificaciones en segundo plano: diario local y aplicador compartidos
+    diario = escritura_diferida.compartido(conectar=ConexionSQL.conectar, auditar=auditoria.auditar_en)
+    # Auditoría de altas, bajas y modificaciones (imágenes antes/después)
+    registro_cambios = auditoria.compartida()
     dropdown_tablas: ft.Dropdown = None  
     btn_guardar: ft.ElevatedButton = None  
     formulario: ft.Column = None
@@ -42,6 +85,184 @@ def main(page: ft.Page):
         column_spacing=20
     )
 
+    # Registros relacionados (padres e hijos por clave foránea) con caché y precarga
+    cache_navegacion = relaciones.compartida(ConexionSQL.conectar, ConexionSQL.identificador())
+    tabla_en_grilla = None
+    # Registros abiertos en el diálogo de detalle, para "Volver": [(tabla, nombres, valores)]
+    pila_detalle: List[tuple] = []
+    relacionados = {"tabla": None}
+    estado_relacionados = ft.Text("", size=12, color="#000000")
+    tbl_relacionados = ft.DataTable(
+        columns=[ft.DataColumn(ft.Text(""))],
+        rows=[],
+        heading_row_color="#F4F1BB",
+        border=ft.border.all(1, "#000000"),
+        column_spacing=16
+    )
+    grilla_relacionados = renderizador.GrillaReciclable(
+        tbl_relacionados,
+        tam_pool=relaciones.LIMITE_RELACIONADOS,
+        al_ver_detalle=lambda nombres, valores: abrir_detalle(relacionados["tabla"], nombres, valores),
+        estilo_texto={"size": 12, "color": "#000000"},
+        estilo_columna={"color": "#000000", "weight": "bold"}
+    )
+
+    # Detalle completo de un registro a pedido (reemplaza los tooltips por celda)
+    def ver_detalle(nombres, valores):
+        pila_detalle.clear()
+        abrir_detalle(tabla_en_grilla, nombres, valores)
+        # Lo próximo probable: abrir las filas vecinas de la grilla
+        indice = next((i for i, fila in enumerate(grilla_datos.valores) if fila is valores), None)
+        if indice is not None:
+            for vecina in grilla_datos.valores[max(0, indice - 1):indice + 2]:
+                cache_navegacion.precargar(relaciones.navegaciones(estructura_tablas, tabla_en_grilla, nombres, vecina))
+
+    def etiqueta_navegacion(navegacion: Dict) -> str:
+        cantidad = cache_navegacion.cantidad(navegacion)
+        if navegacion["tipo"] == "padre":
+            return f"↑ {navegacion['titulo']}"
+        if cantidad is None:
+            return f"↓ {navegacion['titulo']}"
+        mas = "+" if cantidad >= relaciones.LIMITE_RELACIONADOS else ""
+        return f"↓ {navegacion['titulo']} ({cantidad}{mas})"
+
+    # Valores grandes (LOB) del detalle: se leen completos solo a pedido
+    txt_lob = ft.TextField(multiline=True, read_only=True, min_lines=4, max_lines=12, text_size=12,
+                           visible=False, color="#000000")
+
+    def controles_lob(tabla, nombres, valores) -> List[ft.Control]:
+        columnas = {col["nombre"]: col for col in estructura_tablas.get(tabla) or []}
+        # El valor grande se lee por la clave primaria de la fila (sin clave de una columna, no se ofrece)
+        try:
+            clave = esquema.columna_clave(tabla, estructura_tablas[tabla])
+            valor_clave = valores[list(nombres).index(clave)]
+        except (KeyError, ValueError):
+            return []
+        botones = []
+        for nombre, valor in zip(nombres, valores):
+            if not isinstance(valor, lob.ValorLob) or nombre not in columnas:
+                continue
+            col = columnas[nombre]
+            if not valor.binario:
+                botones.append(ft.OutlinedButton(
+                    f"Ver {nombre}", icon=ft.icons.ARTICLE,
+                    on_click=lambda e, col=col: ver_lob(tabla, col, clave, valor_clave)
+                ))
+            botones.append(ft.OutlinedButton(
+                f"Descargar {nombre} ({lob.formato_tamano(valor.largo)})", icon=ft.icons.DOWNLOAD,
+                on_click=lambda e, col=col: descargar_lob(tabla, col, clave, valor_clave)
+            ))
+        if not botones:
+            return []
+        txt_lob.visible = False
+        txt_lob.value = ""
+        return [ft.Row(botones, wrap=True), txt_lob]
+
+    def ver_lob(tabla: str, col: Dict, clave: str, valor_clave):
+        conn = None
+        try:
+            conn = conectar()
+            texto, truncado = lob.leer_texto(conn, tabla, clave, valor_clave, col)
+            txt_lob.label = col["nombre"] + (" (se muestra el primer MB; descárguelo para verlo completo)"
+                                              if truncado else "")
+            txt_lob.value = texto
+        except Exception as e:
+            txt_lob.label = col["nombre"]
+            txt_lob.value = f"Error: {str(e)}"
+        finally:
+            if conn:
+                conn.close()
+        txt_lob.visible = True
+        page.update()
+
+    def descargar_lob(tabla: str, col: Dict, clave: str, valor_clave):
+        extension = "bin" if lob.es_binario(col) else "txt"
+        nombre_archivo = f"{tabla}_{col['nombre']}_{valor_clave}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+        # Se escribe trozo a trozo en segundo plano
+        def tarea():
+            conn = None
+            try:
+                conn = conectar()
+                escritos = lob.descargar(conn, tabla, clave, valor_clave, col, nombre_archivo)
+                mostrar_mensaje(f"Descargado: {nombre_archivo} ({lob.formato_tamano(escritos)})")
+            except Exception as e:
+                mostrar_mensaje(f"Error al descargar {col['nombre']}: {str(e)}", error=True)
+            finally:
+                if conn:
+                    conn.close()
+
+        mostrar_mensaje(f"Descargando {col['nombre']}...")
+        threading.Thread(target=tarea, daemon=True).start()
+
+    def abrir_detalle(tabla, nombres, valores):
+        pila_detalle.append((tabla, nombres, valores))
+        navegaciones = relaciones.navegaciones(estructura_tablas, tabla, nombres, valores) if tabla else []
+        cache_navegacion.precargar(navegaciones)
+        grilla_relacionados.mostrar([], [])
+        estado_relacionados.value = "Registros relacionados:" if navegaciones else ""
+        extra = controles_lob(tabla, nombres, valores) if tabla else []
+        if navegaciones:
+            extra += [
+                estado_relacionados,
+                ft.Row([
+                    ft.OutlinedButton(etiqueta_navegacion(nav), on_click=lambda e, nav=nav: navegar(nav))
+                    for nav in navegaciones
+                ], wrap=True),
+                ft.Container(ft.ListView([tbl_relacionados]), height=220),
+            ]
+        acciones = [ft.TextButton("Cerrar", on_click=lambda e: cerrar_detalle())]
+        if len(pila_detalle) > 1:
+            acciones.insert(0, ft.TextButton("Volver", on_click=lambda e: volver_detalle()))
+        page.dialog = renderizador.dialogo_detalle(
+            nombres, valores, titulo=f"Detalle: {tabla}" if tabla else "Detalle del registro",
+            extra=extra, acciones=acciones
+        )
+        page.dialog.open = True
+        page.update()
+
+    def navegar(navegacion: Dict):
+        estado_relacionados.value = f"Cargando {navegacion['titulo']}..."
+        page.update()
+        try:
+            nombres, descripcion, filas = cache_navegacion.obtener(navegacion)
+        except Exception as e:
+            estado_relacionados.value = f"Error: {str(e)}"
+            page.update()
+            return
+        if navegacion["tipo"] == "padre" and filas:
+            # El padre es un único registro: se abre directamente
+            abrir_detalle(navegacion["tabla"], nombres, filas[0])
+            return
+        relacionados["tabla"] = navegacion["tabla"]
+        formatos = formateadores_grilla(navegacion["tabla"], descripcion)
+        grilla_relacionados.mostrar(nombres, filas, formateadores=formatos)
+        mas = "+" if len(filas) >= relaciones.LIMITE_RELACIONADOS else ""
+        estado_relacionados.value = f"{navegacion['titulo']} = {navegacion['valor']}: {len(filas)}{mas} registros"
+        page.update()
+        # Lo próximo probable: abrir alguna de las primeras filas
+        for fila in filas[:3]:
+            cache_navegacion.precargar(relaciones.navegaciones(estructura_tablas, navegacion["tabla"], nombres, fila))
+
+    def volver_detalle():
+        pila_detalle.pop()
+        abrir_detalle(*pila_detalle.pop())
+
+    def cerrar_detalle():
+        pila_detalle.clear()
+        page.dialog.open = False
+        page.update()
+
+    # Las filas de tbl_datos se reciclan entre cargas
+    grilla_datos = renderizador.GrillaReciclable(
+        tbl_datos,
+        tam_pool=configuracion.ajuste("tam_pagina_normal"),
+        al_ver_detalle=ver_detalle,
+        estilo_texto={"size": 12, "color": "#000000"},
+        estilo_columna={"color": "#000000", "weight": "bold"}
+    )
+    vista_datos = ft.ListView([tbl_datos], expand=True, auto_scroll=True)
+
     # Navbar superior (se mantiene sin cambios)
     navbar = ft.Container(
         content=ft.Row(
@@ -70,197 +291,429 @@ def main(page: ft.Page):
         border_radius=ft.border_radius.only(top_left=10, top_right=10)
     )
 
+    # Conexión para esta sesión (en modo servidor se presta del pool compartido)
+    def conectar():
+        return ConexionSQL.conectar(sesion=page.session_id)
+
+    # Lectura con reintentos ante fallas transitorias (con otra conexión en cada intento)
+    def leer(funcion):
+        return ConexionSQL.leer(funcion, sesion=page.session_id)
+
     # Funciones generales de mensajes y actualización
     def mostrar_mensaje(mensaje: str, error: bool = False):
         status_bar.value = mensaje
         status_bar.color = ft.colors.RED if error else "#7B1FA2"
         page.update()
 
-    # Cargar estructura de la BD (tablas y columnas)
-    def cargar_estructura_bd():
+    # Cargar estructura de la BD (tablas y columnas) y refrescar la caché local.
+    # Sin forzar, se reutiliza la estructura que otra sesión leyó hace poco.
+    def cargar_estructura_bd(forzar: bool = True):
         nonlocal tablas_disponibles, estructura_tablas
         try:
-            conn = ConexionSQL.conectar()
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT TABLE_NAME 
-                FROM INFORMATION_SCHEMA.TABLES 
-                WHERE TABLE_TYPE = 'BASE TABLE'
-                ORDER BY TABLE_NAME
-            """)
-            tablas_disponibles = [row[0] for row in cursor.fetchall()]
-            for tabla in tablas_disponibles:
-                cursor.execute(f"""
-                    SELECT COLUMN_NAME, DATA_TYPE 
-                    FROM INFORMATION_SCHEMA.COLUMNS 
-                    WHERE TABLE_NAME = '{tabla}'
-                    ORDER BY ORDINAL_POSITION
-                """)
-                estructura_tablas[tabla] = [
-                    {"nombre": row[0], "tipo": row[1]} for row in cursor.fetchall()
-                ]
+            clave = ConexionSQL.identificador()
+            edad = configuracion.ajuste("edad_esquema_compartido")
+            reciente = None if forzar else esquema.estructura_reciente(clave, edad)
+            if reciente:
+                tablas_disponibles, estructura_tablas = reciente
+            else:
+                tablas_disponibles, estructura_tablas = leer(esquema.cargar_estructura)
+                esquema.guardar_cache(clave, tablas_disponibles, estructura_tablas)
             actualizar_lista_tablas()
             mostrar_mensaje(f"Estructura cargada: {len(tablas_disponibles)} tablas")
         except Exception as e:
-            mostrar_mensaje(f"Error: {str(e)}", error=True)
+            mostrar_mensaje(resiliencia.describir(e), error=True)
+
+    # Usar la estructura guardada en caché (si existe) mientras se consulta el servidor
+    def cargar_estructura_cache() -> bool:
+        nonlocal tablas_disponibles, estructura_tablas
+        cache = esquema.leer_cache(ConexionSQL.identificador())
+        if not cache:
+            return False
+        tablas_disponibles, estructura_tablas = cache
+        actualizar_lista_tablas()
+        mostrar_mensaje(f"Estructura en caché: {len(tablas_disponibles)} tablas (actualizando...)")
+        return True
+
+    # Precalentamiento en segundo plano: caché, conexión, estructura y primera vista previa
+    def precalentar():
+        estadisticas_tablas.cargar_cache()
+        if cargar_estructura_cache() and dropdown_tablas.value:
+            cargar_datos_tabla(dropdown_tablas.value)
+        tabla_previa = dropdown_tablas.value
+        cargar_estructura_bd(forzar=False)
+        if dropdown_tablas.value and dropdown_tablas.value != tabla_previa:
+            cargar_datos_tabla(dropdown_tablas.value)
+        estadisticas_tablas.iniciar(al_actualizar=actualizar_lista_tablas)
+        cache_referencias.iniciar()
+
+    # Cambio de perfil de conexión (en cualquier sesión): cachés del nuevo origen y recarga
+    def aplicar_perfil(nombre: str):
+        nonlocal estadisticas_tablas, cache_referencias, cache_navegacion, cache_perfiles, columnas_visibles
+        clave = ConexionSQL.identificador()
+        estadisticas_tablas = estadisticas.compartida(ConexionSQL.conectar, clave)
+        cache_referencias = referencias.compartida(ConexionSQL.conectar, clave)
+        cache_perfiles = perfilado.compartida(ConexionSQL.conectar, clave)
+        columnas_visibles = proyecciones.compartidas(clave, identidad_sesion())
+        cache_navegacion = relaciones.compartida(ConexionSQL.conectar, clave)
+        dropdown_perfil.value = nombre
+        mostrar_mensaje(f"Perfil {nombre}: conectando...")
+        threading.Thread(target=precalentar, daemon=True).start()
+
+    def cambiar_perfil(nombre: str):
+        # En modo servidor el perfil es de todas las sesiones (y se guarda en disco):
+        # una sesión no puede cambiarlo, se elige al iniciar el servidor
+        if ConexionSQL.pool() is not None:
+            dropdown_perfil.value = configuracion.nombre_perfil_activo()
+            mostrar_mensaje("En modo servidor el perfil de conexión no se puede cambiar desde una sesión",
+                            error=True)
+            page.update()
+            return
+        try:
+            ConexionSQL.cambiar_perfil(nombre)
+        except Exception as e:
+            mostrar_mensaje(f"Error al cambiar de perfil: {str(e)}", error=True)
+            dropdown_perfil.value = configuracion.nombre_perfil_activo()
+            page.update()
 
     # Actualizar el dropdown de tablas
     def actualizar_lista_tablas():
+        tablas = list(tablas_disponibles)
+        if dropdown_orden.value == "filas":
+            tablas.sort(key=lambda t: estadisticas_tablas.filas(t) or 0, reverse=True)
+        elif dropdown_orden.value == "tamano":
+            tablas.sort(key=lambda t: estadisticas_tablas.bytes(t) or 0, reverse=True)
         dropdown_tablas.options = [
-            ft.dropdown.Option(tabla) for tabla in tablas_disponibles
+            ft.dropdown.Option(key=tabla, text=estadisticas_tablas.etiqueta(tabla)) for tabla in tablas
         ]
-        # Después de cargar las opciones:
-        if dropdown_tablas.options:
+        # Después de cargar las opciones (se conserva la selección si sigue existiendo):
+        if dropdown_tablas.value not in tablas_disponibles and dropdown_tablas.options:
             dropdown_tablas.value = dropdown_tablas.options[0].key
 
         page.update()
 
+    # Conversores por columna para la grilla, con el largo de celda configurado
+    def formateadores_grilla(tabla: str, descripcion):
+        largo = configuracion.ajuste("largo_celda")
+        return conversores.formateadores(
+            descripcion, estructura_tablas.get(tabla), largo_maximo=largo,
+            respaldo=lambda valor: renderizador.texto_celda(valor, largo)
+        )
+
     # Función para visualizar registros de la tabla
     def cargar_datos_tabla(tabla: str):
-        nonlocal current_connection
+        nonlocal tabla_en_grilla
         try:
-            if current_connection:
-                current_connection.close()
-            current_connection = ConexionSQL.conectar()
-            cursor = current_connection.cursor()
-            cursor.execute(f"SELECT TOP 50 * FROM {tabla}")
-
-            # Configurar columnas con tooltips
-            columnas = []
-            for col in cursor.description:
-                nombre_columna = col[0] if col[0] else "Columna"
-                tooltip_text = f"{nombre_columna} ({col[1]})" if col[1] else nombre_columna
-                columnas.append(
-                    ft.DataColumn(
-                        ft.Text(nombre_columna, color="#000000", weight="bold"),
-                        tooltip=tooltip_text if tooltip_text else None
-                    )
-                )
-
-            # Configurar filas con tooltips
-            filas = []
-            for row in cursor.fetchall():
-                celdas = []
-                for valor in row:
-                    texto = str(valor)[:50] + "..." if valor and len(str(valor)) > 50 else str(valor) if valor is not None else "NULL"
-                    tooltip_valor = str(valor) if valor is not None else "NULL"
-                    celdas.append(
-                        ft.DataCell(
-                                    ft.Container(
-                                        content=ft.Text(texto, color="#000000", size=12),
-                                        tooltip=tooltip_valor if tooltip_valor else ""
-                                    )
-                                )
-
-                    )
-                filas.append(ft.DataRow(cells=celdas))
+            # El tamaño de página depende de las filas estimadas de la tabla
+            filas_estimadas = estadisticas_tablas.filas(tabla)
+            limite = estadisticas.tam_pagina(filas_estimadas)
+            # Solo las columnas visibles; las LOB llegan como prefijo y largo y el valor
+            # completo se lee a pedido. La conexión se libera apenas se leyeron las filas.
+            columnas = columnas_visibles.columnas(tabla, estructura_tablas.get(tabla))
+            nombres, descripcion, filas = leer(
+                lambda conn: capa_datos.leer_registros(conn, tabla, limite, columnas)
+            )
+            # Columnas con tooltip de tipo; los valores se vuelcan en las filas recicladas
+            tooltips = [f"{nombre} ({col[1]})" if col[1] else nombre for nombre, col in zip(nombres, descripcion)]
+            # Un conversor por columna según el tipo SQL del esquema
+            formatos = formateadores_grilla(tabla, descripcion)
+            grilla_datos.mostrar(nombres, filas, tooltips, formatos, columnas_visibles.anchos(tabla, nombres))
+            tabla_en_grilla = tabla
+            if filas:
+                cache_navegacion.precargar(relaciones.navegaciones(estructura_tablas, tabla, nombres, filas[0]))
 
-            tbl_datos.columns = columnas
-            tbl_datos.rows = filas
-            mostrar_mensaje(f"{tabla}: {len(filas)} registros cargados")
-            # Mostrar la tabla en el área dinámica
-            content_area.content = ft.ListView([tbl_datos], expand=True, auto_scroll=True)
+            total = f" de ~{estadisticas.formato_cantidad(filas_estimadas)}" if filas_estimadas is not None else ""
+            mostrar_mensaje(f"{tabla}: {len(filas)}{total} registros cargados")
+            # Mostrar la tabla en el área dinámica (siempre el mismo contenedor)
+            content_area.content = vista_datos
         except Exception as e:
-            mostrar_mensaje(f"Error al cargar {tabla}: {str(e)}", error=True)
+            mostrar_mensaje(resiliencia.describir(e, f"Error al cargar {tabla}"), error=True)
             tbl_datos.columns = [ft.DataColumn(ft.Text("Error", color=ft.colors.RED))]
             tbl_datos.rows = [ft.DataRow(cells=[ft.DataCell(ft.Text(str(e), color=ft.colors.RED))])]
-            content_area.content = ft.ListView([tbl_datos], expand=True)
+            content_area.content = vista_datos
         finally:
             page.update()
 
+    # Perfil de la tabla: nulos, distintos, mínimo/máximo y valores frecuentes por columna
+    txt_perfil = ft.Text("", size=13, color="#000000")
+    tbl_perfil = ft.DataTable(
+        columns=[ft.DataColumn(ft.Text(titulo, weight="bold", color="#000000")) for titulo in
+                 ("Columna", "Tipo", "Nulos", "Distintos", "Mínimo", "Máximo", "Más frecuentes")],
+        rows=[],
+        heading_row_color="#F4F1BB",
+        border=ft.border.all(1, "#000000"),
+        border_radius=8,
+        column_spacing=20
+    )
+    vista_perfil = ft.Column([
+        ft.Row([
+            txt_perfil,
+            ft.IconButton(ft.icons.REFRESH, tooltip="Recalcular",
+                          on_click=lambda e: mostrar_perfil(dropdown_tablas.value, recalcular=True)),
+        ]),
+        ft.ListView([tbl_perfil], expand=True),
+    ], expand=True)
+
+    def celda_perfil(texto) -> ft.DataCell:
+        texto = "" if texto is None else str(texto)
+        largo = configuracion.ajuste("largo_celda")
+        return ft.DataCell(ft.Text(texto[:largo] + "..." if len(texto) > largo else texto,
+                                   size=12, color="#000000", tooltip=texto if len(texto) > largo else None))
+
+    def pintar_perfil(tabla: str, perfil: Dict):
+        filas = []
+        for col in perfil["columnas"]:
+            nulos = f"{col['nulos']} ({100.0 * col['nulos'] / col['filas']:.1f}%)" if col["filas"] else "0"
+            frecuentes = ", ".join(
+                f"{renderizador.TEXTO_NULO if valor is None else valor} ({veces})"
+                for valor, veces in col.get("frecuentes", [])
+            )
+            if "distintos" in col and "frecuentes" not in col:
+                frecuentes = "(sin repetidos)"
+            filas.append(ft.DataRow(cells=[
+                celda_perfil(col["nombre"]), celda_perfil(col["tipo"]), celda_perfil(nulos),
+                celda_perfil(col.get("distintos")), celda_perfil(col.get("minimo")),
+                celda_perfil(col.get("maximo")), celda_perfil(frecuentes),
+            ]))
+        tbl_perfil.rows = filas
+        muestra = f" (muestra del {perfil['muestra']:g}%)" if perfil["muestra"] else ""
+        txt_perfil.value = (f"Perfil de {tabla}: {perfil['filas']} filas{muestra} - "
+                            f"calculado {perfil['calculado'].replace('T', ' ')} en {perfil['duracion_ms']:.0f} ms")
+
+    def mostrar_perfil(tabla: str, recalcular: bool = False):
+        if not tabla:
+            mostrar_mensaje("Seleccione una tabla primero", error=True)
+            return
+        columnas_esquema = estructura_tablas.get(tabla, [])
+        perfil = None if recalcular else cache_perfiles.obtener(tabla, columnas_esquema)
+        content_area.content = vista_perfil
+        if perfil:
+            pintar_perfil(tabla, perfil)
+            mostrar_mensaje(f"Perfil de {tabla} (guardado)")
+            return
+        tbl_perfil.rows = []
+        txt_perfil.value = f"Calculando el perfil de {tabla}..."
+        mostrar_mensaje(txt_perfil.value)
+
+        # Las consultas de agregación corren en el servidor, en segundo plano
+        def tarea():
+            try:
+                perfil = cache_perfiles.calcular(tabla, columnas_esquema, estadisticas_tablas.filas(tabla))
+                pintar_perfil(tabla, perfil)
+                mostrar_mensaje(f"Perfil de {tabla} calculado en {perfil['duracion_ms']:.0f} ms")
+            except Exception as e:
+                txt_perfil.value = f"Error al calcular el perfil de {tabla}"
+                mostrar_mensaje(f"Error al calcular el perfil: {str(e)}", error=True)
+
+        threading.Thread(target=tarea, daemon=True).start()
+
+    # Comparación de la tabla con otra tabla o con la misma tabla en otro perfil
+    # (resúmenes por rango de claves en el servidor, ver comparacion.py)
+    dropdown_perfil_b = ft.Dropdown(
+        label="Perfil B", width=200,
+        options=[ft.dropdown.Option(nombre) for nombre in configuracion.nombres_perfiles()],
+        text_style=ft.TextStyle(color="#000000"), label_style=ft.TextStyle(color="#000000")
+    )
+    txt_tabla_b = ft.TextField(label="Tabla B (vacío: la misma)", width=250, bgcolor="#ffffff",
+                               text_style=ft.TextStyle(color="#000000"))
+    txt_comparacion = ft.Text("", size=13, color="#000000")
+    lista_comparacion = ft.ListView(expand=True, spacing=2)
+    vista_comparacion = ft.Column([
+        ft.Row([
+            dropdown_perfil_b,
+            txt_tabla_b,
+            ft.ElevatedButton("Comparar", icon=ft.icons.COMPARE_ARROWS,
+                              on_click=lambda e: comparar_tabla(dropdown_tablas.value)),
+        ], wrap=True),
+        txt_comparacion,
+        lista_comparacion,
+    ], expand=True)
+
+    def mostrar_comparacion():
+        if not dropdown_tablas.value:
+            mostrar_mensaje("Seleccione una tabla primero", error=True)
+            return
+        dropdown_perfil_b.value = dropdown_perfil_b.value or configuracion.nombre_perfil_activo()
+        txt_comparacion.value = f"Comparar {dropdown_tablas.value} ({configuracion.nombre_perfil_activo()}) con:"
+        content_area.content = vista_comparacion
+        page.update()
+
+    def linea_comparacion(texto: str, color: str) -> ft.Text:
+        return ft.Text(texto, size=12, color=color, selectable=True)
+
+    def comparar_tabla(tabla: str):
+        if not tabla:
+            mostrar_mensaje("Seleccione una tabla primero", error=True)
+            return
+        perfil_b = dropdown_perfil_b.value or configuracion.nombre_perfil_activo()
+        tabla_b = (txt_tabla_b.value or "").strip() or tabla
+        # Se comparan las columnas visibles. En el mismo perfil, la estructura
+        # de las dos tablas ya está cargada
+        mismo_perfil = perfil_b == configuracion.nombre_perfil_activo()
+        columnas_b = estructura_tablas.get(tabla_b) if mismo_perfil else None
+        lista_comparacion.controls = []
+        txt_comparacion.value = f"Comparando {tabla} con {perfil_b}.{tabla_b}..."
+        mostrar_mensaje(txt_comparacion.value)
+
+        def avance(texto: str):
+            txt_comparacion.value = f"Comparando {tabla} con {perfil_b}.{tabla_b}: {texto}"
+            page.update()
+
+        def tarea():
+            try:
+                resultado = comparacion.comparar(
+                    conectar, tabla, lambda: ConexionSQL.conectar_perfil(perfil_b), tabla_b,
+                    columnas_a=columnas_visibles.columnas(tabla, estructura_tablas.get(tabla)),
+                    columnas_b=columnas_b, al_avanzar=avance
+                )
+            except Exception as e:
+                txt_comparacion.value = f"Error al comparar {tabla}"
+                mostrar_mensaje(resiliencia.describir(e, "Error al comparar"), error=True)
+                return
+            lineas = []
+            for nombre in resultado["solo_columnas_a"] + resultado["solo_columnas_b"]:
+                lineas.append(linea_comparacion(f"Columna {nombre} en un solo lado (no se compara)", "#7B1FA2"))
+            for clave in resultado["solo_en_a"]:
+                lineas.append(linea_comparacion(f"Solo en A: {clave}", "#2E7D32"))
+            for clave in resultado["solo_en_b"]:
+                lineas.append(linea_comparacion(f"Solo en B: {clave}", "#C62828"))
+            for fila in resultado["distintas"]:
+                cambios = ", ".join(f"{nombre}: {renderizador.TEXTO_NULO if va is None else va} → "
+                                    f"{renderizador.TEXTO_NULO if vb is None else vb}"
+                                    for nombre, (va, vb) in fila["columnas"].items())
+                lineas.append(linea_comparacion(f"Distinta {fila['clave']}: {cambios}", "#000000"))
+            lista_comparacion.controls = lineas
+            txt_comparacion.value = comparacion.describir(resultado)
+            mostrar_mensaje(f"Comparación de {tabla} terminada: {resultado['diferencias']} diferencias")
+
+        threading.Thread(target=tarea, daemon=True).start()
+
+    # Columna con clave foránea: buscador + lista con las filas de la tabla referenciada.
+    # Devuelve (control para el formulario, control que tiene el valor).
+    def campo_referencia(col: Dict, valor: str = ""):
+        ref = col["referencia"]
+        etiqueta = referencias.columna_etiqueta(estructura_tablas.get(ref["tabla"], []), ref["columna"])
+        lista = ft.Dropdown(
+            label=col["nombre"],
+            width=300,
+            value=valor or None,
+            tooltip=f"Referencia a {ref['tabla']}.{ref['columna']}",
+            bgcolor="#ffffff",
+            text_style=ft.TextStyle(color="#000000")
+        )
+
+        def poner_opciones(texto: str):
+            opciones = cache_referencias.buscar(ref["tabla"], ref["columna"], etiqueta, texto)
+            lista.options = [ft.dropdown.Option(key=clave, text=etiqueta_opcion) for clave, etiqueta_opcion in opciones]
+            # El valor elegido se conserva aunque no esté entre los resultados de la búsqueda
+            if lista.value and all(op.key != lista.value for op in lista.options):
+                lista.options.insert(0, ft.dropdown.Option(lista.value))
+
+        def buscar(e):
+            try:
+                poner_opciones(e.control.value)
+            except Exception as ex:
+                mostrar_mensaje(f"Error buscando en {ref['tabla']}: {str(ex)}", error=True)
+            page.update()
+
+        buscador = ft.TextField(
+            hint_text=f"Buscar en {ref['tabla']}...",
+            width=300,
+            dense=True,
+            on_change=buscar,
+            bgcolor="#ffffff",
+            text_style=ft.TextStyle(color="#000000")
+        )
+        poner_opciones("")
+        return ft.Column([buscador, lista], spacing=2), lista
+
     # Función para cargar formulario dinámico para agregar registro
     def actualizar_formulario_agregar():
+        nonlocal plantilla_actual
         tabla = dropdown_tablas.value
         if not tabla:
             return
 
         try:
-            conn = ConexionSQL.conectar()
-            cursor = conn.cursor()
-            cursor.execute(f"""
-                SELECT COLUMN_NAME, DATA_TYPE 
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = '{tabla}'
-            """)
-            columnas = cursor.fetchall()
-            conn.close()
+            # La plantilla se arma una vez por tabla desde la estructura en caché;
+            # en los usos siguientes solo se vacían sus campos
+            plantilla_actual = plantillas.obtener(tabla, estructura_tablas[tabla])
+            formulario.controls = plantilla_actual.reiniciar()
         except Exception as e:
-            mostrar_mensaje(f"Error: {str(e)}", error=True)
+            mostrar_mensaje(resiliencia.describir(e), error=True)
             return
-
-        # Limpiar formulario anterior
-        formulario.controls.clear()
-        form_fields.clear()
-
-        for columna, tipo in columnas:
-            # Determinar tipo de campo según SQL Server
-            if "int" in tipo or "decimal" in tipo:
-                input_type = "number"
-            elif "date" in tipo:
-                input_type = "date"
-            else:
-                input_type = "text"
-
-            campo = ft.TextField(
-                label=columna, 
-                width=300, 
-                tooltip=f"Tipo: {tipo}",
-                bgcolor="#ffffff",
-                text_style=ft.TextStyle(color="#000000"),
-                input_filter=input_type
-            )
-            form_fields.append((columna, campo))
-            formulario.controls.append(campo)
         btn_guardar.text = "Agregar Registro"
+        btn_guardar.on_click = lambda e: guardar_registro()
         btn_guardar.visible = True
         # Mostrar formulario en el área dinámica
         content_area.content = formulario
         page.update()
 
+    # Entrada de auditoría de un cambio hecho desde esta sesión
+    def entrada_auditoria(operacion: str, tabla: str, clave, valor_clave, antes, despues, detalle=None):
+        return auditoria.entrada(ConexionSQL.identificador(), operacion, tabla, clave, valor_clave,
+                                 antes, despues, sesion=page.session_id, detalle=detalle,
+                                 quien=identidad_sesion())
+
+    # Se audita en la misma transacción (tablas del ajuste) o se encola para escribir por lotes
+    def auditar_en(entrada):
+        return auditoria.auditar_en(entrada, registro_cambios)
+
     # Función para guardar registro (para agregar)
     def guardar_registro():
-        tabla = dropdown_tablas.value
-        if not tabla:
+        if plantilla_actual is None:
             mostrar_mensaje("Seleccione una tabla", error=True)
             return
+        tabla = plantilla_actual.tabla
 
-        datos = {col: campo.value for col, campo in form_fields}
-
-        # Validar que los campos no estén vacíos
-        if any(valor.strip() == "" for valor in datos.values()):
-            mostrar_mensaje("Todos los campos son obligatorios", error=True)
+        # Validar las columnas que no admiten NULL (las demás vacías se guardan como NULL)
+        faltan = plantilla_actual.faltantes()
+        if faltan:
+            mostrar_mensaje(f"Complete los campos obligatorios: {', '.join(faltan)}", error=True)
             return
+        datos = plantilla_actual.valores()
+        # Clave para la auditoría (una compuesta se anota con todas sus columnas)
+        claves = esquema.clave_primaria(estructura_tablas[tabla])
+        clave = ", ".join(claves)
+        valor_clave = datos.get(claves[0]) if len(claves) == 1 else tuple(datos.get(c) for c in claves)
 
+        conn = None
         try:
-            conn = ConexionSQL.conectar()
-            cursor = conn.cursor()
-            columnas = ", ".join(datos.keys())
-            valores_placeholder = ", ".join(["?" for _ in datos])
-            valores = tuple(datos.values())
-            query = f"INSERT INTO {tabla} ({columnas}) VALUES ({valores_placeholder})"
-            cursor.execute(query, valores)
-            conn.commit()
-            conn.close()
-
-            mostrar_mensaje("Registro guardado con éxito")
+            # Los textos se convierten al tipo de cada columna antes de enviarlos
+            datos = conversores.convertir_registro(datos, conversores.parsers(estructura_tablas[tabla]),
+                                                   plantilla_actual.texto_vacio())
+            if chk_diferida.value:
+                # La auditoría viaja con la operación y se escribe cuando se aplica
+                numero = diario.encolar(
+                    ConexionSQL.identificador(), "insertar", tabla, datos, sesion=page.session_id,
+                    auditoria=entrada_auditoria("insertar", tabla, clave, valor_clave, None, datos)
+                )
+                mostrar_mensaje(f"Registro en cola (#{numero}): se guardará en segundo plano")
+            else:
+                auditar, anotar = auditar_en(entrada_auditoria("insertar", tabla, clave, valor_clave, None, datos))
+                conn = conectar()
+                capa_datos.insertar_registro(conn, tabla, datos, auditar=auditar)
+                anotar()
+                cache_referencias.invalidar(tabla)
+                cache_navegacion.invalidar(tabla)
+                mostrar_mensaje("Registro guardado con éxito")
             # Limpiar formulario
-            for _, campo in form_fields:
-                campo.value = ""
+            formulario.controls = plantilla_actual.reiniciar()
             page.update()
         except Exception as e:
-            mostrar_mensaje(f"Error: {str(e)}", error=True)
+            mostrar_mensaje(resiliencia.describir(e), error=True)
+        finally:
+            if conn:
+                conn.close()
 
-    # Función para cargar formulario para eliminación (usando la clave primaria, se asume que es la primera columna)
+    # Función para cargar formulario para eliminación (usando la clave primaria)
     def actualizar_formulario_eliminar():
         tabla = dropdown_tablas.value
         if not tabla:
             return
         # Limpiar formulario anterior
         formulario.controls.clear()
-        form_fields.clear()
         try:
-            # Se asume que la primera columna es la clave primaria
-            primer_campo = estructura_tablas[tabla][0]["nombre"]
+            primer_campo = esquema.columna_clave(tabla, estructura_tablas[tabla])
         except Exception as e:
             mostrar_mensaje(f"Error obteniendo clave primaria: {str(e)}", error=True)
             return
@@ -271,36 +724,168 @@ def main(page: ft.Page):
             bgcolor="#ffffff",
             text_style=ft.TextStyle(color="#000000")
         )
-        form_fields.append((primer_campo, campo))
         formulario.controls.append(campo)
-        btn_guardar.text = "Eliminar Registro"
+        btn_guardar.text = "Cargar Registro"
         btn_guardar.visible = True
         content_area.content = formulario
         page.update()
 
-    # Función para eliminar registro (basado en la clave primaria)
-    def eliminar_registro():
+        # Primero se muestra el registro; al eliminar se verifica que no haya cambiado
+        btn_guardar.on_click = lambda e: cargar_registro_eliminar(primer_campo, campo.value)
+
+    # Lee el registro a editar y captura su versión (rowversion o valores originales)
+    def leer_para_editar(clave_primaria: str, valor_clave: str):
         tabla = dropdown_tablas.value
-        if not tabla:
-            mostrar_mensaje("Seleccione una tabla", error=True)
-            return
-        clave, campo = form_fields[0]
-        valor = campo.value
-        if not valor.strip():
+        if not valor_clave.strip():
             mostrar_mensaje("Debe ingresar el valor de la clave primaria", error=True)
-            return
+            return None
+        valor = conversores.convertir_registro(
+            {clave_primaria: valor_clave}, conversores.parsers(estructura_tablas[tabla])
+        )[clave_primaria]
+        registro = tomar_version(tabla, clave_primaria, valor)
+        if not registro:
+            mostrar_mensaje("Registro no encontrado", error=True)
+        return registro
+
+    def tomar_version(tabla: str, clave_primaria: str, valor):
+        conn = conectar()
         try:
-            conn = ConexionSQL.conectar()
-            cursor = conn.cursor()
-            query = f"DELETE FROM {tabla} WHERE {clave} = ?"
-            cursor.execute(query, (valor,))
-            conn.commit()
+            registro = capa_datos.leer_registro(conn, tabla, clave_primaria, valor)
+            dial = dialecto.dialecto(conn)
+        finally:
             conn.close()
-            mostrar_mensaje("Registro eliminado con éxito")
-            campo.value = ""
+        edicion.clear()
+        if registro:
+            edicion.update(
+                tabla=tabla, clave=clave_primaria, valor_clave=valor, dialecto=dial,
+                version=capa_datos.capturar_version(estructura_tablas[tabla], registro, dial),
+                columna_version=capa_datos.columna_version(estructura_tablas[tabla], dial),
+                # Imagen anterior para la auditoría
+                antes=dict(zip([col["nombre"] for col in estructura_tablas[tabla]], registro)),
+            )
+        return registro
+
+    # Campos del formulario con los valores actuales del registro
+    def mostrar_campos_registro(registro, solo_lectura: bool = False):
+        nonlocal plantilla_actual
+        tabla = edicion["tabla"]
+        # Valores actuales en formato editable (NULL vacío, fechas ISO, binarios en hexadecimal)
+        formatos = conversores.formateadores_edicion(estructura_tablas[tabla])
+        valores = {col["nombre"]: formatos[idx](registro[idx]) for idx, col in enumerate(estructura_tablas[tabla])}
+        plantilla_actual = plantillas.obtener(tabla, estructura_tablas[tabla])
+        # La clave no se modifica y la columna rowversion la mantiene el servidor
+        formulario.controls = plantilla_actual.reiniciar(
+            valores, solo_lectura=solo_lectura,
+            columnas_solo_lectura=[c for c in (edicion["clave"], edicion["columna_version"]) if c]
+        )
+
+    # Diálogo de conflicto: valores propios frente a los vigentes en el servidor
+    def mostrar_conflicto(conflicto: capa_datos.ConflictoConcurrencia, propios: Dict,
+                          al_sobrescribir, al_recargar):
+        if conflicto.actual is None:
+            mostrar_mensaje(str(conflicto), error=True)
+            return
+        columnas = [col["nombre"] for col in estructura_tablas[edicion["tabla"]]]
+        formatos = conversores.formateadores_edicion(estructura_tablas[edicion["tabla"]])
+        filas = []
+        for idx, columna in enumerate(columnas):
+            actual = formatos[idx](conflicto.actual[idx])
+            propio = formatos[idx](propios[columna]) if columna in propios else actual
+            distinto = actual != propio
+            filas.append(ft.Row([
+                ft.Text(columna, weight="bold", width=160, size=12),
+                ft.Text(propio, width=220, size=12, selectable=True),
+                ft.Text(actual, width=220, size=12, selectable=True,
+                        color=ft.colors.RED if distinto else None),
+            ]))
+
+        def cerrar(accion=None):
+            page.dialog.open = False
+            page.update()
+            if accion:
+                accion(conflicto.actual)
+
+        page.dialog = ft.AlertDialog(
+            title=ft.Text(str(conflicto)),
+            content=ft.Container(
+                ft.ListView([
+                    ft.Row([
+                        ft.Text("Columna", weight="bold", width=160, size=12),
+                        ft.Text("Su valor", weight="bold", width=220, size=12),
+                        ft.Text("Valor actual", weight="bold", width=220, size=12),
+                    ]),
+                    *filas
+                ], spacing=4),
+                width=650, height=400
+            ),
+            actions=[
+                ft.TextButton("Sobrescribir", on_click=lambda e: cerrar(al_sobrescribir)),
+                ft.TextButton("Recargar", on_click=lambda e: cerrar(al_recargar)),
+                ft.TextButton("Cancelar", on_click=lambda e: cerrar()),
+            ]
+        )
+        page.dialog.open = True
+        page.update()
+
+    # Muestra el registro a eliminar (solo lectura) antes de confirmar
+    def cargar_registro_eliminar(clave_primaria: str, valor_clave: str):
+        try:
+            registro = leer_para_editar(clave_primaria, valor_clave)
+            if not registro:
+                return
+            mostrar_campos_registro(registro, solo_lectura=True)
+            btn_guardar.text = "Eliminar Registro"
+            btn_guardar.on_click = lambda e: eliminar_registro()
             page.update()
         except Exception as e:
-            mostrar_mensaje(f"Error: {str(e)}", error=True)
+            mostrar_mensaje(resiliencia.describir(e), error=True)
+
+    # Función para eliminar registro (clave primaria + versión leída)
+    def eliminar_registro():
+        if not edicion:
+            mostrar_mensaje("Cargue primero el registro", error=True)
+            return
+        conn = None
+        try:
+            auditar, anotar = auditar_en(entrada_auditoria(
+                "eliminar", edicion["tabla"], edicion["clave"], edicion["valor_clave"], edicion["antes"], None
+            ))
+            conn = conectar()
+            if capa_datos.eliminar_registro(conn, edicion["tabla"], edicion["clave"], edicion["valor_clave"],
+                                            edicion["version"], auditar=auditar) == 0:
+                mostrar_mensaje("Registro no encontrado", error=True)
+                return
+            anotar()
+            mostrar_mensaje("Registro eliminado con éxito")
+            cache_referencias.invalidar(edicion["tabla"])
+            cache_navegacion.invalidar(edicion["tabla"])
+            edicion.clear()
+            actualizar_formulario_eliminar()
+        except capa_datos.ConflictoConcurrencia as conflicto:
+            # Lo que el usuario vio al cargar (la versión capturada) frente a lo vigente
+            vistos = {columna: valor for columna, _, valor in edicion["version"]}
+            mostrar_conflicto(conflicto, vistos, al_sobrescribir=eliminar_con_version, al_recargar=recargar_eliminar)
+        except Exception as e:
+            mostrar_mensaje(resiliencia.describir(e), error=True)
+        finally:
+            if conn:
+                conn.close()
+
+    # Resolución de conflictos: tomar la versión vigente y reintentar, o mostrarla
+    def renovar_version(actual):
+        edicion["version"] = capa_datos.capturar_version(
+            estructura_tablas[edicion["tabla"]], actual, edicion["dialecto"]
+        )
+        edicion["antes"] = dict(zip([col["nombre"] for col in estructura_tablas[edicion["tabla"]]], actual))
+
+    def eliminar_con_version(actual):
+        renovar_version(actual)
+        eliminar_registro()
+
+    def recargar_eliminar(actual):
+        renovar_version(actual)
+        mostrar_campos_registro(actual, solo_lectura=True)
+        page.update()
 
     # Función para cargar formulario para modificar registro
     # Se solicita primero el valor de la clave primaria para cargar los datos actuales
@@ -309,10 +894,8 @@ def main(page: ft.Page):
         if not tabla:
             return
         formulario.controls.clear()
-        form_fields.clear()
         try:
-            # Se asume que la primera columna es la clave primaria
-            clave_primaria = estructura_tablas[tabla][0]["nombre"]
+            clave_primaria = esquema.columna_clave(tabla, estructura_tablas[tabla])
         except Exception as e:
             mostrar_mensaje(f"Error obteniendo clave primaria: {str(e)}", error=True)
             return
@@ -335,62 +918,281 @@ def main(page: ft.Page):
 
     # Función para cargar registro y crear formulario con los datos actuales
     def cargar_registro_modificar(clave_primaria: str, valor_clave: str):
-        tabla = dropdown_tablas.value
         try:
-            conn = ConexionSQL.conectar()
-            cursor = conn.cursor()
-            query = f"SELECT * FROM {tabla} WHERE {clave_primaria} = ?"
-            cursor.execute(query, (valor_clave,))
-            registro = cursor.fetchone()
+            registro = leer_para_editar(clave_primaria, valor_clave)
             if not registro:
-                mostrar_mensaje("Registro no encontrado", error=True)
                 return
-
-            # Limpiar formulario y crear campos con valores actuales
-            formulario.controls.clear()
-            form_fields.clear()
-            columnas = [col["nombre"] for col in estructura_tablas[tabla]]
-            for idx, columna in enumerate(columnas):
-                campo = ft.TextField(
-                    label=columna,
-                    width=300,
-                    value=str(registro[idx]),
-                    bgcolor="#ffffff",
-                    text_style=ft.TextStyle(color="#000000")
-                )
-                form_fields.append((columna, campo))
-                formulario.controls.append(campo)
+            mostrar_campos_registro(registro)
             btn_guardar.text = "Modificar Registro"
             btn_guardar.on_click = lambda e: modificar_registro()
             page.update()
         except Exception as e:
-            mostrar_mensaje(f"Error: {str(e)}", error=True)
+            mostrar_mensaje(resiliencia.describir(e), error=True)
 
-    # Función para modificar registro
+    # Función para modificar registro: el UPDATE incluye la versión leída,
+    # así no se pisan los cambios de otro usuario (sin bloquear el registro)
     def modificar_registro():
-        tabla = dropdown_tablas.value
-        if not tabla:
-            mostrar_mensaje("Seleccione una tabla", error=True)
+        if not edicion:
+            mostrar_mensaje("Cargue primero el registro", error=True)
+            return
+        tabla = edicion["tabla"]
+        faltan = plantilla_actual.faltantes()
+        if faltan:
+            mostrar_mensaje(f"Complete los campos obligatorios: {', '.join(faltan)}", error=True)
             return
-        datos = {col: campo.value for col, campo in form_fields}
+        datos = plantilla_actual.valores()
+        conn = None
         try:
-            conn = ConexionSQL.conectar()
-            cursor = conn.cursor()
-            # Se asume que la primera columna es la clave primaria para identificar el registro
-            clave_primaria = list(datos.keys())[0]
-            valor_clave = list(datos.values())[0]
-            # Se actualizan los campos (excluyendo la clave primaria)
-            set_part = ", ".join([f"{col} = ?" for col in list(datos.keys())[1:]])
-            valores = list(datos.values())[1:]
-            valores.append(valor_clave)
-            query = f"UPDATE {tabla} SET {set_part} WHERE {clave_primaria} = ?"
-            cursor.execute(query, tuple(valores))
-            conn.commit()
+            datos = conversores.convertir_registro(datos, conversores.parsers(estructura_tablas[tabla]),
+                                                   plantilla_actual.texto_vacio())
+            # Se actualizan los campos (excluyendo la clave primaria y la rowversion)
+            cambios = {
+                col: valor for col, valor in datos.items()
+                if col not in (edicion["clave"], edicion["columna_version"])
+            }
+            if chk_diferida.value:
+                numero = diario.encolar(
+                    ConexionSQL.identificador(), "modificar", tabla, cambios, sesion=page.session_id,
+                    clave=edicion["clave"], valor_clave=edicion["valor_clave"], version=edicion["version"],
+                    auditoria=entrada_auditoria("modificar", tabla, edicion["clave"], edicion["valor_clave"],
+                                                edicion["antes"], cambios)
+                )
+                # La versión nueva se conocerá al aplicarse: hay que volver a cargar el registro
+                edicion.clear()
+                mostrar_mensaje(f"Modificación en cola (#{numero}): se aplicará en segundo plano")
+                return
+            auditar, anotar = auditar_en(entrada_auditoria(
+                "modificar", tabla, edicion["clave"], edicion["valor_clave"], edicion["antes"], cambios
+            ))
+            conn = conectar()
+            if capa_datos.modificar_registro(conn, tabla, edicion["clave"], edicion["valor_clave"],
+                                             cambios, edicion["version"], auditar=auditar) == 0:
+                mostrar_mensaje("Registro no encontrado", error=True)
+                return
+            anotar()
+            cache_referencias.invalidar(tabla)
+            cache_navegacion.invalidar(tabla)
+            # La nueva versión es la que acabamos de escribir
             conn.close()
+            conn = None
+            tomar_version(tabla, edicion["clave"], edicion["valor_clave"])
             mostrar_mensaje("Registro modificado con éxito")
-            page.update()
+        except capa_datos.ConflictoConcurrencia as conflicto:
+            mostrar_conflicto(conflicto, datos, al_sobrescribir=modificar_con_version, al_recargar=recargar_modificar)
         except Exception as e:
-            mostrar_mensaje(f"Error: {str(e)}", error=True)
+            mostrar_mensaje(resiliencia.describir(e), error=True)
+        finally:
+            if conn:
+                conn.close()
+
+    def modificar_con_version(actual):
+        renovar_version(actual)
+        modificar_registro()
+
+    def recargar_modificar(actual):
+        renovar_version(actual)
+        mostrar_campos_registro(actual)
+        page.update()
+
+    # Cola de escrituras diferidas del origen de datos (incluye las de ejecuciones anteriores)
+    chk_diferida = ft.Checkbox(label="Guardar en segundo plano", value=False, label_style=ft.TextStyle(color="#000000"),
+                               tooltip="Las altas y modificaciones se anotan localmente y se aplican sin esperar al servidor")
+    btn_cola = ft.TextButton("Cola: vacía", icon=ft.icons.PENDING_ACTIONS, on_click=lambda e: mostrar_cola())
+    NOMBRES_ESTADO = {"pendiente": "pendientes", "aplicada": "aplicadas", "conflicto": "con conflicto",
+                      "error": "con error"}
+
+    def actualizar_cola(tablas=()):
+        # Las escrituras aplicadas cambian las opciones y los relacionados
+        for tabla in tablas:
+            cache_referencias.invalidar(tabla)
+            cache_navegacion.invalidar(tabla)
+        resumen = diario.resumen(ConexionSQL.identificador())
+        partes = [f"{resumen[estado]} {nombre}" for estado, nombre in NOMBRES_ESTADO.items()
+                  if resumen.get(estado) and estado != "aplicada"]
+        btn_cola.text = "Cola: " + (", ".join(partes) if partes else "al día")
+        btn_cola.style = ft.ButtonStyle(color=ft.colors.RED if resumen.get("conflicto") or resumen.get("error")
+                                        else "#000000")
+        page.update()
+
+    def accion_cola(accion, numero: int, **opciones):
+        accion(numero, **opciones)
+        mostrar_cola()
+
+    def mostrar_cola():
+        filas = []
+        for entrada in diario.listar(ConexionSQL.identificador()):
+            acciones = []
+            if entrada["estado"] in ("conflicto", "error"):
+                acciones.append(ft.IconButton(ft.icons.REPLAY, tooltip="Reintentar",
+                                              on_click=lambda e, n=entrada["id"]: accion_cola(diario.reintentar, n)))
+                if entrada["estado"] == "conflicto" and entrada["operacion"] == "modificar":
+                    acciones.append(ft.IconButton(
+                        ft.icons.SAVE_AS, tooltip="Sobrescribir los cambios del otro usuario",
+                        on_click=lambda e, n=entrada["id"]: accion_cola(diario.reintentar, n, sin_version=True)
+                    ))
+            if entrada["estado"] != "pendiente":
+                acciones.append(ft.IconButton(ft.icons.DELETE, tooltip="Quitar de la lista",
+                                              on_click=lambda e, n=entrada["id"]: accion_cola(diario.descartar, n)))
+            detalle = ", ".join(f"{col}={valor}" for col, valor in entrada["datos"].items())
+            if entrada["error"]:
+                detalle = f"{entrada['error']} - {detalle}"
+            filas.append(ft.Row([
+                ft.Text(f"#{entrada['id']}", width=50, size=12),
+                ft.Text(f"{entrada['operacion']} {entrada['tabla']}", width=160, size=12),
+                ft.Text(entrada["estado"], width=80, size=12,
+                        color=ft.colors.RED if entrada["estado"] in ("conflicto", "error") else None),
+                ft.Text(detalle, size=12, expand=True, max_lines=2, overflow=ft.TextOverflow.ELLIPSIS,
+                        tooltip=detalle),
+                *acciones,
+            ]))
+
+        def limpiar(e):
+            diario.limpiar_aplicadas(ConexionSQL.identificador())
+            mostrar_cola()
+
+        page.dialog = ft.AlertDialog(
+            title=ft.Text("Escrituras en segundo plano"),
+            content=ft.Container(ft.ListView(filas or [ft.Text("No hay escrituras en la cola")], spacing=4),
+                                 width=800, height=400),
+            actions=[
+                ft.TextButton("Quitar aplicadas", on_click=limpiar),
+                ft.TextButton("Cerrar", on_click=lambda e: cerrar_dialogo()),
+            ]
+        )
+        page.dialog.open = True
+        page.update()
+
+    def cerrar_dialogo():
+        page.dialog.open = False
+        page.update()
+
+    # Elección de columnas visibles, orden y anchos; se aplica al SELECT de la grilla,
+    # de la exportación y de la comparación
+    def elegir_columnas(tabla: str):
+        if not tabla or tabla not in estructura_tablas:
+            mostrar_mensaje("Seleccione una tabla primero", error=True)
+            return
+        columnas_esquema = estructura_tablas[tabla]
+        # Las columnas de la clave primaria se muestran siempre y quedan primeras
+        clave = esquema.clave_primaria(columnas_esquema)
+        visibles = [col["nombre"] for col in columnas_visibles.columnas(tabla, columnas_esquema)]
+        # Primero las visibles en su orden, luego las ocultas en el orden de la tabla
+        orden = visibles + [col["nombre"] for col in columnas_esquema if col["nombre"] not in visibles]
+        tipos = {col["nombre"]: col["tipo"] for col in columnas_esquema}
+        casillas = {
+            nombre: ft.Checkbox(label=f"{nombre} ({tipos[nombre]})", value=nombre in visibles,
+                                disabled=nombre in clave, tooltip="La clave se muestra siempre" if nombre in clave else None)
+            for nombre in orden
+        }
+        campos_ancho = {
+            nombre: ft.TextField(value=str(ancho or ""), hint_text="auto", width=90, dense=True,
+                                 input_filter=ft.NumbersOnlyInputFilter(), tooltip="Ancho en píxeles")
+            for nombre, ancho in zip(orden, columnas_visibles.anchos(tabla, orden))
+        }
+        lista = ft.ListView(spacing=2)
+
+        def mover(i: int, paso: int):
+            orden[i], orden[i + paso] = orden[i + paso], orden[i]
+            pintar()
+
+        def pintar():
+            # La clave queda siempre primera
+            fijas = len(clave)
+            lista.controls = [ft.Row([
+                ft.IconButton(ft.icons.ARROW_UPWARD, disabled=i <= fijas, on_click=lambda e, i=i: mover(i, -1)),
+                ft.IconButton(ft.icons.ARROW_DOWNWARD, disabled=i < fijas or i == len(orden) - 1,
+                              on_click=lambda e, i=i: mover(i, 1)),
+                ft.Container(casillas[nombre], expand=True),
+                campos_ancho[nombre],
+            ]) for i, nombre in enumerate(orden)]
+            page.update()
+
+        def marcar_todas(e):
+            for casilla in casillas.values():
+                casilla.value = True
+            page.update()
+
+        def aplicar(restablecer: bool = False):
+            if restablecer:
+                columnas_visibles.restablecer(tabla)
+            else:
+                columnas_visibles.guardar(
+                    tabla, orden,
+                    ocultas=[nombre for nombre in orden if not casillas[nombre].value and nombre not in clave],
+                    anchos={nombre: int(campo.value) for nombre, campo in campos_ancho.items()
+                            if (campo.value or "").isdigit()}
+                )
+            cerrar_dialogo()
+            cantidad = len(columnas_visibles.columnas(tabla, columnas_esquema))
+            mostrar_mensaje(f"{tabla}: {cantidad} de {len(columnas_esquema)} columnas visibles")
+            if tabla_en_grilla == tabla:
+                cargar_datos_tabla(tabla)
+
+        page.dialog = ft.AlertDialog(
+            title=ft.Text(f"Columnas de {tabla}"),
+            content=ft.Container(lista, width=520, height=420),
+            actions=[
+                ft.TextButton("Todas", on_click=marcar_todas),
+                ft.TextButton("Restablecer", on_click=lambda e: aplicar(restablecer=True)),
+                ft.TextButton("Guardar", on_click=lambda e: aplicar()),
+                ft.TextButton("Cancelar", on_click=lambda e: cerrar_dialogo()),
+            ]
+        )
+        page.dialog.open = True
+        pintar()
+
+    # Historial de cambios de la tabla (todos o los de un registro), por rango de fechas
+    def mostrar_auditoria(tabla: str):
+        if not tabla:
+            mostrar_mensaje("Seleccione una tabla primero", error=True)
+            return
+        txt_valor = ft.TextField(label="Valor de la clave (vacío: todos)", width=220, dense=True,
+                                 value="" if edicion.get("tabla") != tabla else str(edicion["valor_clave"]))
+        txt_desde = ft.TextField(label="Desde", hint_text="AAAA-MM-DD", width=140, dense=True)
+        txt_hasta = ft.TextField(label="Hasta", hint_text="AAAA-MM-DD", width=140, dense=True)
+        lista = ft.ListView(spacing=6)
+        en_servidor = auditoria.transaccional(tabla)
+
+        def buscar(e=None):
+            conn = None
+            try:
+                filtros = {"tabla": tabla, "valor_clave": (txt_valor.value or "").strip(),
+                           "desde": (txt_desde.value or "").strip(), "hasta": (txt_hasta.value or "").strip()}
+                if en_servidor:
+                    conn = conectar()
+                    entradas = auditoria.consultar_servidor(conn, **filtros)
+                else:
+                    entradas = registro_cambios.consultar(ConexionSQL.identificador(), **filtros)
+            except Exception as ex:
+                mostrar_mensaje(f"Error al leer la auditoría: {resiliencia.describir(ex)}", error=True)
+                return
+            finally:
+                if conn:
+                    conn.close()
+            lista.controls = [ft.Text("Sin cambios registrados", color="#000000")] if not entradas else []
+            for entrada in entradas:
+                titulo = (f"{entrada['momento'][:19]}  {entrada['operacion']}  "
+                          f"{entrada['clave']}={entrada['valor_clave']}  ({entrada['usuario']})")
+                if entrada["detalle"]:
+                    titulo += f"  [{entrada['detalle']}]"
+                detalle = [
+                    f"    {columna}: {'' if antes is None else antes} → {'' if despues is None else despues}"
+                    for columna, (antes, despues) in auditoria.cambios(entrada).items()
+                ]
+                lista.controls.append(ft.Text("\n".join([titulo] + detalle), size=12, color="#000000",
+                                              selectable=True))
+            page.update()
+
+        page.dialog = ft.AlertDialog(
+            title=ft.Text(f"Auditoría de {tabla}" + (" (servidor)" if en_servidor else "")),
+            content=ft.Container(ft.Column([
+                ft.Row([txt_valor, txt_desde, txt_hasta, ft.IconButton(ft.icons.SEARCH, on_click=buscar)]),
+                ft.Container(lista, expand=True),
+            ]), width=720, height=480),
+            actions=[ft.TextButton("Cerrar", on_click=lambda e: cerrar_dialogo())]
+        )
+        page.dialog.open = True
+        buscar()
 
     # Botón principal para ejecutar la acción del formulario (se reutiliza para agregar, eliminar o modificar)
     btn_guardar = ft.ElevatedButton(
@@ -404,8 +1206,11 @@ def main(page: ft.Page):
     # Contenedor del formulario (se usa en agregar, eliminar y modificar)
     formulario = ft.Column([], spacing=10)
 
-    # Área dinámica de contenido inicial (se muestra la tabla por defecto)
-    content_area.content = ft.ListView([tbl_datos], expand=True, auto_scroll=True)
+    # Área dinámica de contenido inicial: esqueleto mientras se precalienta la conexión
+    content_area.content = ft.Column(
+        [ft.ProgressRing(color="#ED6A5A"), ft.Text("Cargando tablas...", color="#000000")],
+        horizontal_alignment=ft.CrossAxisAlignment.CENTER
+    )
 
     # Sidebar con el menú y botones ABM (se mantiene el dropdown original y se agregan nuevos botones)
     dropdown_tablas = ft.Dropdown(
@@ -418,6 +1223,34 @@ def main(page: ft.Page):
         label_style=ft.TextStyle(color="#000000"),
         focused_border_color="#9BC1BC"
     )
+    dropdown_perfil = ft.Dropdown(
+        label="PERFIL DE CONEXIÓN",
+        value=configuracion.nombre_perfil_activo(),
+        options=[ft.dropdown.Option(nombre) for nombre in configuracion.nombres_perfiles()],
+        on_change=lambda e: cambiar_perfil(e.control.value),
+        disabled=ConexionSQL.pool() is not None,
+        tooltip="En modo servidor el perfil se elige al iniciar el servidor" if ConexionSQL.pool() is not None else None,
+        width=200,
+        border_color="#9BC1BC",
+        text_style=ft.TextStyle(color="#000000"),
+        label_style=ft.TextStyle(color="#000000"),
+        focused_border_color="#9BC1BC"
+    )
+    dropdown_orden = ft.Dropdown(
+        label="ORDENAR POR",
+        value="nombre",
+        options=[
+            ft.dropdown.Option(key="nombre", text="Nombre"),
+            ft.dropdown.Option(key="filas", text="Filas"),
+            ft.dropdown.Option(key="tamano", text="Tamaño"),
+        ],
+        on_change=lambda e: actualizar_lista_tablas(),
+        width=200,
+        border_color="#9BC1BC",
+        text_style=ft.TextStyle(color="#000000"),
+        label_style=ft.TextStyle(color="#000000"),
+        focused_border_color="#9BC1BC"
+    )
     sidebar = ft.Container(
         content=ft.Column(
             [
@@ -426,7 +1259,9 @@ def main(page: ft.Page):
                         [
                             ft.Text("MENÚ", color="#000000", size=16, weight="bold"),
                             ft.Divider(height=10, color="#9BC1BC"),
+                            dropdown_perfil,
                             dropdown_tablas,
+                            dropdown_orden,
                             ft.Divider(height=20, color="#9BC1BC"),
                             ft.ElevatedButton(
                                 "Refrescar",
@@ -438,6 +1273,17 @@ def main(page: ft.Page):
                                     shape=ft.RoundedRectangleBorder(radius=8)
                                 )
                             ),
+                            ft.ElevatedButton(
+                                "Columnas",
+                                icon=ft.icons.VIEW_COLUMN,
+                                tooltip="Columnas visibles, orden y ancho (solo esas se piden al servidor)",
+                                on_click=lambda e: elegir_columnas(dropdown_tablas.value),
+                                style=ft.ButtonStyle(
+                                    bgcolor="#9BC1BC",
+                                    color="#000000",
+                                    shape=ft.RoundedRectangleBorder(radius=8)
+                                )
+                            ),
                             ft.ElevatedButton(
                                 "Exportar CSV",
                                 icon=ft.icons.FILE_DOWNLOAD,
@@ -448,6 +1294,39 @@ def main(page: ft.Page):
                                     shape=ft.RoundedRectangleBorder(radius=8)
                                 )
                             ),
+                            ft.ElevatedButton(
+                                "Perfil",
+                                icon=ft.icons.QUERY_STATS,
+                                tooltip="Nulos, distintos, mínimo/máximo y valores frecuentes por columna",
+                                on_click=lambda e: mostrar_perfil(dropdown_tablas.value),
+                                style=ft.ButtonStyle(
+                                    bgcolor="#9BC1BC",
+                                    color="#000000",
+                                    shape=ft.RoundedRectangleBorder(radius=8)
+                                )
+                            ),
+                            ft.ElevatedButton(
+                                "Comparar",
+                                icon=ft.icons.COMPARE_ARROWS,
+                                tooltip="Diferencias con otra tabla o con la misma tabla en otro perfil",
+                                on_click=lambda e: mostrar_comparacion(),
+                                style=ft.ButtonStyle(
+                                    bgcolor="#9BC1BC",
+                                    color="#000000",
+                                    shape=ft.RoundedRectangleBorder(radius=8)
+                                )
+                            ),
+                            ft.ElevatedButton(
+                                "Auditoría",
+                                icon=ft.icons.HISTORY,
+                                tooltip="Cambios hechos a la tabla o a un registro: quién, cuándo, antes y después",
+                                on_click=lambda e: mostrar_auditoria(dropdown_tablas.value),
+                                style=ft.ButtonStyle(
+                                    bgcolor="#9BC1BC",
+                                    color="#000000",
+                                    shape=ft.RoundedRectangleBorder(radius=8)
+                                )
+                            ),
                             ft.Divider(height=20, color="#9BC1BC"),
                             ft.Text("Operaciones ABM", color="#000000", size=14, weight="bold"),
                             ft.ElevatedButton(
@@ -486,6 +1365,8 @@ def main(page: ft.Page):
                                     shape=ft.RoundedRectangleBorder(radius=8)
                                 )
                             ),
+                            chk_diferida,
+                            btn_cola,
                         ],
                         spacing=15
                     ),
@@ -501,7 +1382,7 @@ def main(page: ft.Page):
     )
 
     # Barra de estado
-    status_bar = ft.Text("Sistema listo", color="#000000", size=14)
+    status_bar = ft.Text("Conectando...", color="#000000", size=14)
 
     # Layout principal: Navbar, Sidebar, Área de contenido y Status Bar
     main_layout = ft.Column(
@@ -533,15 +1414,13 @@ def main(page: ft.Page):
             mostrar_mensaje("Seleccione una tabla primero", error=True)
             return
         tabla = dropdown_tablas.value
+        conn = None
         try:
-            conn = ConexionSQL.conectar()
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {tabla}")
+            conn = conectar()
             nombre_archivo = f"{tabla}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            with open(nombre_archivo, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([col[0] for col in cursor.description])
-                writer.writerows(cursor.fetchall())
+            por_lotes = estadisticas.exportar_por_lotes(estadisticas_tablas.filas(tabla))
+            capa_datos.exportar_csv(conn, tabla, nombre_archivo, por_lotes,
+                                    columnas_visibles.columnas(tabla, estructura_tablas.get(tabla)))
             mostrar_mensaje(f"Exportado: {nombre_archivo}")
         except Exception as e:
             mostrar_mensaje(f"Error al exportar: {str(e)}", error=True)
@@ -549,18 +1428,23 @@ def main(page: ft.Page):
             if conn:
                 conn.close()
 
-    # Cargar nombres de las tablas disponibles al iniciar
-    try:
-        conn = ConexionSQL.conectar()
-        cursor = conn.cursor()
-        cursor.execute("SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE'")
-        dropdown_tablas.options = [ft.dropdown.Option(row[0]) for row in cursor.fetchall()]
-        conn.close()
-    except Exception as e:
-        mostrar_mensaje(f"Error al cargar tablas: {str(e)}", error=True)
-
+    # Pintar la ventana de inmediato; la conexión y la estructura se cargan en segundo plano
     page.add(main_layout)
-    cargar_estructura_bd()
+    threading.Thread(target=precalentar, daemon=True).start()
+    # Los cambios de perfil son de todo el proceso: cada sesión recarga sus datos
+    ConexionSQL.al_cambiar_perfil(aplicar_perfil)
+    # Aplicador de escrituras diferidas (uno por proceso) y avisos de la cola a esta sesión
+    diario.iniciar(origen=ConexionSQL.identificador)
+    diario.suscribir(actualizar_cola)
+    actualizar_cola()
+    # Escritor de la auditoría por lotes (uno por proceso)
+    registro_cambios.iniciar()
+
+    def al_desconectar(e):
+        ConexionSQL.quitar_aviso(aplicar_perfil)
+        diario.desuscribir(actualizar_cola)
+
+    page.on_disconnect = al_desconectar
 
 if __name__ == "__main__":
     ft.app(target=main)
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""Capa de datos de las operaciones ABM (alta, baja, modificación) y de lectura.
+
+Las funciones reciben una conexión abierta y no dependen de la interfaz, así
+las usan tanto crud.py como las herramientas de carga y benchmarks.
+
+Concurrencia optimista: al leer un registro para editarlo se captura su
+versión (la columna rowversion si la tabla la tiene o, si no, los valores
+originales) y esa versión se agrega al WHERE del UPDATE/DELETE. Si otro
+usuario cambió el registro entretanto, no se afecta ninguna fila y se lanza
+ConflictoConcurrencia con los valores actuales. No se toman bloqueos.
+
+Alta, modificación y baja aceptan `auditar(conn)`: se llama con la misma
+conexión después del cambio y antes del commit, solo si el cambio afectó
+alguna fila (auditoría en la misma transacción; ver auditoria.py).
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import configuracion
+import conversores
+import dialecto
+import lob
+
+# Columnas de versión de fila que mantiene el servidor (SQL Server)
+TIPOS_VERSION = {"timestamp", "rowversion"}
+# Tipos que SQL Server no puede comparar por igualdad: no entran en la instantánea
+TIPOS_NO_COMPARABLES = {"text", "ntext", "image", "xml", "geography", "geometry", "hierarchyid", "sql_variant"}
+# datetime/smalldatetime se comparan con el parámetro convertido a su tipo (evita
+# la conversión implícita a datetime2, que cambia los milisegundos)
+TIPOS_CON_CAST = {"datetime", "smalldatetime"}
+
+# Versión capturada: [(columna, tipo, valor original)]
+Version = List[Tuple[str, str, object]]
+
+
+class ConflictoConcurrencia(Exception):
+    """El registro cambió o se eliminó desde que se leyó; `actual` trae la fila vigente (o None)."""
+
+    def __init__(self, actual: Optional[Sequence]):
+        super().__init__(
+            "El registro fue modificado por otro usuario" if actual is not None
+            else "El registro fue eliminado por otro usuario"
+        )
+        self.actual = actual
+
+
+def columna_version(columnas_esquema: List[Dict], dial: str) -> Optional[str]:
+    """Nombre de la columna rowversion de la tabla (solo SQL Server), o None."""
+    if dial != dialecto.MSSQL:
+        return None
+    for col in columnas_esquema:
+        if col["tipo"].lower() in TIPOS_VERSION:
+            return col["nombre"]
+    return None
+
+
+def capturar_version(columnas_esquema: List[Dict], registro: Sequence, dial: str) -> Version:
+    """Versión del registro leído: su rowversion o, si no hay, los valores comparables."""
+    version = columna_version(columnas_esquema, dial)
+    columnas = [
+        (col["nombre"], col["tipo"].lower(), valor)
+        for col, valor in zip(columnas_esquema, registro)
+    ]
+    if version:
+        return [c for c in columnas if c[0] == version]
+    # En SQLite text es un texto común: todas las columnas se comparan por igualdad
+    if dial == dialecto.SQLITE:
+        return columnas
+    return [c for c in columnas if c[1] not in TIPOS_NO_COMPARABLES]
+
+
+def _predicado(clave: str, valor_clave, version: Optional[Version], dial: str) -> Tuple[str, tuple]:
+    """WHERE por clave más la versión capturada (igualdad con NULL incluida)."""
+    condiciones, parametros = [f"{clave} = ?"], [valor_clave]
+    for columna, tipo, valor in version or []:
+        if valor is None:
+            condiciones.append(f"{columna} IS NULL")
+            continue
+        marcador = f"CAST(? AS {tipo})" if dial == dialecto.MSSQL and tipo in TIPOS_CON_CAST else "?"
+        condiciones.append(f"{columna} = {marcador}")
+        parametros.append(valor)
+    return " AND ".join(condiciones), tuple(parametros)
+
+
+def _verificar(conn, cursor, tabla: str, clave: str, valor_clave, version: Optional[Version]) -> int:
+    """Si la versión no coincidió (0 filas), distingue "no existe" de "cambió" leyendo la fila actual."""
+    if cursor.rowcount == 0 and version:
+        actual = leer_registro(conn, tabla, clave, valor_clave)
+        raise ConflictoConcurrencia(actual)
+    return cursor.rowcount
+
+
+def leer_registros(conn, tabla: str, limite: int,
+                   columnas_esquema: Optional[List[Dict]] = None) -> Tuple[List[str], tuple, List[Sequence]]:
+    """Primeras `limite` filas de la tabla: (nombres, descripción del cursor, filas).
+
+    Con `columnas_esquema` se leen solo esas columnas, en ese orden (la
+    proyección elegida; ver proyecciones.py), y las columnas LOB no se leen
+    completas: llegan como lob.ValorLob (prefijo y largo calculados en el servidor).
+    """
+    dial = dialecto.dialecto(conn)
+    cursor = conn.cursor()
+    if lob.columnas_lob(columnas_esquema):
+        cursor.execute(lob.consulta_grilla(tabla, columnas_esquema, limite, dial))
+        descripcion = lob.descripcion_grilla(columnas_esquema, cursor.description)
+        filas = lob.armar_filas(columnas_esquema, cursor.fetchall())
+    else:
+        cursor.execute(dialecto.select_top(tabla, limite, dial, columnas=_lista_columnas(columnas_esquema)))
+        descripcion = cursor.description
+        filas = cursor.fetchall()
+    cursor.close()
+    return [col[0] if col[0] else "Columna" for col in descripcion], descripcion, filas
+
+
+def _lista_columnas(columnas_esquema: Optional[List[Dict]]) -> str:
+    """Columnas del SELECT: las indicadas, o * sin esquema."""
+    return ", ".join(col["nombre"] for col in columnas_esquema) if columnas_esquema else "*"
+
+
+def leer_registro(conn, tabla: str, clave: str, valor) -> Optional[Sequence]:
+    """Registro identificado por su clave, o None si no existe."""
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM {tabla} WHERE {clave} = ?", (valor,))
+    registro = cursor.fetchone()
+    cursor.close()
+    return registro
+
+
+def _auditar(conn, auditar: Optional[Callable], filas: int):
+    """Auditoría dentro de la transacción; si falla, el cambio se deshace."""
+    if auditar is None or filas == 0:
+        return
+    try:
+        auditar(conn)
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def insertar_registro(conn, tabla: str, datos: Dict, auditar: Optional[Callable] = None) -> int:
+    """INSERT con parámetros; confirma la transacción."""
+    columnas = ", ".join(datos.keys())
+    valores_placeholder = ", ".join(["?" for _ in datos])
+    cursor = conn.cursor()
+    cursor.execute(f"INSERT INTO {tabla} ({columnas}) VALUES ({valores_placeholder})", tuple(datos.values()))
+    filas = cursor.rowcount
+    _auditar(conn, auditar, filas)
+    conn.commit()
+    return filas
+
+
+
+def modificar_registro(conn, tabla: str, clave: str, valor_clave, datos: Dict,
+                       version: Optional[Version] = None, auditar: Optional[Callable] = None) -> int:
+    """UPDATE de los campos indicados; devuelve las filas modificadas.
+
+    Con `version` (ver capturar_version) lanza ConflictoConcurrencia si el
+    registro cambió desde que se leyó.
+    """
+    set_part = ", ".join([f"{col} = ?" for col in datos])
+    where, parametros = _predicado(clave, valor_clave, version, dialecto.dialecto(conn))
+    cursor = conn.cursor()
+    cursor.execute(f"UPDATE {tabla} SET {set_part} WHERE {where}", tuple(datos.values()) + parametros)
+    _auditar(conn, auditar, cursor.rowcount)
+    conn.commit()
+    return _verificar(conn, cursor, tabla, clave, valor_clave, version)
+
+
+def eliminar_registro(conn, tabla: str, clave: str, valor, version: Optional[Version] = None,
+                      auditar: Optional[Callable] = None) -> int:
+    """DELETE por clave; devuelve las filas eliminadas (con `version`, igual que modificar_registro)."""
+    where, parametros = _predicado(clave, valor, version, dialecto.dialecto(conn))
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM {tabla} WHERE {where}", parametros)
+    _auditar(conn, auditar, cursor.rowcount)
+    conn.commit()
+    return _verificar(conn, cursor, tabla, clave, valor, version)
+
+
+def exportar_csv(conn, tabla: str, nombre_archivo: str, por_lotes: bool = True,
+                 columnas_esquema: Optional[List[Dict]] = None) -> int:
+    """Exporta la tabla completa a CSV; devuelve la cantidad de filas escritas.
+
+    Con `columnas_esquema` se exportan solo esas columnas, en ese orden. Los
+    valores se escriben con los conversores de exportación de cada columna
+    (fechas ISO, binarios en hexadecimal, NULL vacío).
+    """
+    import csv  # importación diferida: solo se necesita al exportar
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {_lista_columnas(columnas_esquema)} FROM {tabla}")
+    formatos = conversores.formateadores_exportacion(cursor.description, columnas_esquema)
+    tam_lote = configuracion.ajuste("tam_lote_exportacion")
+    escritas = 0
+    with open(nombre_archivo, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([col[0] for col in cursor.description])
+        if por_lotes:
+            # Tablas grandes (o de tamaño desconocido): lectura por lotes
+            while True:
+                filas = cursor.fetchmany(tam_lote)
+                if not filas:
+                    break
+                writer.writerows(conversores.formatear_filas(filas, formatos))
+                escritas += len(filas)
+        else:
+            filas = cursor.fetchall()
+            writer.writerows(conversores.formatear_filas(filas, formatos))
+            escritas = len(filas)
+    cursor.close()
+    return escritas
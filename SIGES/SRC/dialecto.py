@@ -0,0 +1,29 @@
+"""Diferencias de SQL entre SQL Server y la base SQLite sustituta."""
+
+MSSQL = "mssql"
+SQLITE = "sqlite"
+
+
+def dialecto(conn) -> str:
+    """Devuelve el dialecto de una conexión abierta (o prestada por el pool)."""
+    # Conexión prestada por el pool o envuelta por el driver de fallas
+    while hasattr(conn, "conexion_real"):
+        conn = conn.conexion_real
+    if type(conn).__module__.startswith("sqlite3"):
+        return SQLITE
+    return MSSQL
+
+
+def citar(nombre: str, dial: str) -> str:
+    """Nombre de columna (o tabla) entre delimitadores: [x] en SQL Server, "x" en SQLite."""
+    if dial == SQLITE:
+        return '"' + nombre.replace('"', '""') + '"'
+    return "[" + nombre.replace("]", "]]") + "]"
+
+
+def select_top(tabla: str, limite: int, dial: str, columnas: str = "*", resto: str = "") -> str:
+    """SELECT con límite de filas según el dialecto (`resto`: WHERE/ORDER BY opcionales)."""
+    resto = f" {resto}" if resto else ""
+    if dial == SQLITE:
+        return f"SELECT {columnas} FROM {tabla}{resto} LIMIT {int(limite)}"
+    return f"SELECT TOP {int(limite)} {columnas} FROM {tabla}{resto}"
@@ -0,0 +1,138 @@
+"""Driver sustituto con inyección de fallas (pruebas de tolerancia a fallas).
+
+Envuelve la base SQLite sustituta y, según la variable de entorno
+SIGES_FALLAS, hace fallar al azar las conexiones y las consultas con errores
+equivalentes a los de pyodbc (SQLSTATE 08S01, 08001, HYT00), o simula que el
+servidor está caído:
+
+    SIGES_FALLAS="conexion=0.2,consulta=0.05,semilla=1"
+
+caer() y levantar() simulan la caída y vuelta del servidor desde el código
+(p. ej. prueba_carga.py). Las conexiones abiertas antes de la caída también
+fallan, como las de un servidor reiniciado.
+"""
+import os
+import random
+import sqlite3
+import threading
+from typing import Dict
+
+_estado = {"caido": False, "generacion": 0, "sembrado": False}
+_bloqueo = threading.Lock()
+_aleatorio = random.Random()
+# Fallas inyectadas por tipo (para informar en las pruebas)
+inyectadas: Dict[str, int] = {"conexion": 0, "consulta": 0, "caida": 0}
+
+
+class ErrorSimulado(sqlite3.OperationalError):
+    """Error con la forma de pyodbc: args = (SQLSTATE, mensaje)."""
+
+
+def activo() -> bool:
+    return bool(os.environ.get("SIGES_FALLAS"))
+
+
+def probabilidades() -> Dict[str, float]:
+    """"conexion=0.2,consulta=0.05,semilla=1" -> {"conexion": 0.2, ...}."""
+    valores = {"conexion": 0.0, "consulta": 0.0}
+    for parte in (os.environ.get("SIGES_FALLAS") or "").split(","):
+        nombre, _, valor = parte.partition("=")
+        if nombre.strip():
+            valores[nombre.strip()] = float(valor or 0)
+    semilla = valores.pop("semilla", None)
+    with _bloqueo:
+        if semilla is not None and not _estado["sembrado"]:
+            _aleatorio.seed(int(semilla))
+            _estado["sembrado"] = True
+    return valores
+
+
+def caer():
+    with _bloqueo:
+        _estado["caido"] = True
+        _estado["generacion"] += 1
+
+
+def levantar():
+    with _bloqueo:
+        _estado["caido"] = False
+
+
+def _fallar(tipo: str, estado: str, mensaje: str):
+    with _bloqueo:
+        inyectadas[tipo] += 1
+    raise ErrorSimulado(estado, f"[{estado}] [Driver simulado] {mensaje}")
+
+
+def _sortear(probabilidad: float) -> bool:
+    with _bloqueo:
+        return _aleatorio.random() < probabilidad
+
+
+def _estado_error() -> str:
+    with _bloqueo:
+        return _aleatorio.choice(("08S01", "HYT00"))
+
+
+class ConexionConFallas:
+    """Conexión SQLite que falla como una conexión de red inestable."""
+
+    def __init__(self, conexion: sqlite3.Connection, probabilidad_consulta: float):
+        self.conexion_real = conexion
+        self.probabilidad_consulta = probabilidad_consulta
+        self.generacion = _estado["generacion"]
+
+    def _viva(self):
+        if _estado["caido"] or self.generacion != _estado["generacion"]:
+            _fallar("caida", "08S01", "Communication link failure")
+
+    def verificar(self):
+        self._viva()
+        if _sortear(self.probabilidad_consulta):
+            _fallar("consulta", _estado_error(), "Communication link failure")
+
+    def commit(self):
+        self._viva()
+        self.conexion_real.commit()
+
+    def rollback(self):
+        self._viva()
+        self.conexion_real.rollback()
+
+    def cursor(self):
+        return CursorConFallas(self, self.conexion_real.cursor())
+
+    def __getattr__(self, nombre):
+        return getattr(self.conexion_real, nombre)
+
+
+class CursorConFallas:
+    def __init__(self, conexion: ConexionConFallas, cursor):
+        self._conexion = conexion
+        self._cursor = cursor
+
+    def execute(self, *args):
+        self._conexion.verificar()
+        self._cursor.execute(*args)
+        return self
+
+    def executemany(self, *args):
+        self._conexion.verificar()
+        self._cursor.executemany(*args)
+        return self
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+def conectar(ruta: str) -> ConexionConFallas:
+    """Abre la base sustituta, o falla según SIGES_FALLAS y la caída simulada."""
+    valores = probabilidades()
+    if _estado["caido"]:
+        _fallar("caida", "08001", "TCP Provider: No connection could be made")
+    if _sortear(valores["conexion"]):
+        _fallar("conexion", "08001", "TCP Provider: No connection could be made")
+    return ConexionConFallas(sqlite3.connect(ruta, check_same_thread=False), valores["consulta"])
@@ -0,0 +1,318 @@
+"""Ejecución de scripts SQL con varias sentencias y varios conjuntos de resultados.
+
+El script se divide en lotes con el separador GO. En SQL Server cada lote se
+envía entero en un solo execute (las variables y tablas variables viven lo que
+dura el lote) y los resultados de cada sentencia se recorren con nextset(),
+como en SSMS. La base SQLite sustituta no acepta varias sentencias por
+execute: ahí cada lote se divide además por punto y coma (respetando cadenas,
+comentarios y bloques BEGIN/END).
+Las filas se leen por lotes con fetchmany para no cargar todo en memoria.
+Los parámetros con nombre (:nombre, @nombre) se envían enlazados (ver parametros.py).
+"""
+import re
+import time
+from typing import Dict, Iterator, List, Optional
+
+import dialecto
+import parametros
+
+# Línea "GO" o "GO n" (n = cantidad de repeticiones del lote)
+_SEPARADOR_GO = re.compile(r"^\s*GO(?:\s+(\d+))?\s*(?:--.*)?$", re.IGNORECASE)
+# Objetos cuyo cuerpo debe enviarse entero (no se divide por punto y coma)
+_CUERPO_ENTERO = re.compile(
+    r"^\s*(CREATE|ALTER|CREATE\s+OR\s+ALTER)\s+(PROC|PROCEDURE|FUNCTION|TRIGGER|VIEW)\b",
+    re.IGNORECASE
+)
+# BEGIN que inicia una transacción (no un bloque): BEGIN TRAN, BEGIN; o BEGIN IMMEDIATE en SQLite
+_BEGIN_TRANSACCION = re.compile(
+    r"\s*(?:;|$)|\s+(?:TRAN|TRANSACTION|DISTRIBUTED|DEFERRED|IMMEDIATE|EXCLUSIVE)\b", re.IGNORECASE
+)
+
+TAM_LOTE = 500
+
+
+def dividir_lotes(texto: str) -> List[str]:
+    """Divide el texto en lotes usando las líneas GO (GO n repite el lote n veces)."""
+    lotes, actual = [], []
+    for linea in texto.splitlines():
+        coincidencia = _SEPARADOR_GO.match(linea)
+        if coincidencia:
+            lote = "\n".join(actual).strip()
+            if lote:
+                lotes.extend([lote] * int(coincidencia.group(1) or 1))
+            actual = []
+        else:
+            actual.append(linea)
+    lote = "\n".join(actual).strip()
+    if lote:
+        lotes.append(lote)
+    return lotes
+
+
+def dividir_sentencias(lote: str) -> List[str]:
+    """Divide un lote por punto y coma fuera de cadenas, comentarios y bloques."""
+    if _CUERPO_ENTERO.match(_sin_comentarios_iniciales(lote)):
+        return [lote]
+
+    sentencias, inicio, profundidad = [], 0, 0
+    i, n = 0, len(lote)
+    while i < n:
+        c = lote[i]
+        if c in ("'", '"', "["):
+            cierre = "]" if c == "[" else c
+            i += 1
+            while i < n:
+                if lote[i] == cierre:
+                    # Comilla duplicada = comilla escapada
+                    if i + 1 < n and lote[i + 1] == cierre:
+                        i += 2
+                        continue
+                    break
+                i += 1
+        elif lote.startswith("--", i):
+            fin = lote.find("\n", i)
+            i = n if fin == -1 else fin
+        elif lote.startswith("/*", i):
+            fin = lote.find("*/", i + 2)
+            i = n if fin == -1 else fin + 1
+        elif c.isalpha() or c == "_":
+            j = i
+            while j < n and (lote[j].isalnum() or lote[j] in "_@#$"):
+                j += 1
+            palabra = lote[i:j].upper()
+            if palabra == "CASE" or (palabra == "BEGIN" and not _BEGIN_TRANSACCION.match(lote, j)):
+                profundidad += 1
+            elif palabra == "END" and profundidad:
+                profundidad -= 1
+            i = j - 1
+        elif c == ";" and profundidad == 0:
+            sentencias.append(lote[inicio:i])
+            inicio = i + 1
+        i += 1
+    sentencias.append(lote[inicio:])
+    return [s.strip() for s in sentencias if _sin_comentarios_iniciales(s).strip()]
+
+
+def dividir_script(texto: str, dial: str = dialecto.MSSQL) -> List[str]:
+    """Lo que se envía en cada execute, en orden: los lotes GO en SQL Server, las sentencias en SQLite."""
+    if dial != dialecto.SQLITE:
+        return dividir_lotes(texto)
+    return [s for lote in dividir_lotes(texto) for s in dividir_sentencias(lote)]
+
+
+def _sin_comentarios_iniciales(texto: str) -> str:
+    texto = texto.lstrip()
+    while texto.startswith("--") or texto.startswith("/*"):
+        if texto.startswith("--"):
+            fin = texto.find("\n")
+            texto = "" if fin == -1 else texto[fin + 1:].lstrip()
+        else:
+            fin = texto.find("*/")
+            texto = "" if fin == -1 else texto[fin + 2:].lstrip()
+    return texto
+
+
+def leer_por_lotes(cursor, tam_lote: int = TAM_LOTE, primer_lote: Optional[int] = None) -> Iterator[list]:
+    """Lee el conjunto de resultados actual con fetchmany.
+
+    `primer_lote` permite pedir menos filas la primera vez, para mostrarlas
+    cuanto antes mientras se siguen leyendo las demás.
+    """
+    tam = primer_lote or tam_lote
+    while True:
+        filas = cursor.fetchmany(tam)
+        tam = tam_lote
+        if not filas:
+            return
+        yield filas
+
+
+def siguiente_conjunto(cursor) -> bool:
+    """Avanza al siguiente conjunto de resultados (sqlite3 no tiene nextset)."""
+    nextset = getattr(cursor, "nextset", None)
+    return bool(nextset and nextset())
+
+
+def cancelar(conn, cursor):
+    """Interrumpe desde otro hilo la sentencia en curso (pyodbc: cursor.cancel; sqlite3: interrupt)."""
+    if hasattr(cursor, "cancel"):
+        cursor.cancel()
+        return
+    # Conexión prestada por el pool o envuelta por el driver de fallas
+    while hasattr(conn, "conexion_real"):
+        conn = conn.conexion_real
+    if hasattr(conn, "interrupt"):
+        conn.interrupt()
+
+
+def ejecutar_script(conn, sentencias: List[str], transaccion: bool = False,
+                    tam_lote: int = TAM_LOTE, valores: Optional[Dict] = None,
+                    primer_lote: Optional[int] = None, cursor=None) -> Iterator[Dict]:
+    """Ejecuta las sentencias (ver dividir_script) en orden y produce un evento por resultado.
+
+    Eventos producidos (diccionarios):
+      - {"tipo": "resultado", "sentencia", "texto", "columnas", "lotes"}: un
+        conjunto de filas; "lotes" debe consumirse antes de pedir el siguiente evento.
+      - {"tipo": "fin", "sentencia", "texto", "duracion", "primera_fila", "filas_afectadas",
+        "error", "mensajes", "parametros"}: fin de una sentencia, con tiempo, cantidad
+        de filas, los mensajes informativos del servidor (p. ej. SET STATISTICS IO,
+        TIME) y los valores de sus parámetros (None si no tiene).
+
+    "duracion" cuenta solo el trabajo del driver (execute, fetchmany, nextset),
+    no el tiempo en que el generador queda suspendido mientras el llamador
+    muestra las filas o espera al usuario. "primera_fila" es ese mismo tiempo
+    hasta el primer lote con filas (None si la sentencia no devolvió filas).
+
+    Con transaccion=True todo el script se confirma al final o se revierte ante
+    el primer error; si no, cada sentencia se confirma al terminar.
+    La ejecución se detiene en la primera sentencia con error.
+    Con `valores` ({nombre: valor}) los parámetros de cada sentencia se envían
+    enlazados; sin ellos las sentencias se envían tal cual. `primer_lote`: filas
+    del primer fetchmany de cada resultado (ver leer_por_lotes). `cursor`: uno ya
+    abierto de `conn`, para poder cancelarlo desde otro hilo (ver cancelar).
+    """
+    contexto = ";\n".join(sentencias)
+    cursor = cursor or conn.cursor()
+    try:
+        for indice, texto in enumerate(sentencias):
+            inicio = time.perf_counter()
+            trabajo = 0.0  # segundos de trabajo del driver antes de `inicio`
+            primera_fila = None
+            filas_afectadas = 0
+            mensajes = []
+            usados = None
+            try:
+                nombres = parametros.nombres(texto, contexto) if valores is not None else []
+                if nombres:
+                    usados = {nombre: valores.get(nombre) for nombre in nombres}
+                    cursor.execute(*parametros.enlazar(texto, valores, contexto))
+                else:
+                    cursor.execute(texto)
+                while True:
+                    mensajes.extend(_mensajes(cursor))
+                    if cursor.description is not None:
+                        contador = {"filas": 0, "segundos": 0.0, "primera": None}
+                        trabajo += time.perf_counter() - inicio
+                        yield {
+                            "tipo": "resultado",
+                            "sentencia": indice,
+                            "texto": texto,
+                            "columnas": [col[0] for col in cursor.description],
+                            "descripcion": cursor.description,
+                            "lotes": _contar_lotes(leer_por_lotes(cursor, tam_lote, primer_lote), contador),
+                        }
+                        # Se reanuda después de mostrar el resultado: cuenta solo la lectura
+                        if primera_fila is None and contador["primera"] is not None:
+                            primera_fila = trabajo + contador["primera"]
+                        trabajo += contador["segundos"]
+                        inicio = time.perf_counter()
+                        filas_afectadas += contador["filas"]
+                    elif cursor.rowcount and cursor.rowcount > 0:
+                        filas_afectadas += cursor.rowcount
+                    if not siguiente_conjunto(cursor):
+                        break
+                if not transaccion:
+                    conn.commit()
+            except Exception as e:
+                if transaccion or not getattr(conn, "autocommit", False):
+                    conn.rollback()
+                yield {
+                    "tipo": "fin", "sentencia": indice, "texto": texto,
+                    "duracion": trabajo + time.perf_counter() - inicio, "primera_fila": primera_fila,
+                    "filas_afectadas": filas_afectadas, "error": e, "mensajes": mensajes,
+                    "parametros": usados,
+                }
+                return
+            yield {
+                "tipo": "fin", "sentencia": indice, "texto": texto,
+                "duracion": trabajo + time.perf_counter() - inicio, "primera_fila": primera_fila,
+                "filas_afectadas": filas_afectadas, "error": None, "mensajes": mensajes,
+                "parametros": usados,
+            }
+        if transaccion:
+            conn.commit()
+    finally:
+        cursor.close()
+
+
+def ejecutar_para_valores(conn, sentencia: str, conjuntos: List[Dict], maximo_filas: int = 1000,
+                          cursor=None) -> Dict:
+    """Ejecuta una sentencia con parámetros una vez por conjunto de valores, en una transacción.
+
+    Siempre se envía el mismo texto con marcadores ?, así el driver la prepara
+    una vez y el servidor reutiliza el plan. Las sentencias sin resultados
+    (INSERT, UPDATE, DELETE, EXEC) van en un solo executemany; las que devuelven
+    filas se ejecutan una vez por conjunto y sus filas se juntan, precedidas por
+    los valores de los parámetros, hasta `maximo_filas` (los conjuntos restantes
+    no se ejecutan). Ante un error se revierte todo y "conjunto" indica cuál falló
+    (None si fue dentro del executemany, del segundo en adelante). `cursor`: como
+    en ejecutar_script.
+    """
+    nombres = parametros.nombres(sentencia)
+    if not nombres:
+        raise ValueError("La sentencia no tiene parámetros (:nombre o @nombre)")
+    if not conjuntos:
+        raise ValueError("Indique al menos un conjunto de valores")
+    texto = parametros.enlazar(sentencia, conjuntos[0])[0]
+    lista = [parametros.enlazar(sentencia, valores)[1] for valores in conjuntos]
+    resultado = {
+        "texto": texto, "columnas": None, "descripcion": None, "filas": [], "filas_afectadas": 0,
+        "ejecuciones": 0, "conjuntos": len(lista), "error": None, "conjunto": None,
+    }
+    inicio = time.perf_counter()
+    actual = 0
+    cursor = cursor or conn.cursor()
+    try:
+        cursor.execute(texto, lista[0])
+        if cursor.description is None:
+            afectadas = [cursor.rowcount]
+            if len(lista) > 1:
+                # executemany no indica qué conjunto falló
+                actual = None
+                cursor.executemany(texto, lista[1:])
+                afectadas.append(cursor.rowcount)
+            resultado["ejecuciones"] = len(lista)
+            # Algunos drivers no informan las filas de executemany (-1)
+            resultado["filas_afectadas"] = sum(a for a in afectadas if a and a > 0)
+        else:
+            resultado["columnas"] = [f"@{nombre}" for nombre in nombres] + [col[0] for col in cursor.description]
+            resultado["descripcion"] = tuple((f"@{nombre}", None) for nombre in nombres) + tuple(cursor.description)
+            for actual, valores in enumerate(conjuntos):
+                if actual:
+                    cursor.execute(texto, lista[actual])
+                resultado["ejecuciones"] += 1
+                prefijo = tuple(valores.get(nombre) for nombre in nombres)
+                restantes = maximo_filas - len(resultado["filas"])
+                resultado["filas"].extend(prefijo + tuple(fila) for fila in cursor.fetchmany(restantes))
+                while siguiente_conjunto(cursor):
+                    pass
+                if len(resultado["filas"]) >= maximo_filas:
+                    break
+            resultado["filas_afectadas"] = len(resultado["filas"])
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        resultado.update(error=e, conjunto=actual, filas=[])
+    finally:
+        cursor.close()
+    resultado["duracion"] = time.perf_counter() - inicio
+    return resultado
+
+
+def _mensajes(cursor) -> List[str]:
+    """Mensajes informativos del conjunto actual (pyodbc los expone en cursor.messages)."""
+    return [str(mensaje[-1]) for mensaje in (getattr(cursor, "messages", None) or [])]
+
+
+def _contar_lotes(lotes: Iterator[list], contador: Dict) -> Iterator[list]:
+    """Cuenta las filas y el tiempo de lectura (sin el que pasa el consumidor entre lotes)."""
+    while True:
+        inicio = time.perf_counter()
+        filas = next(lotes, None)
+        contador["segundos"] += time.perf_counter() - inicio
+        if filas is None:
+            return
+        if contador["primera"] is None:
+            contador["primera"] = contador["segundos"]
+        contador["filas"] += len(filas)
+        yield filas
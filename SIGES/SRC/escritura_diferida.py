@@ -0,0 +1,377 @@
+"""Escritura diferida de los formularios (alta y modificación) con diario local.
+
+En modo diferido, guardar un registro no espera al servidor: la operación se
+anota en un diario SQLite local (WAL, sobrevive a un cierre de la aplicación)
+y se devuelve enseguida. Un hilo de fondo aplica las operaciones pendientes
+en orden de llegada, por lotes con una sola conexión, y deja en cada entrada
+su estado:
+
+    pendiente -> aplicada | conflicto | error
+
+Las fallas transitorias (red, servidor caído) no cambian el estado: el lote
+se corta para respetar el orden y se reintenta más tarde con espera
+creciente. Los conflictos de concurrencia guardan la fila vigente del
+servidor para mostrarla. Si la aplicación se cierra entre la confirmación en
+el servidor y la anotación en el diario, la entrada se vuelve a aplicar al
+reiniciar (entrega al menos una vez).
+
+Cada operación puede llevar su entrada de auditoría (quién la pidió y con qué
+datos); se escribe cuando la operación se aplica, no al encolarla, con la
+función `auditar` del diario.
+"""
+import base64
+import decimal
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime, time as hora
+from typing import Callable, Dict, List, Optional, Tuple
+
+import datos as capa_datos
+import esquema
+import resiliencia
+
+TAM_LOTE = 50
+INTERVALO = 2.0           # revisión periódica (además del aviso al encolar)
+ESPERA_MAXIMA = 60.0      # tope de la espera entre reintentos
+OPERACIONES = ("insertar", "modificar")
+
+
+# --- Valores con tipo en JSON ----------------------------------------------------
+
+def _a_json(valor):
+    if isinstance(valor, datetime):
+        return {"$": "datetime", "v": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"$": "date", "v": valor.isoformat()}
+    if isinstance(valor, hora):
+        return {"$": "time", "v": valor.isoformat()}
+    if isinstance(valor, decimal.Decimal):
+        return {"$": "decimal", "v": str(valor)}
+    if isinstance(valor, (bytes, bytearray)):
+        return {"$": "bytes", "v": base64.b64encode(bytes(valor)).decode("ascii")}
+    if isinstance(valor, uuid.UUID):
+        return {"$": "uuid", "v": str(valor)}
+    if isinstance(valor, (list, tuple)):
+        return [_a_json(v) for v in valor]
+    if isinstance(valor, dict):
+        return {"$": "dict", "v": {k: _a_json(v) for k, v in valor.items()}}
+    return valor
+
+
+def _de_json(valor):
+    if isinstance(valor, list):
+        return [_de_json(v) for v in valor]
+    if not isinstance(valor, dict):
+        return valor
+    texto = valor["v"]
+    if valor["$"] == "dict":
+        return {k: _de_json(v) for k, v in texto.items()}
+    return {
+        "datetime": datetime.fromisoformat, "date": date.fromisoformat, "time": hora.fromisoformat,
+        "decimal": decimal.Decimal, "bytes": base64.b64decode, "uuid": uuid.UUID,
+    }[valor["$"]](texto)
+
+
+def codificar(valor) -> Optional[str]:
+    if valor is None:
+        return None
+    if isinstance(valor, dict):
+        return json.dumps({k: _a_json(v) for k, v in valor.items()})
+    return json.dumps(_a_json(valor))
+
+
+def decodificar(texto: Optional[str]):
+    if texto is None:
+        return None
+    valor = json.loads(texto)
+    if isinstance(valor, dict) and "$" not in valor:
+        return {k: _de_json(v) for k, v in valor.items()}
+    return _de_json(valor)
+
+
+class DiarioEscrituras:
+    """Diario local de escrituras pendientes y aplicador de fondo."""
+
+    def __init__(self, ruta: Optional[str] = None, conectar: Optional[Callable] = None,
+                 auditar: Optional[Callable[[Dict], Tuple[Optional[Callable], Callable]]] = None):
+        """`auditar(entrada)` devuelve (auditar(conn) para datos.py o None, anotar()), como auditoria.auditar_en."""
+        self.ruta = ruta or os.path.join(esquema.directorio_cache(), "escrituras.db")
+        self.conectar = conectar
+        self.auditar = auditar
+        self._avisos: List[Callable] = []
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        conn = self._abrir()
+        conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS escrituras (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                origen TEXT NOT NULL,
+                sesion TEXT,
+                operacion TEXT NOT NULL,
+                tabla TEXT NOT NULL,
+                datos TEXT NOT NULL,
+                clave TEXT,
+                valor_clave TEXT,
+                version TEXT,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                intentos INTEGER NOT NULL DEFAULT 0,
+                proximo_intento REAL NOT NULL DEFAULT 0,
+                error TEXT,
+                actual TEXT,
+                creada TEXT NOT NULL,
+                aplicada TEXT,
+                auditoria TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_escrituras_estado ON escrituras (origen, estado, id);
+        """)
+        # Diarios creados antes de que las entradas llevaran su auditoría
+        if "auditoria" not in {fila["name"] for fila in conn.execute("PRAGMA table_info(escrituras)")}:
+            conn.execute("ALTER TABLE escrituras ADD COLUMN auditoria TEXT")
+        conn.close()
+
+    def _abrir(self):
+        # isolation_level=None: cada cambio de estado se confirma apenas ocurre
+        conn = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # --- Entradas -------------------------------------------------------------------
+
+    def encolar(self, origen: str, operacion: str, tabla: str, datos: Dict, sesion=None,
+                clave: Optional[str] = None, valor_clave=None,
+                version: Optional[capa_datos.Version] = None, auditoria: Optional[Dict] = None) -> int:
+        """Anota la operación en el diario (durable al volver) y despierta al aplicador.
+
+        `auditoria` es la entrada de auditoría del cambio; se registra al aplicarse."""
+        if operacion not in OPERACIONES:
+            raise ValueError(f"Operación desconocida: {operacion}")
+        conn = self._abrir()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO escrituras (origen, sesion, operacion, tabla, datos, clave, valor_clave,"
+                " version, creada, auditoria) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (origen, None if sesion is None else str(sesion), operacion, tabla, codificar(datos), clave,
+                 codificar([valor_clave]), codificar(version), datetime.now().isoformat(timespec="seconds"),
+                 codificar(auditoria))
+            )
+            numero = cursor.lastrowid
+        finally:
+            conn.close()
+        self._despertar.set()
+        self._avisar()
+        return numero
+
+    def listar(self, origen: str, sesion=None, limite: int = 100) -> List[Dict]:
+        """Entradas más recientes (las no aplicadas primero)."""
+        condicion, parametros = "origen = ?", [origen]
+        if sesion is not None:
+            condicion += " AND sesion = ?"
+            parametros.append(str(sesion))
+        conn = self._abrir()
+        try:
+            filas = conn.execute(
+                f"SELECT * FROM escrituras WHERE {condicion}"
+                " ORDER BY estado = 'aplicada', id DESC LIMIT ?", (*parametros, limite)
+            ).fetchall()
+        finally:
+            conn.close()
+        entradas = []
+        for fila in filas:
+            entrada = dict(fila)
+            entrada["datos"] = decodificar(fila["datos"])
+            entrada["actual"] = decodificar(fila["actual"])
+            entradas.append(entrada)
+        return entradas
+
+    def resumen(self, origen: str, sesion=None) -> Dict[str, int]:
+        """Cantidad de entradas por estado."""
+        condicion, parametros = "origen = ?", [origen]
+        if sesion is not None:
+            condicion += " AND sesion = ?"
+            parametros.append(str(sesion))
+        conn = self._abrir()
+        try:
+            return dict(conn.execute(
+                f"SELECT estado, COUNT(*) FROM escrituras WHERE {condicion} GROUP BY estado", parametros
+            ).fetchall())
+        finally:
+            conn.close()
+
+    def reintentar(self, numero: int, sin_version: bool = False):
+        """Vuelve a poner en cola una entrada con conflicto o error.
+
+        Con `sin_version`, la modificación sobrescribe los cambios del otro usuario."""
+        conn = self._abrir()
+        try:
+            conn.execute(
+                "UPDATE escrituras SET estado = 'pendiente', intentos = 0, proximo_intento = 0, error = NULL,"
+                f" actual = NULL{', version = NULL' if sin_version else ''}"
+                " WHERE id = ? AND estado IN ('conflicto', 'error')", (numero,)
+            )
+        finally:
+            conn.close()
+        self._despertar.set()
+        self._avisar()
+
+    def descartar(self, numero: int):
+        conn = self._abrir()
+        try:
+            conn.execute("DELETE FROM escrituras WHERE id = ? AND estado <> 'pendiente'", (numero,))
+        finally:
+            conn.close()
+        self._avisar()
+
+    def limpiar_aplicadas(self, origen: str):
+        conn = self._abrir()
+        try:
+            conn.execute("DELETE FROM escrituras WHERE origen = ? AND estado = 'aplicada'", (origen,))
+        finally:
+            conn.close()
+        self._avisar()
+
+    # --- Aplicación -------------------------------------------------------------------
+
+    def _marcar(self, diario, numero: int, estado: str, error: Optional[str] = None, actual=None):
+        diario.execute(
+            "UPDATE escrituras SET estado = ?, error = ?, actual = ?, aplicada = ? WHERE id = ?",
+            (estado, error, codificar(None if actual is None else list(actual)),
+             datetime.now().isoformat(timespec="seconds") if estado == "aplicada" else None, numero)
+        )
+
+    def _auditoria(self, entrada) -> Tuple[Optional[Callable], Callable]:
+        """(auditar(conn), anotar()) de la entrada de auditoría encolada con la operación."""
+        registro = decodificar(entrada["auditoria"])
+        if registro is None or self.auditar is None:
+            return None, lambda: None
+        # Quién y qué se anotaron al encolar; el momento es el de la aplicación
+        registro["momento"] = datetime.now()
+        registro["detalle"] = f"aplicada desde la cola #{entrada['id']}"
+        return self.auditar(registro)
+
+    def aplicar_lote(self, origen: str, tam_lote: int = TAM_LOTE) -> Dict[str, int]:
+        """Aplica en orden hasta `tam_lote` entradas pendientes del origen con una conexión.
+
+        Ante una falla transitoria se detiene (las siguientes esperan a la
+        anterior) y programa el reintento."""
+        conteo = {"aplicadas": 0, "conflictos": 0, "errores": 0, "postergadas": 0, "tablas": set()}
+        diario = self._abrir()
+        try:
+            pendientes = diario.execute(
+                "SELECT * FROM escrituras WHERE origen = ? AND estado = 'pendiente' ORDER BY id LIMIT ?",
+                (origen, tam_lote)
+            ).fetchall()
+            if not pendientes:
+                return conteo
+            if pendientes[0]["proximo_intento"] > time.time():
+                conteo["postergadas"] = len(pendientes)
+                return conteo
+            conn = None
+            try:
+                conn = self.conectar()
+                for entrada in pendientes:
+                    datos = decodificar(entrada["datos"])
+                    auditar, anotar = self._auditoria(entrada)
+                    try:
+                        if entrada["operacion"] == "insertar":
+                            capa_datos.insertar_registro(conn, entrada["tabla"], datos, auditar=auditar)
+                        else:
+                            valor_clave = decodificar(entrada["valor_clave"])[0]
+                            version = [tuple(v) for v in decodificar(entrada["version"]) or []] or None
+                            if capa_datos.modificar_registro(conn, entrada["tabla"], entrada["clave"],
+                                                             valor_clave, datos, version, auditar=auditar) == 0:
+                                raise LookupError("Registro no encontrado")
+                    except capa_datos.ConflictoConcurrencia as conflicto:
+                        self._marcar(diario, entrada["id"], "conflicto", str(conflicto), conflicto.actual)
+                        conteo["conflictos"] += 1
+                        continue
+                    except Exception as e:
+                        if resiliencia.es_transitorio(e):
+                            raise
+                        self._marcar(diario, entrada["id"], "error", str(e))
+                        conteo["errores"] += 1
+                        continue
+                    anotar()
+                    self._marcar(diario, entrada["id"], "aplicada")
+                    conteo["aplicadas"] += 1
+                    conteo["tablas"].add(entrada["tabla"])
+            except Exception as e:
+                # Transitoria (o no se pudo conectar): se reintenta la primera pendiente más tarde
+                if resiliencia.es_transitorio(e) and hasattr(conn, "descartar"):
+                    conn.descartar()
+                restantes = diario.execute(
+                    "SELECT id, intentos FROM escrituras WHERE origen = ? AND estado = 'pendiente'"
+                    " ORDER BY id LIMIT 1", (origen,)
+                ).fetchone()
+                if restantes:
+                    espera = min(ESPERA_MAXIMA, 2 ** restantes["intentos"])
+                    diario.execute(
+                        "UPDATE escrituras SET intentos = intentos + 1, proximo_intento = ?, error = ?"
+                        " WHERE id = ?", (time.time() + espera, str(e), restantes["id"])
+                    )
+                    conteo["postergadas"] += 1
+            finally:
+                if conn is not None:
+                    conn.close()
+        finally:
+            diario.close()
+        return conteo
+
+    def iniciar(self, origen: Callable[[], str], intervalo: float = INTERVALO):
+        """Hilo de fondo que aplica las pendientes del origen actual (origen() en cada vuelta)."""
+        if self._hilo and self._hilo.is_alive():
+            return
+
+        def bucle():
+            while not self._detener.is_set():
+                self._despertar.clear()
+                try:
+                    conteo = self.aplicar_lote(origen())
+                    if any(conteo[k] for k in ("aplicadas", "conflictos", "errores")):
+                        self._avisar(conteo["tablas"])
+                        continue  # puede haber más pendientes: siguiente lote sin esperar
+                except Exception as e:
+                    print("Error en la escritura diferida:", e)
+                self._despertar.wait(intervalo)
+
+        self._hilo = threading.Thread(target=bucle, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._despertar.set()
+
+    # --- Avisos a las sesiones --------------------------------------------------------
+
+    def suscribir(self, aviso: Callable):
+        self._avisos.append(aviso)
+
+    def desuscribir(self, aviso: Callable):
+        if aviso in self._avisos:
+            self._avisos.remove(aviso)
+
+    def _avisar(self, tablas=frozenset()):
+        """Avisa a las sesiones; `tablas`: tablas con escrituras recién aplicadas."""
+        for aviso in list(self._avisos):
+            try:
+                aviso(tablas)
+            except Exception as e:
+                print("Error al avisar de la escritura diferida:", e)
+
+
+_compartido: Optional[DiarioEscrituras] = None
+_bloqueo = threading.Lock()
+
+
+def compartido(conectar: Optional[Callable] = None, auditar: Optional[Callable] = None) -> DiarioEscrituras:
+    """Diario único para el proceso (un solo aplicador mantiene el orden)."""
+    global _compartido
+    with _bloqueo:
+        if _compartido is None:
+            _compartido = DiarioEscrituras(conectar=conectar, auditar=auditar)
+        return _compartido
@@ -0,0 +1,230 @@
+"""Carga de la estructura de la base de datos (tablas y columnas) con caché local.
+
+La estructura se guarda en disco para que la ventana pueda mostrarse con la
+última estructura conocida mientras se refresca desde el servidor. También se
+guarda en memoria, compartida por todas las sesiones del proceso (modo servidor).
+
+Las columnas que son clave foránea (de una sola columna) llevan además
+"referencia": {"tabla", "columna"} con la tabla y columna referenciadas, y las
+de valores grandes (text, image, xml, (max)) llevan "lob": True (ver lob.py).
+Las columnas de la clave primaria llevan "primaria": True, las que no admiten
+NULL "nulable": False y las de texto o binario de largo fijo, "largo". Las
+que asigna el servidor (IDENTITY, columnas calculadas y, en SQLite, la clave
+INTEGER PRIMARY KEY) llevan "automatica": True.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import dialecto
+import lob
+
+# Se incrementa cuando cambia el formato del archivo de caché
+VERSION_CACHE = 6
+
+# Copia en memoria compartida entre sesiones: clave -> (momento, tablas, estructura)
+_memoria: Dict[str, Tuple[float, List[str], Dict[str, List[Dict]]]] = {}
+_bloqueo_memoria = threading.Lock()
+# Tipos cuyo largo máximo se guarda (los formularios lo usan como límite)
+_TIPOS_CON_LARGO = {"char", "varchar", "nchar", "nvarchar", "character", "binary", "varbinary"}
+
+
+def directorio_cache() -> str:
+    """Directorio de caché local de SIGES (configurable con SIGES_CACHE_DIR)."""
+    ruta = os.environ.get("SIGES_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".siges")
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def _ruta_cache(clave: str) -> str:
+    nombre = "".join(c if c.isalnum() else "_" for c in clave)
+    return os.path.join(directorio_cache(), f"esquema_{nombre}.json")
+
+
+def leer_cache(clave: str) -> Optional[Tuple[List[str], Dict[str, List[Dict]]]]:
+    """Devuelve (tablas, estructura) desde la caché, o None si no hay caché válida."""
+    with _bloqueo_memoria:
+        if clave in _memoria:
+            _, tablas, estructura = _memoria[clave]
+            return tablas, estructura
+    try:
+        with open(_ruta_cache(clave), encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if datos.get("version") != VERSION_CACHE:
+        return None
+    return datos["tablas"], datos["estructura"]
+
+
+def guardar_cache(clave: str, tablas: List[str], estructura: Dict[str, List[Dict]]):
+    """Guarda la estructura en memoria y en disco (escritura atómica)."""
+    with _bloqueo_memoria:
+        _memoria[clave] = (time.monotonic(), tablas, estructura)
+    ruta = _ruta_cache(clave)
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION_CACHE, "tablas": tablas, "estructura": estructura}, f)
+    os.replace(temporal, ruta)
+
+
+def estructura_reciente(clave: str, edad_maxima: float) -> Optional[Tuple[List[str], Dict[str, List[Dict]]]]:
+    """Estructura en memoria si se leyó del servidor hace menos de edad_maxima segundos."""
+    with _bloqueo_memoria:
+        if clave in _memoria:
+            momento, tablas, estructura = _memoria[clave]
+            if time.monotonic() - momento < edad_maxima:
+                return tablas, estructura
+    return None
+
+
+def cargar_estructura(conn) -> Tuple[List[str], Dict[str, List[Dict]]]:
+    """Lee tablas, columnas y claves foráneas del servidor con consultas al catálogo."""
+    cursor = conn.cursor()
+    estructura: Dict[str, List[Dict]] = {}
+    if dialecto.dialecto(conn) == dialecto.SQLITE:
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+        claves_primarias = {}
+        foraneas = []
+        for (tabla,) in cursor.fetchall():
+            cursor.execute(f"PRAGMA table_info('{tabla}')")
+            filas = cursor.fetchall()
+            # (cid, nombre, tipo, notnull, predeterminado, pk)
+            estructura[tabla] = [_columna(row[1], _tipo_base(row[2]), _largo_declarado(row[2]), not row[3])
+                                 for row in filas]
+            claves_primarias[tabla] = [row[1] for row in sorted(filas, key=lambda r: r[5]) if row[5]]
+            _marcar_primaria(estructura, tabla, claves_primarias[tabla])
+            # INTEGER PRIMARY KEY es el rowid: SQLite asigna el valor si no se indica
+            if len(claves_primarias[tabla]) == 1:
+                for row, col in zip(filas, estructura[tabla]):
+                    if row[5] and (row[2] or "").strip().upper() == "INTEGER":
+                        col["automatica"] = True
+            cursor.execute(f"PRAGMA foreign_key_list('{tabla}')")
+            # (id, seq, tabla referenciada, columna, columna referenciada, ...)
+            por_restriccion: Dict[int, list] = {}
+            for row in cursor.fetchall():
+                por_restriccion.setdefault(row[0], []).append(row)
+            foraneas.extend(
+                (tabla, filas_fk[0][3], filas_fk[0][2], filas_fk[0][4])
+                for filas_fk in por_restriccion.values() if len(filas_fk) == 1
+            )
+        for tabla, columna, referida, columna_referida in foraneas:
+            # Sin columna explícita, la referencia es a la clave primaria
+            if not columna_referida:
+                primarias = claves_primarias.get(referida) or []
+                columna_referida = primarias[0] if len(primarias) == 1 else None
+            if columna_referida:
+                _marcar_referencia(estructura, tabla, columna, referida, columna_referida)
+    else:
+        cursor.execute("""
+            SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE, c.CHARACTER_MAXIMUM_LENGTH, c.IS_NULLABLE,
+                   COLUMNPROPERTY(OBJECT_ID(QUOTENAME(c.TABLE_SCHEMA) + '.' + QUOTENAME(c.TABLE_NAME)),
+                                  c.COLUMN_NAME, 'IsIdentity')
+                   | COLUMNPROPERTY(OBJECT_ID(QUOTENAME(c.TABLE_SCHEMA) + '.' + QUOTENAME(c.TABLE_NAME)),
+                                    c.COLUMN_NAME, 'IsComputed')
+            FROM INFORMATION_SCHEMA.COLUMNS c
+            JOIN INFORMATION_SCHEMA.TABLES t
+              ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+            WHERE t.TABLE_TYPE = 'BASE TABLE'
+            ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+        """)
+        for tabla, columna, tipo, largo, nulable, automatica in cursor.fetchall():
+            estructura.setdefault(tabla, []).append(_columna(columna, tipo, largo, nulable == "YES", bool(automatica)))
+        cursor.execute("""
+            SELECT k.TABLE_NAME, k.COLUMN_NAME
+            FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
+            JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE k
+              ON k.CONSTRAINT_SCHEMA = tc.CONSTRAINT_SCHEMA AND k.CONSTRAINT_NAME = tc.CONSTRAINT_NAME
+            WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY'
+            ORDER BY k.TABLE_NAME, k.ORDINAL_POSITION
+        """)
+        primarias: Dict[str, List[str]] = {}
+        for tabla, columna in cursor.fetchall():
+            primarias.setdefault(tabla, []).append(columna)
+        for tabla, columnas in primarias.items():
+            _marcar_primaria(estructura, tabla, columnas)
+        # Claves foráneas de una sola columna
+        cursor.execute("""
+            SELECT OBJECT_NAME(fkc.parent_object_id), pc.name,
+                   OBJECT_NAME(fkc.referenced_object_id), rc.name
+            FROM sys.foreign_key_columns fkc
+            JOIN sys.columns pc ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+            JOIN sys.columns rc ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+            WHERE fkc.constraint_object_id IN (
+                SELECT constraint_object_id FROM sys.foreign_key_columns
+                GROUP BY constraint_object_id HAVING COUNT(*) = 1
+            )
+        """)
+        for tabla, columna, referida, columna_referida in cursor.fetchall():
+            _marcar_referencia(estructura, tabla, columna, referida, columna_referida)
+    cursor.close()
+    return sorted(estructura), estructura
+
+
+def _columna(nombre: str, tipo: str, largo: Optional[int] = None, nulable: bool = True,
+             automatica: bool = False) -> Dict:
+    columna = {"nombre": nombre, "tipo": tipo}
+    # varchar(max), nvarchar(max) y varbinary(max) informan largo -1
+    if tipo.lower() in lob.TIPOS_LOB or largo == -1:
+        columna["lob"] = True
+    elif largo and tipo.lower() in _TIPOS_CON_LARGO:
+        columna["largo"] = largo
+    if not nulable:
+        columna["nulable"] = False
+    if automatica:
+        columna["automatica"] = True
+    return columna
+
+
+def clave_primaria(columnas_esquema: List[Dict]) -> List[str]:
+    """Columnas de la clave primaria; sin clave declarada, la primera columna."""
+    primaria = [col["nombre"] for col in columnas_esquema if col.get("primaria")]
+    if not primaria and columnas_esquema:
+        primaria = [columnas_esquema[0]["nombre"]]
+    return primaria
+
+
+def columna_clave(tabla: str, columnas_esquema: List[Dict]) -> str:
+    """Columna que identifica un registro en los formularios y la lectura de valores grandes.
+
+    ValueError si la clave primaria es compuesta (esas pantallas usan una sola columna).
+    """
+    clave = clave_primaria(columnas_esquema)
+    if len(clave) != 1:
+        raise ValueError(f"{tabla} tiene una clave primaria compuesta ({', '.join(clave)});"
+                         " solo se editan tablas con clave de una columna")
+    return clave[0]
+
+
+def _marcar_primaria(estructura: Dict[str, List[Dict]], tabla: str, columnas: List[str]):
+    for col in estructura.get(tabla, []):
+        if col["nombre"] in columnas:
+            col["primaria"] = True
+
+
+def _marcar_referencia(estructura: Dict[str, List[Dict]], tabla: str, columna: str,
+                       referida: str, columna_referida: str):
+    for col in estructura.get(tabla, []):
+        if col["nombre"] == columna and referida in estructura:
+            col["referencia"] = {"tabla": referida, "columna": columna_referida}
+
+
+def _largo_declarado(tipo_declarado: str) -> Optional[int]:
+    """Largo de un tipo declarado en SQLite ("VARCHAR(50)" -> 50)."""
+    _, _, resto = (tipo_declarado or "").partition("(")
+    largo = resto.split(",")[0].split(")")[0].strip()
+    return int(largo) if largo.isdigit() else None
+
+
+def _tipo_base(tipo_declarado: str) -> str:
+    """Normaliza un tipo declarado en SQLite ("VARCHAR(50)") al estilo DATA_TYPE ("varchar").
+
+    TIMESTAMP en SQLite es una fecha y hora en texto, no el rowversion de SQL Server.
+    """
+    tipo = (tipo_declarado or "").split("(")[0].strip().lower()
+    return "datetime" if tipo == "timestamp" else tipo
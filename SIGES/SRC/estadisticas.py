@@ -0,0 +1,195 @@
+"""Estadísticas aproximadas de tablas (filas y tamaño) leídas del catálogo.
+
+Nunca se usa COUNT(*): en SQL Server se leen sys.dm_db_partition_stats (o
+sys.partitions si falta el permiso VIEW DATABASE STATE); en SQLite,
+sqlite_stat1 / MAX(rowid) y la tabla virtual dbstat. Las estadísticas se
+refrescan en segundo plano y se guardan en la caché local.
+"""
+import json
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+import configuracion
+import dialecto
+import esquema
+
+# Las políticas según el tamaño de la tabla (páginas, exportación) y el
+# intervalo de refresco son ajustes de configuracion.py.
+
+
+def leer_estadisticas(conn) -> Dict[str, Dict]:
+    """Devuelve {tabla: {"filas": int, "bytes": int|None}} desde el catálogo."""
+    cursor = conn.cursor()
+    try:
+        if dialecto.dialecto(conn) == dialecto.SQLITE:
+            return _leer_sqlite(cursor)
+        return _leer_mssql(cursor)
+    finally:
+        cursor.close()
+
+
+def _leer_mssql(cursor) -> Dict[str, Dict]:
+    try:
+        cursor.execute("""
+            SELECT t.name,
+                   SUM(CASE WHEN ps.index_id IN (0, 1) THEN ps.row_count ELSE 0 END),
+                   SUM(ps.used_page_count) * 8192
+            FROM sys.dm_db_partition_stats ps
+            JOIN sys.tables t ON t.object_id = ps.object_id
+            GROUP BY t.name
+        """)
+        return {fila[0]: {"filas": int(fila[1] or 0), "bytes": int(fila[2] or 0)} for fila in cursor.fetchall()}
+    except Exception:
+        # Sin VIEW DATABASE STATE: sys.partitions da las filas, no el tamaño
+        cursor.execute("""
+            SELECT t.name, SUM(p.rows)
+            FROM sys.partitions p
+            JOIN sys.tables t ON t.object_id = p.object_id
+            WHERE p.index_id IN (0, 1)
+            GROUP BY t.name
+        """)
+        return {fila[0]: {"filas": int(fila[1] or 0), "bytes": None} for fila in cursor.fetchall()}
+
+
+def _leer_sqlite(cursor) -> Dict[str, Dict]:
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+    tablas = [fila[0] for fila in cursor.fetchall()]
+
+    # sqlite_stat1 (existe después de ANALYZE): el primer número de "stat" es la cantidad de filas
+    analizadas = {}
+    try:
+        cursor.execute("SELECT tbl, MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 GROUP BY tbl")
+        analizadas = {fila[0]: int(fila[1] or 0) for fila in cursor.fetchall()}
+    except Exception:
+        pass
+
+    tamanos = {}
+    try:
+        cursor.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+        tamanos = {fila[0]: int(fila[1] or 0) for fila in cursor.fetchall()}
+    except Exception:
+        pass  # SQLite compilado sin dbstat
+
+    resultado = {}
+    for tabla in tablas:
+        filas = analizadas.get(tabla)
+        if filas is None:
+            # MAX(rowid) se resuelve con el índice de la tabla (aproximado si hubo borrados)
+            try:
+                cursor.execute(f"SELECT MAX(rowid) FROM \"{tabla}\"")
+                filas = int(cursor.fetchone()[0] or 0)
+            except Exception:
+                filas = 0  # tabla WITHOUT ROWID
+        resultado[tabla] = {"filas": filas, "bytes": tamanos.get(tabla)}
+    return resultado
+
+
+def tam_pagina(filas: Optional[int]) -> int:
+    """Cantidad de filas a pedir para la grilla según el tamaño de la tabla."""
+    ajustes = configuracion.actual()["ajustes"]
+    if filas is None:
+        return ajustes["tam_pagina_normal"]
+    if filas <= ajustes["filas_carga_completa"]:
+        return ajustes["filas_carga_completa"]
+    if filas >= ajustes["filas_tabla_grande"]:
+        return ajustes["tam_pagina_grande"]
+    return ajustes["tam_pagina_normal"]
+
+
+def exportar_por_lotes(filas: Optional[int]) -> bool:
+    """True si la exportación debe leer por lotes (fetchmany) en lugar de fetchall."""
+    return filas is None or filas >= configuracion.ajuste("filas_exportacion_directa")
+
+
+def formato_cantidad(valor: Optional[float], unidad: str = "") -> str:
+    """Cantidad abreviada: 950, 12,3 K, 4,1 M."""
+    if valor is None:
+        return "?"
+    for limite, sufijo in ((1e9, " G"), (1e6, " M"), (1e3, " K")):
+        if valor >= limite:
+            return f"{valor / limite:.1f}".replace(".", ",") + sufijo + unidad
+    return f"{int(valor)}" + (f" {unidad}" if unidad else "")
+
+
+class CacheEstadisticas:
+    """Estadísticas por tabla en memoria y en disco, con refresco en segundo plano."""
+
+    def __init__(self, conectar: Callable, clave: str):
+        self.conectar = conectar
+        self.ruta = os.path.join(
+            esquema.directorio_cache(),
+            "estadisticas_" + "".join(c if c.isalnum() else "_" for c in clave) + ".json"
+        )
+        self.datos: Dict[str, Dict] = {}
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def cargar_cache(self) -> bool:
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                self.datos = json.load(f)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def refrescar(self):
+        """Lee las estadísticas del servidor y actualiza la caché en disco."""
+        conn = self.conectar()
+        try:
+            self.datos = leer_estadisticas(conn)
+        finally:
+            conn.close()
+        temporal = f"{self.ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self.datos, f)
+        os.replace(temporal, self.ruta)
+
+    def iniciar(self, al_actualizar: Optional[Callable] = None, intervalo: Optional[float] = None):
+        """Refresca ahora y luego cada `intervalo` segundos en un hilo de fondo."""
+        if self._hilo and self._hilo.is_alive():
+            return
+        intervalo = intervalo or configuracion.ajuste("intervalo_estadisticas")
+
+        def bucle():
+            while not self._detener.is_set():
+                try:
+                    self.refrescar()
+                    if al_actualizar:
+                        al_actualizar()
+                except Exception as e:
+                    print("Error al refrescar estadísticas:", e)
+                self._detener.wait(intervalo)
+
+        self._hilo = threading.Thread(target=bucle, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def filas(self, tabla: str) -> Optional[int]:
+        return self.datos.get(tabla, {}).get("filas")
+
+    def bytes(self, tabla: str) -> Optional[int]:
+        return self.datos.get(tabla, {}).get("bytes")
+
+    def etiqueta(self, tabla: str) -> str:
+        """Texto para la lista de tablas: "tabla (~1,2 M filas, 35,0 MB)"."""
+        if tabla not in self.datos:
+            return tabla
+        texto = f"{tabla} (~{formato_cantidad(self.filas(tabla))} filas"
+        if self.bytes(tabla) is not None:
+            texto += f", {formato_cantidad(self.bytes(tabla), 'B')}"
+        return texto + ")"
+
+
+_compartidas: Dict[str, CacheEstadisticas] = {}
+_bloqueo = threading.Lock()
+
+
+def compartida(conectar: Callable, clave: str) -> CacheEstadisticas:
+    """Caché de estadísticas única por origen de datos (la comparten todas las sesiones)."""
+    with _bloqueo:
+        if clave not in _compartidas:
+            _compartidas[clave] = CacheEstadisticas(conectar, clave)
+        return _compartidas[clave]
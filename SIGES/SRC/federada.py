@@ -0,0 +1,531 @@
+"""Consulta federada: tablas del servidor, archivos locales y copias locales en un solo SQL.
+
+La consulta se ejecuta en una base SQLite en memoria (el motor local) donde:
+  - cada archivo registrado (CSV o, con openpyxl instalado, Excel .xlsx) es
+    una tabla con el nombre que se le dio;
+  - cada consulta guardada con copia local (vistas_locales) es una vista con
+    su nombre;
+  - srv.Tabla es la tabla Tabla del servidor, que se trae en vivo en cada
+    ejecución.
+
+De cada tabla srv.* se piden solo las columnas que la consulta nombra (todas
+si usa *) y, cuando la tabla aparece una sola vez, solo las filas que cumplen
+los filtros simples del WHERE principal que se refieren a ella
+(columna = valor, IN, BETWEEN, LIKE, comparaciones, IS NOT NULL), enviados con
+parámetros. El join, la agrupación y el resto de la consulta se resuelven en
+el motor local, no en el servidor.
+
+Los filtros enviados al servidor solo sirven para traer menos filas: la
+consulta completa se evalúa siempre en el motor local, con la semántica de
+SQLite. Por eso solo se envían los filtros que en el servidor aceptan al
+menos las mismas filas que localmente (en columnas de texto, por la
+intercalación, solo =, IN y LIKE). Las tablas srv.* son copias: modificarlas
+no cambia el servidor.
+"""
+import csv
+import decimal
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, time as hora
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import openpyxl
+except ImportError:  # opcional: solo para registrar planillas .xlsx
+    openpyxl = None
+
+import configuracion
+import conversores
+import dialecto
+import parametros
+
+PREFIJO = "srv"
+TAM_LOTE = 5000
+MAX_HILOS = 4  # tablas del servidor que se traen a la vez
+
+# Familia de conversión -> tipo de la columna local (decimales NUMERIC: se comparan como número)
+_TIPOS_LOCALES = {"entero": "INTEGER", "flotante": "REAL", "decimal": "NUMERIC", "bit": "INTEGER",
+                  "binario": "BLOB"}
+# Familias en las que la comparación del servidor coincide con la local (sin intercalación)
+_FAMILIAS_ORDENABLES = {"entero", "flotante", "decimal", "bit", "fecha", "fechahora", "hora"}
+_OPERADORES_POSITIVOS = {"=", "like", "in"}
+
+_REFERENCIA = re.compile(rf"\b{PREFIJO}\s*\.\s*(\w+|\[[^\]]+\]|\"[^\"]+\")(?:\s+(?:AS\s+)?(\w+))?",
+                         re.IGNORECASE)
+_NO_ALIAS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "outer", "natural", "on", "using",
+    "group", "order", "having", "limit", "union", "except", "intersect", "window", "set", "values",
+    "select", "from", "when", "then", "else", "end", "and", "or", "not", "returning",
+}
+_CLAUSULA = re.compile(r"\b(WHERE|GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|UNION|EXCEPT|INTERSECT|WINDOW|RETURNING)\b",
+                       re.IGNORECASE)
+_CONECTOR = re.compile(r"\b(AND|OR|BETWEEN)\b", re.IGNORECASE)
+_TODAS = re.compile(r"(?:\bSELECT(?:\s+DISTINCT)?|,)\s*\*", re.IGNORECASE)
+
+_COLUMNA = r"(?:(\w+)\s*\.\s*)?(\w+|\[[^\]]+\]|\"[^\"]+\")"
+_LITERAL = r"(N?'(?:[^']|'')*'|-?\d+(?:\.\d+)?|[:@]\w+)"
+_COMPARACION = re.compile(rf"{_COLUMNA}\s*(=|<>|!=|<=|>=|<|>|(?:NOT\s+)?LIKE\b)\s*{_LITERAL}",
+                          re.IGNORECASE | re.DOTALL)
+_EN = re.compile(rf"{_COLUMNA}\s+(NOT\s+)?IN\s*\(([^()]*)\)", re.IGNORECASE | re.DOTALL)
+_ENTRE = re.compile(rf"{_COLUMNA}\s+(NOT\s+)?BETWEEN\s+{_LITERAL}\s+AND\s+{_LITERAL}", re.IGNORECASE | re.DOTALL)
+_NO_NULO = re.compile(rf"{_COLUMNA}\s+IS\s+NOT\s+NULL", re.IGNORECASE | re.DOTALL)
+_ENTERO = re.compile(r"-?(?:0|[1-9]\d{0,17})")
+_REAL = re.compile(r"-?\d+[.,]\d+")
+
+
+class FiltroNoEnviable(Exception):
+    """El filtro no se puede enviar al servidor (se evalúa solo en el motor local)."""
+
+
+def _sin_comillas(nombre: str) -> str:
+    return nombre[1:-1] if nombre[:1] in "[\"" else nombre
+
+
+def _nombre_tabla(nombre: str) -> str:
+    """Nombre de tabla válido en el motor local (letras, números y _)."""
+    limpio = re.sub(r"\W", "_", nombre.strip())
+    return limpio if limpio and not limpio[0].isdigit() else f"t_{limpio}"
+
+
+def _valor(valor):
+    """Valor tal como se guarda en el motor local (fechas como las de date()/datetime() de SQLite)."""
+    if valor is None or isinstance(valor, (int, float, str, bytes)):
+        return valor
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=" ")
+    if isinstance(valor, (date, hora)):
+        return valor.isoformat()
+    if isinstance(valor, bytearray):
+        return bytes(valor)
+    return str(valor)  # Decimal (la columna NUMERIC lo vuelve número), UUID y otros
+
+
+def _tipo_local(valores) -> str:
+    """Tipo declarado de una columna de archivo según sus valores (sin tipo: guarda lo que venga)."""
+    tipos = {type(v) for v in valores if v is not None}
+    if tipos and tipos <= {int}:
+        return "INTEGER"
+    if tipos and tipos <= {int, float}:
+        return "REAL"
+    if tipos == {bytes}:
+        return "BLOB"
+    return "TEXT" if tipos else ""
+
+
+def leer_origenes(texto: str) -> Dict[str, str]:
+    """"ventas = C:\\datos\\ventas.csv" por línea -> {"ventas": ruta}; sin nombre, el del archivo."""
+    origenes = {}
+    for linea in (texto or "").splitlines():
+        if not linea.strip():
+            continue
+        nombre, separador, ruta = linea.partition("=")
+        if not separador:
+            nombre, ruta = os.path.splitext(os.path.basename(linea.strip()))[0], linea
+        origenes[_nombre_tabla(nombre)] = ruta.strip().strip('"')
+    return origenes
+
+
+# --- Archivos locales ---------------------------------------------------------
+
+def _convertir_texto(columnas: List[List[str]]) -> List[list]:
+    """Columnas de un CSV: enteros o números si todos sus valores lo son (vacío = NULL)."""
+    convertidas = []
+    for valores in columnas:
+        valores = [v.strip() or None for v in valores]
+        presentes = [v for v in valores if v is not None]
+        if presentes and all(_ENTERO.fullmatch(v) for v in presentes):
+            convertidas.append([None if v is None else int(v) for v in valores])
+        elif presentes and all(_ENTERO.fullmatch(v) or _REAL.fullmatch(v) for v in presentes):
+            convertidas.append([None if v is None else float(v.replace(",", ".")) for v in valores])
+        else:
+            convertidas.append(valores)
+    return convertidas
+
+
+def _encabezado(nombres: List) -> List[str]:
+    """Nombres de columna sin vacíos ni repetidos."""
+    resultado = []
+    for i, nombre in enumerate(nombres):
+        nombre = str(nombre).strip() if nombre is not None else ""
+        nombre = nombre or f"columna_{i + 1}"
+        base, n = nombre, 2
+        while nombre.lower() in (r.lower() for r in resultado):
+            nombre, n = f"{base}_{n}", n + 1
+        resultado.append(nombre)
+    return resultado
+
+
+def leer_csv(ruta: str) -> Tuple[List[str], List[tuple]]:
+    """(columnas, filas) de un CSV con encabezado; separador detectado (, ; tab |)."""
+    for codificacion in ("utf-8-sig", "latin-1"):
+        try:
+            with open(ruta, newline="", encoding=codificacion) as f:
+                muestra = f.read(65536)
+                f.seek(0)
+                try:
+                    formato = csv.Sniffer().sniff(muestra, delimiters=",;\t|")
+                except csv.Error:
+                    formato = csv.excel
+                lector = csv.reader(f, formato)
+                encabezado = _encabezado(next(lector, []))
+                filas = [fila for fila in lector if any(v.strip() for v in fila)]
+            break
+        except UnicodeDecodeError:
+            continue
+    ancho = len(encabezado)
+    columnas = [[fila[i] if i < len(fila) else "" for fila in filas] for i in range(ancho)]
+    return encabezado, list(zip(*_convertir_texto(columnas))) if ancho else []
+
+
+def leer_excel(ruta: str) -> Tuple[List[str], List[tuple]]:
+    """(columnas, filas) de la primera hoja de un .xlsx (la primera fila es el encabezado)."""
+    if openpyxl is None:
+        raise RuntimeError("Para registrar planillas Excel instale openpyxl (o guárdelas como CSV)")
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezado = _encabezado(next(filas, ()))
+        datos = [
+            tuple(_valor(v) for v in (tuple(fila) + (None,) * len(encabezado))[:len(encabezado)])
+            for fila in filas if any(v is not None for v in fila)
+        ]
+    finally:
+        libro.close()
+    return encabezado, datos
+
+
+def leer_archivo(ruta: str) -> Tuple[List[str], List[tuple]]:
+    if not os.path.isfile(ruta):
+        raise FileNotFoundError(f"No existe el archivo {ruta}")
+    if os.path.splitext(ruta)[1].lower() in (".xlsx", ".xlsm"):
+        return leer_excel(ruta)
+    return leer_csv(ruta)
+
+
+# --- Análisis de la consulta ----------------------------------------------------
+
+def _profundidades(limpio: str) -> List[int]:
+    """Nivel de paréntesis de cada posición del texto."""
+    nivel, niveles = 0, []
+    for c in limpio:
+        if c == ")":
+            nivel -= 1
+        niveles.append(nivel)
+        if c == "(":
+            nivel += 1
+    return niveles
+
+
+def referencias(sql: str) -> List[Dict]:
+    """Tablas srv.* de la sentencia: {"tabla", "alias", "nivel"} (nivel 0: consulta principal)."""
+    limpio = parametros.sin_literales(sql)
+    niveles = _profundidades(limpio)
+    encontradas = []
+    for coincidencia in _REFERENCIA.finditer(sql):
+        if limpio[coincidencia.start()] == " ":
+            continue  # dentro de un texto o comentario
+        tabla = _sin_comillas(coincidencia.group(1))
+        alias = coincidencia.group(2)
+        if alias and alias.lower() in _NO_ALIAS:
+            alias = None
+        encontradas.append({"tabla": tabla, "alias": alias or tabla, "nivel": niveles[coincidencia.start()]})
+    return encontradas
+
+
+def _condiciones(sql: str) -> List[str]:
+    """Condiciones unidas por AND del WHERE principal ([] si hay OR o UNION en ese nivel)."""
+    limpio = parametros.sin_literales(sql)
+    niveles = _profundidades(limpio)
+    clausulas = [c for c in _CLAUSULA.finditer(limpio) if niveles[c.start()] == 0]
+    if any(c.group(1).upper() in ("UNION", "EXCEPT", "INTERSECT") for c in clausulas):
+        return []
+    donde = next((i for i, c in enumerate(clausulas) if c.group(1).upper() == "WHERE"), None)
+    if donde is None:
+        return []
+    desde = clausulas[donde].end()
+    hasta = clausulas[donde + 1].start() if donde + 1 < len(clausulas) else len(sql)
+    partes, inicio, entre = [], desde, False
+    for conector in _CONECTOR.finditer(limpio, desde, hasta):
+        if niveles[conector.start()] != 0:
+            continue
+        palabra = conector.group(1).upper()
+        if palabra == "OR":
+            return []
+        if palabra == "BETWEEN":
+            entre = True
+        elif entre:
+            entre = False  # el AND del BETWEEN
+        else:
+            partes.append(sql[inicio:conector.start()])
+            inicio = conector.end()
+    partes.append(sql[inicio:hasta])
+    return [parte.strip().rstrip(";").strip() for parte in partes]
+
+
+def _literal(texto: str, valores: Dict, dial: str):
+    if texto[0] in ":@":
+        if texto[1:] not in valores:
+            raise FiltroNoEnviable(texto)
+        return valores[texto[1:]]
+    if texto[-1] == "'":
+        return texto[texto.index("'") + 1:-1].replace("''", "'")
+    if _ENTERO.fullmatch(texto):
+        return int(texto)
+    return decimal.Decimal(texto) if dial == dialecto.MSSQL else float(texto)
+
+
+def _filtro(condicion: str, alias: str, unica: bool, columnas: Dict[str, Dict], valores: Dict,
+            dial: str) -> Optional[Tuple[str, tuple]]:
+    """(SQL del filtro para el servidor con ?, valores) o None si la condición no es de esta tabla."""
+    for patron in (_COMPARACION, _EN, _ENTRE, _NO_NULO):
+        coincidencia = patron.fullmatch(condicion)
+        if coincidencia:
+            break
+    else:
+        return None
+    calificador, columna = coincidencia.group(1), _sin_comillas(coincidencia.group(2)).lower()
+    if calificador and calificador.lower() != alias.lower():
+        return None
+    # Sin calificar, solo si ninguna otra tabla del servidor tiene esa columna
+    if columna not in columnas or (not calificador and not unica):
+        return None
+    nombre, familia = dialecto.citar(columnas[columna]["nombre"], dial), columnas[columna]["familia"]
+    ordenable = dial == dialecto.SQLITE or familia in _FAMILIAS_ORDENABLES
+    try:
+        if patron is _NO_NULO:
+            return f"{nombre} IS NOT NULL", ()
+        if patron is _ENTRE:
+            if not ordenable:
+                return None
+            negado = "NOT " if coincidencia.group(3) else ""
+            return (f"{nombre} {negado}BETWEEN ? AND ?",
+                    (_literal(coincidencia.group(4), valores, dial), _literal(coincidencia.group(5), valores, dial)))
+        if patron is _EN:
+            literales = [p.strip() for p in coincidencia.group(4).split(",")]
+            if not all(re.fullmatch(_LITERAL, p) for p in literales) or (coincidencia.group(3) and not ordenable):
+                return None
+            negado = "NOT " if coincidencia.group(3) else ""
+            return (f"{nombre} {negado}IN ({', '.join('?' * len(literales))})",
+                    tuple(_literal(p, valores, dial) for p in literales))
+        operador = " ".join(coincidencia.group(3).upper().split())
+        if operador.lower() not in _OPERADORES_POSITIVOS and not ordenable:
+            return None
+        return f"{nombre} {operador} ?", (_literal(coincidencia.group(4), valores, dial),)
+    except FiltroNoEnviable:
+        return None
+
+
+def columnas_usadas(sentencias: List[str], alias: List[str], columnas: List[str]) -> List[str]:
+    """Columnas de la tabla que las sentencias nombran (todas si usan * o alias.*)."""
+    usadas = set()
+    for sql in sentencias:
+        limpio = parametros.sin_literales(sql)
+        if _TODAS.search(limpio) or any(re.search(rf"\b{re.escape(a)}\s*\.\s*\*", limpio, re.I) for a in alias):
+            return list(columnas)
+        for columna in columnas:
+            if re.search(rf"(?<![\w@:]){re.escape(columna)}\b", limpio, re.I) \
+                    or re.search(rf"[\[\"]{re.escape(columna)}[\]\"]", sql, re.I):
+                usadas.add(columna)
+    # Sin columnas nombradas (p. ej. COUNT(*)) basta la primera, la clave
+    return [c for c in columnas if c in usadas] or columnas[:1]
+
+
+# --- Motor local -------------------------------------------------------------------
+
+class MotorFederado:
+    """Base SQLite en memoria con los archivos, las copias locales y las tablas srv.*."""
+
+    def __init__(self, conectar: Callable, vistas=None):
+        self.conectar = conectar
+        self.vistas = vistas
+        # La consulta se ejecuta desde el hilo de la ejecución, no desde el que crea el motor
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute(f"ATTACH DATABASE ':memory:' AS {PREFIJO}")
+        if vistas is not None:
+            self.conn.execute("ATTACH DATABASE ? AS copias", (vistas.ruta,))
+        self._bloqueo = threading.Lock()
+        self._archivos: Dict[str, Tuple[str, float, int]] = {}  # tabla -> (ruta, mtime, tamaño)
+
+    def _crear(self, tabla: str, columnas: List[str], tipos: List[str], filas) -> int:
+        definicion = ", ".join(f"{dialecto.citar(c, dialecto.SQLITE)} {t}".rstrip() for c, t in zip(columnas, tipos))
+        marcadores = ", ".join("?" * len(columnas))
+        with self._bloqueo:
+            self.conn.execute(f"DROP TABLE IF EXISTS {tabla}")
+            self.conn.execute(f"CREATE TABLE {tabla} ({definicion})")
+        cantidad = 0
+        # Cada lote se lee del servidor fuera del bloqueo: las demás tablas se cargan mientras tanto
+        for lote in filas:
+            with self._bloqueo:
+                self.conn.executemany(f"INSERT INTO {tabla} VALUES ({marcadores})", lote)
+            cantidad += len(lote)
+        with self._bloqueo:
+            self.conn.commit()
+        return cantidad
+
+    def registrar_archivos(self, origenes: Dict[str, str]) -> Dict[str, int]:
+        """Carga los archivos nuevos o modificados y quita los que ya no están; {tabla: filas cargadas}."""
+        cargados = {}
+        for tabla in set(self._archivos) - set(origenes):
+            with self._bloqueo:
+                self.conn.execute(f'DROP TABLE IF EXISTS "{tabla}"')
+            del self._archivos[tabla]
+        for tabla, ruta in origenes.items():
+            estado = os.stat(ruta) if os.path.isfile(ruta) else None
+            firma = (os.path.abspath(ruta), estado.st_mtime, estado.st_size) if estado else None
+            if firma and self._archivos.get(tabla) == firma:
+                continue
+            columnas, filas = leer_archivo(ruta)
+            tipos = [_tipo_local(valores) for valores in zip(*filas)] if filas else ["TEXT"] * len(columnas)
+            cargados[tabla] = self._crear(f'"{tabla}"', columnas, tipos, [filas])
+            self._archivos[tabla] = firma
+        return cargados
+
+    def registrar_vistas(self) -> List[str]:
+        """Una vista local por consulta guardada con copia (salvo que un archivo use el nombre)."""
+        if self.vistas is None:
+            return []
+        nombres = []
+        with self._bloqueo:
+            for nombre, in self.conn.execute("SELECT name FROM temp.sqlite_master WHERE type = 'view'").fetchall():
+                self.conn.execute(f'DROP VIEW temp."{nombre}"')
+            for consulta in self.vistas.listar():
+                # Las copias de otro origen de datos no se mezclan con las tablas de este servidor
+                if (not consulta["actualizada"] or consulta["nombre"] in self._archivos
+                        or not self.vistas.es_del_origen(consulta)):
+                    continue
+                self.conn.execute(f'CREATE TEMP VIEW "{consulta["nombre"]}" AS '
+                                  f'SELECT * FROM copias.vista_{consulta["id"]}')
+                nombres.append(consulta["nombre"])
+        return nombres
+
+    def preparar(self, sentencias: List[str], valores: Optional[Dict] = None,
+                 al_avanzar: Optional[Callable[[str], None]] = None) -> List[Dict]:
+        """Trae del servidor las tablas srv.* que usan las sentencias.
+
+        Devuelve, por tabla, {"tabla", "columnas", "de_columnas", "filtros",
+        "filas", "duracion", "aviso"} para mostrar qué se pidió al servidor.
+        """
+        valores = valores or {}
+        usos: Dict[str, List[Tuple[Dict, str]]] = {}  # tabla en minúsculas -> [(referencia, sentencia)]
+        for sql in sentencias:
+            for referencia in referencias(sql):
+                usos.setdefault(referencia["tabla"].lower(), []).append((referencia, sql))
+        for tabla in [n for n, in self.conn.execute(f"SELECT name FROM {PREFIJO}.sqlite_master WHERE type = 'table'")]:
+            if tabla.lower() not in usos:
+                with self._bloqueo:
+                    self.conn.execute(f'DROP TABLE {PREFIJO}."{tabla}"')
+        if not usos:
+            return []
+
+        pendientes = list(usos.values())
+        informe, errores = [], []
+        bloqueo = threading.Lock()
+
+        def trabajar():
+            while True:
+                with bloqueo:
+                    if not pendientes or errores:
+                        return
+                    referencias_tabla = pendientes.pop(0)
+                try:
+                    resultado = self._traer(referencias_tabla, valores, al_avanzar)
+                    with bloqueo:
+                        informe.append(resultado)
+                except Exception as e:
+                    with bloqueo:
+                        errores.append(e)
+
+        hilos = [threading.Thread(target=trabajar, daemon=True) for _ in range(min(MAX_HILOS, len(pendientes)))]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        if errores:
+            raise errores[0]
+        return sorted(informe, key=lambda r: r["tabla"].lower())
+
+    def _traer(self, usos: List[Tuple[Dict, str]], valores: Dict, al_avanzar: Optional[Callable]) -> Dict:
+        tabla = usos[0][0]["tabla"]
+        if not re.fullmatch(r"[\w.]+", tabla):
+            raise ValueError(f"Nombre de tabla del servidor no válido: {tabla}")
+        inicio = time.perf_counter()
+        maximo = configuracion.ajuste("filas_federada_servidor")
+        servidor = self.conectar()
+        try:
+            dial = dialecto.dialecto(servidor)
+            cursor = servidor.cursor()
+            cursor.execute(dialecto.select_top(tabla, 0, dial))
+            descripcion = {
+                col[0].lower(): {"nombre": col[0], "familia": conversores.familia(None, col[1])}
+                for col in cursor.description
+            }
+            todas = [col[0] for col in cursor.description]
+            cursor.fetchall()
+            sentencias = list(dict.fromkeys(sql for _, sql in usos))
+            columnas = columnas_usadas(sentencias, [r["alias"] for r, _ in usos], todas)
+            filtros = self._filtros(usos, descripcion, valores, dial)
+            aviso = None
+            try:
+                cursor = self._consultar(servidor, tabla, columnas, filtros, dial)
+            except Exception as e:
+                if not filtros:
+                    raise
+                # Un filtro que el servidor no acepta (p. ej. tipos distintos) se evalúa solo en el motor local
+                aviso = f"El servidor rechazó los filtros ({e}); se trajo la tabla sin filtrar"
+                filtros = []
+                cursor = self._consultar(servidor, tabla, columnas, filtros, dial)
+            tipos = [_TIPOS_LOCALES.get(conversores.familia(None, col[1]), "") for col in cursor.description]
+            contador = {"filas": 0}
+
+            def lotes():
+                while True:
+                    filas = cursor.fetchmany(TAM_LOTE)
+                    if not filas:
+                        return
+                    contador["filas"] += len(filas)
+                    if contador["filas"] > maximo:
+                        raise ValueError(
+                            f"{PREFIJO}.{tabla} trae más de {maximo} filas: agregue filtros sobre sus columnas"
+                            " en el WHERE o aumente el ajuste filas_federada_servidor"
+                        )
+                    if al_avanzar:
+                        al_avanzar(f"{PREFIJO}.{tabla}: {contador['filas']} filas")
+                    yield [tuple(_valor(v) for v in fila) for fila in filas]
+
+            filas = self._crear(f'{PREFIJO}."{tabla}"', columnas, tipos, lotes())
+            cursor.close()
+        finally:
+            servidor.close()
+        return {"tabla": tabla, "columnas": columnas, "de_columnas": len(todas),
+                "filtros": filtros, "filas": filas,
+                "duracion": time.perf_counter() - inicio, "aviso": aviso}
+
+    @staticmethod
+    def _filtros(usos: List[Tuple[Dict, str]], columnas: Dict[str, Dict], valores: Dict,
+                 dial: str) -> List[Tuple[str, tuple]]:
+        """Filtros para el servidor: solo si la tabla aparece una vez y en la consulta principal."""
+        if len(usos) != 1 or usos[0][0]["nivel"] != 0:
+            return []
+        referencia, sql = usos[0]
+        # Las columnas sin calificar solo se atribuyen a esta tabla si es la única del servidor
+        unica = len(referencias(sql)) == 1
+        filtros = []
+        for condicion in _condiciones(sql):
+            filtro = _filtro(condicion, referencia["alias"], unica, columnas, valores, dial)
+            if filtro:
+                filtros.append(filtro)
+        return filtros
+
+    @staticmethod
+    def _consultar(servidor, tabla: str, columnas: List[str], filtros: List[Tuple[str, tuple]], dial: str):
+        donde = " WHERE " + " AND ".join(sql for sql, _ in filtros) if filtros else ""
+        cursor = servidor.cursor()
+        cursor.execute(f"SELECT {', '.join(dialecto.citar(c, dial) for c in columnas)} FROM {tabla}{donde}",
+                       tuple(v for _, valores in filtros for v in valores))
+        return cursor
+
+    def cerrar(self):
+        self.conn.close()
@@ -0,0 +1,222 @@
+"""Formularios de alta y modificación armados a partir del esquema.
+
+Cada tabla tiene una plantilla: los controles del formulario se crean una sola
+vez (la primera vez que se abre) según el tipo de cada columna, y en los usos
+siguientes solo se reinician sus valores. El control depende de la familia de
+conversión de la columna (conversores.py):
+
+- números: campo con filtro de entrada y teclado numérico;
+- bit: casilla (de tres estados si la columna admite NULL);
+- fechas: campo de texto con botón de calendario;
+- clave foránea: buscador con lista (se vuelve a crear en cada uso, porque sus
+  opciones dependen de la búsqueda);
+- textos: largo máximo de la columna, y varias líneas para los valores grandes.
+
+Las columnas que no admiten NULL se marcan con "*" y se exigen al guardar,
+salvo las de texto: en ellas un campo vacío se guarda como '' (en las que
+admiten NULL, vacío es NULL). Las columnas que asigna el servidor (IDENTITY,
+calculadas, rowversion) se muestran sin poder editarse y nunca se envían.
+Las plantillas son por sesión (los controles de Flet pertenecen a una página)
+y se descartan si la tabla cambia de estructura.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import flet as ft
+
+import conversores
+
+# Filtros de entrada por familia numérica
+_FILTROS = {
+    "entero": r"^-?[0-9]*$",
+    "decimal": r"^-?[0-9]*([.,][0-9]*)?$",
+    "flotante": r"^-?[0-9]*([.,][0-9]*)?([eE]-?[0-9]*)?$",
+}
+_AYUDAS = {
+    "fecha": "AAAA-MM-DD",
+    "fechahora": "AAAA-MM-DD HH:MM:SS",
+    "hora": "HH:MM:SS",
+    "binario": "0x...",
+    "guid": "XXXXXXXX-XXXX-XXXX-XXXX-XXXXXXXXXXXX",
+}
+# Columnas que mantiene el servidor: se muestran pero no se envían (además de las "automatica")
+TIPOS_SOLO_LECTURA = {"timestamp", "rowversion"}
+# Textos más largos que esto (o LOB) se editan en varias líneas
+LARGO_MULTILINEA = 255
+
+
+def _obligatoria(col: Dict) -> bool:
+    """NOT NULL y a cargo del usuario (en las de texto, vacío es '')."""
+    return (col.get("nulable") is False and not _del_servidor(col)
+            and conversores.familia(col["tipo"]) != "texto")
+
+
+def _del_servidor(col: Dict) -> bool:
+    """Columna cuyo valor asigna el servidor (IDENTITY, calculada, rowversion)."""
+    return bool(col.get("automatica")) or col["tipo"].lower() in TIPOS_SOLO_LECTURA
+
+
+def _estilo_campo() -> Dict:
+    return {"width": 300, "bgcolor": "#ffffff", "text_style": ft.TextStyle(color="#000000")}
+
+
+class Campo:
+    """Un campo de la plantilla: el control visible y cómo leer/escribir su valor como texto."""
+
+    def __init__(self, col: Dict, control: ft.Control, entrada: ft.Control):
+        self.col = col
+        self.nombre = col["nombre"]
+        self.control = control
+        self.entrada = entrada
+        self.obligatorio = _obligatoria(col)
+        self.del_servidor = _del_servidor(col)
+
+    def poner(self, texto: str, solo_lectura: bool):
+        if isinstance(self.entrada, ft.Checkbox):
+            valor = (texto or "").strip().lower()
+            self.entrada.value = None if valor == "" and self.entrada.tristate else valor in ("1", "true", "sí", "si")
+            self.entrada.disabled = solo_lectura
+        else:
+            self.entrada.value = texto or ""
+            self.entrada.read_only = solo_lectura
+            self.entrada.error_text = None
+
+    def texto(self) -> str:
+        if isinstance(self.entrada, ft.Checkbox):
+            return "" if self.entrada.value is None else ("1" if self.entrada.value else "0")
+        return self.entrada.value or ""
+
+
+class Plantilla:
+    """Formulario compilado de una tabla (controles creados una vez y reutilizados)."""
+
+    def __init__(self, page: ft.Page, tabla: str, columnas_esquema: List[Dict],
+                 campo_referencia: Callable[[Dict, str], Tuple[ft.Control, ft.Control]]):
+        self.page = page
+        self.tabla = tabla
+        self.firma = _firma(columnas_esquema)
+        self.campo_referencia = campo_referencia
+        self.campos: List[Campo] = []
+        self._calendario: Optional[ft.DatePicker] = None
+        self._destino: Optional[Campo] = None
+        for col in columnas_esquema:
+            if col.get("referencia"):
+                # Marcador: el control real se crea en cada reinicio
+                self.campos.append(Campo(col, ft.Container(), ft.TextField()))
+            else:
+                self.campos.append(self._crear(col))
+
+    def _crear(self, col: Dict) -> Campo:
+        nombre, tipo = col["nombre"], col["tipo"]
+        familia = conversores.familia(tipo)
+        etiqueta = nombre + (" *" if _obligatoria(col) else "")
+        if familia == "bit":
+            casilla = ft.Checkbox(label=etiqueta, tristate=col.get("nulable") is not False, tooltip=f"Tipo: {tipo}")
+            return Campo(col, casilla, casilla)
+        ayuda = "Lo asigna el servidor" if _del_servidor(col) else _AYUDAS.get(familia)
+        opciones = {"label": etiqueta, "tooltip": f"Tipo: {tipo}", "hint_text": ayuda}
+        if familia in _FILTROS:
+            opciones.update(input_filter=ft.InputFilter(allow=True, regex_string=_FILTROS[familia]),
+                            keyboard_type=ft.KeyboardType.NUMBER)
+        elif familia == "texto":
+            largo = col.get("largo")
+            if largo:
+                opciones["max_length"] = largo
+            if col.get("lob") or (largo or 0) > LARGO_MULTILINEA:
+                opciones.update(multiline=True, min_lines=1, max_lines=5)
+        campo_texto = ft.TextField(**opciones, **_estilo_campo())
+        campo = Campo(col, campo_texto, campo_texto)
+        if familia in ("fecha", "fechahora"):
+            boton = ft.IconButton(ft.icons.CALENDAR_MONTH, tooltip="Elegir fecha",
+                                  on_click=lambda e, campo=campo: self._elegir_fecha(campo))
+            campo.control = ft.Row([campo_texto, boton], spacing=4)
+        return campo
+
+    def _elegir_fecha(self, campo: Campo):
+        if campo.entrada.read_only:
+            return
+        # Un solo calendario por plantilla, agregado a la página la primera vez
+        if self._calendario is None:
+            self._calendario = ft.DatePicker(on_change=lambda e: self._fecha_elegida())
+            self.page.overlay.append(self._calendario)
+            self.page.update()
+        self._destino = campo
+        try:
+            self._calendario.value = conversores.REGISTRO["fechahora"][2](campo.texto()) if campo.texto() else None
+        except ValueError:
+            self._calendario.value = None
+        self._calendario.pick_date()
+
+    def _fecha_elegida(self):
+        campo, elegida = self._destino, self._calendario.value
+        if campo is None or elegida is None:
+            return
+        if conversores.familia(campo.col["tipo"]) == "fecha":
+            campo.entrada.value = elegida.strftime("%Y-%m-%d")
+        else:
+            # Se conserva la hora que ya tenía el campo
+            anterior = campo.texto()
+            hora = anterior[11:] if len(anterior) > 10 else "00:00:00"
+            campo.entrada.value = f"{elegida.strftime('%Y-%m-%d')} {hora}"
+        self.page.update()
+
+    def reiniciar(self, valores: Optional[Dict[str, str]] = None, solo_lectura: bool = False,
+                  columnas_solo_lectura: Iterable[str] = ()) -> List[ft.Control]:
+        """Pone los valores (vacíos en un alta) y devuelve los controles para el formulario."""
+        valores = valores or {}
+        columnas_solo_lectura = set(columnas_solo_lectura)
+        for campo in self.campos:
+            texto = valores.get(campo.nombre, "")
+            bloqueado = solo_lectura or campo.del_servidor or campo.nombre in columnas_solo_lectura
+            if campo.col.get("referencia") and not solo_lectura:
+                campo.control, campo.entrada = self.campo_referencia(campo.col, texto)
+                continue
+            if campo.col.get("referencia"):
+                # Solo lectura: basta un campo de texto con el valor
+                campo.entrada = ft.TextField(label=campo.nombre, **_estilo_campo())
+                campo.control = campo.entrada
+            campo.poner(texto, bloqueado)
+        return [campo.control for campo in self.campos]
+
+    def valores(self) -> Dict[str, str]:
+        """Texto de cada campo editable (para conversores.convertir_registro)."""
+        return {campo.nombre: campo.texto() for campo in self.campos if not campo.del_servidor}
+
+    def texto_vacio(self) -> List[str]:
+        """Columnas de texto NOT NULL: vacías se guardan como '' (no como NULL)."""
+        return [campo.nombre for campo in self.campos
+                if not campo.del_servidor and campo.col.get("nulable") is False
+                and conversores.familia(campo.col["tipo"]) == "texto"]
+
+    def faltantes(self) -> List[str]:
+        """Columnas obligatorias (NOT NULL) que quedaron vacías; las marca en el formulario."""
+        faltan = []
+        for campo in self.campos:
+            if campo.obligatorio and campo.texto().strip() == "":
+                faltan.append(campo.nombre)
+                if isinstance(campo.entrada, ft.TextField):
+                    campo.entrada.error_text = "Obligatorio"
+        return faltan
+
+
+def _firma(columnas_esquema: List[Dict]) -> List:
+    return [[col["nombre"], col["tipo"], col.get("largo"), col.get("nulable", True),
+             bool(col.get("referencia")), bool(col.get("automatica"))] for col in columnas_esquema]
+
+
+class Plantillas:
+    """Plantillas de formulario de una sesión, una por tabla."""
+
+    def __init__(self, page: ft.Page, campo_referencia: Callable):
+        self.page = page
+        self.campo_referencia = campo_referencia
+        self._por_tabla: Dict[str, Plantilla] = {}
+
+    def obtener(self, tabla: str, columnas_esquema: List[Dict]) -> Plantilla:
+        plantilla = self._por_tabla.get(tabla)
+        if plantilla is None or plantilla.firma != _firma(columnas_esquema):
+            plantilla = Plantilla(self.page, tabla, columnas_esquema, self.campo_referencia)
+            self._por_tabla[tabla] = plantilla
+        return plantilla
+
+    def limpiar(self):
+        self._por_tabla.clear()
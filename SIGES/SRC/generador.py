@@ -0,0 +1,487 @@
+"""Generador de datos de prueba a partir de la estructura de las tablas.
+
+Lee el esquema (tipos, largos, nulabilidad, clave primaria y claves foráneas,
+ver esquema.py) y genera filas sintéticas verosímiles: nombres, correos,
+fechas, importes, códigos, según el tipo y el nombre de cada columna. Las filas
+se insertan por lotes con executemany (fast_executemany en SQL Server) en la
+base destino, la SQLite sustituta o SQL Server.
+
+Es determinista: con la misma semilla y la misma base de partida se generan
+exactamente los mismos datos, así las mediciones de rendimiento se pueden
+repetir. Cada tabla usa su propio generador aleatorio derivado de la semilla y
+del nombre de la tabla, de modo que el resultado no depende del orden en que
+los hilos terminan.
+
+Las tablas se siembran por niveles según sus claves foráneas: primero las que
+no referencian a otras, luego las que solo referencian a las ya sembradas, y
+así sucesivamente. Las tablas de un mismo nivel se siembran en paralelo y, en
+cada tabla, la generación de un lote se solapa con la inserción del anterior.
+Los valores de las claves foráneas se eligen entre los que existen en la tabla
+referida (leídos al terminar su nivel). Las columnas que asigna el servidor
+(IDENTITY, calculadas, rowversion) no se envían.
+
+Uso desde la línea de comandos:
+
+    python generador.py [TABLA ...] [--filas 10000] [--semilla 1] [--perfil NOMBRE]
+                        [--filas-tabla clientes=500,pedidos=20000] [--nulos 0.1]
+                        [--lote 1000] [--hilos 4]
+
+Sin tablas se siembran todas. Las tablas referidas que no se indican no se
+siembran: se usan sus filas existentes.
+"""
+import argparse
+import hashlib
+import queue
+import random
+import threading
+import time
+import unicodedata
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import conversores
+import dialecto
+import esquema
+
+FILAS = 10000
+TAM_LOTE = 1000
+HILOS = 4
+# Proporción de NULL en las columnas que lo admiten
+PROPORCION_NULOS = 0.1
+# Valores que se leen de una tabla referida (o claves existentes) como máximo
+MAX_VALORES_REFERENCIA = 100000
+# Reintentos para no repetir una clave primaria compuesta o elegida de otra tabla
+REINTENTOS_CLAVE = 20
+# Las fechas se generan en los años anteriores a esta (fija, no "hoy": determinismo)
+FECHA_BASE = datetime(2025, 1, 1)
+ANIOS_FECHAS = 5
+# Tipos que no se generan (el servidor los mantiene o no tienen un valor razonable)
+TIPOS_OMITIDOS = {"timestamp", "rowversion", "geography", "geometry", "hierarchyid", "sql_variant"}
+
+_NOMBRES = ("Ana", "Juan", "María", "Carlos", "Lucía", "José", "Sofía", "Diego", "Valentina", "Martín",
+            "Camila", "Pedro", "Laura", "Jorge", "Elena", "Pablo", "Rosa", "Andrés", "Julia", "Miguel")
+_APELLIDOS = ("García", "Rodríguez", "González", "Fernández", "López", "Martínez", "Sánchez", "Pérez",
+              "Gómez", "Díaz", "Romero", "Torres", "Ruiz", "Álvarez", "Castro", "Vargas", "Rojas", "Silva")
+_CIUDADES = ("Montevideo", "Buenos Aires", "Santiago", "Lima", "Bogotá", "Quito", "Asunción", "La Paz",
+             "Córdoba", "Rosario", "Valparaíso", "Medellín", "Salto", "Mendoza")
+_CALLES = ("San Martín", "Artigas", "Belgrano", "Rivadavia", "Colón", "Sarmiento", "Bolívar", "Mitre")
+_PALABRAS = ("servicio", "pedido", "cliente", "pago", "entrega", "revisión", "producto", "cuenta",
+             "registro", "pendiente", "aprobado", "factura", "stock", "proveedor", "control", "nota",
+             "urgente", "mensual", "general", "interno", "detalle", "ajuste", "consulta", "envío")
+_ESTADOS = ("activo", "inactivo", "pendiente", "aprobado", "anulado", "cerrado")
+
+
+def semilla_tabla(semilla: int, tabla: str) -> int:
+    """Semilla propia de la tabla (estable entre ejecuciones, a diferencia de hash())."""
+    return int.from_bytes(hashlib.md5(f"{semilla}:{tabla}".encode("utf-8")).digest()[:8], "big")
+
+
+def niveles(estructura: Dict[str, List[Dict]], tablas: List[str]) -> List[List[str]]:
+    """Tablas agrupadas por nivel de dependencia (claves foráneas entre las tablas indicadas).
+
+    Las referencias a la propia tabla no cuentan. Si hay un ciclo, sus tablas
+    van juntas en un último nivel (sus claves foráneas toman valores existentes o NULL).
+    """
+    pendientes = {
+        tabla: {col["referencia"]["tabla"] for col in estructura[tabla]
+                if col.get("referencia") and col["referencia"]["tabla"] in tablas
+                and col["referencia"]["tabla"] != tabla}
+        for tabla in tablas
+    }
+    resultado, hechas = [], set()
+    while pendientes:
+        nivel = sorted(tabla for tabla, requeridas in pendientes.items() if requeridas <= hechas)
+        if not nivel:
+            nivel = sorted(pendientes)
+        resultado.append(nivel)
+        hechas.update(nivel)
+        for tabla in nivel:
+            del pendientes[tabla]
+    return resultado
+
+
+def columnas_generadas(columnas_esquema: List[Dict]) -> List[Dict]:
+    """Columnas a las que se envía un valor (sin las que asigna el servidor)."""
+    return [col for col in columnas_esquema
+            if not col.get("automatica") and col["tipo"].lower() not in TIPOS_OMITIDOS]
+
+
+# --- Valores por columna -------------------------------------------------------------
+
+def _recortar(texto: str, largo: Optional[int]) -> str:
+    return texto[:largo] if largo else texto
+
+
+def _sin_acentos(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+
+
+def _generador_texto(col: Dict, clave: bool = False) -> Callable[[random.Random, int], str]:
+    """Texto según el nombre de la columna (nombre, correo, teléfono, ...); código si es clave."""
+    nombre = col["nombre"].lower()
+    largo = col.get("largo") or (None if col.get("lob") else 50)
+    fijo = col["tipo"].lower() in ("char", "nchar")
+
+    if clave:
+        # Código de hasta 10 caracteres: prácticamente no se repite
+        alfabeto = "ABCDEFGHJKLMNPQRSTUVWXYZ0123456789"
+
+        def valor(rng, n):
+            return "".join(rng.choice(alfabeto) for _ in range(min(largo or 10, 10)))
+    elif "correo" in nombre or "email" in nombre or "mail" in nombre:
+        def valor(rng, n):
+            return _sin_acentos(f"{rng.choice(_NOMBRES)}.{rng.choice(_APELLIDOS)}{n}@ejemplo.com".lower())
+    elif "apellido" in nombre:
+        def valor(rng, n):
+            return rng.choice(_APELLIDOS)
+    elif "nombre" in nombre or "titular" in nombre or "contacto" in nombre:
+        def valor(rng, n):
+            return f"{rng.choice(_NOMBRES)} {rng.choice(_APELLIDOS)}"
+    elif "telefono" in nombre or "teléfono" in nombre or "celular" in nombre:
+        def valor(rng, n):
+            return f"09{rng.randrange(1000000, 10000000)}"
+    elif "direccion" in nombre or "dirección" in nombre or "domicilio" in nombre:
+        def valor(rng, n):
+            return f"{rng.choice(_CALLES)} {rng.randrange(1, 5000)}"
+    elif "ciudad" in nombre or "localidad" in nombre:
+        def valor(rng, n):
+            return rng.choice(_CIUDADES)
+    elif "estado" in nombre or "situacion" in nombre:
+        def valor(rng, n):
+            return rng.choice(_ESTADOS)
+    elif "codigo" in nombre or "código" in nombre or fijo or (largo and largo <= 12):
+        alfabeto = "ABCDEFGHJKLMNPQRSTUVWXYZ0123456789"
+
+        def valor(rng, n):
+            return "".join(rng.choice(alfabeto) for _ in range(min(largo or 8, 8)))
+    else:
+        def valor(rng, n):
+            cantidad = rng.randrange(2, 12 if (largo or 400) > 60 else 5)
+            return " ".join(rng.choice(_PALABRAS) for _ in range(cantidad)).capitalize()
+
+    return lambda rng, n: _recortar(valor(rng, n), largo)
+
+
+def _generador_entero(col: Dict) -> Callable[[random.Random, int], int]:
+    nombre, tipo = col["nombre"].lower(), col["tipo"].lower()
+    if "edad" in nombre:
+        desde, hasta = 18, 90
+    elif "anio" in nombre or "año" in nombre:
+        desde, hasta = FECHA_BASE.year - ANIOS_FECHAS, FECHA_BASE.year
+    elif "cantidad" in nombre or "stock" in nombre:
+        desde, hasta = 0, 500
+    else:
+        desde, hasta = {"tinyint": (0, 255), "smallint": (0, 32767)}.get(tipo, (1, 100000))
+    return lambda rng, n: rng.randint(desde, hasta)
+
+
+def _generador_fecha(familia: str) -> Callable[[random.Random, int], object]:
+    segundos = ANIOS_FECHAS * 365 * 86400
+    if familia == "fecha":
+        return lambda rng, n: (FECHA_BASE - timedelta(days=rng.randrange(ANIOS_FECHAS * 365))).date()
+    if familia == "hora":
+        return lambda rng, n: (datetime.min + timedelta(seconds=rng.randrange(86400))).time()
+    return lambda rng, n: FECHA_BASE - timedelta(seconds=rng.randrange(segundos))
+
+
+def generador_valor(col: Dict, clave: bool = False) -> Callable[[random.Random, int], object]:
+    """Función (aleatorio, número de fila) -> valor para una columna sin referencia."""
+    familia = conversores.familia(col["tipo"])
+    if familia == "entero":
+        return _generador_entero(col)
+    if familia == "decimal":
+        # Sin precisión en el esquema: importes chicos, que entran en cualquier decimal(p, 2)
+        return lambda rng, n: Decimal(rng.randrange(0, 100000)) / 100
+    if familia == "flotante":
+        return lambda rng, n: round(rng.uniform(0, 1000), 4)
+    if familia == "bit":
+        return lambda rng, n: rng.random() < 0.5
+    if familia in ("fecha", "fechahora", "hora"):
+        return _generador_fecha(familia)
+    if familia == "guid":
+        return lambda rng, n: str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    if familia == "binario":
+        largo = min(col.get("largo") or 16, 16)
+        return lambda rng, n: bytes(rng.getrandbits(8) for _ in range(largo))
+    if col["tipo"].lower() == "xml":
+        return lambda rng, n: f"<dato><n>{n}</n><valor>{rng.choice(_PALABRAS)}</valor></dato>"
+    return _generador_texto(col, clave)
+
+
+# --- Filas de una tabla --------------------------------------------------------------
+
+def _secuencial(col: Dict) -> bool:
+    """Clave entera simple que no es referencia: se numera a continuación de la máxima."""
+    return conversores.familia(col["tipo"]) == "entero" and not col.get("referencia")
+
+
+def generar_filas(tabla: str, columnas_esquema: List[Dict], cantidad: int, semilla: int,
+                  valores_referencia: Dict[Tuple[str, str], List], siguiente_clave: int = 1,
+                  claves_existentes: Optional[Set[tuple]] = None,
+                  nulos: float = PROPORCION_NULOS) -> Iterator[tuple]:
+    """Filas de la tabla (valores de columnas_generadas, en ese orden).
+
+    `valores_referencia` tiene, por (tabla, columna) referida, los valores
+    existentes entre los que se eligen las claves foráneas. Las filas cuya
+    clave primaria no se logra hacer única se omiten.
+    """
+    rng = random.Random(semilla_tabla(semilla, tabla))
+    columnas = columnas_generadas(columnas_esquema)
+    primaria = [col["nombre"] for col in columnas_esquema if col.get("primaria")]
+    posiciones_clave = [i for i, col in enumerate(columnas) if col["nombre"] in primaria]
+    # Clave de una columna entera: secuencial, no hace falta controlar repetidos
+    secuencial = len(primaria) == 1 and len(posiciones_clave) == 1 and _secuencial(columnas[posiciones_clave[0]])
+    usadas = set(claves_existentes or ()) if posiciones_clave and not secuencial else None
+
+    generadores = []
+    for col in columnas:
+        referencia = col.get("referencia")
+        es_clave = col["nombre"] in primaria
+        admite_nulo = col.get("nulable") is not False and not es_clave
+        if es_clave and secuencial:
+            generadores.append((lambda rng, n: siguiente_clave + n, False))
+        elif referencia and referencia["tabla"] == tabla:
+            # Referencia a la propia tabla: una fila anterior (o NULL)
+            generadores.append((None, admite_nulo))
+        elif referencia:
+            opciones = valores_referencia.get((referencia["tabla"], referencia["columna"])) or []
+            if not opciones and not admite_nulo:
+                raise ValueError(f"{tabla}.{col['nombre']}: la tabla {referencia['tabla']} no tiene filas")
+            generadores.append(((lambda rng, n, opciones=opciones: rng.choice(opciones) if opciones else None),
+                                admite_nulo))
+        else:
+            generadores.append((generador_valor(col, es_clave), admite_nulo))
+
+    # Referencias a la propia tabla: valores existentes más los ya generados,
+    # y la posición de la columna referida en la fila
+    nombres = [col["nombre"] for col in columnas]
+    propias: Dict[int, List] = {}
+    origen_propias: Dict[int, Optional[int]] = {}
+    for i, col in enumerate(columnas):
+        if generadores[i][0] is None:
+            columna = col["referencia"]["columna"]
+            propias[i] = list(valores_referencia.get((tabla, columna)) or [])
+            origen_propias[i] = nombres.index(columna) if columna in nombres else None
+
+    for n in range(cantidad):
+        for _ in range(REINTENTOS_CLAVE):
+            fila = []
+            for i, (generar, admite_nulo) in enumerate(generadores):
+                if admite_nulo and rng.random() < nulos:
+                    fila.append(None)
+                elif generar is None:
+                    fila.append(rng.choice(propias[i]) if propias[i] else None)
+                else:
+                    fila.append(generar(rng, n))
+            if usadas is None:
+                break
+            clave = tuple(fila[i] for i in posiciones_clave)
+            if clave not in usadas:
+                usadas.add(clave)
+                break
+        else:
+            continue
+        for i, referida in origen_propias.items():
+            if referida is not None and fila[referida] is not None:
+                propias[i].append(fila[referida])
+        yield tuple(fila)
+
+
+# --- Lecturas auxiliares -------------------------------------------------------------
+
+def leer_valores(conn, tabla: str, columna: str, limite: int = MAX_VALORES_REFERENCIA) -> List:
+    """Valores distintos de una columna, ordenados (el orden fijo mantiene el determinismo)."""
+    cursor = conn.cursor()
+    cursor.execute(dialecto.select_top(tabla, limite, dialecto.dialecto(conn), columnas=f"DISTINCT {columna}",
+                                       resto=f"WHERE {columna} IS NOT NULL ORDER BY {columna}"))
+    valores = [fila[0] for fila in cursor.fetchall()]
+    cursor.close()
+    return valores
+
+
+def leer_claves(conn, tabla: str, primaria: List[str], limite: int = MAX_VALORES_REFERENCIA) -> Set[tuple]:
+    cursor = conn.cursor()
+    cursor.execute(dialecto.select_top(tabla, limite, dialecto.dialecto(conn), columnas=", ".join(primaria)))
+    claves = {tuple(fila) for fila in cursor.fetchall()}
+    cursor.close()
+    return claves
+
+
+def maxima_clave(conn, tabla: str, columna: str) -> int:
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT MAX({columna}) FROM {tabla}")
+    maxima = cursor.fetchone()[0]
+    cursor.close()
+    return int(maxima or 0)
+
+
+# --- Siembra -------------------------------------------------------------------------
+
+def sembrar_tabla(conectar: Callable, tabla: str, columnas_esquema: List[Dict], cantidad: int, semilla: int,
+                  valores_referencia: Dict[Tuple[str, str], List], tam_lote: int = TAM_LOTE,
+                  nulos: float = PROPORCION_NULOS) -> Dict:
+    """Genera e inserta `cantidad` filas por lotes; un hilo genera mientras otro inserta."""
+    inicio = time.perf_counter()
+    columnas = columnas_generadas(columnas_esquema)
+    if not columnas:
+        raise ValueError(f"{tabla}: no tiene columnas a las que enviar valores")
+    primaria = [col["nombre"] for col in columnas_esquema if col.get("primaria")]
+    conn = conectar()
+    try:
+        siguiente, existentes = 1, None
+        claves_generadas = [col for col in columnas if col["nombre"] in primaria]
+        if len(primaria) == 1 and len(claves_generadas) == 1 and _secuencial(claves_generadas[0]):
+            siguiente = maxima_clave(conn, tabla, primaria[0]) + 1
+        elif claves_generadas:
+            existentes = leer_claves(conn, tabla, [col["nombre"] for col in claves_generadas])
+        filas = generar_filas(tabla, columnas_esquema, cantidad, semilla, valores_referencia,
+                              siguiente, existentes, nulos)
+        decimales = [i for i, col in enumerate(columnas) if conversores.familia(col["tipo"]) == "decimal"]
+        if decimales and dialecto.dialecto(conn) == dialecto.SQLITE:
+            # sqlite3 no acepta Decimal: se envía como texto (afinidad NUMERIC)
+            filas = (tuple(str(v) if i in decimales and v is not None else v for i, v in enumerate(fila))
+                     for fila in filas)
+
+        # Generación adelantada de hasta dos lotes mientras se inserta
+        lotes: "queue.Queue" = queue.Queue(maxsize=2)
+        detener = threading.Event()
+
+        def productor():
+            try:
+                lote = []
+                for fila in filas:
+                    if detener.is_set():
+                        return
+                    lote.append(fila)
+                    if len(lote) >= tam_lote:
+                        lotes.put(lote)
+                        lote = []
+                if lote:
+                    lotes.put(lote)
+                lotes.put(None)
+            except Exception as e:
+                lotes.put(e)
+
+        threading.Thread(target=productor, daemon=True).start()
+        cursor = conn.cursor()
+        if dialecto.dialecto(conn) == dialecto.MSSQL:
+            # Envío de cada lote en bloque (pyodbc)
+            try:
+                cursor.fast_executemany = True
+            except AttributeError:
+                pass
+        sentencia = (f"INSERT INTO {tabla} ({', '.join(col['nombre'] for col in columnas)})"
+                     f" VALUES ({', '.join('?' for _ in columnas)})")
+        insertadas, segundos_insercion = 0, 0.0
+        try:
+            while True:
+                lote = lotes.get()
+                if lote is None:
+                    break
+                if isinstance(lote, Exception):
+                    raise lote
+                inicio_lote = time.perf_counter()
+                cursor.executemany(sentencia, lote)
+                conn.commit()
+                segundos_insercion += time.perf_counter() - inicio_lote
+                insertadas += len(lote)
+        except Exception:
+            detener.set()
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+    duracion = time.perf_counter() - inicio
+    return {"tabla": tabla, "filas": insertadas, "duracion": duracion, "insercion": segundos_insercion,
+            "filas_por_segundo": insertadas / duracion if duracion else 0.0}
+
+
+def sembrar(conectar: Callable, estructura: Dict[str, List[Dict]], tablas: List[str], filas: int = FILAS,
+            semilla: int = 1, filas_tabla: Optional[Dict[str, int]] = None, hilos: int = HILOS,
+            tam_lote: int = TAM_LOTE, nulos: float = PROPORCION_NULOS,
+            al_terminar: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """Siembra las tablas nivel por nivel; las de un nivel, en paralelo. Devuelve un resumen por tabla."""
+    desconocidas = [tabla for tabla in tablas if tabla not in estructura]
+    if desconocidas:
+        raise ValueError(f"Tablas desconocidas: {', '.join(desconocidas)}")
+    filas_tabla = filas_tabla or {}
+    resumen = []
+    for nivel in niveles(estructura, tablas):
+        # Valores de las tablas referidas (sembradas en niveles anteriores o ya existentes)
+        referidas = sorted({(col["referencia"]["tabla"], col["referencia"]["columna"])
+                            for tabla in nivel for col in estructura[tabla] if col.get("referencia")})
+        conn = conectar()
+        try:
+            valores_referencia = {(tabla, columna): leer_valores(conn, tabla, columna)
+                                  for tabla, columna in referidas}
+        finally:
+            conn.close()
+        with ThreadPoolExecutor(max_workers=max(1, hilos)) as ejecutor:
+            futuros = [
+                ejecutor.submit(sembrar_tabla, conectar, tabla, estructura[tabla],
+                                filas_tabla.get(tabla, filas), semilla, valores_referencia, tam_lote, nulos)
+                for tabla in nivel
+            ]
+            for futuro in futuros:
+                resultado = futuro.result()
+                resumen.append(resultado)
+                if al_terminar:
+                    al_terminar(resultado)
+    return resumen
+
+
+def leer_filas_tabla(texto: str) -> Dict[str, int]:
+    """"clientes=500,pedidos=20000" -> {"clientes": 500, "pedidos": 20000}."""
+    resultado = {}
+    for parte in (texto or "").split(","):
+        if parte.strip():
+            tabla, _, cantidad = parte.partition("=")
+            resultado[tabla.strip()] = int(cantidad)
+    return resultado
+
+
+def main():
+    from conexion_sql import ConexionSQL
+    import configuracion
+
+    parser = argparse.ArgumentParser(description="Siembra tablas con datos sintéticos a partir del esquema")
+    parser.add_argument("tablas", nargs="*", help="Tablas a sembrar (por omisión, todas)")
+    parser.add_argument("--filas", type=int, default=FILAS, help="Filas por tabla")
+    parser.add_argument("--filas-tabla", default="", help="Filas de tablas puntuales: tabla=n,...")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--perfil", default=None, help="Perfil de la base destino (por omisión, el activo)")
+    parser.add_argument("--nulos", type=float, default=PROPORCION_NULOS, help="Proporción de NULL")
+    parser.add_argument("--lote", type=int, default=TAM_LOTE, help="Filas por INSERT en bloque")
+    parser.add_argument("--hilos", type=int, default=HILOS, help="Tablas sembradas en paralelo")
+    args = parser.parse_args()
+
+    perfil = args.perfil or configuracion.nombre_perfil_activo()
+
+    def conectar():
+        return ConexionSQL.conectar_perfil(perfil)
+
+    conn = conectar()
+    try:
+        tablas, estructura = esquema.cargar_estructura(conn)
+    finally:
+        conn.close()
+    inicio = time.perf_counter()
+    resumen = sembrar(
+        conectar, estructura, args.tablas or tablas, args.filas, args.semilla,
+        leer_filas_tabla(args.filas_tabla), args.hilos, args.lote, args.nulos,
+        al_terminar=lambda r: print(f"  {r['tabla']}: {r['filas']} filas en {r['duracion']:.2f} s"
+                                    f" ({r['filas_por_segundo']:.0f} filas/s)")
+    )
+    total = sum(r["filas"] for r in resumen)
+    segundos = time.perf_counter() - inicio
+    print(f"{len(resumen)} tablas, {total} filas en {segundos:.2f} s ({total / max(segundos, 1e-9):.0f} filas/s),"
+          f" semilla {args.semilla}")
+
+
+if __name__ == "__main__":
+    main()
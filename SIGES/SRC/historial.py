@@ -0,0 +1,255 @@
+"""Historial persistente de consultas y registro de consultas lentas.
+
+Cada ejecución se guarda en un archivo SQLite local (historial.db en el
+directorio de caché). Las escrituras se encolan y las hace un hilo en segundo
+plano por lotes, así registrar una consulta no agrega latencia a la ejecución.
+Cuando una consulta supera el umbral de lentitud, el mismo hilo captura su plan
+de ejecución con una conexión aparte.
+
+Las consultas con parámetros se guardan con su texto original y los valores
+aparte: todas las ejecuciones comparten la huella y los últimos valores usados
+se pueden volver a elegir (parametros_recientes).
+"""
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import dialecto
+import esquema
+import parametros as parametros_consulta
+
+# Consultas más lentas que esto (en milisegundos) guardan su plan de ejecución
+UMBRAL_LENTA_MS = 1000
+# Conjuntos de valores recientes que se ofrecen por consulta
+PARAMETROS_RECIENTES = 10
+TAM_LOTE_ESCRITURA = 100
+
+_CADENA = re.compile(r"N?'(?:[^']|'')*'")
+_NUMERO = re.compile(r"(?<![\w@#$])[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_COMENTARIO_LINEA = re.compile(r"--[^\n]*")
+_COMENTARIO_BLOQUE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_ESPACIOS = re.compile(r"\s+")
+_LISTA_VALORES = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalizar(sql: str) -> str:
+    """Huella de una consulta: sin comentarios, literales reemplazados por ? y en minúsculas."""
+    texto = _COMENTARIO_BLOQUE.sub(" ", sql)
+    texto = _COMENTARIO_LINEA.sub(" ", texto)
+    texto = _CADENA.sub("?", texto)
+    texto = _NUMERO.sub("?", texto)
+    texto = _LISTA_VALORES.sub("(?)", texto)
+    return _ESPACIOS.sub(" ", texto).strip().lower()
+
+
+def capturar_plan(conn, sentencia: str, valores: Optional[Dict] = None) -> str:
+    """Plan estimado de una sentencia (no la ejecuta); `valores`: sus parámetros con nombre."""
+    enlazados = ()
+    if valores:
+        sentencia, enlazados = parametros_consulta.enlazar(sentencia, valores)
+    cursor = conn.cursor()
+    try:
+        if dialecto.dialecto(conn) == dialecto.SQLITE:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sentencia}", enlazados)
+            return "\n".join(" | ".join(str(v) for v in fila) for fila in cursor.fetchall())
+        cursor.execute("SET SHOWPLAN_XML ON")
+        try:
+            cursor.execute(sentencia, *enlazados)
+            partes = []
+            while True:
+                if cursor.description is not None:
+                    partes.extend(str(fila[0]) for fila in cursor.fetchall())
+                if not cursor.nextset():
+                    break
+            return "\n".join(partes)
+        finally:
+            cursor.execute("SET SHOWPLAN_XML OFF")
+    finally:
+        cursor.close()
+
+
+class HistorialConsultas:
+    """Historial de consultas con escritura asíncrona por lotes."""
+
+    def __init__(self, ruta: Optional[str] = None, conectar: Optional[Callable] = None,
+                 umbral_lenta_ms: float = UMBRAL_LENTA_MS):
+        self.ruta = ruta or os.path.join(esquema.directorio_cache(), "historial.db")
+        self.conectar = conectar
+        self.umbral_lenta_ms = umbral_lenta_ms
+        self._cola: "queue.Queue[Dict]" = queue.Queue()
+        conn = self._abrir()
+        conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS consultas (
+                id INTEGER PRIMARY KEY,
+                fecha TEXT NOT NULL,
+                origen TEXT,
+                sql TEXT NOT NULL,
+                huella TEXT NOT NULL,
+                parametros TEXT,
+                duracion_ms REAL,
+                filas INTEGER,
+                error TEXT,
+                plan TEXT,
+                mensajes TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_consultas_huella ON consultas (huella);
+            CREATE INDEX IF NOT EXISTS ix_consultas_fecha ON consultas (fecha);
+        """)
+        conn.close()
+        self._hilo = threading.Thread(target=self._escritor, daemon=True)
+        self._hilo.start()
+
+    def _abrir(self):
+        return sqlite3.connect(self.ruta, timeout=10)
+
+    def registrar(self, sql: str, duracion: float, filas: int = 0, error=None,
+                  parametros=None, origen: str = "", mensajes: Optional[List[str]] = None):
+        """Encola una ejecución (duración en segundos). No bloquea."""
+        self._cola.put({
+            "fecha": datetime.now().isoformat(timespec="milliseconds"),
+            "origen": origen,
+            "sql": sql,
+            "parametros": parametros,
+            "duracion_ms": duracion * 1000,
+            "filas": filas,
+            "error": str(error) if error else None,
+            "mensajes": mensajes,
+        })
+
+    def vaciar(self):
+        """Espera a que se escriban todas las entradas encoladas."""
+        self._cola.join()
+
+    def _escritor(self):
+        conn = self._abrir()
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < TAM_LOTE_ESCRITURA:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conn.executemany(
+                    "INSERT INTO consultas (fecha, origen, sql, huella, parametros, duracion_ms,"
+                    " filas, error, plan, mensajes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [self._fila(entrada) for entrada in lote]
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print("Error al guardar el historial de consultas:", e)
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
+
+    def _fila(self, entrada: Dict) -> tuple:
+        plan = mensajes = None
+        if entrada["duracion_ms"] >= self.umbral_lenta_ms and not entrada["error"]:
+            # Solo las consultas lentas guardan plan y estadísticas de E/S y tiempo
+            # Las consultas federadas se ejecutan en el motor local: el servidor no tiene su plan
+            if self.conectar and entrada["origen"] != "federada":
+                plan = self._plan(entrada["sql"], entrada["parametros"])
+            if entrada["mensajes"]:
+                mensajes = "\n".join(entrada["mensajes"])
+        return (
+            entrada["fecha"], entrada["origen"], entrada["sql"], normalizar(entrada["sql"]),
+            json.dumps(entrada["parametros"], default=str) if entrada["parametros"] is not None else None,
+            entrada["duracion_ms"], entrada["filas"], entrada["error"], plan, mensajes,
+        )
+
+    def _plan(self, sql: str, valores=None) -> Optional[str]:
+        conn = None
+        try:
+            conn = self.conectar()
+            return capturar_plan(conn, sql, valores if isinstance(valores, dict) else None)
+        except Exception as e:
+            return f"No se pudo capturar el plan: {e}"
+        finally:
+            if conn:
+                conn.close()
+
+    def buscar(self, texto: str = "", limite: int = 200, solo_lentas: bool = False) -> List[Dict]:
+        """Últimas ejecuciones cuyo SQL contiene el texto."""
+        condicion = "WHERE sql LIKE ?" + (" AND duracion_ms >= ?" if solo_lentas else "")
+        parametros = [f"%{texto}%"] + ([self.umbral_lenta_ms] if solo_lentas else []) + [limite]
+        conn = self._abrir()
+        try:
+            cursor = conn.execute(
+                "SELECT id, fecha, sql, parametros, duracion_ms, filas, error, duracion_ms >= ?"
+                f" FROM consultas {condicion} ORDER BY id DESC LIMIT ?",
+                [self.umbral_lenta_ms] + parametros
+            )
+            claves = ["id", "fecha", "sql", "parametros", "duracion_ms", "filas", "error", "lenta"]
+            return [dict(zip(claves, fila)) for fila in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def parametros_recientes(self, sql: str, limite: int = PARAMETROS_RECIENTES) -> List[Dict]:
+        """Últimos conjuntos de valores distintos con que se ejecutó la consulta sin error."""
+        conn = self._abrir()
+        try:
+            cursor = conn.execute(
+                "SELECT parametros FROM consultas WHERE huella = ? AND parametros IS NOT NULL"
+                " AND error IS NULL ORDER BY id DESC LIMIT ?",
+                (normalizar(sql), limite * 20)
+            )
+            vistos, recientes = set(), []
+            for (texto,) in cursor:
+                if texto not in vistos and len(recientes) < limite:
+                    vistos.add(texto)
+                    recientes.append(json.loads(texto))
+            return recientes
+        finally:
+            conn.close()
+
+    def detalle(self, id_consulta: int) -> Optional[Dict]:
+        """Entrada completa, incluido el plan capturado."""
+        conn = self._abrir()
+        try:
+            cursor = conn.execute("SELECT * FROM consultas WHERE id = ?", (id_consulta,))
+            fila = cursor.fetchone()
+            return dict(zip([c[0] for c in cursor.description], fila)) if fila else None
+        finally:
+            conn.close()
+
+    def agregados(self, texto: str = "", limite: int = 100) -> List[Dict]:
+        """Estadísticas por consulta normalizada, ordenadas por tiempo total.
+
+        "ultima_ms" frente a "promedio_ms" permite detectar regresiones.
+        """
+        conn = self._abrir()
+        try:
+            cursor = conn.execute("""
+                SELECT huella, COUNT(*), AVG(duracion_ms), MAX(duracion_ms),
+                       SUM(error IS NOT NULL), MAX(fecha),
+                       (SELECT c2.duracion_ms FROM consultas c2
+                        WHERE c2.huella = c.huella ORDER BY c2.id DESC LIMIT 1)
+                FROM consultas c
+                WHERE huella LIKE ?
+                GROUP BY huella
+                ORDER BY SUM(duracion_ms) DESC
+                LIMIT ?
+            """, (f"%{texto.lower()}%", limite))
+            claves = ["huella", "ejecuciones", "promedio_ms", "maximo_ms", "errores", "ultima_fecha", "ultima_ms"]
+            return [dict(zip(claves, fila)) for fila in cursor.fetchall()]
+        finally:
+            conn.close()
+
+
+_compartido: Optional[HistorialConsultas] = None
+_bloqueo = threading.Lock()
+
+
+def compartido(conectar: Optional[Callable] = None) -> HistorialConsultas:
+    """Instancia única del historial para el proceso."""
+    global _compartido
+    with _bloqueo:
+        if _compartido is None:
+            _compartido = HistorialConsultas(conectar=conectar)
+        return _compartido
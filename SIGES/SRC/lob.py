@@ -0,0 +1,202 @@
+"""Columnas de valores grandes (LOB): varchar(max), nvarchar(max), varbinary(max),
+text, ntext, image, xml.
+
+La grilla no trae esos valores completos: la consulta pide solo un prefijo y el
+largo calculados en el servidor, y la celda muestra un ValorLob. El valor
+completo se lee a pedido, en trozos con SUBSTRING, y los binarios se escriben
+directamente en un archivo sin armarlos en memoria.
+"""
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import dialecto
+
+# Tipos que siempre son LOB; los (max) se reconocen por su largo -1
+TIPOS_LOB = {"text", "ntext", "image", "xml", "blob", "clob"}
+TIPOS_BINARIOS = {"image", "varbinary", "binary", "blob"}
+# Caracteres del prefijo que se muestra en la grilla
+LARGO_PREFIJO = 100
+# Valores mayores a esto en consultas libres se recortan al leerlos
+UMBRAL_CONSULTA = 4096
+TAM_TROZO = 64 * 1024
+# Tipos antiguos (y xml) que se convierten a (max) para poder leerlos con SUBSTRING
+_CONVERSION_MSSQL = {"xml": "nvarchar(max)", "text": "varchar(max)", "ntext": "nvarchar(max)",
+                     "image": "varbinary(max)"}
+
+
+class ValorLob:
+    """Lo que la grilla muestra de un LOB: prefijo (solo texto), largo en bytes y en caracteres.
+
+    El largo en bytes depende de la codificación del servidor (UTF-16 en nvarchar)
+    y solo se usa para mostrar el tamaño; si el valor está completo se decide
+    por caracteres.
+    """
+
+    __slots__ = ("prefijo", "largo", "binario", "caracteres")
+
+    def __init__(self, prefijo: Optional[str], largo: Optional[int], binario: bool,
+                 caracteres: Optional[int] = None):
+        self.prefijo = prefijo
+        self.largo = largo
+        self.binario = binario
+        self.caracteres = caracteres
+
+    def __str__(self) -> str:
+        tamano = formato_tamano(self.largo)
+        if self.binario:
+            return f"<binario, {tamano}>"
+        if self.caracteres is not None and len(self.prefijo or "") >= self.caracteres:
+            return self.prefijo
+        return f"{self.prefijo}... ({tamano})"
+
+
+def formato_tamano(largo: Optional[int]) -> str:
+    if largo is None:
+        return "tamaño desconocido"
+    for unidad in ("bytes", "KB", "MB"):
+        if largo < 1024 or unidad == "MB":
+            return f"{largo} {unidad}" if unidad == "bytes" else f"{largo:.1f} {unidad}"
+        largo /= 1024
+
+
+def es_lob(columna: Dict) -> bool:
+    return bool(columna.get("lob"))
+
+
+def es_binario(columna: Dict) -> bool:
+    return columna["tipo"].lower() in TIPOS_BINARIOS
+
+
+def columnas_lob(columnas_esquema: Optional[List[Dict]]) -> List[str]:
+    return [col["nombre"] for col in columnas_esquema or [] if es_lob(col)]
+
+
+def _expresion(col: Dict, dial: str) -> str:
+    """Columna lista para SUBSTRING (xml, text, ntext e image se convierten al tipo (max))."""
+    conversion = _CONVERSION_MSSQL.get(col["tipo"].lower()) if dial == dialecto.MSSQL else None
+    return f"CAST({col['nombre']} AS {conversion})" if conversion else col["nombre"]
+
+
+def _expresiones(col: Dict, dial: str, largo_prefijo: int) -> Tuple[str, str, str]:
+    """(prefijo, largo en bytes, largo en caracteres) de una columna LOB, como expresiones SQL."""
+    nombre = col["nombre"]
+    if es_binario(col):
+        largo = f"length(CAST({nombre} AS BLOB))" if dial == dialecto.SQLITE else f"DATALENGTH({nombre})"
+        return "NULL", largo, "NULL"
+    if dial == dialecto.SQLITE:
+        return (f"substr({nombre}, 1, {int(largo_prefijo)})", f"length(CAST({nombre} AS BLOB))",
+                f"length({nombre})")
+    expresion = _expresion(col, dial)
+    # LEN ignora los espacios finales: se cuenta con un carácter agregado
+    return (f"SUBSTRING({expresion}, 1, {int(largo_prefijo)})", f"DATALENGTH({nombre})",
+            f"LEN({expresion} + 'x') - 1")
+
+
+def consulta_grilla(tabla: str, columnas_esquema: List[Dict], limite: int, dial: str,
+                    largo_prefijo: int = LARGO_PREFIJO) -> str:
+    """SELECT de la grilla con cada LOB reemplazado por su prefijo y sus largos."""
+    partes = []
+    for col in columnas_esquema:
+        if es_lob(col):
+            prefijo, largo, caracteres = _expresiones(col, dial, largo_prefijo)
+            partes.append(f"{prefijo} AS {col['nombre']}")
+            partes.append(f"{largo} AS {col['nombre']}__largo")
+            partes.append(f"{caracteres} AS {col['nombre']}__caracteres")
+        else:
+            partes.append(col["nombre"])
+    return dialecto.select_top(tabla, limite, dial, columnas=", ".join(partes))
+
+
+def armar_filas(columnas_esquema: List[Dict], filas: Sequence[Sequence]) -> List[tuple]:
+    """Junta cada terna (prefijo, largo, caracteres) de consulta_grilla en un ValorLob."""
+    resultado = []
+    for fila in filas:
+        valores, i = [], 0
+        for col in columnas_esquema:
+            if es_lob(col):
+                prefijo, largo, caracteres = fila[i:i + 3]
+                valores.append(None if largo is None else ValorLob(prefijo, largo, es_binario(col), caracteres))
+                i += 3
+            else:
+                valores.append(fila[i])
+                i += 1
+        resultado.append(tuple(valores))
+    return resultado
+
+
+def descripcion_grilla(columnas_esquema: List[Dict], descripcion: Sequence) -> tuple:
+    """cursor.description de consulta_grilla sin las columnas de largo."""
+    resultado, i = [], 0
+    for col in columnas_esquema:
+        resultado.append(descripcion[i])
+        i += 3 if es_lob(col) else 1
+    return tuple(resultado)
+
+
+def recortar_filas(filas: Sequence[Sequence], umbral: int = UMBRAL_CONSULTA,
+                   largo_prefijo: int = LARGO_PREFIJO) -> List[Sequence]:
+    """Consultas libres: los valores mayores al umbral se reemplazan por un ValorLob.
+
+    El driver ya los trajo, pero así no quedan retenidos en las pestañas.
+    """
+    resultado = []
+    for fila in filas:
+        if any(isinstance(v, (str, bytes, bytearray)) and len(v) > umbral for v in fila):
+            fila = tuple(_recortar(v, largo_prefijo) if isinstance(v, (str, bytes, bytearray))
+                         and len(v) > umbral else v for v in fila)
+        resultado.append(fila)
+    return resultado
+
+
+def _recortar(valor, largo_prefijo: int) -> ValorLob:
+    if isinstance(valor, str):
+        return ValorLob(valor[:largo_prefijo], len(valor.encode("utf-8")), False, len(valor))
+    return ValorLob(None, len(valor), True)
+
+
+def leer_trozos(conn, tabla: str, clave: str, valor_clave, col: Dict,
+                tam_trozo: int = TAM_TROZO) -> Iterator:
+    """Lee el valor completo de una columna LOB en trozos (str o bytes) de hasta tam_trozo."""
+    dial = dialecto.dialecto(conn)
+    funcion = "substr" if dial == dialecto.SQLITE else "SUBSTRING"
+    expresion = _expresion(col, dial)
+    cursor = conn.cursor()
+    try:
+        inicio = 1
+        while True:
+            cursor.execute(
+                f"SELECT {funcion}({expresion}, ?, ?) FROM {tabla} WHERE {clave} = ?",
+                (inicio, tam_trozo, valor_clave)
+            )
+            fila = cursor.fetchone()
+            trozo = fila[0] if fila else None
+            if not trozo:
+                return
+            yield trozo
+            if len(trozo) < tam_trozo:
+                return
+            inicio += tam_trozo
+    finally:
+        cursor.close()
+
+
+def leer_texto(conn, tabla: str, clave: str, valor_clave, col: Dict, maximo: int = 1024 * 1024) -> Tuple[str, bool]:
+    """Texto completo (hasta `maximo` caracteres) para mostrar; (texto, truncado)."""
+    partes, leidos = [], 0
+    for trozo in leer_trozos(conn, tabla, clave, valor_clave, col):
+        partes.append(trozo)
+        leidos += len(trozo)
+        if leidos >= maximo:
+            return "".join(partes)[:maximo], True
+    return "".join(partes), False
+
+
+def descargar(conn, tabla: str, clave: str, valor_clave, col: Dict, ruta: str) -> int:
+    """Escribe el valor en un archivo trozo a trozo; devuelve los bytes escritos."""
+    escritos = 0
+    binario = es_binario(col)
+    with open(ruta, "wb") as archivo:
+        for trozo in leer_trozos(conn, tabla, clave, valor_clave, col):
+            datos = bytes(trozo) if binario else trozo.encode("utf-8")
+            archivo.write(datos)
+            escritos += len(datos)
+    return escritos
@@ -1,7 +1,19 @@
 import flet as ft
 from conexion_sql import ConexionSQL
-from datetime import datetime
-import pyodbc
+import configuracion
+import json
+import conversores
+import dialecto
+import ejecutor_script
+import federada
+import historial
+import lob
+import parametros
+import renderizador
+import resiliencia
+import threading
+import time
+import vistas_locales
 import warnings
 
 # Ignorar advertencias de deprecación
@@ -15,7 +27,9 @@ def main(page: ft.Page):
     page.scroll = ft.ScrollMode.AUTO
     page.padding = 20
 
-    current_connection = None
+    historial_consultas = historial.compartido(conectar=ConexionSQL.conectar)
+    vistas = vistas_locales.compartidas(conectar=ConexionSQL.conectar, origen=ConexionSQL.identificador)
+    motor_federado = None  # se crea con la primera consulta federada
 
     txt_query = ft.TextField(
         label="Consulta SQL",
@@ -24,7 +38,27 @@ def main(page: ft.Page):
         value="",  # CONSULTA AUTOMÁTICA
         width=1200,
         text_size=14,
-        border_color=ft.colors.BLUE_800
+        border_color=ft.colors.BLUE_800,
+        on_change=lambda e: detectar_parametros()
+    )
+
+    # Parámetros de la consulta (:nombre o @nombre): un campo por parámetro. Los
+    # valores se envían enlazados, así el servidor reutiliza el plan entre ejecuciones
+    campos_parametros = {}
+    fila_parametros = ft.Row([], wrap=True, visible=False)
+    recientes = []
+    dropdown_recientes = ft.Dropdown(
+        label="Valores recientes", width=350, text_size=13, visible=False,
+        on_change=lambda e: elegir_recientes()
+    )
+    chk_varios = ft.Checkbox(
+        label="Ejecutar para varios valores", value=False, visible=False,
+        on_change=lambda e: mostrar_varios()
+    )
+    txt_conjuntos = ft.TextField(
+        label="Valores: uno por línea (el valor, o nombre=valor; ...)",
+        multiline=True, min_lines=3, max_lines=8, width=1200, text_size=13, visible=False,
+        tooltip="Los parámetros que una línea no indica toman el valor de su campo"
     )
 
     tbl_resultados = ft.DataTable(
@@ -39,65 +73,670 @@ def main(page: ft.Page):
         divider_thickness=0.5
     )
 
+    # Pestañas de resultados: una por cada conjunto de resultados del script
+    tabs_resultados = ft.Tabs(
+        tabs=[ft.Tab(text="Resultados", content=ft.ListView([tbl_resultados], auto_scroll=True))],
+        expand=True
+    )
+
+    chk_transaccion = ft.Checkbox(label="Ejecutar en una sola transacción", value=False)
+
+    # Consulta federada: srv.Tabla (tablas del servidor), archivos registrados y copias
+    # locales de consultas guardadas, unidos en un motor SQLite local
+    chk_federada = ft.Checkbox(
+        label="Consulta federada (srv.Tabla, archivos y copias locales)", value=False,
+        on_change=lambda e: mostrar_federada()
+    )
+    txt_archivos = ft.TextField(
+        label="Archivos locales: nombre = ruta del CSV o .xlsx (uno por línea)",
+        multiline=True, min_lines=2, max_lines=6, width=1200, text_size=13, visible=False,
+        tooltip="Cada archivo es una tabla con ese nombre; las copias locales se usan por su nombre"
+    )
+
     status_bar = ft.Text("Estado: Listo para conectar", color=ft.colors.BLUE_800)
 
+    # Filas que se muestran de entrada por conjunto de resultados; "Cargar más" lee otras
+    # tantas y "Dejar aquí" descarta el resto sin leerlo
+    MAX_FILAS_PESTANA = 1000
+    # Las primeras filas se piden en un lote chico para mostrarlas cuanto antes
+    PRIMER_LOTE = 50
+    # Mínimo entre actualizaciones de la grilla mientras llegan filas (segundos)
+    INTERVALO_REFRESCO = 0.25
+
     def format_value(value):
         """Formatea valores para mejor visualización"""
-        if value is None:
-            return ft.Text("NULL", italic=True, color=ft.colors.GREY)
-        if isinstance(value, datetime):
-            return ft.Text(value.strftime("%Y-%m-%d"), size=12)
-        return ft.Text(str(value), size=12, overflow=ft.TextOverflow.ELLIPSIS)
+        return renderizador.texto_celda(value, largo_maximo=200)
+
+    def nueva_tabla(columnas, filas):
+        """DataTable con el estilo de resultados"""
+        return ft.DataTable(
+            columns=columnas,
+            rows=filas,
+            heading_row_color=ft.colors.BLUE_GREY_100,
+            heading_row_height=40,
+            data_row_min_height=40,
+            column_spacing=20,
+            horizontal_margin=10,
+            divider_thickness=0.5
+        )
+
+    def pestana_resultado(titulo, tabla, resumen, color=ft.colors.GREY_700):
+        return ft.Tab(
+            text=titulo,
+            content=ft.Column([
+                ft.Text(resumen, size=12, color=color),
+                ft.ListView([tabla], expand=True)
+            ], expand=True)
+        )
+
+    def ver_detalle(nombres, valores):
+        page.dialog = renderizador.dialogo_detalle(nombres, valores)
+        page.dialog.open = True
+        page.update()
+
+    # Pestañas de resultados recicladas entre ejecuciones: (pestaña, resumen, grilla, barra "Cargar más")
+    pestanas_recicladas = []
+
+    def pestana_reciclada(indice):
+        while len(pestanas_recicladas) <= indice:
+            tabla = nueva_tabla([], [])
+            resumen = ft.Text("", size=12, color=ft.colors.GREY_700)
+            grilla = renderizador.GrillaReciclable(tabla, formatear=format_value, al_ver_detalle=ver_detalle)
+            barra = ft.Row([
+                ft.ElevatedButton("Cargar más", icon=ft.icons.EXPAND_MORE, on_click=lambda e: decidir("mas")),
+                ft.TextButton("Dejar aquí", on_click=lambda e: decidir("dejar")),
+            ], visible=False)
+            pestana = ft.Tab(text="", content=ft.Column(
+                [ft.Row([resumen, barra]), ft.ListView([tabla], expand=True)], expand=True
+            ))
+            pestanas_recicladas.append((pestana, resumen, grilla, barra))
+        return pestanas_recicladas[indice]
+
+    def pestana_error(titulo, e, color=ft.colors.RED):
+        tabla = nueva_tabla(
+            [ft.DataColumn(ft.Text("Error"))],
+            [ft.DataRow(cells=[ft.DataCell(ft.Text(str(e), color=color))])]
+        )
+        return pestana_resultado(titulo, tabla, str(e), color)
+
+    def detectar_parametros():
+        """Crea o quita los campos cuando cambian los parámetros de la consulta (no en cada tecla)."""
+        nombres = parametros.nombres(txt_query.value or "")
+        if nombres == list(campos_parametros):
+            return
+        anteriores = dict(campos_parametros)
+        campos_parametros.clear()
+        for nombre in nombres:
+            campos_parametros[nombre] = anteriores.get(nombre) or ft.TextField(
+                label=nombre, width=200, text_size=13, hint_text="vacío = NULL",
+                on_submit=ejecutar_consulta
+            )
+        fila_parametros.controls = list(campos_parametros.values())
+        fila_parametros.visible = chk_varios.visible = bool(nombres)
+        if not nombres:
+            chk_varios.value = False
+        mostrar_varios()
+        actualizar_recientes()
+
+    def valores_parametros():
+        return {nombre: parametros.valor(campo.value) for nombre, campo in campos_parametros.items()}
+
+    def dividir_consulta(texto: str):
+        """Lo que se envía en cada execute: lotes GO en SQL Server, sentencias en SQLite y en la federada."""
+        return ejecutor_script.dividir_script(
+            texto, dialecto.SQLITE if chk_federada.value else ConexionSQL.dialecto()
+        )
+
+    def sentencia_parametrizada():
+        """Primera sentencia con parámetros: los valores recientes se buscan por ella."""
+        texto = txt_query.value or ""
+        for sentencia in dividir_consulta(texto):
+            if parametros.nombres(sentencia, texto):
+                return sentencia
+        return None
+
+    def actualizar_recientes():
+        nonlocal recientes
+        sentencia = sentencia_parametrizada() if campos_parametros else None
+        recientes = historial_consultas.parametros_recientes(sentencia) if sentencia else []
+        dropdown_recientes.options = [
+            ft.dropdown.Option(key=str(i), text=parametros.escribir_valores(valores))
+            for i, valores in enumerate(recientes)
+        ]
+        dropdown_recientes.value = None
+        dropdown_recientes.visible = bool(recientes)
+        page.update()
+
+    def elegir_recientes():
+        if dropdown_recientes.value is None:
+            return
+        poner_valores(recientes[int(dropdown_recientes.value)])
+
+    def poner_valores(valores):
+        for nombre, valor in (valores or {}).items():
+            if nombre in campos_parametros:
+                campos_parametros[nombre].value = "" if valor is None else str(valor)
+        page.update()
+
+    def mostrar_varios():
+        txt_conjuntos.visible = bool(chk_varios.value)
+        page.update()
+
+    def mostrar_federada():
+        txt_archivos.visible = bool(chk_federada.value)
+        page.update()
+
+    def preparar_federada(sentencias, valores):
+        """Carga los archivos y trae las tablas srv.* al motor local.
+
+        Devuelve la conexión del motor y una pestaña con lo que se pidió al servidor (o None).
+        """
+        nonlocal motor_federado
+        if motor_federado is None:
+            motor_federado = federada.MotorFederado(ConexionSQL.conectar, vistas)
+        status_bar.value = "Consulta federada: cargando archivos locales..."
+        status_bar.color = ft.colors.BLUE_800
+        page.update()
+        motor_federado.registrar_archivos(federada.leer_origenes(txt_archivos.value))
+        motor_federado.registrar_vistas()
+
+        def avance(texto):
+            status_bar.value = f"Consulta federada: trayendo {texto}"
+            page.update()
+
+        informe = motor_federado.preparar(sentencias, valores, al_avanzar=avance)
+        if not informe:
+            return motor_federado.conn, None
+        tabla = nueva_tabla(
+            [ft.DataColumn(ft.Text(titulo)) for titulo in ("Tabla", "Columnas", "Filtros enviados", "Filas", "Tiempo")],
+            [
+                ft.DataRow(cells=[
+                    ft.DataCell(ft.Text(f"{federada.PREFIJO}.{r['tabla']}")),
+                    ft.DataCell(ft.Text(f"{len(r['columnas'])} de {r['de_columnas']}",
+                                        tooltip=", ".join(r["columnas"]))),
+                    ft.DataCell(ft.Text(
+                        r["aviso"] or " AND ".join(sql for sql, _ in r["filtros"]) or "ninguno",
+                        color=ft.colors.ORANGE if r["aviso"] else None,
+                        tooltip="Valores: " + ", ".join(str(v) for _, valores in r["filtros"] for v in valores)
+                    )),
+                    ft.DataCell(ft.Text(str(r["filas"]))),
+                    ft.DataCell(ft.Text(f"{r['duracion'] * 1000:.0f} ms")),
+                ])
+                for r in informe
+            ]
+        )
+        filas = sum(r["filas"] for r in informe)
+        segundos = max(r["duracion"] for r in informe)
+        return motor_federado.conn, pestana_resultado(
+            "Servidor", tabla, f"{filas} filas traídas del servidor en {segundos:.2f} s; el join se resolvió localmente"
+        )
+
+    def ejecutar_para_varios(pestanas, conexion, cursor):
+        """Una sola sentencia preparada para todos los conjuntos de valores de txt_conjuntos."""
+        sentencias = dividir_consulta(txt_query.value or "")
+        if len(sentencias) != 1:
+            raise ValueError("Para varios valores la consulta debe tener una sola sentencia (un solo lote, sin GO)")
+        nombres = parametros.nombres(sentencias[0])
+        conjuntos = parametros.leer_conjuntos(txt_conjuntos.value, nombres, base=valores_parametros())
+        resultado = ejecutor_script.ejecutar_para_valores(
+            conexion, sentencias[0], conjuntos, maximo_filas=MAX_FILAS_PESTANA, cursor=cursor
+        )
+        historial_consultas.registrar(sentencias[0], resultado["duracion"], resultado["filas_afectadas"],
+                                      resultado["error"], origen="main")
+        duracion = f"{resultado['duracion'] * 1000:.0f} ms"
+        if resultado["error"]:
+            if resultado["conjunto"] is None:
+                donde = f"los conjuntos 2 a {len(conjuntos)}"
+            else:
+                donde = (f"el conjunto {resultado['conjunto'] + 1}"
+                         f" ({parametros.escribir_valores(conjuntos[resultado['conjunto']])})")
+            pestanas.append(pestana_error("Varios valores: Error", resultado["error"]))
+            status_bar.value = f"Error en {donde}: {resultado['error']}. No se guardó ningún cambio"
+            status_bar.color = ft.colors.RED
+            return
+        if resultado["columnas"]:
+            pestana, resumen, grilla, _ = pestana_reciclada(0)
+            formatos = conversores.formateadores(resultado["descripcion"], largo_maximo=200, respaldo=format_value)
+            grilla.mostrar(resultado["columnas"], resultado["filas"], formateadores=formatos)
+            pestana.text = "Varios valores"
+            limite = " (se muestran las primeras)" if len(resultado["filas"]) >= MAX_FILAS_PESTANA else ""
+            resumen.value = (f"{len(resultado['filas'])} filas{limite} de {resultado['ejecuciones']}"
+                             f" de {resultado['conjuntos']} ejecuciones - {duracion}")
+            pestanas.append(pestana)
+        else:
+            tabla = nueva_tabla(
+                [ft.DataColumn(ft.Text("Información"))],
+                [ft.DataRow(cells=[ft.DataCell(ft.Text("Sentencia ejecutada para todos los valores",
+                                                       color=ft.colors.GREEN))])]
+            )
+            pestanas.append(pestana_resultado(
+                "Varios valores", tabla,
+                f"{resultado['ejecuciones']} ejecuciones, {resultado['filas_afectadas']} filas afectadas - {duracion}"
+            ))
+        status_bar.value = f"Sentencia ejecutada para {resultado['ejecuciones']} conjuntos de valores en {duracion}"
+        status_bar.color = ft.colors.GREEN
+
+    # Ejecución en segundo plano: las filas se muestran a medida que llegan. Al llegar al
+    # tope de filas de un resultado, la lectura espera "Cargar más" o "Dejar aquí".
+    # Cada ejecución usa su propia conexión; una nueva cancela la anterior y espera a que
+    # su hilo termine antes de usar las pestañas recicladas
+    ejecucion = {"numero": 0, "actual": None}
+
+    def decidir(accion):
+        corrida = ejecucion["actual"]
+        if corrida:
+            corrida["accion"] = accion
+            corrida["continuar"].set()
+
+    def cancelar(corrida):
+        """Libera la espera de "Cargar más" y cancela la sentencia en curso de la ejecución."""
+        corrida["accion"] = "detener"
+        corrida["continuar"].set()
+        if corrida["cursor"] is not None:
+            try:
+                ejecutor_script.cancelar(corrida["conexion"], corrida["cursor"])
+            except Exception as e:
+                print("No se pudo cancelar la consulta anterior:", e)
+
+    def lanzar(tarea):
+        """Ejecuta tarea(corrida) en un hilo, cuando terminó el de la ejecución anterior (que se cancela)."""
+        anterior = ejecucion["actual"]
+        ejecucion["numero"] += 1
+        corrida = {"numero": ejecucion["numero"], "continuar": threading.Event(), "accion": None,
+                   "conexion": None, "cursor": None, "hilo": None}
+        ejecucion["actual"] = corrida
+        if anterior:
+            cancelar(anterior)
+
+        def hilo():
+            if anterior:
+                anterior["hilo"].join()
+            # Si mientras tanto se lanzó otra, esta ya no corre
+            if corrida["numero"] == ejecucion["numero"]:
+                tarea(corrida)
+
+        corrida["hilo"] = threading.Thread(target=hilo, daemon=True)
+        corrida["hilo"].start()
 
     def ejecutar_consulta(e):
-        nonlocal current_connection
-        try:
-            if current_connection:
-                current_connection.close()
+        """Lanza la ejecución; una nueva cancela la anterior si sigue ejecutando, leyendo o esperando."""
+        lanzar(ejecutar_en_segundo_plano)
 
-            current_connection = ConexionSQL.conectar()
-            if not current_connection:
-                raise Exception("No se pudo establecer la conexión")
-                
-            cursor = current_connection.cursor()
-            cursor.execute(txt_query.value)
+    def mostrar_en_vivo(evento, pestana, resumen, grilla, barra, corrida, inicio):
+        """Agrega los lotes del resultado a la grilla con actualizaciones espaciadas.
 
-            if cursor.description is None:
-                status_bar.value = "Operación completada (sin resultados)"
-                status_bar.color = ft.colors.GREEN
-                tbl_resultados.columns = [ft.DataColumn(ft.Text("Información"))]
-                tbl_resultados.rows = [ft.DataRow(cells=[ft.DataCell(ft.Text("Consulta ejecutada exitosamente", color=ft.colors.GREEN))])]
+        Devuelve (filas leídas, segundos hasta la primera fila o None, si quedaron
+        filas sin leer); None si la ejecución fue reemplazada por otra.
+        """
+        formatos = conversores.formateadores(evento["descripcion"], largo_maximo=200, respaldo=format_value)
+        grilla.mostrar(evento["columnas"], [], formateadores=formatos)
+        lotes = iter(evento["lotes"])
+        tope, leidas, primera_fila = MAX_FILAS_PESTANA, 0, None
+        pendientes, sobrantes, ultimo_refresco = [], [], 0.0
+        while True:
+            lote = sobrantes or next(lotes, None)
+            if lote is None:
+                break
+            if corrida["numero"] != ejecucion["numero"]:
+                return None
+            # Los valores grandes se recortan por lote para no retenerlos en la pestaña
+            lote = lob.recortar_filas(lote) if not sobrantes else lote
+            lote, sobrantes = lote[:tope - leidas], lote[tope - leidas:]
+            leidas += len(lote)
+            pendientes.extend(lote)
+            ahora = time.perf_counter()
+            if primera_fila is None and lote:
+                primera_fila = ahora - inicio
+            if pendientes and (leidas == len(pendientes) or ahora - ultimo_refresco >= INTERVALO_REFRESCO
+                               or leidas >= tope):
+                grilla.agregar(pendientes, formatos)
+                pendientes, ultimo_refresco = [], ahora
+                resumen.value = f"{leidas} filas... (primera fila en {primera_fila * 1000:.0f} ms)"
+                status_bar.value = f"Leyendo resultados: {leidas} filas"
+                page.update()
+            if leidas >= tope:
+                # Tope alcanzado: el cursor queda abierto hasta que el usuario decida
+                barra.visible = True
+                resumen.value = f"{leidas} filas leídas, hay más"
+                status_bar.value = f"Se muestran {leidas} filas: Cargar más o Dejar aquí"
+                status_bar.color = ft.colors.BLUE_800
+                page.update()
+                corrida["continuar"].wait()
+                corrida["continuar"].clear()
+                barra.visible = False
+                if corrida["accion"] == "mas":
+                    tope += MAX_FILAS_PESTANA
+                    continue
+                if corrida["accion"] == "detener":
+                    return None
+                return leidas, primera_fila, True
+        if pendientes:
+            grilla.agregar(pendientes, formatos)
+        return leidas, primera_fila, False
+
+    def ejecutar_en_segundo_plano(corrida):
+        pestanas = []
+        total_sentencias = 0
+        total_filas = 0
+        primera_fila = None  # segundos hasta la primera fila: la métrica principal
+        inicio = time.perf_counter()
+
+        def vigente():
+            return corrida["numero"] == ejecucion["numero"]
+
+        pestana_servidor = None  # consulta federada: qué se pidió al servidor
+        federada_activa = chk_federada.value
+        origen = "federada" if federada_activa else "main"
+        conexion = None
+        try:
+            sentencias = dividir_consulta(txt_query.value or "")
+            valores = valores_parametros() if campos_parametros else None
+            if federada_activa:
+                conexion, pestana_servidor = preparar_federada(sentencias, valores)
             else:
-                # Obtener nombres de las columnas dinámicamente
-                columnas = [ft.DataColumn(ft.Text(col[0], size=12, weight="bold")) for col in cursor.description]
+                conexion = ConexionSQL.conectar()
+                if dialecto.dialecto(conexion) == dialecto.MSSQL:
+                    # Estadísticas de E/S y tiempo para el registro de consultas lentas
+                    conexion.cursor().execute("SET STATISTICS IO, TIME ON")
+            # El cursor queda a la vista para que una ejecución nueva pueda cancelarlo
+            corrida["conexion"], corrida["cursor"] = conexion, conexion.cursor()
+            if not vigente():
+                return
 
-                # Obtener filas y celdas con formato
-                filas = []
-                for row in cursor.fetchall():
-                    celdas = [ft.DataCell(format_value(valor)) for valor in row]
-                    filas.append(ft.DataRow(cells=celdas))
+            if not federada_activa and chk_varios.value and campos_parametros:
+                ejecutar_para_varios(pestanas, conexion, corrida["cursor"])
+                return
 
-                # Actualizar la tabla con nuevos datos
-                tbl_resultados.columns = columnas
-                tbl_resultados.rows = filas
+            status_bar.value = "Ejecutando..."
+            status_bar.color = ft.colors.BLUE_800
+            page.update()
+            total_sentencias = len(sentencias)
+            mostrados = {}  # sentencia -> [(pestaña, resumen, filas, cortado)] de sus resultados
+            for evento in ejecutor_script.ejecutar_script(
+                conexion, sentencias, transaccion=chk_transaccion.value,
+                tam_lote=configuracion.perfil_activo()["tam_lote"],
+                valores=valores,
+                primer_lote=PRIMER_LOTE,
+                cursor=corrida["cursor"]
+            ):
+                if not vigente():
+                    return
+                numero = evento["sentencia"] + 1
+                if evento["tipo"] == "resultado":
+                    # Pestaña nueva a la vista desde el primer lote
+                    pestana, resumen, grilla, barra = pestana_reciclada(len(pestanas))
+                    anteriores = mostrados.setdefault(numero, [])
+                    pestana.text = f"{numero}" if not anteriores else f"{numero}.{len(anteriores) + 1}"
+                    if len(anteriores) == 1:
+                        anteriores[0][0].text = f"{numero}.1"
+                    resumen.value = "Leyendo..."
+                    pestanas.append(pestana)
+                    tabs_resultados.tabs = list(pestanas)
+                    tabs_resultados.selected_index = len(pestanas) - 1 if primera_fila is None else 0
+                    leido = mostrar_en_vivo(evento, pestana, resumen, grilla, barra, corrida, inicio)
+                    if leido is None:
+                        return
+                    filas, primera, cortado = leido
+                    if primera_fila is None and primera is not None:
+                        primera_fila = primera
+                    total_filas += filas
+                    anteriores.append((pestana, resumen, filas, cortado))
+                    continue
 
-                status_bar.value = f"Consulta exitosa - {len(filas)} registros"
-                status_bar.color = ft.colors.GREEN
+                # Fin de la sentencia: resumen de sus pestañas (o una de resumen si no devolvió filas)
+                historial_consultas.registrar(
+                    evento["texto"], evento["duracion"], evento["filas_afectadas"],
+                    evento["error"], parametros=evento["parametros"], origen=origen, mensajes=evento["mensajes"]
+                )
+                duracion = f"{evento['duracion'] * 1000:.0f} ms"
+                if evento["primera_fila"] is not None:
+                    duracion += f", primera fila en {evento['primera_fila'] * 1000:.0f} ms"
+                if evento["error"]:
+                    pestanas.append(pestana_error(f"{numero}: Error", evento["error"]))
+                    raise evento["error"]
+                conjuntos = mostrados.pop(numero, [])
+                for pestana, resumen, filas, cortado in conjuntos:
+                    limite = " (se muestran las primeras)" if cortado else ""
+                    resumen.value = f"{filas} filas{limite} - {duracion}"
+                if not conjuntos:
+                    tabla = nueva_tabla(
+                        [ft.DataColumn(ft.Text("Información"))],
+                        [ft.DataRow(cells=[ft.DataCell(ft.Text("Consulta ejecutada exitosamente", color=ft.colors.GREEN))])]
+                    )
+                    pestanas.append(pestana_resultado(
+                        f"{numero}", tabla,
+                        f"{evento['filas_afectadas']} filas afectadas - {duracion}"
+                    ))
+                    tabs_resultados.tabs = list(pestanas)
+                    page.update()
 
-        except pyodbc.Error as e:
-            status_bar.value = f"Error SQL: {str(e)}"
-            status_bar.color = ft.colors.RED
-            tbl_resultados.columns = [ft.DataColumn(ft.Text("Error SQL"))]
-            tbl_resultados.rows = [ft.DataRow(cells=[ft.DataCell(ft.Text(str(e), color=ft.colors.RED))])]
+            if pestana_servidor:
+                pestanas.append(pestana_servidor)
+                tabs_resultados.tabs = list(pestanas)
+            segundos = time.perf_counter() - inicio
+            primera = f"Primera fila en {primera_fila * 1000:.0f} ms - " if primera_fila is not None else ""
+            status_bar.value = (f"{primera}{total_filas} filas - {total_sentencias} sentencias"
+                                f" en {segundos:.2f} s")
+            status_bar.color = ft.colors.GREEN
+
+        except ConexionSQL.errores_driver() as e:
+            # Una ejecución reemplazada termina por la cancelación: no informa nada
+            if vigente():
+                status_bar.value = f"Error SQL: {str(e)}"
+                status_bar.color = ft.colors.RED
+                if not pestanas:
+                    pestanas.append(pestana_error("Error SQL", e))
 
         except Exception as e:
-            status_bar.value = f"Error: {str(e)}"
-            status_bar.color = ft.colors.ORANGE
-            tbl_resultados.columns = [ft.DataColumn(ft.Text("Error"))]
-            tbl_resultados.rows = [ft.DataRow(cells=[ft.DataCell(ft.Text(str(e), color=ft.colors.ORANGE))])]
+            if vigente():
+                status_bar.value = resiliencia.describir(e)
+                status_bar.color = ft.colors.ORANGE
+                if not pestanas:
+                    pestanas.append(pestana_error("Error", e, ft.colors.ORANGE))
 
         finally:
+            # La conexión del motor federado se conserva entre ejecuciones
+            if conexion is not None and not federada_activa:
+                conexion.close()
+            if vigente():
+                if pestanas:
+                    tabs_resultados.tabs = pestanas
+                    # Ante un error se muestra la última pestaña (la del error)
+                    tabs_resultados.selected_index = 0 if status_bar.color == ft.colors.GREEN else len(pestanas) - 1
+                page.update()
+            # El historial se escribe en segundo plano; se refresca cuando termina
+            threading.Thread(
+                target=lambda: (historial_consultas.vaciar(), actualizar_historial(), actualizar_recientes()),
+                daemon=True
+            ).start()
+
+    # Panel de historial: búsqueda, re-ejecución y agregados por consulta normalizada
+    txt_buscar_historial = ft.TextField(
+        hint_text="Buscar en el historial...",
+        width=400,
+        text_size=13,
+        on_submit=lambda e: actualizar_historial()
+    )
+    chk_agrupar = ft.Checkbox(label="Agrupar por consulta", value=False, on_change=lambda e: actualizar_historial())
+    chk_lentas = ft.Checkbox(label="Solo lentas", value=False, on_change=lambda e: actualizar_historial())
+    lista_historial = ft.ListView(height=250, spacing=2)
+
+    def reejecutar(sql, valores=None):
+        txt_query.value = sql
+        detectar_parametros()
+        poner_valores(json.loads(valores) if valores else None)
+        ejecutar_consulta(None)
+
+    def mostrar_plan(id_consulta):
+        entrada = historial_consultas.detalle(id_consulta)
+        texto = "\n\n".join(filter(None, [entrada.get("plan"), entrada.get("mensajes")])) or "Sin plan capturado"
+        page.dialog = ft.AlertDialog(
+            title=ft.Text(f"Plan de ejecución ({entrada['duracion_ms']:.0f} ms)"),
+            content=ft.Container(
+                ft.ListView([ft.Text(texto, selectable=True, size=11, font_family="Consolas")]),
+                width=900, height=500
+            )
+        )
+        page.dialog.open = True
+        page.update()
+
+    def actualizar_historial():
+        texto = txt_buscar_historial.value or ""
+        controles = []
+        if chk_agrupar.value:
+            for agregado in historial_consultas.agregados(texto):
+                # Una ejecución reciente mucho más lenta que el promedio indica una regresión
+                regresion = agregado["ultima_ms"] > 2 * agregado["promedio_ms"] and agregado["ejecuciones"] > 1
+                controles.append(ft.Row([
+                    ft.Text(f"{agregado['ejecuciones']}x", width=50, size=12),
+                    ft.Text(f"prom {agregado['promedio_ms']:.0f} ms", width=110, size=12),
+                    ft.Text(f"máx {agregado['maximo_ms']:.0f} ms", width=110, size=12),
+                    ft.Text(f"última {agregado['ultima_ms']:.0f} ms", width=120, size=12,
+                            color=ft.colors.RED if regresion else None),
+                    ft.Text(agregado["huella"], size=12, expand=True, max_lines=1,
+                            overflow=ft.TextOverflow.ELLIPSIS),
+                ]))
+        else:
+            for entrada in historial_consultas.buscar(texto, solo_lentas=chk_lentas.value):
+                controles.append(ft.Row([
+                    ft.IconButton(ft.icons.REPLAY, tooltip="Ejecutar de nuevo",
+                                  on_click=lambda e, sql=entrada["sql"], valores=entrada["parametros"]:
+                                  reejecutar(sql, valores)),
+                    ft.IconButton(ft.icons.INSIGHTS, tooltip="Ver plan", visible=bool(entrada["lenta"]),
+                                  on_click=lambda e, id_consulta=entrada["id"]: mostrar_plan(id_consulta)),
+                    ft.Text(entrada["fecha"][11:19], width=70, size=12),
+                    ft.Text(f"{entrada['duracion_ms']:.0f} ms", width=80, size=12,
+                            color=ft.colors.ORANGE if entrada["lenta"] else None),
+                    ft.Text(f"{entrada['filas']} filas", width=90, size=12),
+                    ft.Text(entrada["error"] or entrada["sql"], size=12, expand=True, max_lines=1,
+                            overflow=ft.TextOverflow.ELLIPSIS,
+                            color=ft.colors.RED if entrada["error"] else None),
+                ]))
+        lista_historial.controls = controles
+        page.update()
+
+    # Consultas guardadas y vistas materializadas en la base local
+    txt_nombre_vista = ft.TextField(label="Nombre", width=200, text_size=13)
+    txt_valores_vista = ft.TextField(label="Parámetros (nombre=valor; ...)", width=300, text_size=13)
+    chk_materializar = ft.Checkbox(label="Copia local", value=False)
+    txt_intervalo_vista = ft.TextField(label="Cada (min)", width=90, text_size=13, value="60")
+    txt_marca_vista = ft.TextField(label="Columna marca", width=140, text_size=13,
+                                   tooltip="Fecha de modificación o id creciente (refresco incremental)")
+    txt_clave_vista = ft.TextField(label="Columna clave", width=140, text_size=13,
+                                   tooltip="Las filas modificadas reemplazan a su copia local")
+    lista_vistas = ft.ListView(height=200, spacing=2)
+
+    def guardar_vista(e):
+        try:
+            nombre = (txt_nombre_vista.value or "").strip()
+            if not nombre or not (txt_query.value or "").strip():
+                raise ValueError("Indique un nombre y escriba la consulta")
+            vistas.guardar(
+                nombre, txt_query.value, parametros.leer_valores(txt_valores_vista.value),
+                chk_materializar.value, int(txt_intervalo_vista.value or 0),
+                txt_marca_vista.value, txt_clave_vista.value
+            )
+            status_bar.value = f"Consulta '{nombre}' guardada"
+            status_bar.color = ft.colors.GREEN
+            if chk_materializar.value:
+                actualizar_vista(nombre)
+        except Exception as ex:
+            status_bar.value = f"Error: {str(ex)}"
+            status_bar.color = ft.colors.RED
+        actualizar_lista_vistas()
+
+    def editar_vista(consulta):
+        txt_query.value = consulta["sql"]
+        detectar_parametros()
+        txt_nombre_vista.value = consulta["nombre"]
+        txt_valores_vista.value = parametros.escribir_valores(consulta["parametros"])
+        chk_materializar.value = bool(consulta["materializar"])
+        txt_intervalo_vista.value = str(consulta["intervalo_min"])
+        txt_marca_vista.value = consulta["columna_marca"] or ""
+        txt_clave_vista.value = consulta["columna_clave"] or ""
+        page.update()
+
+    def abrir_vista(nombre):
+        """Muestra la copia local (sin consultar el servidor) en lugar de la ejecución en curso."""
+        lanzar(lambda corrida: mostrar_vista(nombre))
+
+    def mostrar_vista(nombre):
+        try:
+            nombres, filas, consulta = vistas.leer(nombre, MAX_FILAS_PESTANA)
+        except Exception as ex:
+            status_bar.value = f"Error: {str(ex)}"
+            status_bar.color = ft.colors.RED
             page.update()
+            return
+        pestana, resumen, grilla, _ = pestana_reciclada(0)
+        grilla.mostrar(nombres, filas)
+        pestana.text = nombre
+        limite = f" (se muestran {len(filas)})" if consulta["filas"] > len(filas) else ""
+        resumen.value = (f"Copia local actualizada {vistas_locales.antiguedad(consulta['actualizada'])}"
+                         f" ({consulta['actualizada']}) - {consulta['filas']} filas{limite}")
+        tabs_resultados.tabs = [pestana]
+        tabs_resultados.selected_index = 0
+        status_bar.value = f"Vista '{nombre}' leída de la copia local"
+        status_bar.color = ft.colors.GREEN
+        page.update()
+
+    def actualizar_vista(nombre, completa=False):
+        """Refresca la copia local en segundo plano."""
+        def tarea():
+            try:
+                resultado = vistas.refrescar(nombre, completa)
+                tipo = "incremental" if resultado["incremental"] else "completa"
+                status_bar.value = (f"Vista '{nombre}' actualizada ({tipo}): {resultado['nuevas']} filas nuevas,"
+                                    f" {resultado['total']} en total, {resultado['duracion_ms']:.0f} ms")
+                status_bar.color = ft.colors.GREEN
+            except Exception as ex:
+                status_bar.value = f"Error al actualizar '{nombre}': {str(ex)}"
+                status_bar.color = ft.colors.RED
+            actualizar_lista_vistas()
+
+        status_bar.value = f"Actualizando '{nombre}'..."
+        status_bar.color = ft.colors.BLUE_800
+        page.update()
+        threading.Thread(target=tarea, daemon=True).start()
+
+    def eliminar_vista(nombre):
+        vistas.eliminar(nombre)
+        actualizar_lista_vistas()
+
+    def actualizar_lista_vistas():
+        controles = []
+        for consulta in vistas.listar():
+            del_origen = vistas.es_del_origen(consulta)
+            if consulta["materializar"]:
+                estado = f"copia local {vistas_locales.antiguedad(consulta['actualizada'])}"
+                if consulta["actualizada"]:
+                    estado += f", {consulta['filas']} filas"
+                if consulta["intervalo_min"]:
+                    estado += f", cada {consulta['intervalo_min']} min"
+            else:
+                estado = "sin copia local"
+            if not del_origen:
+                # Guardada con otro perfil: no se actualiza desde este
+                estado = f"de {consulta['origen']}; {estado}"
+            controles.append(ft.Row([
+                ft.IconButton(ft.icons.TABLE_VIEW, tooltip="Abrir copia local",
+                              visible=bool(consulta["actualizada"]),
+                              on_click=lambda e, n=consulta["nombre"]: abrir_vista(n)),
+                ft.IconButton(ft.icons.SYNC, tooltip="Actualizar ahora",
+                              visible=bool(consulta["materializar"]) and del_origen,
+                              on_click=lambda e, n=consulta["nombre"]: actualizar_vista(n)),
+                ft.IconButton(ft.icons.EDIT, tooltip="Cargar en el editor",
+                              on_click=lambda e, c=consulta: editar_vista(c)),
+                ft.IconButton(ft.icons.DELETE, tooltip="Eliminar",
+                              on_click=lambda e, n=consulta["nombre"]: eliminar_vista(n)),
+                ft.Text(consulta["nombre"], width=200, size=12, weight="bold"),
+                ft.Text(estado, width=330, size=12,
+                        color=ft.colors.RED if consulta["error"] else None if del_origen else ft.colors.GREY,
+                        tooltip=consulta["error"]),
+                ft.Text(consulta["sql"], size=12, expand=True, max_lines=1, overflow=ft.TextOverflow.ELLIPSIS),
+            ]))
+        lista_vistas.controls = controles
+        page.update()
 
     page.add(
         ft.Column(
@@ -108,6 +747,12 @@ def main(page: ft.Page):
                             ft.Text("Sistema de Gestión SIGES", size=24, weight="bold", color=ft.colors.BLUE_800),
                             ft.Divider(height=10),
                             txt_query,
+                            fila_parametros,
+                            ft.Row([dropdown_recientes, chk_varios]),
+                            txt_conjuntos,
+                            chk_transaccion,
+                            chk_federada,
+                            txt_archivos,
                             ft.Row([
                                 ft.ElevatedButton(
                                     "Ejecutar Consulta",
@@ -135,7 +780,8 @@ def main(page: ft.Page):
                             ft.Text("Resultados:", size=16, weight="bold", color=ft.colors.BLUE_800),
                             ft.Divider(height=10),
                             ft.Container(
-                                content=ft.ListView([tbl_resultados], height=500, auto_scroll=True),
+                                content=tabs_resultados,
+                                height=500,
                                 padding=10,
                                 border=ft.border.all(1, ft.colors.GREY_300),
                                 border_radius=8
@@ -146,6 +792,36 @@ def main(page: ft.Page):
                     elevation=3
                 ),
                 
+                ft.Card(
+                    content=ft.Container(
+                        content=ft.Column([
+                            ft.Text("Historial de consultas:", size=16, weight="bold", color=ft.colors.BLUE_800),
+                            ft.Row([txt_buscar_historial, chk_agrupar, chk_lentas]),
+                            ft.Divider(height=10),
+                            lista_historial
+                        ]),
+                        padding=15
+                    ),
+                    elevation=3
+                ),
+
+                ft.Card(
+                    content=ft.Container(
+                        content=ft.Column([
+                            ft.Text("Consultas guardadas:", size=16, weight="bold", color=ft.colors.BLUE_800),
+                            ft.Row([
+                                txt_nombre_vista, txt_valores_vista, chk_materializar, txt_intervalo_vista,
+                                txt_marca_vista, txt_clave_vista,
+                                ft.ElevatedButton("Guardar consulta", icon=ft.icons.SAVE, on_click=guardar_vista),
+                            ], wrap=True),
+                            ft.Divider(height=10),
+                            lista_vistas
+                        ]),
+                        padding=15
+                    ),
+                    elevation=3
+                ),
+
                 ft.Container(
                     content=status_bar,
                     padding=15,
@@ -160,11 +836,17 @@ def main(page: ft.Page):
     )
 
     def on_window_event(e):
-        if e.data == "close" and current_connection:
-            current_connection.close()
+        if e.data == "close" and ejecucion["actual"]:
+            cancelar(ejecucion["actual"])
+        if e.data == "close" and motor_federado:
+            motor_federado.cerrar()
 
     page.on_window_event = on_window_event
     page.update()
+    actualizar_historial()
+    actualizar_lista_vistas()
+    # Las copias locales vencidas se refrescan en segundo plano
+    vistas.iniciar_programador(al_actualizar=actualizar_lista_vistas)
 
 if __name__ == "__main__":
     ft.app(target=main)
@@ -0,0 +1,158 @@
+"""Parámetros con nombre en las consultas (:nombre o @nombre).
+
+El driver solo acepta marcadores posicionales (?), así que los nombres se
+reemplazan por ? y los valores se ordenan según aparecen. Se ignoran los
+textos entre comillas, los identificadores entre corchetes y los comentarios.
+Con @nombre no son parámetros las variables del propio script (DECLARE y
+parámetros de CREATE PROCEDURE/FUNCTION), los nombres de argumento de EXEC
+(@arg = valor) ni las variables del sistema (@@ROWCOUNT).
+
+Enviar la consulta con parámetros (en lugar de escribir los valores en el
+texto) permite que SQL Server reutilice el mismo plan para todos los valores.
+"""
+import decimal
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+_TOKENS = re.compile(
+    r"(?P<cadena>N?'(?:[^']|'')*')"
+    r"|(?P<corchete>\[[^\]]*\])"
+    r"|(?P<comillas>\"[^\"]*\")"
+    r"|(?P<linea>--[^\n]*)"
+    r"|(?P<bloque>/\*.*?\*/)"
+    r"|(?<![:\w]):(?P<nombre>[A-Za-z_]\w*)"
+    r"|(?<![@\w$#])@(?P<variable>[A-Za-z_]\w*)",
+    re.DOTALL,
+)
+# Cláusula DECLARE: hasta el punto y coma o el fin de línea (sigue si la línea
+# termina en coma o la siguiente empieza con coma)
+_DECLARE = re.compile(r"\bDECLARE\b((?:,[ \t]*\r?\n|\r?\n(?=\s*,)|[^;\n])*)", re.IGNORECASE)
+_DECLARADA = re.compile(r"(?:^|,)\s*@(\w+)")
+# Encabezado de procedimiento o función: sus parámetros son variables del cuerpo
+_ENCABEZADO = re.compile(r"\b(?:CREATE|ALTER)\s+(?:OR\s+ALTER\s+)?(?:PROC|PROCEDURE|FUNCTION)\b(.*?)\bAS\b",
+                         re.IGNORECASE | re.DOTALL)
+_EXEC = re.compile(r"\bEXEC(?:UTE)?\b((?:,[ \t]*\r?\n|[^;\n])*)", re.IGNORECASE)
+_ARGUMENTO = re.compile(r"@\w+(?=\s*=(?!=))")
+# Números que se envían como número: enteros y decimales simples, sin ceros a
+# la izquierda (un código "007" sigue siendo texto), sin "_", exponentes ni nan/inf
+_ENTERO = re.compile(r"-?(?:0|[1-9][0-9]*)")
+_DECIMAL = re.compile(r"-?(?:0|[1-9][0-9]*)\.[0-9]+")
+
+
+def sin_literales(sql: str) -> str:
+    """El texto con cadenas, identificadores y comentarios en blanco (mismas posiciones)."""
+    def blanco(coincidencia):
+        if coincidencia.group("nombre") or coincidencia.group("variable"):
+            return coincidencia.group(0)
+        return re.sub(r"[^\n]", " ", coincidencia.group(0))
+    return _TOKENS.sub(blanco, sql)
+
+
+def _excluidas(sql: str) -> Tuple[Set[str], Set[int]]:
+    """Variables del script (por nombre, en minúsculas) y posiciones de argumentos de EXEC."""
+    limpio = sin_literales(sql)
+    variables = set()
+    for clausula in _DECLARE.finditer(limpio):
+        variables.update(n.lower() for n in _DECLARADA.findall(clausula.group(1)))
+    for encabezado in _ENCABEZADO.finditer(limpio):
+        variables.update(n.lower() for n in re.findall(r"@(\w+)", encabezado.group(1)))
+    argumentos = {
+        llamada.start(1) + argumento.start()
+        for llamada in _EXEC.finditer(limpio) for argumento in _ARGUMENTO.finditer(llamada.group(1))
+    }
+    return variables, argumentos
+
+
+def _parametros(sql: str, contexto: Optional[str] = None):
+    """(coincidencia, nombre o None) por token; `contexto`: script completo al que pertenece `sql`."""
+    variables, _ = _excluidas(contexto if contexto is not None else sql)
+    _, argumentos = _excluidas(sql)
+    for coincidencia in _TOKENS.finditer(sql):
+        nombre = coincidencia.group("nombre")
+        variable = coincidencia.group("variable")
+        if variable and variable.lower() not in variables and coincidencia.start() not in argumentos:
+            nombre = variable
+        yield coincidencia, nombre
+
+
+def nombres(sql: str, contexto: Optional[str] = None) -> List[str]:
+    """Nombres de los parámetros de la consulta, sin repetir y en orden de aparición."""
+    vistos: List[str] = []
+    for _, nombre in _parametros(sql, contexto):
+        if nombre and nombre not in vistos:
+            vistos.append(nombre)
+    return vistos
+
+
+def enlazar(sql: str, valores: Dict, contexto: Optional[str] = None) -> Tuple[str, tuple]:
+    """Reemplaza :nombre y @nombre por ? y devuelve (sql, valores en orden). ValueError si falta alguno.
+
+    `contexto` es el script completo cuando `sql` es una de sus sentencias
+    (las variables declaradas en otra sentencia no son parámetros).
+    """
+    partes, ordenados, anterior = [], [], 0
+    for coincidencia, nombre in _parametros(sql, contexto):
+        if not nombre:
+            continue
+        if nombre not in valores:
+            raise ValueError(f"Falta el valor del parámetro {coincidencia.group(0)}")
+        partes.append(sql[anterior:coincidencia.start()] + "?")
+        ordenados.append(valores[nombre])
+        anterior = coincidencia.end()
+    partes.append(sql[anterior:])
+    return "".join(partes), tuple(ordenados)
+
+
+def valor(texto: str):
+    """Valor de un campo de parámetro: vacío = NULL, entero o decimal simple como número, si no el texto.
+
+    Los decimales se envían como Decimal (sin el redondeo de float).
+    """
+    texto = (texto or "").strip()
+    if texto == "":
+        return None
+    if _ENTERO.fullmatch(texto):
+        return int(texto)
+    if _DECIMAL.fullmatch(texto):
+        return decimal.Decimal(texto)
+    return texto
+
+
+def leer_valores(texto: str) -> Dict:
+    """"fecha=2024-01-01; id=5" -> {"fecha": "2024-01-01", "id": 5} (números como en valor())."""
+    valores = {}
+    for parte in (texto or "").replace("\n", ";").split(";"):
+        if not parte.strip():
+            continue
+        nombre, separador, texto_valor = parte.partition("=")
+        if not separador:
+            raise ValueError(f"Se esperaba nombre=valor: {parte.strip()}")
+        texto_valor = texto_valor.strip()
+        valores[nombre.strip().lstrip(":@")] = valor(texto_valor) if texto_valor else ""
+    return valores
+
+
+def leer_conjuntos(texto: str, nombres_parametros: List[str], base: Optional[Dict] = None) -> List[Dict]:
+    """Conjuntos de valores para ejecutar una sentencia varias veces, uno por línea.
+
+    Cada línea es "nombre=valor; ..." o, si la consulta tiene un solo parámetro,
+    directamente el valor. Los parámetros que una línea no indica toman el valor de `base`.
+    """
+    conjuntos = []
+    for numero, linea in enumerate((texto or "").splitlines(), start=1):
+        if not linea.strip():
+            continue
+        valores = dict(base or {})
+        if len(nombres_parametros) == 1 and "=" not in linea:
+            valores[nombres_parametros[0]] = valor(linea)
+        else:
+            valores.update(leer_valores(linea))
+        faltan = [nombre for nombre in nombres_parametros if nombre not in valores]
+        if faltan:
+            raise ValueError(f"Línea {numero}: falta {', '.join(faltan)}")
+        conjuntos.append(valores)
+    return conjuntos
+
+
+def escribir_valores(valores: Dict) -> str:
+    return "; ".join(f"{nombre}={'' if valor is None else valor}" for nombre, valor in valores.items())
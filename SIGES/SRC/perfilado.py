@@ -0,0 +1,216 @@
+"""Perfil rápido de una tabla calculado en el servidor.
+
+Por columna: nulos, valores distintos, mínimo, máximo y los valores más
+frecuentes. Las agregaciones se envían al servidor en consultas por grupo de
+columnas que corren en paralelo (cada una con su conexión del pool), y en las
+tablas grandes se calculan sobre una muestra (TABLESAMPLE en SQL Server, rowid
+espaciados en SQLite, que se buscan uno a uno) en lugar de recorrer toda la tabla. Los valores más
+frecuentes no se buscan en las columnas sin repetidos (p. ej. la clave).
+
+Los perfiles se guardan en disco junto a la caché del esquema, con la firma de
+las columnas: si la tabla cambió de estructura, el perfil guardado se descarta.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import configuracion
+import datos as capa_datos
+import dialecto
+import esquema
+import lob
+
+# Columnas por consulta de agregación
+TAM_GRUPO = 8
+HILOS = 4
+SEMILLA = 2718
+# En SQL Server, MIN/MAX no admiten bit ni uniqueidentifier
+_SIN_MIN_MAX = {"bit", "uniqueidentifier"}
+
+
+def _comparable(col: Dict) -> bool:
+    return not lob.es_lob(col) and col["tipo"].lower() not in capa_datos.TIPOS_NO_COMPARABLES
+
+
+def _texto(valor):
+    """Valor guardable en JSON (fechas, decimales y binarios como texto)."""
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    if isinstance(valor, (bytes, bytearray)):
+        return "0x" + bytes(valor[:32]).hex().upper()
+    return str(valor)
+
+
+def origen(tabla: str, filas_estimadas: Optional[int], dial: str) -> Tuple[str, Optional[float]]:
+    """FROM de las consultas: la tabla o una muestra; devuelve (origen, porcentaje muestreado)."""
+    muestra = configuracion.ajuste("filas_muestra_perfil")
+    if not filas_estimadas or filas_estimadas <= muestra:
+        return tabla, None
+    porcentaje = max(0.01, round(100.0 * muestra / filas_estimadas, 2))
+    # La misma muestra en todas las consultas del perfil (REPEATABLE / rowid)
+    if dial == dialecto.SQLITE:
+        # Un rowid cada `cada` entre el mínimo y el máximo: solo se leen las filas muestreadas
+        cada = max(1, round(100 / porcentaje))
+        return (f"(WITH RECURSIVE salto(r) AS (SELECT min(rowid) FROM {tabla} UNION ALL "
+                f"SELECT r + {cada} FROM salto WHERE r + {cada} <= (SELECT max(rowid) FROM {tabla})) "
+                f"SELECT * FROM {tabla} WHERE rowid IN (SELECT r FROM salto)) AS muestra"), 100.0 / cada
+    return f"{tabla} TABLESAMPLE SYSTEM ({porcentaje} PERCENT) REPEATABLE ({SEMILLA})", porcentaje
+
+
+def _agregados(conn, desde: str, columnas: List[Dict], dial: str, aproximado: bool) -> Dict[str, Dict]:
+    """Una consulta con COUNT/COUNT DISTINCT/MIN/MAX de un grupo de columnas."""
+    expresiones = ["COUNT(*)"]
+    for col in columnas:
+        nombre, tipo = col["nombre"], col["tipo"].lower()
+        expresiones.append(f"COUNT({nombre})")
+        if not _comparable(col):
+            continue
+        if aproximado:
+            expresiones.append(f"APPROX_COUNT_DISTINCT({nombre})")
+        else:
+            expresiones.append(f"COUNT(DISTINCT {nombre})")
+        if dial == dialecto.MSSQL and tipo in _SIN_MIN_MAX:
+            minimo = maximo = "NULL"
+            if tipo == "bit":
+                minimo, maximo = f"MIN(CAST({nombre} AS int))", f"MAX(CAST({nombre} AS int))"
+            expresiones += [minimo, maximo]
+        else:
+            expresiones += [f"MIN({nombre})", f"MAX({nombre})"]
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(expresiones)} FROM {desde}")
+    fila = list(cursor.fetchone())
+    cursor.close()
+
+    total = fila.pop(0)
+    resultado = {}
+    for col in columnas:
+        no_nulos = fila.pop(0)
+        datos = {"filas": total, "nulos": total - no_nulos}
+        if _comparable(col):
+            distintos, minimo, maximo = fila.pop(0), fila.pop(0), fila.pop(0)
+            datos.update(distintos=distintos, minimo=_texto(minimo), maximo=_texto(maximo))
+        resultado[col["nombre"]] = datos
+    return resultado
+
+
+def _frecuentes(conn, desde: str, col: Dict, dial: str, cantidad: int) -> List[List]:
+    """Los `cantidad` valores más frecuentes de la columna: [[valor, veces]]."""
+    nombre = col["nombre"]
+    cursor = conn.cursor()
+    cursor.execute(dialecto.select_top(
+        desde, cantidad, dial, columnas=f"{nombre}, COUNT(*) AS veces",
+        resto=f"GROUP BY {nombre} ORDER BY COUNT(*) DESC"
+    ))
+    filas = [[_texto(valor), veces] for valor, veces in cursor.fetchall()]
+    cursor.close()
+    return filas
+
+
+def _con_repetidos(datos: Dict) -> bool:
+    return datos["distintos"] < datos["filas"] - datos["nulos"]
+
+
+def _firma(columnas_esquema: List[Dict]) -> List[List[str]]:
+    return [[col["nombre"], col["tipo"]] for col in columnas_esquema]
+
+
+class CachePerfiles:
+    """Perfiles por tabla en memoria y en disco (uno por origen de datos)."""
+
+    def __init__(self, conectar: Callable, clave: str):
+        self.conectar = conectar
+        self.ruta = os.path.join(
+            esquema.directorio_cache(),
+            "perfiles_" + "".join(c if c.isalnum() else "_" for c in clave) + ".json"
+        )
+        self._bloqueo = threading.Lock()
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                self.datos: Dict[str, Dict] = json.load(f)
+        except (OSError, ValueError):
+            self.datos = {}
+
+    def obtener(self, tabla: str, columnas_esquema: List[Dict]) -> Optional[Dict]:
+        """Perfil guardado, si la tabla conserva la misma estructura."""
+        with self._bloqueo:
+            perfil = self.datos.get(tabla)
+        if perfil and perfil.get("firma") == _firma(columnas_esquema):
+            return perfil
+        return None
+
+    def calcular(self, tabla: str, columnas_esquema: List[Dict], filas_estimadas: Optional[int]) -> Dict:
+        """Calcula el perfil en el servidor (en paralelo por grupo de columnas) y lo guarda."""
+        inicio = time.perf_counter()
+        conn = self.conectar()
+        try:
+            dial = dialecto.dialecto(conn)
+            aproximado = False
+            if dial == dialecto.MSSQL:
+                # APPROX_COUNT_DISTINCT existe desde SQL Server 2019
+                cursor = conn.cursor()
+                cursor.execute("SELECT CAST(SERVERPROPERTY('ProductMajorVersion') AS int)")
+                aproximado = (cursor.fetchone()[0] or 0) >= 15
+                cursor.close()
+        finally:
+            conn.close()
+        desde, porcentaje = origen(tabla, filas_estimadas, dial)
+        cantidad = configuracion.ajuste("valores_frecuentes_perfil")
+
+        def con_conexion(funcion, *args):
+            conn = self.conectar()
+            try:
+                return funcion(conn, desde, *args)
+            finally:
+                conn.close()
+
+        grupos = [columnas_esquema[i:i + TAM_GRUPO] for i in range(0, len(columnas_esquema), TAM_GRUPO)]
+        with ThreadPoolExecutor(max_workers=HILOS) as ejecutor:
+            agregados = [ejecutor.submit(con_conexion, _agregados, grupo, dial, aproximado) for grupo in grupos]
+            por_columna: Dict[str, Dict] = {}
+            for futuro in agregados:
+                por_columna.update(futuro.result())
+            frecuentes = {
+                col["nombre"]: ejecutor.submit(con_conexion, _frecuentes, col, dial, cantidad)
+                for col in columnas_esquema
+                if _comparable(col) and _con_repetidos(por_columna[col["nombre"]])
+            }
+            for nombre, futuro in frecuentes.items():
+                por_columna[nombre]["frecuentes"] = futuro.result()
+
+        columnas = [{"nombre": col["nombre"], "tipo": col["tipo"], **por_columna[col["nombre"]]}
+                    for col in columnas_esquema]
+        perfil = {
+            "firma": _firma(columnas_esquema),
+            "calculado": datetime.now().isoformat(timespec="seconds"),
+            "duracion_ms": (time.perf_counter() - inicio) * 1000,
+            "muestra": porcentaje,
+            "filas": columnas[0]["filas"] if columnas else 0,
+            "filas_estimadas": filas_estimadas,
+            "columnas": columnas,
+        }
+        self._guardar(tabla, perfil)
+        return perfil
+
+    def _guardar(self, tabla: str, perfil: Dict):
+        with self._bloqueo:
+            self.datos[tabla] = perfil
+            temporal = f"{self.ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(self.datos, f)
+            os.replace(temporal, self.ruta)
+
+
+_compartidas: Dict[str, CachePerfiles] = {}
+_bloqueo = threading.Lock()
+
+
+def compartida(conectar: Callable, clave: str) -> CachePerfiles:
+    """Caché de perfiles única por origen de datos (la comparten todas las sesiones)."""
+    with _bloqueo:
+        if clave not in _compartidas:
+            _compartidas[clave] = CachePerfiles(conectar, clave)
+        return _compartidas[clave]
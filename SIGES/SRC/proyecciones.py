@@ -0,0 +1,92 @@
+"""Columnas visibles por tabla (proyección) elegidas por el usuario.
+
+La grilla, la exportación a CSV y la comparación de tablas piden al servidor
+solo las columnas visibles, en el orden elegido, en lugar de SELECT *: en las
+tablas anchas (o con varios LOB) lo que viaja por la red depende de las
+columnas que se miran. También se recuerda el ancho de cada columna.
+
+La elección se guarda en el directorio local de SIGES del usuario, una por
+origen de datos (y, en modo servidor, por identidad de la sesión: cada usuario
+web tiene la suya). Las columnas de la clave primaria (esquema.clave_primaria) se
+muestran siempre y en primer lugar: el detalle y la lectura de valores grandes
+identifican la fila por su clave. Las columnas nuevas de la tabla
+aparecen al final como visibles; las que ya no existen se ignoran.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import esquema
+
+
+class Proyecciones:
+    """Columnas visibles, orden y anchos por tabla, en memoria y en disco."""
+
+    def __init__(self, clave: str, sesion: Optional[str] = None):
+        nombre = clave if sesion is None else f"{clave}_{sesion}"
+        self.ruta = os.path.join(
+            esquema.directorio_cache(),
+            "columnas_" + "".join(c if c.isalnum() else "_" for c in nombre) + ".json"
+        )
+        self._bloqueo = threading.Lock()
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                self.datos: Dict[str, Dict] = json.load(f)
+        except (OSError, ValueError):
+            self.datos = {}
+
+    def elegida(self, tabla: str) -> Optional[Dict]:
+        """{"ocultas": [...], "orden": [...], "anchos": {...}} guardado, o None."""
+        with self._bloqueo:
+            return self.datos.get(tabla)
+
+    def columnas(self, tabla: str, columnas_esquema: List[Dict]) -> List[Dict]:
+        """Columnas del esquema a leer, en el orden elegido (todas si no hay elección)."""
+        if not columnas_esquema:
+            return columnas_esquema
+        eleccion = self.elegida(tabla) or {}
+        ocultas = set(eleccion.get("ocultas", []))
+        posicion = {nombre: i for i, nombre in enumerate(eleccion.get("orden", []))}
+        clave = esquema.clave_primaria(columnas_esquema)
+        visibles = [col for col in columnas_esquema if col["nombre"] in clave or col["nombre"] not in ocultas]
+        # La clave primero, en su orden; las que no figuran en el orden guardado (columnas nuevas) van al final
+        visibles.sort(key=lambda col: (col["nombre"] not in clave,
+                                       clave.index(col["nombre"]) if col["nombre"] in clave else 0,
+                                       posicion.get(col["nombre"], len(posicion))))
+        return visibles
+
+    def anchos(self, tabla: str, nombres: List[str]) -> List[Optional[int]]:
+        """Ancho guardado de cada columna (None: automático)."""
+        anchos = (self.elegida(tabla) or {}).get("anchos", {})
+        return [anchos.get(nombre) for nombre in nombres]
+
+    def guardar(self, tabla: str, orden: List[str], ocultas: List[str], anchos: Dict[str, int]):
+        with self._bloqueo:
+            self.datos[tabla] = {"orden": list(orden), "ocultas": list(ocultas),
+                                 "anchos": {nombre: ancho for nombre, ancho in anchos.items() if ancho}}
+            self._escribir()
+
+    def restablecer(self, tabla: str):
+        """Vuelve a mostrar todas las columnas en el orden de la tabla."""
+        with self._bloqueo:
+            if self.datos.pop(tabla, None) is not None:
+                self._escribir()
+
+    def _escribir(self):
+        temporal = f"{self.ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self.datos, f)
+        os.replace(temporal, self.ruta)
+
+
+_compartidas: Dict[Tuple[str, Optional[str]], Proyecciones] = {}
+_bloqueo = threading.Lock()
+
+
+def compartidas(clave: str, sesion: Optional[str] = None) -> Proyecciones:
+    """Proyecciones del origen de datos y de la identidad de la sesión (una instancia por proceso)."""
+    with _bloqueo:
+        if (clave, sesion) not in _compartidas:
+            _compartidas[(clave, sesion)] = Proyecciones(clave, sesion)
+        return _compartidas[(clave, sesion)]
@@ -0,0 +1,366 @@
+"""Pruebas de carga de SIGES.
+
+Uso:
+    python prueba_carga.py sesiones [--sesiones 50] [--duracion 30] [--pool 10] [--pausa 0.2]
+    python prueba_carga.py crud [--mezcla leer=60,insertar=15,...] [--concurrencia 8]
+                                [--procesos] [--duracion 30] [--filas 10000] [--pool N]
+    python prueba_carga.py fallas [--conexion 0.2] [--consulta 0.05] [--caida 5]
+                                  [--sesiones 20] [--duracion 20] [--pool 5]
+
+"sesiones": cada sesión simula a un usuario del modo servidor: toma la
+estructura (compartida), abre tablas al azar y espera entre acciones.
+
+"crud": genera carga sin interfaz llamando directamente a la capa de datos
+(datos.py) con una mezcla configurable de lecturas, altas, modificaciones,
+bajas y exportaciones sobre una tabla sembrada, con hilos o procesos. Informa
+rendimiento, latencias p50/p95/p99, errores y eventos de bloqueo/contención.
+
+"fallas": sesiones de lectura contra el driver con inyección de fallas
+(driver_fallas.py): conexiones y consultas que fallan al azar y una caída del
+servidor a mitad de la prueba. Informa lecturas exitosas, fallas inyectadas,
+reconexiones del pool, aperturas del circuito y cuánto tardan en fallar los
+pedidos mientras el servidor está caído (deben fallar rápido, sin reintentos).
+
+Sin SIGES_SQLITE se usa una base SQLite sustituta temporal (ver benchmark.py).
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from typing import Dict, List
+
+import benchmark
+
+TABLA_CARGA = "carga_prueba"
+MEZCLA_PREDETERMINADA = "leer=60,insertar=15,modificar=15,eliminar=5,exportar=5"
+OPERACIONES = ("leer", "insertar", "modificar", "eliminar", "exportar")
+
+
+def percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def simular_sesion(sesion: int, fin: float, pausa: float, resultados: Dict, bloqueo: threading.Lock):
+    import dialecto
+    import esquema
+    from conexion_sql import ConexionSQL, PoolSaturado
+
+    aleatorio = random.Random(sesion)
+    clave = ConexionSQL.identificador()
+    latencias, rechazos, errores = [], 0, 0
+
+    estructura = esquema.estructura_reciente(clave, 60)
+    if not estructura:
+        conn = ConexionSQL.conectar(sesion=sesion)
+        try:
+            estructura = esquema.cargar_estructura(conn)
+        finally:
+            conn.close()
+        esquema.guardar_cache(clave, *estructura)
+    tablas = estructura[0]
+
+    while time.monotonic() < fin:
+        tabla = aleatorio.choice(tablas)
+        inicio = time.perf_counter()
+        try:
+            conn = ConexionSQL.conectar(sesion=sesion)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(dialecto.select_top(tabla, 50, dialecto.dialecto(conn)))
+                cursor.fetchall()
+            finally:
+                conn.close()
+            latencias.append(time.perf_counter() - inicio)
+        except PoolSaturado:
+            rechazos += 1
+        except Exception:
+            errores += 1
+        time.sleep(aleatorio.uniform(0, 2 * pausa))
+
+    with bloqueo:
+        resultados["latencias"].extend(latencias)
+        resultados["rechazos"] += rechazos
+        resultados["errores"] += errores
+
+
+def bench_sesiones(args):
+    from conexion_sql import ConexionSQL
+    pool = ConexionSQL.activar_pool(args.pool, args.espera)
+
+    resultados = {"latencias": [], "rechazos": 0, "errores": 0}
+    bloqueo = threading.Lock()
+    fin = time.monotonic() + args.duracion
+    hilos = [
+        threading.Thread(target=simular_sesion, args=(i, fin, args.pausa, resultados, bloqueo))
+        for i in range(args.sesiones)
+    ]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - inicio
+
+    latencias = resultados["latencias"]
+    estado = pool.estado()
+    print(f"sesiones: {args.sesiones}   pool: {args.pool}   duración: {transcurrido:.1f} s")
+    print(f"consultas: {len(latencias)}   ({len(latencias) / transcurrido:.1f}/s)")
+    print(f"latencia p50 {percentil(latencias, 50) * 1000:.1f} ms   "
+          f"p95 {percentil(latencias, 95) * 1000:.1f} ms   p99 {percentil(latencias, 99) * 1000:.1f} ms")
+    print(f"esperas por conexión: {estado['esperas_totales']}   rechazos (admisión): {resultados['rechazos']}"
+          f"   errores: {resultados['errores']}   conexiones abiertas: {estado['abiertas']}")
+    pool.cerrar()
+
+
+def leer_mezcla(texto: str) -> Dict[str, float]:
+    """"leer=60,insertar=15" -> pesos por operación."""
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        nombre = nombre.strip()
+        if nombre not in OPERACIONES:
+            raise ValueError(f"Operación desconocida en la mezcla: {nombre}")
+        mezcla[nombre] = float(peso or 1)
+    return mezcla
+
+
+def sembrar(filas: int):
+    """Crea (o recrea) la tabla de carga con `filas` registros."""
+    import dialecto
+    from conexion_sql import ConexionSQL
+
+    conn = ConexionSQL.conectar()
+    cursor = conn.cursor()
+    if dialecto.dialecto(conn) == dialecto.SQLITE:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLA_CARGA}")
+        cursor.execute(f"CREATE TABLE {TABLA_CARGA} (id INTEGER PRIMARY KEY, nombre VARCHAR(50),"
+                       " valor INTEGER, fecha VARCHAR(20))")
+    else:
+        cursor.execute(f"IF OBJECT_ID('{TABLA_CARGA}') IS NOT NULL DROP TABLE {TABLA_CARGA}")
+        cursor.execute(f"CREATE TABLE {TABLA_CARGA} (id INT IDENTITY PRIMARY KEY, nombre VARCHAR(50),"
+                       " valor INT, fecha VARCHAR(20))")
+    cursor.executemany(
+        f"INSERT INTO {TABLA_CARGA} (nombre, valor, fecha) VALUES (?, ?, ?)",
+        [(f"registro {i}", i, "2024-01-01") for i in range(filas)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def es_contencion(error: Exception) -> bool:
+    """Bloqueos, interbloqueos y esperas de bloqueo agotadas (SQLite y SQL Server)."""
+    texto = str(error).lower()
+    return any(marca in texto for marca in (
+        "locked", "busy", "deadlock", "lock request time out", "40001", "1205", "1222"
+    ))
+
+
+def ejecutar_operacion(nombre: str, conn, aleatorio: random.Random, max_id: int):
+    import datos
+    if nombre == "leer":
+        datos.leer_registros(conn, TABLA_CARGA, 50)
+    elif nombre == "insertar":
+        datos.insertar_registro(conn, TABLA_CARGA, {
+            "nombre": f"nuevo {aleatorio.random():.6f}", "valor": aleatorio.randint(0, 10 ** 6), "fecha": "2024-06-01"
+        })
+    elif nombre == "modificar":
+        datos.modificar_registro(conn, TABLA_CARGA, "id", aleatorio.randint(1, max_id),
+                                 {"valor": aleatorio.randint(0, 10 ** 6)})
+    elif nombre == "eliminar":
+        datos.eliminar_registro(conn, TABLA_CARGA, "id", aleatorio.randint(1, max_id))
+    elif nombre == "exportar":
+        datos.exportar_csv(conn, TABLA_CARGA, os.devnull)
+
+
+def trabajador_crud(indice: int, mezcla: Dict[str, float], duracion: float, max_id: int,
+                    pool: int = 0) -> Dict:
+    """Ejecuta operaciones al azar según la mezcla hasta cumplir la duración."""
+    import sys
+    sys.path.insert(0, benchmark.DIRECTORIO)
+    from conexion_sql import ConexionSQL
+    if pool and ConexionSQL.pool() is None:
+        ConexionSQL.activar_pool(pool)
+
+    aleatorio = random.Random(indice)
+    nombres, pesos = list(mezcla), list(mezcla.values())
+    resultado = {nombre: {"latencias": [], "errores": 0, "contencion": 0} for nombre in nombres}
+    fin = time.monotonic() + duracion
+    while time.monotonic() < fin:
+        nombre = aleatorio.choices(nombres, pesos)[0]
+        inicio = time.perf_counter()
+        conn = None
+        try:
+            conn = ConexionSQL.conectar(sesion=indice)
+            ejecutar_operacion(nombre, conn, aleatorio, max_id)
+            resultado[nombre]["latencias"].append(time.perf_counter() - inicio)
+        except Exception as e:
+            resultado[nombre]["errores"] += 1
+            if es_contencion(e):
+                resultado[nombre]["contencion"] += 1
+        finally:
+            if conn:
+                conn.close()
+    return resultado
+
+
+def _trabajador_proceso(parametros) -> Dict:
+    return trabajador_crud(*parametros)
+
+
+def bench_crud(args):
+    mezcla = leer_mezcla(args.mezcla)
+    sembrar(args.filas)
+
+    parametros = [(i, mezcla, args.duracion, args.filas, args.pool) for i in range(args.concurrencia)]
+    inicio = time.perf_counter()
+    if args.procesos:
+        import multiprocessing
+        with multiprocessing.Pool(args.concurrencia) as procesos:
+            resultados = procesos.map(_trabajador_proceso, parametros)
+    else:
+        resultados = [None] * args.concurrencia
+
+        def correr(i):
+            resultados[i] = trabajador_crud(*parametros[i])
+
+        hilos = [threading.Thread(target=correr, args=(i,)) for i in range(args.concurrencia)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+    transcurrido = time.perf_counter() - inicio
+
+    modo = "procesos" if args.procesos else "hilos"
+    print(f"concurrencia: {args.concurrencia} {modo}   duración: {transcurrido:.1f} s   mezcla: {args.mezcla}")
+    print(f"{'operación':<10} {'total':>8} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+          f" {'errores':>8} {'contención':>11}")
+    todas, errores, contencion = [], 0, 0
+    for nombre in mezcla:
+        latencias = [x for r in resultados for x in r[nombre]["latencias"]]
+        err = sum(r[nombre]["errores"] for r in resultados)
+        cont = sum(r[nombre]["contencion"] for r in resultados)
+        todas.extend(latencias)
+        errores += err
+        contencion += cont
+        print(f"{nombre:<10} {len(latencias):>8} {len(latencias) / transcurrido:>9.1f}"
+              f" {percentil(latencias, 50) * 1000:>9.2f} {percentil(latencias, 95) * 1000:>9.2f}"
+              f" {percentil(latencias, 99) * 1000:>9.2f} {err:>8} {cont:>11}")
+    total = len(todas) + errores
+    print(f"{'total':<10} {len(todas):>8} {len(todas) / transcurrido:>9.1f}"
+          f" {percentil(todas, 50) * 1000:>9.2f} {percentil(todas, 95) * 1000:>9.2f}"
+          f" {percentil(todas, 99) * 1000:>9.2f} {errores:>8} {contencion:>11}")
+    if total:
+        print(f"tasa de error: {errores / total:.2%}   eventos de contención: {contencion}")
+
+
+def bench_fallas(args):
+    import datos
+    import driver_fallas
+    import resiliencia
+    from conexion_sql import ConexionSQL
+
+    sembrar(1000)
+    os.environ["SIGES_FALLAS"] = f"conexion={args.conexion},consulta={args.consulta},semilla=1"
+    pool = ConexionSQL.activar_pool(args.pool)
+    pool.validar_tras = 1.0
+
+    resultados = {"exitos": [], "fallas": [], "rapidas": [], "errores": {}, "cortadas_despues": 0,
+                  "recuperacion": None}
+    bloqueo = threading.Lock()
+    inicio_caida = time.monotonic() + args.duracion / 3
+    fin_caida = inicio_caida + args.caida
+    fin = time.monotonic() + args.duracion
+
+    def sesion(indice: int):
+        aleatorio = random.Random(indice)
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            try:
+                ConexionSQL.leer(lambda conn: datos.leer_registros(conn, TABLA_CARGA, 20), sesion=indice)
+                clave = "exitos"
+            except Exception as e:
+                clave = "rapidas" if isinstance(e, resiliencia.CircuitoAbierto) else "fallas"
+                with bloqueo:
+                    resultados["errores"][type(e).__name__] = resultados["errores"].get(type(e).__name__, 0) + 1
+            ahora = time.monotonic()
+            with bloqueo:
+                resultados[clave].append(time.perf_counter() - inicio)
+                # Lo que cuesta la recuperación: lecturas cortadas con el servidor ya levantado
+                if ahora > fin_caida:
+                    if clave == "rapidas":
+                        resultados["cortadas_despues"] += 1
+                    elif clave == "exitos" and resultados["recuperacion"] is None:
+                        resultados["recuperacion"] = ahora - fin_caida
+            time.sleep(aleatorio.uniform(0, 0.1))
+
+    hilos = [threading.Thread(target=sesion, args=(i,)) for i in range(args.sesiones)]
+    for hilo in hilos:
+        hilo.start()
+    # Caída simulada del servidor a un tercio de la prueba
+    time.sleep(max(0.0, inicio_caida - time.monotonic()))
+    driver_fallas.caer()
+    time.sleep(max(0.0, fin_caida - time.monotonic()))
+    driver_fallas.levantar()
+    for hilo in hilos:
+        hilo.join()
+
+    exitos, fallas, rapidas = resultados["exitos"], resultados["fallas"], resultados["rapidas"]
+    total = len(exitos) + len(fallas) + len(rapidas)
+    estado = pool.estado()
+    print(f"sesiones: {args.sesiones}   pool: {args.pool}   fallas: conexión {args.conexion:.0%},"
+          f" consulta {args.consulta:.0%}, caída de {args.caida:.0f} s")
+    print(f"lecturas: {total}   exitosas: {len(exitos)} ({len(exitos) / max(1, total):.1%})"
+          f"   fallidas: {len(fallas)}   cortadas por el circuito: {len(rapidas)}")
+    print(f"latencia exitosas p50 {percentil(exitos, 50) * 1000:.1f} ms   p99 {percentil(exitos, 99) * 1000:.1f} ms"
+          f"   cortadas p99 {percentil(rapidas, 99) * 1000:.2f} ms")
+    recuperacion = resultados["recuperacion"]
+    print(f"recuperación: primera lectura exitosa "
+          f"{'-' if recuperacion is None else f'{recuperacion:.2f} s'} después de la caída"
+          f"   cortadas con el servidor levantado: {resultados['cortadas_despues']}")
+    print(f"fallas inyectadas: {driver_fallas.inyectadas}   reconexiones del pool: {estado['reconexiones']}"
+          f"   aperturas del circuito: {ConexionSQL.circuito().aperturas}")
+    print(f"errores por tipo: {resultados['errores']}")
+    pool.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pruebas de carga de SIGES")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("sesiones", help="sesiones concurrentes del modo servidor")
+    p.add_argument("--sesiones", type=int, default=50)
+    p.add_argument("--duracion", type=float, default=30, help="segundos")
+    p.add_argument("--pool", type=int, default=10)
+    p.add_argument("--espera", type=float, default=5.0)
+    p.add_argument("--pausa", type=float, default=0.2, help="pausa media entre acciones (s)")
+    p.set_defaults(funcion=bench_sesiones)
+
+    p = sub.add_parser("crud", help="carga de operaciones ABM sobre la capa de datos")
+    p.add_argument("--mezcla", default=MEZCLA_PREDETERMINADA)
+    p.add_argument("--concurrencia", type=int, default=8)
+    p.add_argument("--procesos", action="store_true", help="usar procesos en lugar de hilos")
+    p.add_argument("--duracion", type=float, default=30, help="segundos")
+    p.add_argument("--filas", type=int, default=10000, help="filas sembradas en la tabla de carga")
+    p.add_argument("--pool", type=int, default=0, help="tamaño del pool (0: conexión por operación)")
+    p.set_defaults(funcion=bench_crud)
+
+    p = sub.add_parser("fallas", help="lecturas con fallas inyectadas y caída del servidor")
+    p.add_argument("--conexion", type=float, default=0.2, help="probabilidad de falla al conectar")
+    p.add_argument("--consulta", type=float, default=0.05, help="probabilidad de falla por consulta")
+    p.add_argument("--caida", type=float, default=5, help="segundos de caída simulada")
+    p.add_argument("--sesiones", type=int, default=20)
+    p.add_argument("--duracion", type=float, default=20, help="segundos")
+    p.add_argument("--pool", type=int, default=5)
+    p.set_defaults(funcion=bench_fallas)
+
+    args = parser.parse_args()
+    benchmark.preparar_entorno()
+    args.funcion(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Datos de referencia (clave, etiqueta) para las columnas con clave foránea.
+
+Las tablas referenciadas chicas se leen completas una vez y se filtran en el
+cliente; en las grandes se guarda solo la primera página y la búsqueda se hace
+en el servidor de forma incremental (TOP n ... LIKE 'texto%'). Listas y
+resultados de búsqueda se guardan en una caché LRU compartida por todas las
+sesiones, que un hilo de fondo refresca cuando envejecen.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import dialecto
+
+CAPACIDAD = 128              # entradas en la caché (listas y búsquedas)
+LIMITE_COMPLETA = 1000       # hasta esta cantidad de filas la tabla se lee entera
+LIMITE_BUSQUEDA = 50         # opciones por búsqueda en tablas grandes
+MIN_CARACTERES_BUSQUEDA = 2  # menos caracteres: se muestra la primera página
+EDAD_MAXIMA = 300            # segundos antes de refrescar una lista
+INTERVALO_REFRESCO = 60
+
+TIPOS_TEXTO = {"varchar", "nvarchar", "char", "nchar", "text", "ntext"}
+NOMBRES_ETIQUETA = ("nombre", "descripcion", "descripción", "name", "titulo", "título", "detalle")
+
+Opciones = List[Tuple[str, str]]
+
+
+def columna_etiqueta(columnas_esquema: List[Dict], clave: str) -> Optional[str]:
+    """Columna descriptiva de la tabla referenciada (nombre, descripción o el primer texto)."""
+    textos = [
+        col["nombre"] for col in columnas_esquema
+        if col["nombre"] != clave and col["tipo"].lower() in TIPOS_TEXTO
+    ]
+    for nombre in textos:
+        if nombre.lower() in NOMBRES_ETIQUETA:
+            return nombre
+    for nombre in textos:
+        if any(parte in nombre.lower() for parte in NOMBRES_ETIQUETA):
+            return nombre
+    return textos[0] if textos else None
+
+
+def _opciones(filas) -> Opciones:
+    return [
+        (str(fila[0]), f"{fila[0]} - {fila[1]}" if len(fila) > 1 and fila[1] is not None else str(fila[0]))
+        for fila in filas
+    ]
+
+
+def leer_opciones(conn, tabla: str, clave: str, etiqueta: Optional[str],
+                  limite: int, texto: str = "") -> Opciones:
+    """Pares (clave, texto) de la tabla referenciada; con `texto`, los que empiezan así."""
+    dial = dialecto.dialecto(conn)
+    columnas = f"{clave}, {etiqueta}" if etiqueta else clave
+    orden = f"ORDER BY {etiqueta or clave}"
+    parametros: tuple = ()
+    resto = orden
+    if texto:
+        # Búsqueda por prefijo: aprovecha los índices de la etiqueta o la clave
+        patron = texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        tipo_texto = "NVARCHAR(100)" if dial == dialecto.MSSQL else "TEXT"
+        condiciones = [f"CAST({clave} AS {tipo_texto}) LIKE ? ESCAPE '\\'"]
+        parametros = (patron,)
+        if etiqueta:
+            condiciones.append(f"{etiqueta} LIKE ? ESCAPE '\\'")
+            parametros += (patron,)
+        resto = f"WHERE {' OR '.join(condiciones)} {orden}"
+    cursor = conn.cursor()
+    cursor.execute(dialecto.select_top(tabla, limite, dial, columnas, resto), parametros)
+    filas = cursor.fetchall()
+    cursor.close()
+    return _opciones(filas)
+
+
+class CacheReferencias:
+    """Caché LRU de opciones por tabla referenciada, con refresco en segundo plano."""
+
+    def __init__(self, conectar: Callable, capacidad: int = CAPACIDAD, edad_maxima: float = EDAD_MAXIMA):
+        self.conectar = conectar
+        self.capacidad = capacidad
+        self.edad_maxima = edad_maxima
+        # (tabla, clave, etiqueta, texto) -> {"opciones", "completa", "momento"}
+        self._entradas: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._bloqueo = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _obtener(self, llave: tuple) -> Optional[Dict]:
+        with self._bloqueo:
+            entrada = self._entradas.get(llave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(llave)
+            self.aciertos += 1
+            return entrada
+
+    def _guardar(self, llave: tuple, entrada: Dict):
+        with self._bloqueo:
+            self._entradas[llave] = entrada
+            self._entradas.move_to_end(llave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def _leer(self, llave: tuple) -> Dict:
+        tabla, clave, etiqueta, texto = llave
+        conn = self.conectar()
+        try:
+            if texto:
+                opciones = leer_opciones(conn, tabla, clave, etiqueta, LIMITE_BUSQUEDA, texto)
+                completa = False
+            else:
+                # Se pide una fila de más para saber si la tabla entra completa
+                opciones = leer_opciones(conn, tabla, clave, etiqueta, LIMITE_COMPLETA + 1)
+                completa = len(opciones) <= LIMITE_COMPLETA
+                if not completa:
+                    opciones = opciones[:LIMITE_BUSQUEDA]
+        finally:
+            conn.close()
+        entrada = {"opciones": opciones, "completa": completa, "momento": time.monotonic()}
+        self._guardar(llave, entrada)
+        return entrada
+
+    def lista(self, tabla: str, clave: str, etiqueta: Optional[str]) -> Dict:
+        """Entrada de la tabla referenciada: la tabla completa o su primera página."""
+        llave = (tabla, clave, etiqueta, "")
+        return self._obtener(llave) or self._leer(llave)
+
+    def buscar(self, tabla: str, clave: str, etiqueta: Optional[str], texto: str = "") -> Opciones:
+        """Opciones que coinciden con `texto` (en memoria si la tabla está completa)."""
+        entrada = self.lista(tabla, clave, etiqueta)
+        texto = (texto or "").strip()
+        if entrada["completa"]:
+            buscado = texto.casefold()
+            return [op for op in entrada["opciones"] if buscado in op[1].casefold()][:LIMITE_COMPLETA]
+        if len(texto) < MIN_CARACTERES_BUSQUEDA:
+            return entrada["opciones"]
+        llave = (tabla, clave, etiqueta, texto.casefold())
+        resultado = self._obtener(llave)
+        if resultado is None or time.monotonic() - resultado["momento"] > self.edad_maxima:
+            resultado = self._leer(llave)
+        return resultado["opciones"]
+
+    def invalidar(self, tabla: str):
+        """Descarta las entradas de una tabla (después de modificarla)."""
+        with self._bloqueo:
+            for llave in [llave for llave in self._entradas if llave[0] == tabla]:
+                del self._entradas[llave]
+
+    def refrescar_vencidas(self):
+        """Vuelve a leer las listas más viejas que edad_maxima (las búsquedas solo expiran)."""
+        ahora = time.monotonic()
+        with self._bloqueo:
+            vencidas = [
+                llave for llave, entrada in self._entradas.items()
+                if ahora - entrada["momento"] > self.edad_maxima
+            ]
+        for llave in vencidas:
+            if llave[3]:
+                with self._bloqueo:
+                    self._entradas.pop(llave, None)
+            else:
+                self._leer(llave)
+
+    def iniciar(self, intervalo: float = INTERVALO_REFRESCO):
+        """Hilo de fondo que refresca las listas vencidas cada `intervalo` segundos."""
+        if self._hilo and self._hilo.is_alive():
+            return
+
+        def bucle():
+            while not self._detener.wait(intervalo):
+                try:
+                    self.refrescar_vencidas()
+                except Exception as e:
+                    print("Error al refrescar datos de referencia:", e)
+
+        self._hilo = threading.Thread(target=bucle, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+
+_compartidas: Dict[str, CacheReferencias] = {}
+_bloqueo = threading.Lock()
+
+
+def compartida(conectar: Callable, clave: str) -> CacheReferencias:
+    """Caché de referencias única por origen de datos (la comparten todas las sesiones)."""
+    with _bloqueo:
+        if clave not in _compartidas:
+            _compartidas[clave] = CacheReferencias(conectar)
+        return _compartidas[clave]
@@ -0,0 +1,164 @@
+"""Navegación entre registros relacionados por clave foránea (padres e hijos).
+
+Cada navegación es una consulta "filas de T donde columna = valor". Los
+resultados se guardan en una caché LRU por (tabla, columna, valor) compartida
+por las sesiones, y las navegaciones probables (las del registro abierto y las
+de sus vecinos en la grilla) se precargan en segundo plano con un pequeño
+conjunto de hilos que toman conexiones del pool.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import dialecto
+
+LIMITE_RELACIONADOS = 50   # filas por navegación
+CAPACIDAD = 256            # navegaciones en caché
+EDAD_MAXIMA = 60           # segundos antes de volver a consultar
+HILOS_PRECARGA = 4
+
+Resultado = Tuple[List[str], tuple, List[Sequence]]
+
+
+def _hashable(valor):
+    return bytes(valor) if isinstance(valor, bytearray) else valor
+
+
+def navegaciones(estructura: Dict[str, List[Dict]], tabla: str,
+                 nombres: Sequence[str], fila: Sequence) -> List[Dict]:
+    """Registros padre (FK de esta tabla) e hijos (FK que apuntan a esta tabla) de una fila."""
+    valores = dict(zip(nombres, fila))
+    resultado = []
+    for col in estructura.get(tabla, []):
+        ref = col.get("referencia")
+        valor = valores.get(col["nombre"])
+        if ref and valor is not None:
+            resultado.append({
+                "tipo": "padre", "tabla": ref["tabla"], "columna": ref["columna"], "valor": valor,
+                "titulo": f"{ref['tabla']} ({col['nombre']} = {valor})",
+            })
+    for otra in sorted(estructura):
+        for col in estructura[otra]:
+            ref = col.get("referencia")
+            if not ref or ref["tabla"] != tabla:
+                continue
+            valor = valores.get(ref["columna"])
+            if valor is not None:
+                resultado.append({
+                    "tipo": "hijo", "tabla": otra, "columna": col["nombre"], "valor": valor,
+                    "titulo": f"{otra}.{col['nombre']}",
+                })
+    return resultado
+
+
+def leer_relacionados(conn, tabla: str, columna: str, valor,
+                      limite: int = LIMITE_RELACIONADOS) -> Resultado:
+    """Filas de `tabla` con columna = valor: (nombres, descripción, filas)."""
+    cursor = conn.cursor()
+    cursor.execute(dialecto.select_top(tabla, limite, dialecto.dialecto(conn), "*", f"WHERE {columna} = ?"),
+                   (valor,))
+    descripcion = cursor.description
+    filas = cursor.fetchall()
+    cursor.close()
+    return [col[0] if col[0] else "Columna" for col in descripcion], descripcion, filas
+
+
+class CacheNavegacion:
+    """Resultados de navegación en una caché LRU, con precarga en segundo plano."""
+
+    def __init__(self, conectar: Callable, capacidad: int = CAPACIDAD,
+                 edad_maxima: float = EDAD_MAXIMA, hilos: int = HILOS_PRECARGA):
+        self.conectar = conectar
+        self.capacidad = capacidad
+        self.edad_maxima = edad_maxima
+        # (tabla, columna, valor) -> (momento, resultado)
+        self._entradas: "OrderedDict[tuple, Tuple[float, Resultado]]" = OrderedDict()
+        self._en_curso: Dict[tuple, Future] = {}
+        self._bloqueo = threading.Lock()
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="precarga")
+        self.aciertos = 0
+        self.fallos = 0
+        self.precargas = 0
+
+    @staticmethod
+    def _llave(navegacion: Dict) -> tuple:
+        return navegacion["tabla"], navegacion["columna"], _hashable(navegacion["valor"])
+
+    def _vigente(self, llave: tuple) -> Optional[Resultado]:
+        """Resultado en caché si no venció (llamar con el bloqueo tomado)."""
+        entrada = self._entradas.get(llave)
+        if entrada and time.monotonic() - entrada[0] < self.edad_maxima:
+            self._entradas.move_to_end(llave)
+            return entrada[1]
+        return None
+
+    def _leer(self, llave: tuple) -> Resultado:
+        try:
+            conn = self.conectar()
+            try:
+                resultado = leer_relacionados(conn, *llave)
+            finally:
+                conn.close()
+            with self._bloqueo:
+                self._entradas[llave] = (time.monotonic(), resultado)
+                self._entradas.move_to_end(llave)
+                while len(self._entradas) > self.capacidad:
+                    self._entradas.popitem(last=False)
+            return resultado
+        finally:
+            with self._bloqueo:
+                self._en_curso.pop(llave, None)
+
+    def obtener(self, navegacion: Dict) -> Resultado:
+        """Resultado de una navegación: de la caché, de una precarga en curso o del servidor."""
+        llave = self._llave(navegacion)
+        with self._bloqueo:
+            resultado = self._vigente(llave)
+            if resultado is not None:
+                self.aciertos += 1
+                return resultado
+            futuro = self._en_curso.get(llave)
+            if futuro is None:
+                self.fallos += 1
+        if futuro is not None:
+            try:
+                return futuro.result()
+            except Exception:
+                pass  # la precarga falló: se consulta de nuevo
+        return self._leer(llave)
+
+    def cantidad(self, navegacion: Dict) -> Optional[int]:
+        """Filas de la navegación si ya están en caché (sin consultar)."""
+        with self._bloqueo:
+            resultado = self._vigente(self._llave(navegacion))
+        return len(resultado[2]) if resultado is not None else None
+
+    def precargar(self, navegaciones_probables: List[Dict]):
+        """Encola en segundo plano las navegaciones que no están en caché ni en curso."""
+        with self._bloqueo:
+            for navegacion in navegaciones_probables:
+                llave = self._llave(navegacion)
+                if llave in self._en_curso or self._vigente(llave) is not None:
+                    continue
+                self._en_curso[llave] = self._ejecutor.submit(self._leer, llave)
+                self.precargas += 1
+
+    def invalidar(self, tabla: str):
+        """Descarta los resultados de una tabla (después de modificarla)."""
+        with self._bloqueo:
+            for llave in [llave for llave in self._entradas if llave[0] == tabla]:
+                del self._entradas[llave]
+
+
+_compartidas: Dict[str, CacheNavegacion] = {}
+_bloqueo = threading.Lock()
+
+
+def compartida(conectar: Callable, clave: str) -> CacheNavegacion:
+    """Caché de navegación única por origen de datos (la comparten todas las sesiones)."""
+    with _bloqueo:
+        if clave not in _compartidas:
+            _compartidas[clave] = CacheNavegacion(conectar)
+        return _compartidas[clave]
@@ -0,0 +1,186 @@
+"""Grilla con reciclado de controles de Flet.
+
+En lugar de crear un árbol DataRow -> DataCell -> Container -> Text nuevo por
+cada carga, la grilla mantiene un conjunto de filas (del tamaño de la página
+visible) y vuelve a asignar los valores en los mismos controles. Las filas que
+se agregan con agregar() por encima de ese tamaño se descartan en cuanto se
+muestra un resultado más chico, para que el conjunto no crezca sin límite. Como
+Flet solo envía las propiedades que cambiaron, page.update() transmite
+únicamente las celdas con valores distintos. El valor completo de una fila se
+muestra a pedido al seleccionarla, sin tooltips por celda.
+"""
+from datetime import date, datetime
+from typing import Callable, List, Optional, Sequence
+
+import flet as ft
+
+import conversores
+
+TEXTO_NULO = "NULL"
+
+
+def texto_celda(valor, largo_maximo: int = 50) -> str:
+    """Texto visible de un valor (truncado a largo_maximo caracteres)."""
+    if valor is None:
+        return TEXTO_NULO
+    if isinstance(valor, datetime):
+        texto = valor.strftime("%Y-%m-%d %H:%M:%S") if (valor.hour or valor.minute or valor.second) \
+            else valor.strftime("%Y-%m-%d")
+    elif isinstance(valor, date):
+        texto = valor.strftime("%Y-%m-%d")
+    else:
+        texto = str(valor)
+    return texto[:largo_maximo] + "..." if len(texto) > largo_maximo else texto
+
+
+class GrillaReciclable:
+    """Administra las filas de un ft.DataTable reutilizando sus controles."""
+
+    def __init__(self, tabla: ft.DataTable, tam_pool: int = 50,
+                 formatear: Callable = texto_celda,
+                 al_ver_detalle: Optional[Callable] = None,
+                 estilo_texto: Optional[dict] = None,
+                 estilo_columna: Optional[dict] = None):
+        self.tabla = tabla
+        self.formatear = formatear
+        self.al_ver_detalle = al_ver_detalle
+        self.estilo_texto = estilo_texto or {"size": 12}
+        self.estilo_columna = estilo_columna or {"size": 12, "weight": "bold"}
+        self.columnas: List[ft.DataColumn] = []
+        self.filas: List[ft.DataRow] = []
+        self.nombres: List[str] = []
+        self.valores: List[Sequence] = []
+        self.celdas_cambiadas = 0
+        self.tam_pool = tam_pool
+        self._asegurar_filas(tam_pool)
+
+    def _nueva_fila(self, indice: int) -> ft.DataRow:
+        fila = ft.DataRow(cells=[], data=indice)
+        if self.al_ver_detalle:
+            fila.on_select_changed = lambda e: self.al_ver_detalle(
+                self.nombres, self.valores[e.control.data]
+            )
+        return fila
+
+    def _asegurar_filas(self, cantidad: int):
+        while len(self.filas) < cantidad:
+            self.filas.append(self._nueva_fila(len(self.filas)))
+
+    def _recortar_filas(self, visibles: int):
+        """Descarta las filas que sobran por encima del tamaño del pool y de las visibles."""
+        del self.filas[max(self.tam_pool, visibles):]
+
+    def _ajustar_celdas(self, fila: ft.DataRow, cantidad: int):
+        while len(fila.cells) < cantidad:
+            fila.cells.append(ft.DataCell(ft.Text("", **self.estilo_texto)))
+        del fila.cells[cantidad:]
+
+    def mostrar(self, nombres: List[str], filas: Sequence[Sequence],
+                tooltips: Optional[List[str]] = None,
+                formateadores: Optional[List[Callable]] = None,
+                anchos: Optional[List[Optional[int]]] = None) -> int:
+        """Vuelca las filas en los controles existentes.
+
+        `formateadores` trae un conversor por columna (ver conversores.py); si
+        no se indica, se usa `formatear` para todas. `anchos` fija el ancho en
+        píxeles de cada columna (None: automático).
+        Devuelve la cantidad de celdas cuyo contenido cambió (lo que viaja en
+        el próximo page.update()).
+        """
+        cambiadas = 0
+        # Encabezados: se reutilizan los DataColumn existentes
+        while len(self.columnas) < len(nombres):
+            self.columnas.append(ft.DataColumn(ft.Text("", **self.estilo_columna)))
+        del self.columnas[len(nombres):]
+        for i, nombre in enumerate(nombres):
+            columna = self.columnas[i]
+            if columna.label.value != nombre:
+                columna.label.value = nombre
+                cambiadas += 1
+            tooltip = tooltips[i] if tooltips else None
+            if columna.tooltip != tooltip:
+                columna.tooltip = tooltip
+            ancho = anchos[i] if anchos else None
+            if columna.label.width != ancho:
+                columna.label.width = ancho
+
+        # Conversión por columna: una pasada por columna en lugar de por celda
+        textos = conversores.formatear_columnas(filas, formateadores or [self.formatear] * len(nombres))
+
+        self._asegurar_filas(len(filas))
+        for i in range(len(filas)):
+            fila = self.filas[i]
+            self._ajustar_celdas(fila, len(nombres))
+            for j, celda in enumerate(fila.cells):
+                control = celda.content
+                ancho = anchos[j] if anchos else None
+                if control.width != ancho:
+                    control.width = ancho
+                texto = textos[j][i]
+                if control.value != texto:
+                    control.value = texto
+                    cambiadas += 1
+                # El estilo depende del valor, no del texto (una cadena "NULL" no es un nulo)
+                nulo = filas[i][j] is None
+                if control.italic != nulo:
+                    control.italic = nulo
+                    control.color = ft.colors.GREY if nulo else self.estilo_texto.get("color")
+
+        self._recortar_filas(len(filas))
+        self.nombres = list(nombres)
+        self.valores = list(filas)
+        # Las mismas instancias de columnas y filas: Flet solo envía las diferencias
+        self.tabla.columns = self.columnas
+        self.tabla.rows = self.filas[:len(filas)]
+        self.celdas_cambiadas = cambiadas
+        return cambiadas
+
+    def agregar(self, filas: Sequence[Sequence], formateadores: Optional[List[Callable]] = None) -> int:
+        """Agrega filas al final de las ya mostradas (mismas columnas), sin tocar las anteriores.
+
+        Para mostrar un resultado a medida que llega: mostrar() con las primeras
+        filas (o ninguna) y agregar() con cada lote siguiente. Devuelve las celdas nuevas.
+        """
+        if not filas:
+            return 0
+        inicio = len(self.valores)
+        textos = conversores.formatear_columnas(filas, formateadores or [self.formatear] * len(self.nombres))
+        anchos = [columna.label.width for columna in self.columnas]
+        self._asegurar_filas(inicio + len(filas))
+        for i in range(len(filas)):
+            fila = self.filas[inicio + i]
+            self._ajustar_celdas(fila, len(self.nombres))
+            for j, celda in enumerate(fila.cells):
+                control = celda.content
+                control.width = anchos[j]
+                control.value = textos[j][i]
+                nulo = filas[i][j] is None
+                control.italic = nulo
+                control.color = ft.colors.GREY if nulo else self.estilo_texto.get("color")
+        self.valores.extend(filas)
+        self.tabla.rows = self.filas[:len(self.valores)]
+        self.celdas_cambiadas = len(filas) * len(self.nombres)
+        return self.celdas_cambiadas
+
+
+def dialogo_detalle(nombres: List[str], valores: Sequence, titulo: str = "Detalle del registro",
+                    extra: Optional[List[ft.Control]] = None,
+                    acciones: Optional[List[ft.Control]] = None) -> ft.AlertDialog:
+    """Diálogo con los valores completos de una fila (detalle a pedido).
+
+    `extra` agrega controles debajo del detalle (p. ej. registros relacionados).
+    """
+    detalle = ft.ListView([
+        ft.Row([
+            ft.Text(nombre, weight="bold", width=200, size=12),
+            ft.Text(TEXTO_NULO if valor is None else str(valor), selectable=True, size=12, expand=True),
+        ]) for nombre, valor in zip(nombres, valores)
+    ], spacing=4, expand=True)
+    return ft.AlertDialog(
+        title=ft.Text(titulo),
+        content=ft.Container(
+            ft.Column([detalle, *extra], spacing=8) if extra else detalle,
+            width=700, height=600 if extra else 450
+        ),
+        actions=acciones
+    )
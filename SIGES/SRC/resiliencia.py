@@ -0,0 +1,179 @@
+"""Tolerancia a fallas de conexión: clasificación de errores, reintentos y circuito.
+
+- Los errores se clasifican en transitorios (red cortada, tiempo agotado,
+  interbloqueo, base ocupada) y permanentes (sintaxis, permisos, datos).
+  Solo los transitorios se reintentan.
+- reintentar() repite una operación idempotente con espera exponencial y
+  variación aleatoria, para que muchas sesiones no reintenten a la vez.
+- Circuito corta los intentos mientras el servidor no responde: tras
+  `umbral` fallas transitorias seguidas se abre y falla de inmediato con
+  CircuitoAbierto durante `espera` segundos; luego deja pasar un intento de
+  prueba y, si funciona, se vuelve a cerrar. Cada prueba fallida duplica la
+  espera (hasta `espera_maxima`): un corte breve se recupera en segundos y
+  una caída larga no recibe un intento por segundo.
+"""
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+# SQLSTATE de pyodbc que indican una falla de comunicación o de tiempo
+ESTADOS_TRANSITORIOS = {"08S01", "08001", "08004", "08007", "HYT00", "HYT01", "40001"}
+# Errores nativos de SQL Server (y Azure SQL) que vale la pena reintentar
+ERRORES_TRANSITORIOS = {
+    "1205",   # víctima de interbloqueo
+    "233", "64", "10053", "10054", "10060", "10928", "10929",
+    "40197", "40501", "40613", "49918", "49919", "49920",
+}
+# Textos de SQLite (y de red) equivalentes
+TEXTOS_TRANSITORIOS = ("database is locked", "database is busy", "communication link failure",
+                       "connection reset", "timeout expired", "tcp provider")
+
+
+class CircuitoAbierto(ConnectionError):
+    """El servidor no responde: no se intenta conectar hasta que pase la espera."""
+
+    def __init__(self, restante: float):
+        super().__init__(f"Servidor no disponible; se reintentará en {restante:.0f} s")
+        self.restante = restante
+
+
+class ErrorConexion(ConnectionError):
+    """No se pudo abrir la conexión (el error del driver queda en __cause__)."""
+
+
+def es_transitorio(error: BaseException) -> bool:
+    """True si el error se debe a una falla pasajera y la operación puede reintentarse."""
+    if isinstance(error, CircuitoAbierto):
+        return False
+    if isinstance(error, ErrorConexion):
+        # Depende del motivo: un usuario o clave incorrectos no se arreglan reintentando
+        return error.__cause__ is None or es_transitorio(error.__cause__)
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    causa = error.__cause__
+    if causa is not None and causa is not error and es_transitorio(causa):
+        return True
+    argumentos = getattr(error, "args", ())
+    # pyodbc: args = (SQLSTATE, mensaje)
+    if argumentos and isinstance(argumentos[0], str) and argumentos[0] in ESTADOS_TRANSITORIOS:
+        return True
+    texto = str(error).lower()
+    if any(marca in texto for marca in TEXTOS_TRANSITORIOS):
+        return True
+    return any(f"({numero})" in texto or f"error {numero}" in texto for numero in ERRORES_TRANSITORIOS)
+
+
+def describir(error: BaseException, contexto: str = "Error") -> str:
+    """Mensaje para la barra de estado según el tipo de falla."""
+    if isinstance(error, CircuitoAbierto):
+        return f"{contexto}: {error}"
+    if es_transitorio(error):
+        return f"{contexto}: falla de conexión con el servidor (se reintentó): {error}"
+    return f"{contexto}: {error}"
+
+
+class Circuito:
+    """Cortacircuito compartido por todas las conexiones a un mismo servidor."""
+
+    def __init__(self, umbral: int = 5, espera: float = 1.0, espera_maxima: float = 30.0):
+        self.umbral = umbral
+        self.espera = espera
+        self.espera_maxima = espera_maxima
+        self._espera_actual = espera
+        self._bloqueo = threading.Lock()
+        self._fallas = 0
+        self._abierto_hasta = 0.0
+        self._probando = False
+        self.aperturas = 0
+
+    @property
+    def estado(self) -> str:
+        with self._bloqueo:
+            if self._fallas < self.umbral:
+                return "cerrado"
+            return "abierto" if time.monotonic() < self._abierto_hasta else "semiabierto"
+
+    def verificar(self):
+        """Lanza CircuitoAbierto mientras el circuito está abierto (sin tomar el intento de prueba)."""
+        with self._bloqueo:
+            restante = self._abierto_hasta - time.monotonic()
+            if self._fallas >= self.umbral and restante > 0:
+                raise CircuitoAbierto(restante)
+
+    def antes(self):
+        """Lanza CircuitoAbierto si no corresponde intentar todavía."""
+        with self._bloqueo:
+            if self._fallas < self.umbral:
+                return
+            restante = self._abierto_hasta - time.monotonic()
+            if restante > 0:
+                raise CircuitoAbierto(restante)
+            # Semiabierto: un único intento de prueba a la vez
+            if self._probando:
+                raise CircuitoAbierto(0)
+            self._probando = True
+
+    def exito(self):
+        with self._bloqueo:
+            self._fallas = 0
+            self._probando = False
+            self._espera_actual = self.espera
+
+    def falla(self, error: BaseException):
+        """Registra una falla; solo las transitorias cuentan para abrir el circuito
+        (un error permanente significa que el servidor respondió)."""
+        if isinstance(error, CircuitoAbierto):
+            return
+        if not es_transitorio(error):
+            self.exito()
+            return
+        with self._bloqueo:
+            self._fallas += 1
+            if self._fallas >= self.umbral:
+                if self._fallas == self.umbral:
+                    self.aperturas += 1
+                    self._espera_actual = self.espera
+                elif self._probando:
+                    # Falló la prueba: el servidor sigue caído, se espera el doble
+                    self.aperturas += 1
+                    self._espera_actual = min(self.espera_maxima, self._espera_actual * 2)
+                self._abierto_hasta = time.monotonic() + self._espera_actual
+            self._probando = False
+
+    def reiniciar(self):
+        with self._bloqueo:
+            self._fallas = 0
+            self._abierto_hasta = 0.0
+            self._probando = False
+            self._espera_actual = self.espera
+
+
+def reintentar(operacion: Callable, intentos: int = 3, espera_base: float = 0.2,
+               espera_maxima: float = 5.0, circuito: Optional[Circuito] = None,
+               al_reintentar: Optional[Callable] = None,
+               reintentable: Callable[[BaseException], bool] = es_transitorio):
+    """Ejecuta `operacion()` reintentando las fallas transitorias.
+
+    Espera entre intentos: aleatoria entre 0 y espera_base * 2^intento (con
+    tope espera_maxima). Solo para operaciones idempotentes (lecturas,
+    aperturas de conexión). `reintentable` decide qué errores se reintentan
+    (p. ej. para no repetir reintentos que ya hizo una capa inferior).
+    """
+    for intento in range(intentos):
+        if circuito:
+            circuito.antes()
+        try:
+            resultado = operacion()
+        except Exception as e:
+            if circuito:
+                circuito.falla(e)
+            if not reintentable(e) or intento == intentos - 1:
+                raise
+            if al_reintentar:
+                al_reintentar(intento + 1, e)
+            time.sleep(random.uniform(0, min(espera_maxima, espera_base * 2 ** intento)))
+            continue
+        if circuito:
+            circuito.exito()
+        return resultado
@@ -0,0 +1,41 @@
+"""Modo servidor: SIGES en el navegador para varios usuarios concurrentes.
+
+Uso:
+    python servidor.py [--puerto 8550] [--pool 10] [--espera 5] [--perfil nombre]
+
+Sin --pool/--espera/--max-en-espera se usan los valores del perfil de conexión
+activo (ver configuracion.py). El perfil de conexión es el mismo para todas las
+sesiones: se elige con --perfil (solo para este proceso; el perfil activo
+guardado en la configuración no cambia) y no se puede cambiar desde una sesión.
+
+Todas las sesiones comparten un pool de conexiones, la estructura de la base
+y las estadísticas de tablas. Cada sesión conserva su propio estado (tabla
+seleccionada, formularios) en las variables de su página. Cuando el pool está
+lleno, los pedidos esperan su turno en ronda entre sesiones y se rechazan con
+"Servidor ocupado" si la espera supera el límite.
+"""
+import argparse
+
+import flet as ft
+
+import crud
+from conexion_sql import ConexionSQL
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SIGES en modo servidor web")
+    parser.add_argument("--puerto", type=int, default=8550)
+    parser.add_argument("--pool", type=int, help="conexiones máximas al servidor SQL")
+    parser.add_argument("--espera", type=float, help="segundos máximos de espera por una conexión")
+    parser.add_argument("--max-en-espera", type=int, help="pedidos máximos en cola")
+    parser.add_argument("--perfil", help="perfil de conexión (predeterminado: el activo)")
+    args = parser.parse_args()
+
+    if args.perfil:
+        ConexionSQL.cambiar_perfil(args.perfil, persistir=False)
+    ConexionSQL.activar_pool(args.pool, args.espera, args.max_en_espera)
+    ft.app(target=crud.main, view=ft.AppView.WEB_BROWSER, port=args.puerto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""Consultas guardadas y vistas materializadas en una base SQLite local.
+
+Una consulta guardada tiene nombre, SQL con parámetros (:nombre) y sus
+valores. Si se materializa, su resultado se copia a vistas.db (en el
+directorio local de SIGES) y se refresca cada `intervalo_min` minutos desde
+un hilo en segundo plano. Con una columna de marca (fecha de modificación o
+id creciente) el refresco es incremental: solo se piden las filas con marca
+mayor a la última copiada y, si hay columna clave, reemplazan a las locales.
+Abrir una vista lee la copia local, sin consultar el servidor.
+
+Cada consulta guardada recuerda el origen de datos (ConexionSQL.identificador())
+en que se guardó: solo se refresca desde ese origen, así un cambio de perfil no
+mezcla en la copia filas de otro servidor. Las de otro origen se listan pero el
+programador no las refresca.
+"""
+import decimal
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, time as hora
+from typing import Callable, Dict, List, Optional, Tuple
+
+import conversores
+import esquema
+import parametros
+
+TAM_LOTE = 5000
+INTERVALO_REVISION = 30  # segundos entre revisiones del programador
+
+# Familia de conversión -> tipo de la columna local (decimales como texto: sin pérdida)
+_TIPOS_LOCALES = {"entero": "INTEGER", "flotante": "REAL", "bit": "INTEGER", "binario": "BLOB"}
+
+
+def _valor_local(valor):
+    """Valor tal como se guarda en SQLite."""
+    if valor is None or isinstance(valor, (int, float, str, bytes)):
+        return valor
+    if isinstance(valor, (datetime, date, hora)):
+        return valor.isoformat()
+    if isinstance(valor, bytearray):
+        return bytes(valor)
+    return str(valor)  # Decimal, UUID y otros
+
+
+def _serializar_marca(valor) -> Optional[str]:
+    """La marca se guarda con su tipo para enviarla al servidor como parámetro del mismo tipo."""
+    if valor is None:
+        return None
+    for tipo, nombre in ((datetime, "datetime"), (date, "date"), (decimal.Decimal, "decimal")):
+        if isinstance(valor, tipo):
+            return json.dumps({"tipo": nombre, "valor": str(valor) if tipo is decimal.Decimal else valor.isoformat()})
+    return json.dumps({"tipo": "json", "valor": valor})
+
+
+def _leer_marca(texto: Optional[str]):
+    if not texto:
+        return None
+    datos = json.loads(texto)
+    if datos["tipo"] == "datetime":
+        return datetime.fromisoformat(datos["valor"])
+    if datos["tipo"] == "date":
+        return date.fromisoformat(datos["valor"])
+    if datos["tipo"] == "decimal":
+        return decimal.Decimal(datos["valor"])
+    return datos["valor"]
+
+
+def antiguedad(fecha_iso: Optional[str]) -> str:
+    """"hace 5 min", "hace 2 h"... a partir de una fecha ISO."""
+    if not fecha_iso:
+        return "nunca actualizada"
+    segundos = (datetime.now() - datetime.fromisoformat(fecha_iso)).total_seconds()
+    if segundos < 60:
+        return "hace menos de 1 min"
+    if segundos < 3600:
+        return f"hace {segundos / 60:.0f} min"
+    if segundos < 86400:
+        return f"hace {segundos / 3600:.1f} h"
+    return f"hace {segundos / 86400:.1f} días"
+
+
+class VistasLocales:
+    """Consultas guardadas y su copia local."""
+
+    def __init__(self, ruta: Optional[str] = None, conectar: Optional[Callable] = None,
+                 origen: Optional[Callable[[], str]] = None):
+        """`conectar` abre una conexión al origen actual; `origen()` lo identifica."""
+        self.ruta = ruta or os.path.join(esquema.directorio_cache(), "vistas.db")
+        self.conectar = conectar
+        self.origen = origen or (lambda: "")
+        self._refrescando = set()
+        self._bloqueo = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        conn = self._abrir()
+        conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS consultas_guardadas (
+                id INTEGER PRIMARY KEY,
+                nombre TEXT NOT NULL UNIQUE,
+                sql TEXT NOT NULL,
+                parametros TEXT,
+                materializar INTEGER NOT NULL DEFAULT 0,
+                intervalo_min INTEGER NOT NULL DEFAULT 0,
+                columna_marca TEXT,
+                columna_clave TEXT,
+                marca TEXT,
+                actualizada TEXT,
+                filas INTEGER,
+                duracion_ms REAL,
+                error TEXT,
+                origen TEXT
+            );
+        """)
+        # Bases creadas antes de que las consultas recordaran su origen
+        if "origen" not in {fila[1] for fila in conn.execute("PRAGMA table_info(consultas_guardadas)")}:
+            conn.execute("ALTER TABLE consultas_guardadas ADD COLUMN origen TEXT")
+        conn.close()
+
+    def _abrir(self):
+        # isolation_level=None: las transacciones se controlan con BEGIN/COMMIT explícitos
+        return sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+
+    def guardar(self, nombre: str, sql: str, valores: Optional[Dict] = None, materializar: bool = False,
+                intervalo_min: int = 0, columna_marca: str = "", columna_clave: str = ""):
+        """Crea o reemplaza una consulta guardada (si cambia el SQL, la copia local se descarta)."""
+        valores = valores or {}
+        faltantes = [n for n in parametros.nombres(sql) if n not in valores]
+        if faltantes:
+            raise ValueError("Faltan valores para: " + ", ".join(faltantes))
+        anterior = self.obtener(nombre)
+        origen = self.origen()
+        conn = self._abrir()
+        try:
+            conn.execute("BEGIN")
+            cambio = anterior and (
+                anterior["sql"] != sql or anterior["parametros"] != json.loads(json.dumps(valores, default=str))
+                or anterior["origen"] != origen
+            )
+            if cambio or (anterior and not materializar):
+                conn.execute(f"DROP TABLE IF EXISTS vista_{anterior['id']}")
+                conn.execute("UPDATE consultas_guardadas SET marca = NULL, actualizada = NULL, filas = NULL"
+                             " WHERE id = ?", (anterior["id"],))
+            conn.execute("""
+                INSERT INTO consultas_guardadas (nombre, sql, parametros, materializar, intervalo_min,
+                                                 columna_marca, columna_clave, origen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (nombre) DO UPDATE SET sql = excluded.sql, parametros = excluded.parametros,
+                    materializar = excluded.materializar, intervalo_min = excluded.intervalo_min,
+                    columna_marca = excluded.columna_marca, columna_clave = excluded.columna_clave,
+                    origen = excluded.origen
+            """, (nombre, sql, json.dumps(valores, default=str), int(materializar), int(intervalo_min),
+                  columna_marca or None, columna_clave or None, origen))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def eliminar(self, nombre: str):
+        consulta = self.obtener(nombre)
+        if not consulta:
+            return
+        conn = self._abrir()
+        try:
+            conn.execute("BEGIN")
+            conn.execute(f"DROP TABLE IF EXISTS vista_{consulta['id']}")
+            conn.execute("DELETE FROM consultas_guardadas WHERE id = ?", (consulta["id"],))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _filas_a_dict(self, cursor) -> List[Dict]:
+        claves = [c[0] for c in cursor.description]
+        resultado = []
+        for fila in cursor.fetchall():
+            consulta = dict(zip(claves, fila))
+            consulta["parametros"] = json.loads(consulta["parametros"] or "{}")
+            resultado.append(consulta)
+        return resultado
+
+    def listar(self) -> List[Dict]:
+        conn = self._abrir()
+        try:
+            return self._filas_a_dict(conn.execute("SELECT * FROM consultas_guardadas ORDER BY nombre"))
+        finally:
+            conn.close()
+
+    def obtener(self, nombre: str) -> Optional[Dict]:
+        conn = self._abrir()
+        try:
+            consultas = self._filas_a_dict(
+                conn.execute("SELECT * FROM consultas_guardadas WHERE nombre = ?", (nombre,))
+            )
+            return consultas[0] if consultas else None
+        finally:
+            conn.close()
+
+    def es_del_origen(self, consulta: Dict) -> bool:
+        """True si la consulta se guardó en el origen de datos actual (o antes de que se anotara)."""
+        return consulta["origen"] is None or consulta["origen"] == self.origen()
+
+    def refrescar(self, nombre: str, completa: bool = False) -> Dict:
+        """Copia el resultado del servidor a la base local (incremental si hay marca).
+
+        ValueError si la consulta es de otro origen de datos."""
+        consulta = self.obtener(nombre)
+        if consulta is None:
+            raise ValueError(f"No existe la consulta {nombre}")
+        if not self.es_del_origen(consulta):
+            raise ValueError(f"La vista {nombre} es de otro origen de datos ({consulta['origen']}):"
+                             " active ese perfil para actualizarla")
+        with self._bloqueo:
+            if nombre in self._refrescando:
+                raise RuntimeError(f"La vista {nombre} ya se está actualizando")
+            self._refrescando.add(nombre)
+        try:
+            return self._refrescar(consulta, completa)
+        finally:
+            with self._bloqueo:
+                self._refrescando.discard(nombre)
+
+    def _refrescar(self, consulta: Dict, completa: bool) -> Dict:
+        tabla = f"vista_{consulta['id']}"
+        marca = consulta["columna_marca"]
+        ultima = _leer_marca(consulta["marca"])
+        # Sin origen anotado no se sabe de dónde vino la copia: se rehace entera
+        incremental = (bool(marca) and ultima is not None and consulta["actualizada"] and not completa
+                       and consulta["origen"] is not None)
+        sql, valores = parametros.enlazar(consulta["sql"].strip().rstrip(";"), consulta["parametros"])
+        if not incremental:
+            ultima = None
+        else:
+            # La consulta se usa como tabla derivada (no debe terminar en ORDER BY)
+            sql = f"SELECT * FROM ({sql}) AS origen WHERE origen.{marca} > ?"
+            valores += (ultima,)
+
+        inicio = time.perf_counter()
+        servidor = self.conectar()
+        local = self._abrir()
+        try:
+            cursor = servidor.cursor()
+            cursor.execute(sql, valores)
+            descripcion = cursor.description
+            columnas = [col[0] or f"columna_{i}" for i, col in enumerate(descripcion)]
+            indice_marca = columnas.index(marca) if marca in columnas else None
+            indice_clave = columnas.index(consulta["columna_clave"]) if consulta["columna_clave"] in columnas else None
+
+            local.execute("BEGIN")
+            if not incremental:
+                familias = [conversores.familia(None, col[1]) for col in descripcion]
+                # Sin tipo conocido (SQLite sustituta) la columna no declara tipo y guarda el valor tal cual
+                definicion = ", ".join(
+                    f'"{nombre}" {_TIPOS_LOCALES.get(familia, "TEXT") if familia else ""}'.rstrip()
+                    for nombre, familia in zip(columnas, familias)
+                )
+                local.execute(f"DROP TABLE IF EXISTS {tabla}")
+                local.execute(f"CREATE TABLE {tabla} ({definicion})")
+                if indice_clave is not None:
+                    local.execute(f'CREATE INDEX ix_{tabla}_clave ON {tabla} ("{columnas[indice_clave]}")')
+            marcadores = ", ".join("?" * len(columnas))
+            nuevas = 0
+            while True:
+                filas = cursor.fetchmany(TAM_LOTE)
+                if not filas:
+                    break
+                if indice_marca is not None:
+                    maximo = max((f[indice_marca] for f in filas if f[indice_marca] is not None), default=None)
+                    if maximo is not None and (ultima is None or maximo > ultima):
+                        ultima = maximo
+                if incremental and indice_clave is not None:
+                    # Las filas modificadas reemplazan a su versión local
+                    local.executemany(
+                        f'DELETE FROM {tabla} WHERE "{columnas[indice_clave]}" = ?',
+                        [(_valor_local(f[indice_clave]),) for f in filas]
+                    )
+                local.executemany(
+                    f"INSERT INTO {tabla} VALUES ({marcadores})",
+                    [tuple(_valor_local(v) for v in fila) for fila in filas]
+                )
+                nuevas += len(filas)
+            cursor.close()
+            total = local.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+            duracion = (time.perf_counter() - inicio) * 1000
+            local.execute("""
+                UPDATE consultas_guardadas SET marca = ?, actualizada = ?, filas = ?, duracion_ms = ?, error = NULL,
+                    origen = ?
+                WHERE id = ?
+            """, (_serializar_marca(ultima) if marca else None, datetime.now().isoformat(timespec="seconds"),
+                  total, duracion, self.origen(), consulta["id"]))
+            local.execute("COMMIT")
+            return {"incremental": incremental, "nuevas": nuevas, "total": total, "duracion_ms": duracion}
+        except Exception as e:
+            if local.in_transaction:
+                local.execute("ROLLBACK")
+            local.execute("UPDATE consultas_guardadas SET error = ? WHERE id = ?", (str(e), consulta["id"]))
+            raise
+        finally:
+            local.close()
+            servidor.close()
+
+    def leer(self, nombre: str, limite: Optional[int] = None) -> Tuple[List[str], List[tuple], Dict]:
+        """Copia local de una vista: (columnas, filas, datos de la consulta guardada)."""
+        consulta = self.obtener(nombre)
+        if not consulta or not consulta["actualizada"]:
+            raise ValueError(f"La vista {nombre} todavía no tiene copia local")
+        conn = self._abrir()
+        try:
+            cursor = conn.execute(
+                f"SELECT * FROM vista_{consulta['id']}" + (f" LIMIT {int(limite)}" if limite else "")
+            )
+            return [c[0] for c in cursor.description], cursor.fetchall(), consulta
+        finally:
+            conn.close()
+
+    def vencidas(self) -> List[str]:
+        """Vistas materializadas del origen actual cuyo intervalo de refresco ya se cumplió."""
+        ahora = datetime.now()
+        return [
+            consulta["nombre"] for consulta in self.listar()
+            if consulta["materializar"] and consulta["intervalo_min"] > 0 and self.es_del_origen(consulta) and (
+                not consulta["actualizada"]
+                or (ahora - datetime.fromisoformat(consulta["actualizada"])).total_seconds()
+                >= consulta["intervalo_min"] * 60
+            )
+        ]
+
+    def iniciar_programador(self, al_actualizar: Optional[Callable] = None, intervalo: float = INTERVALO_REVISION):
+        """Hilo de fondo que refresca las vistas vencidas."""
+        if self._hilo and self._hilo.is_alive():
+            return
+
+        def bucle():
+            while not self._detener.wait(intervalo):
+                for nombre in self.vencidas():
+                    try:
+                        self.refrescar(nombre)
+                        if al_actualizar:
+                            al_actualizar()
+                    except Exception as e:
+                        print(f"Error al actualizar la vista {nombre}:", e)
+
+        self._hilo = threading.Thread(target=bucle, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+
+_compartidas: Optional[VistasLocales] = None
+_bloqueo = threading.Lock()
+
+
+def compartidas(conectar: Optional[Callable] = None, origen: Optional[Callable[[], str]] = None) -> VistasLocales:
+    """Instancia única de las vistas locales para el proceso."""
+    global _compartidas
+    with _bloqueo:
+        if _compartidas is None:
+            _compartidas = VistasLocales(conectar=conectar, origen=origen)
+        return _compartidas
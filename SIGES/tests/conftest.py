@@ -0,0 +1,17 @@
+"""Configuración común de las pruebas: los módulos de SIGES están en SRC/ (sin paquete)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "SRC"))
+
+
+@pytest.fixture(autouse=True)
+def directorio_local(tmp_path, monkeypatch):
+    """Caché y configuración de SIGES en un directorio temporal (no se toca ~/.siges)."""
+    monkeypatch.setenv("SIGES_CACHE_DIR", str(tmp_path / "siges"))
+    monkeypatch.delenv("SIGES_CONFIG", raising=False)
+    monkeypatch.delenv("SIGES_SQLITE", raising=False)
+    monkeypatch.delenv("SIGES_FALLAS", raising=False)
+    return tmp_path
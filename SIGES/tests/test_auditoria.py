@@ -0,0 +1,99 @@
+"""Auditoría local por lotes y en la transacción del cambio (auditoria.py)."""
+import sqlite3
+
+import pytest
+
+import auditoria
+import configuracion
+import datos
+import dialecto
+
+COLUMNAS = [{"nombre": "id", "tipo": "integer"}, {"nombre": "nombre", "tipo": "text"}]
+
+
+@pytest.fixture
+def registro(directorio_local):
+    return auditoria.Auditoria(str(directorio_local / "auditoria.db"))
+
+
+@pytest.fixture
+def transaccional(directorio_local, monkeypatch):
+    """La tabla t se audita en la transacción del cambio."""
+    monkeypatch.setattr(configuracion, "_actual", None)
+    config = configuracion.predeterminada()
+    config["ajustes"]["tablas_auditoria_transaccional"] = ["t"]
+    configuracion.guardar(config)
+    yield
+    configuracion._actual = None
+
+
+def cambio(numero, origen="sqlite:pruebas", tabla="t"):
+    return auditoria.entrada(origen, "modificar", tabla, "id", numero, {"nombre": "antes"},
+                             {"nombre": f"después {numero}"}, quien="ana")
+
+
+def test_vaciar_escribe_el_bufer_en_orden(registro):
+    for numero in range(3):
+        registro.registrar(cambio(numero))
+    assert registro.pendientes() == 3
+    assert registro.vaciar() == 3 and registro.pendientes() == 0 and registro.vaciar() == 0
+    entradas = registro.consultar("sqlite:pruebas")
+    assert [e["valor_clave"] for e in entradas] == ["2", "1", "0"]
+    assert entradas[0]["usuario"] == "ana" and entradas[0]["despues"] == {"nombre": "después 2"}
+    assert registro.consultar("sqlite:otro") == []
+
+
+def test_la_base_local_es_de_solo_agregado(registro):
+    registro.registrar(cambio(1))
+    registro.vaciar()
+    conn = sqlite3.connect(registro.ruta)
+    try:
+        with pytest.raises(sqlite3.IntegrityError, match="solo agregado"):
+            conn.execute("UPDATE auditoria SET usuario = 'otro'")
+        with pytest.raises(sqlite3.IntegrityError, match="solo agregado"):
+            conn.execute("DELETE FROM auditoria")
+    finally:
+        conn.close()
+
+
+def test_si_falla_la_escritura_el_lote_vuelve_al_bufer(registro, monkeypatch):
+    registro.registrar(cambio(1))
+    registro.registrar(cambio(2))
+    abrir = registro._abrir
+
+    def falla():
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(registro, "_abrir", falla)
+    with pytest.raises(sqlite3.OperationalError):
+        registro.vaciar()
+    registro.registrar(cambio(3))
+    monkeypatch.setattr(registro, "_abrir", abrir)
+    assert registro.vaciar() == 3
+    assert [e["valor_clave"] for e in registro.consultar("sqlite:pruebas")] == ["3", "2", "1"]
+
+
+def test_auditar_en_usa_el_bufer_fuera_del_ajuste(registro):
+    auditar, anotar = auditoria.auditar_en(cambio(1, tabla="otra"), registro)
+    assert auditar is None
+    anotar()
+    assert registro.pendientes() == 1
+
+
+def test_auditar_en_la_misma_transaccion(registro, transaccional):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nombre TEXT)")
+    conn.execute("INSERT INTO t VALUES (1, 'antes')")
+    conn.commit()
+    version = datos.capturar_version(COLUMNAS, (1, "antes"), dialecto.SQLITE)
+    auditar, anotar = auditoria.auditar_en(cambio(1, origen="sqlite:transaccion"), registro)
+    assert datos.modificar_registro(conn, "t", "id", 1, {"nombre": "después 1"}, version, auditar=auditar) == 1
+    anotar()
+    assert registro.pendientes() == 0
+    entradas = auditoria.consultar_servidor(conn, tabla="t", valor_clave=1)
+    assert len(entradas) == 1 and entradas[0]["despues"] == {"nombre": "después 1"}
+    # Con conflicto no hay cambio ni entrada de auditoría
+    auditar, _ = auditoria.auditar_en(cambio(1, origen="sqlite:transaccion"), registro)
+    with pytest.raises(datos.ConflictoConcurrencia):
+        datos.modificar_registro(conn, "t", "id", 1, {"nombre": "otra vez"}, version, auditar=auditar)
+    assert len(auditoria.consultar_servidor(conn, tabla="t")) == 1
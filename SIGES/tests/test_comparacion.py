@@ -0,0 +1,87 @@
+"""Comparación de tablas por resúmenes de rangos de clave (comparacion.py) sobre SQLite."""
+import sqlite3
+
+import pytest
+
+import comparacion
+
+
+@pytest.fixture
+def bases(directorio_local):
+    """Dos bases con la tabla t (id clave, nombre, importe) y 2000 filas iguales."""
+    rutas = []
+    for lado in ("a", "b"):
+        ruta = str(directorio_local / f"{lado}.db")
+        conn = sqlite3.connect(ruta)
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nombre TEXT, importe REAL)")
+        conn.executemany("INSERT INTO t VALUES (?, ?, ?)", [(i, f"fila {i}", i / 4) for i in range(2000)])
+        conn.commit()
+        conn.close()
+        rutas.append(ruta)
+    return rutas
+
+
+def ejecutar(ruta, *sentencias):
+    conn = sqlite3.connect(ruta)
+    for sentencia in sentencias:
+        conn.execute(sentencia)
+    conn.commit()
+    conn.close()
+
+
+def conectar(ruta):
+    # Como ConexionSQL: la conexión se usa desde los hilos de la comparación
+    return sqlite3.connect(ruta, check_same_thread=False)
+
+
+def comparar(ruta_a, ruta_b, tabla_b=None):
+    return comparacion.comparar(lambda: conectar(ruta_a), "t", lambda: conectar(ruta_b), tabla_b)
+
+
+def test_tablas_iguales(bases):
+    resultado = comparar(*bases)
+    assert resultado["diferencias"] == 0
+    assert resultado["filas_a"] == resultado["filas_b"] == 2000
+    # Solo los resúmenes iniciales: no se trae ninguna fila
+    assert resultado["filas_traidas"] == 0
+
+
+def test_encuentra_las_diferencias_sin_traer_la_tabla(bases):
+    ruta_a, ruta_b = bases
+    ejecutar(ruta_a, "DELETE FROM t WHERE id = 10")
+    ejecutar(ruta_b, "DELETE FROM t WHERE id = 1500", "UPDATE t SET nombre = 'otro' WHERE id = 777",
+             "UPDATE t SET importe = NULL WHERE id = 3")
+    resultado = comparar(ruta_a, ruta_b)
+    assert resultado["solo_en_a"] == [1500]
+    assert resultado["solo_en_b"] == [10]
+    assert sorted((d["clave"], d["columnas"]) for d in resultado["distintas"]) == [
+        (3, {"importe": (0.75, None)}),
+        (777, {"nombre": ("fila 777", "otro")}),
+    ]
+    assert resultado["diferencias"] == 4
+    assert resultado["filas_traidas"] < 4000
+
+
+def test_clave_repetida_en_el_otro_lado(bases):
+    ruta_a, ruta_b = bases
+    ejecutar(ruta_b, "CREATE TABLE copia (id INTEGER, nombre TEXT, importe REAL)",
+             "INSERT INTO copia SELECT 5, nombre, importe FROM t")
+    with pytest.raises(ValueError, match="repetida"):
+        comparar(ruta_a, ruta_b, "copia")
+
+
+def test_rango_que_no_se_puede_partir(bases, monkeypatch):
+    # Sin la verificación de clave única, una clave con todas las filas no debe colgar la comparación
+    ruta_a, ruta_b = bases
+    ejecutar(ruta_b, "CREATE TABLE copia (id INTEGER, nombre TEXT, importe REAL)",
+             "INSERT INTO copia SELECT 5, nombre, importe FROM t")
+    monkeypatch.setattr(comparacion.Lado, "claves_invalidas", lambda self: 0)
+    resultado = comparar(ruta_a, ruta_b, "copia")
+    assert resultado["diferencias"] > 0
+
+
+def test_motores_distintos_o_clave_compuesta(bases, directorio_local):
+    ruta = str(directorio_local / "compuesta.db")
+    ejecutar(ruta, "CREATE TABLE t (a INTEGER, b INTEGER, PRIMARY KEY (a, b))")
+    with pytest.raises(ValueError, match="compuesta"):
+        comparar(ruta, ruta)
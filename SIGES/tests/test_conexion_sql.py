@@ -0,0 +1,87 @@
+"""Pool de conexiones y lecturas con reintento sobre el driver con fallas (driver_fallas.py)."""
+import sqlite3
+
+import pytest
+
+import driver_fallas
+import resiliencia
+from conexion_sql import ConexionSQL, PoolConexiones, PoolSaturado
+
+
+@pytest.fixture
+def base(directorio_local, monkeypatch):
+    """Base SQLite sustituta con el driver de fallas activo (sin fallas al azar)."""
+    ruta = str(directorio_local / "sustituta.db")
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nombre TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [(1, "uno"), (2, "dos")])
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv("SIGES_SQLITE", ruta)
+    monkeypatch.setenv("SIGES_FALLAS", "conexion=0,consulta=0")
+    monkeypatch.setattr(ConexionSQL, "_pool", None)
+    monkeypatch.setattr(ConexionSQL, "_circuito", resiliencia.Circuito())
+    driver_fallas.levantar()
+    yield ruta
+    driver_fallas.levantar()
+    if ConexionSQL._pool is not None:
+        ConexionSQL._pool.cerrar()
+
+
+def contar(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM t")
+    return cursor.fetchall()[0][0]
+
+
+def test_pool_reemplaza_la_conexion_cortada_por_el_servidor(base):
+    pool = PoolConexiones(lambda: driver_fallas.conectar(base), tamano=1,
+                          validar=ConexionSQL._validar, validar_tras=0)
+    conn = pool.obtener()
+    pool.devolver(conn)
+    # Reinicio del servidor: la conexión libre quedó muerta
+    driver_fallas.caer()
+    driver_fallas.levantar()
+    nueva = pool.obtener()
+    assert nueva is not conn
+    assert contar(nueva) == 2
+    assert pool.estado()["reconexiones"] == 1
+    assert pool.estado()["abiertas"] == 1
+    pool.devolver(nueva)
+    pool.cerrar()
+
+
+def test_pool_lleno_rechaza_tras_la_espera(base):
+    pool = PoolConexiones(lambda: driver_fallas.conectar(base), tamano=1, espera_maxima=0.05)
+    conn = pool.obtener("a")
+    with pytest.raises(PoolSaturado):
+        pool.obtener("b")
+    assert pool.estado()["rechazos"] == 1
+    pool.devolver(conn)
+    pool.cerrar()
+
+
+def test_lectura_reintenta_con_otra_conexion(base):
+    pool = ConexionSQL.activar_pool(2, 1.0, 10)
+    assert ConexionSQL.leer(contar) == 2
+    driver_fallas.caer()
+    driver_fallas.levantar()
+    # La conexión del pool falla al consultar: se descarta y se reintenta con una nueva
+    assert ConexionSQL.leer(contar) == 2
+    assert pool.estado()["abiertas"] == 1
+    assert driver_fallas.inyectadas["caida"] >= 1
+
+
+def test_servidor_caido_abre_el_circuito(base, monkeypatch):
+    monkeypatch.setattr(resiliencia.time, "sleep", lambda segundos: None)
+    ConexionSQL.activar_pool(2, 1.0, 10)
+    driver_fallas.caer()
+    for _ in range(ConexionSQL.circuito().umbral):
+        with pytest.raises((resiliencia.ErrorConexion, resiliencia.CircuitoAbierto)):
+            ConexionSQL.leer(contar)
+    assert ConexionSQL.circuito().estado == "abierto"
+    # Abierto: falla de inmediato, sin intentar conectar
+    inyectadas = driver_fallas.inyectadas["caida"]
+    with pytest.raises(resiliencia.CircuitoAbierto):
+        ConexionSQL.leer(contar)
+    assert driver_fallas.inyectadas["caida"] == inyectadas
@@ -0,0 +1,29 @@
+"""Perfiles de conexión (configuracion.py)."""
+import json
+
+import pytest
+
+import configuracion
+
+
+@pytest.fixture
+def dos_perfiles(directorio_local, monkeypatch):
+    monkeypatch.setattr(configuracion, "_actual", None)
+    config = configuracion.predeterminada()
+    config["perfiles"]["pruebas"] = dict(config["perfiles"]["predeterminado"], base="Pruebas")
+    configuracion.guardar(config)
+    yield configuracion.ruta_configuracion()
+    configuracion._actual = None
+
+
+def test_perfil_solo_para_el_proceso_no_se_guarda(dos_perfiles):
+    perfil = configuracion.activar_perfil("pruebas", persistir=False)
+    assert perfil["base"] == "Pruebas"
+    assert configuracion.nombre_perfil_activo() == "pruebas"
+    with open(dos_perfiles, encoding="utf-8") as f:
+        assert json.load(f)["perfil_activo"] == "predeterminado"
+
+
+def test_activar_perfil_lo_guarda(dos_perfiles):
+    configuracion.activar_perfil("pruebas")
+    assert configuracion.cargar()["perfil_activo"] == "pruebas"
@@ -0,0 +1,36 @@
+"""Lectura del texto de formularios por tipo de columna (conversores.py)."""
+import decimal
+import sqlite3
+
+import pytest
+
+import conversores
+import esquema
+
+
+def parsear(tipo, texto):
+    return conversores.parsers([{"nombre": "c", "tipo": tipo}])["c"](texto)
+
+
+def test_numeros_validos():
+    assert parsear("int", " -42 ") == -42
+    assert parsear("decimal", "12,50") == decimal.Decimal("12.50")
+    assert parsear("decimal", "7") == decimal.Decimal("7")
+    assert parsear("float", "1.5e3") == 1500.0
+
+
+@pytest.mark.parametrize("tipo", ["int", "decimal", "float"])
+@pytest.mark.parametrize("texto", ["NaN", "Infinity", "-inf", "1_000", "١٢", "0x10", "1e999"])
+def test_rechaza_no_finitos_y_formatos_de_python(tipo, texto):
+    with pytest.raises(ValueError):
+        parsear(tipo, texto)
+
+
+def test_timestamp_de_sqlite_es_fecha_y_hora():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, creado TIMESTAMP)")
+    _, estructura = esquema.cargar_estructura(conn)
+    columna = estructura["t"][1]
+    assert conversores.familia(columna["tipo"]) == "fechahora"
+    # En SQL Server timestamp es el rowversion
+    assert conversores.familia("timestamp") == "binario"
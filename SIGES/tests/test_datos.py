@@ -0,0 +1,66 @@
+"""Concurrencia optimista de modificar/eliminar (datos.py)."""
+import sqlite3
+
+import pytest
+
+import datos
+import dialecto
+
+COLUMNAS = [{"nombre": "id", "tipo": "integer"}, {"nombre": "nombre", "tipo": "text"},
+            {"nombre": "nota", "tipo": "text"}]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nombre TEXT, nota TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", [(1, "uno", None), (2, "dos", "x")])
+    conn.commit()
+    return conn
+
+
+def version(conn, valor_clave):
+    return datos.capturar_version(COLUMNAS, datos.leer_registro(conn, "t", "id", valor_clave), dialecto.SQLITE)
+
+
+def test_modifica_si_la_version_coincide(conn):
+    # La versión incluye un NULL: se compara con IS NULL
+    assert datos.modificar_registro(conn, "t", "id", 1, {"nombre": "UNO"}, version(conn, 1)) == 1
+    assert datos.leer_registro(conn, "t", "id", 1) == (1, "UNO", None)
+
+
+def test_conflicto_si_otro_lo_modifico(conn):
+    leida = version(conn, 1)
+    conn.execute("UPDATE t SET nota = 'otro' WHERE id = 1")
+    conn.commit()
+    with pytest.raises(datos.ConflictoConcurrencia) as error:
+        datos.modificar_registro(conn, "t", "id", 1, {"nombre": "UNO"}, leida)
+    assert error.value.actual == (1, "uno", "otro")
+    assert datos.leer_registro(conn, "t", "id", 1) == (1, "uno", "otro")
+
+
+def test_conflicto_si_otro_lo_elimino(conn):
+    leida = version(conn, 2)
+    conn.execute("DELETE FROM t WHERE id = 2")
+    conn.commit()
+    with pytest.raises(datos.ConflictoConcurrencia, match="eliminado") as error:
+        datos.eliminar_registro(conn, "t", "id", 2, leida)
+    assert error.value.actual is None
+
+
+def test_sin_version_no_hay_conflicto(conn):
+    assert datos.modificar_registro(conn, "t", "id", 9, {"nombre": "nueve"}) == 0
+
+
+def test_auditoria_solo_si_hubo_cambio_y_en_la_misma_transaccion(conn):
+    llamadas = []
+
+    def auditar(c):
+        llamadas.append(c)
+        raise RuntimeError("falla la auditoría")
+
+    with pytest.raises(RuntimeError):
+        datos.eliminar_registro(conn, "t", "id", 1, version(conn, 1), auditar=auditar)
+    assert llamadas == [conn]
+    # El DELETE se deshizo junto con la auditoría
+    assert datos.leer_registro(conn, "t", "id", 1) is not None
@@ -0,0 +1,106 @@
+"""División de scripts en lotes (GO) y sentencias, y su ejecución (ejecutor_script.py)."""
+import sqlite3
+import time
+
+import dialecto
+import ejecutor_script
+
+
+def dividir(texto):
+    """División para la base SQLite sustituta (por sentencia)."""
+    return ejecutor_script.dividir_script(texto, dialecto.SQLITE)
+
+
+def test_sql_server_envia_cada_lote_entero():
+    # Las variables y tablas variables duran lo que dura el lote
+    script = "DECLARE @x int = 5; DECLARE @t TABLE (a int);\nSELECT @x;\nGO\nSELECT 2;"
+    assert ejecutor_script.dividir_script(script) == [
+        "DECLARE @x int = 5; DECLARE @t TABLE (a int);\nSELECT @x;", "SELECT 2;"
+    ]
+
+
+def test_divide_por_punto_y_coma():
+    assert dividir("SELECT 1; SELECT 2;\nSELECT 3") == ["SELECT 1", "SELECT 2", "SELECT 3"]
+
+
+def test_respeta_cadenas_identificadores_y_comentarios():
+    script = ("SELECT 'a;b', 'it''s;' FROM [t;1]; -- fin; de línea\n"
+              "/* bloque; */ SELECT \"c;d\"")
+    assert dividir(script) == [
+        "SELECT 'a;b', 'it''s;' FROM [t;1]",
+        "-- fin; de línea\n/* bloque; */ SELECT \"c;d\"",
+    ]
+
+
+def test_descarta_sentencias_con_solo_comentarios():
+    assert dividir("SELECT 1; -- nada más\n;") == ["SELECT 1"]
+
+
+def test_go_separa_lotes_y_repite():
+    script = "INSERT INTO t VALUES (1)\nGO 3\nSELECT * FROM t\ngo\n"
+    assert ejecutor_script.dividir_lotes(script) == ["INSERT INTO t VALUES (1)"] * 3 + ["SELECT * FROM t"]
+
+
+def test_go_dentro_de_una_linea_no_separa():
+    assert ejecutor_script.dividir_lotes("SELECT 'GO'\nSELECT 1 AS go") == ["SELECT 'GO'\nSELECT 1 AS go"]
+
+
+def test_bloques_begin_end_y_case_no_se_dividen():
+    script = ("IF 1 = 1 BEGIN SELECT 1; SELECT 2; END;\n"
+              "SELECT CASE WHEN x = 1 THEN 'a;' ELSE 'b' END FROM t;")
+    assert dividir(script) == [
+        "IF 1 = 1 BEGIN SELECT 1; SELECT 2; END",
+        "SELECT CASE WHEN x = 1 THEN 'a;' ELSE 'b' END FROM t",
+    ]
+
+
+def test_begin_tran_no_abre_bloque():
+    script = "BEGIN TRAN; UPDATE t SET x = 1; COMMIT;"
+    assert dividir(script) == ["BEGIN TRAN", "UPDATE t SET x = 1", "COMMIT"]
+
+
+def test_procedimiento_se_envia_entero():
+    script = "-- procedimiento\nCREATE PROCEDURE p AS\nSELECT 1;\nSELECT 2;\nGO\nEXEC p;"
+    assert dividir(script) == [
+        "-- procedimiento\nCREATE PROCEDURE p AS\nSELECT 1;\nSELECT 2;",
+        "EXEC p",
+    ]
+
+
+def test_begin_de_transaccion_en_sqlite():
+    assert dividir("BEGIN; INSERT INTO t VALUES (1); COMMIT; SELECT 1;") == [
+        "BEGIN", "INSERT INTO t VALUES (1)", "COMMIT", "SELECT 1"
+    ]
+    assert dividir("BEGIN IMMEDIATE; DELETE FROM t; END") == ["BEGIN IMMEDIATE", "DELETE FROM t", "END"]
+    assert dividir("BEGIN DEFERRED TRANSACTION; SELECT 1") == ["BEGIN DEFERRED TRANSACTION", "SELECT 1"]
+
+
+def test_ejecuta_el_script_en_sqlite():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a INTEGER)")
+    conn.commit()
+    sentencias = dividir("INSERT INTO t VALUES (1); INSERT INTO t VALUES (2); SELECT a FROM t ORDER BY a")
+    eventos = []
+    for evento in ejecutor_script.ejecutar_script(conn, sentencias):
+        if evento["tipo"] == "resultado":
+            evento["filas"] = [tuple(f) for lote in evento.pop("lotes") for f in lote]
+        eventos.append(evento)
+    assert [e["tipo"] for e in eventos] == ["fin", "fin", "resultado", "fin"]
+    assert eventos[2]["filas"] == [(1,), (2,)]
+    assert [e["error"] for e in eventos if e["tipo"] == "fin"] == [None, None, None]
+    assert eventos[0]["filas_afectadas"] == 1
+
+
+def test_duracion_no_cuenta_la_espera_del_consumidor():
+    conn = sqlite3.connect(":memory:")
+    fin = None
+    for evento in ejecutor_script.ejecutar_script(conn, ["SELECT 1 UNION ALL SELECT 2"], tam_lote=1):
+        if evento["tipo"] == "resultado":
+            for _ in evento["lotes"]:
+                time.sleep(0.2)  # la grilla dibuja o el usuario decide si sigue
+            time.sleep(0.2)
+        else:
+            fin = evento
+    assert fin["error"] is None and fin["filas_afectadas"] == 2
+    assert fin["duracion"] < 0.2
+    assert fin["primera_fila"] is not None and fin["primera_fila"] <= fin["duracion"]
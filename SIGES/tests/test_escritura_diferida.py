@@ -0,0 +1,94 @@
+"""Aplicación del diario de escrituras diferidas: orden, reintentos y conflictos (escritura_diferida.py)."""
+import sqlite3
+
+import pytest
+
+import datos
+import dialecto
+import driver_fallas
+import escritura_diferida
+
+ORIGEN = "sqlite:sustituta"
+COLUMNAS = [{"nombre": "id", "tipo": "integer"}, {"nombre": "nombre", "tipo": "text"}]
+
+
+@pytest.fixture
+def servidor(directorio_local, monkeypatch):
+    """Base sustituta detrás del driver de fallas (sin fallas al azar)."""
+    ruta = str(directorio_local / "sustituta.db")
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nombre TEXT)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv("SIGES_FALLAS", "conexion=0,consulta=0")
+    driver_fallas.levantar()
+    yield ruta
+    driver_fallas.levantar()
+
+
+@pytest.fixture
+def diario(servidor, directorio_local):
+    return escritura_diferida.DiarioEscrituras(str(directorio_local / "escrituras.db"),
+                                               conectar=lambda: driver_fallas.conectar(servidor))
+
+
+def filas(ruta):
+    conn = sqlite3.connect(ruta)
+    try:
+        return conn.execute("SELECT id, nombre FROM t ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def estados(diario):
+    return [(e["id"], e["estado"]) for e in sorted(diario.listar(ORIGEN), key=lambda e: e["id"])]
+
+
+def test_aplica_en_orden_de_llegada(diario, servidor):
+    diario.encolar(ORIGEN, "insertar", "t", {"id": 1, "nombre": "uno"})
+    diario.encolar(ORIGEN, "modificar", "t", {"nombre": "UNO"}, clave="id", valor_clave=1)
+    diario.encolar(ORIGEN, "insertar", "t", {"id": 2, "nombre": "dos"})
+    conteo = diario.aplicar_lote(ORIGEN)
+    assert conteo["aplicadas"] == 3 and conteo["tablas"] == {"t"}
+    assert filas(servidor) == [(1, "UNO"), (2, "dos")]
+    assert diario.resumen(ORIGEN) == {"aplicada": 3}
+
+
+def test_falla_transitoria_posterga_sin_perder_el_orden(diario, servidor, monkeypatch):
+    primera = diario.encolar(ORIGEN, "insertar", "t", {"id": 1, "nombre": "uno"})
+    diario.encolar(ORIGEN, "modificar", "t", {"nombre": "UNO"}, clave="id", valor_clave=1)
+    driver_fallas.caer()
+    assert diario.aplicar_lote(ORIGEN)["postergadas"] == 1
+    entrada = next(e for e in diario.listar(ORIGEN) if e["id"] == primera)
+    assert entrada["estado"] == "pendiente" and entrada["intentos"] == 1 and entrada["error"]
+    # Antes de la espera no se intenta de nuevo, aunque el servidor ya responda
+    driver_fallas.levantar()
+    assert diario.aplicar_lote(ORIGEN) == {"aplicadas": 0, "conflictos": 0, "errores": 0,
+                                            "postergadas": 2, "tablas": set()}
+    ahora = escritura_diferida.time.time()
+    monkeypatch.setattr(escritura_diferida.time, "time", lambda: ahora + escritura_diferida.ESPERA_MAXIMA)
+    assert diario.aplicar_lote(ORIGEN)["aplicadas"] == 2
+    assert filas(servidor) == [(1, "UNO")]
+
+
+def test_conflicto_y_error_no_detienen_las_siguientes(diario, servidor):
+    conn = sqlite3.connect(servidor)
+    conn.execute("INSERT INTO t VALUES (1, 'uno')")
+    conn.commit()
+    leida = datos.capturar_version(COLUMNAS, (1, "uno"), dialecto.SQLITE)
+    conn.execute("UPDATE t SET nombre = 'otro' WHERE id = 1")
+    conn.commit()
+    conn.close()
+    conflicto = diario.encolar(ORIGEN, "modificar", "t", {"nombre": "mío"}, clave="id", valor_clave=1,
+                               version=leida)
+    inexistente = diario.encolar(ORIGEN, "modificar", "t", {"nombre": "x"}, clave="id", valor_clave=9)
+    ultima = diario.encolar(ORIGEN, "insertar", "t", {"id": 2, "nombre": "dos"})
+    conteo = diario.aplicar_lote(ORIGEN)
+    assert (conteo["aplicadas"], conteo["conflictos"], conteo["errores"]) == (1, 1, 1)
+    assert estados(diario) == [(conflicto, "conflicto"), (inexistente, "error"), (ultima, "aplicada")]
+    entrada = next(e for e in diario.listar(ORIGEN) if e["id"] == conflicto)
+    assert entrada["actual"] == [1, "otro"]
+    # Reintentar sin versión sobrescribe el cambio del otro usuario
+    diario.reintentar(conflicto, sin_version=True)
+    assert diario.aplicar_lote(ORIGEN)["aplicadas"] == 1
+    assert filas(servidor) == [(1, "mío"), (2, "dos")]
@@ -0,0 +1,84 @@
+"""Análisis del WHERE de las consultas federadas: qué filtros se envían al servidor (federada.py)."""
+from decimal import Decimal
+
+import dialecto
+import federada
+
+COLUMNAS = {
+    "id": {"nombre": "id", "familia": "entero"},
+    "nombre": {"nombre": "nombre", "familia": "texto"},
+    "alta": {"nombre": "alta", "familia": "fecha"},
+    "importe": {"nombre": "importe", "familia": "decimal"},
+}
+
+
+def filtro(condicion, alias="c", unica=True, valores=None, dial=dialecto.MSSQL):
+    return federada._filtro(condicion, alias, unica, COLUMNAS, valores or {}, dial)
+
+
+def test_condiciones_unidas_por_and():
+    sql = "SELECT * FROM srv.clientes c WHERE c.id > 10 AND c.nombre LIKE 'A%' ORDER BY c.id;"
+    assert federada._condiciones(sql) == ["c.id > 10", "c.nombre LIKE 'A%'"]
+
+
+def test_between_conserva_su_and():
+    sql = "SELECT * FROM srv.t WHERE alta BETWEEN '2024-01-01' AND '2024-12-31' AND id = 1"
+    assert federada._condiciones(sql) == ["alta BETWEEN '2024-01-01' AND '2024-12-31'", "id = 1"]
+
+
+def test_or_en_el_nivel_principal_no_se_divide():
+    assert federada._condiciones("SELECT * FROM srv.t WHERE id = 1 OR id = 2") == []
+    # Dentro de paréntesis no afecta: la condición va entera
+    assert federada._condiciones("SELECT * FROM srv.t WHERE (id = 1 OR id = 2) AND nombre = 'x'") == [
+        "(id = 1 OR id = 2)", "nombre = 'x'"
+    ]
+
+
+def test_union_y_consultas_sin_where():
+    assert federada._condiciones("SELECT * FROM srv.t WHERE id = 1 UNION SELECT * FROM srv.u") == []
+    assert federada._condiciones("SELECT * FROM srv.t") == []
+
+
+def test_textos_y_subconsultas_no_cortan_el_where():
+    sql = ("SELECT * FROM srv.t WHERE nombre = 'x AND y OR z' "
+           "AND id IN (SELECT id FROM local WHERE a = 1 OR b = 2) GROUP BY id")
+    assert federada._condiciones(sql) == ["nombre = 'x AND y OR z'", "id IN (SELECT id FROM local WHERE a = 1 OR b = 2)"]
+
+
+def test_comparaciones():
+    assert filtro("c.id >= 10") == ("[id] >= ?", (10,))
+    assert filtro("c.nombre = N'O''Brien'") == ("[nombre] = ?", ("O'Brien",))
+    assert filtro("c.importe < 2.50") == ("[importe] < ?", (Decimal("2.50"),))
+    assert filtro("c.importe < 2.50", dial=dialecto.SQLITE) == ('"importe" < ?', (2.5,))
+    assert filtro("c.id = :id", valores={"id": 7}) == ("[id] = ?", (7,))
+
+
+def test_in_between_y_not_null():
+    assert filtro("c.id IN (1, 2, 3)") == ("[id] IN (?, ?, ?)", (1, 2, 3))
+    assert filtro("c.alta BETWEEN '2024-01-01' AND :hasta", valores={"hasta": "2024-12-31"}) == (
+        "[alta] BETWEEN ? AND ?", ("2024-01-01", "2024-12-31"))
+    assert filtro("c.nombre IS NOT NULL") == ("[nombre] IS NOT NULL", ())
+
+
+def test_condiciones_que_no_se_envian():
+    # De otra tabla, columna desconocida o sin calificar habiendo varias tablas del servidor
+    assert filtro("o.id = 1") is None
+    assert filtro("c.otra = 1") is None
+    assert filtro("id = 1", unica=False) is None
+    assert filtro("id = 1", unica=True) == ("[id] = ?", (1,))
+    # Parámetro sin valor, IN con expresiones, o LIKE negado sobre texto (intercalación del servidor)
+    assert filtro("c.id = :falta") is None
+    assert filtro("c.id IN (1, c.otro)") is None
+    assert filtro("c.nombre NOT LIKE 'A%'") is None
+    assert filtro("c.nombre > 'M'") is None
+    assert filtro("c.nombre NOT LIKE 'A%'", dial=dialecto.SQLITE) == ('"nombre" NOT LIKE ?', ("A%",))
+    assert filtro("c.id + 1 = 2") is None
+
+
+def test_nombres_de_columna_entre_delimitadores():
+    columnas = {"fecha alta": {"nombre": "Fecha Alta", "familia": "fecha"},
+                "a]b": {"nombre": "a]b", "familia": "entero"}}
+    assert federada._filtro('c."Fecha Alta" IS NOT NULL', "c", True, columnas, {}, dialecto.MSSQL) == (
+        "[Fecha Alta] IS NOT NULL", ())
+    assert dialecto.citar("a]b", dialecto.MSSQL) == "[a]]b]"
+    assert dialecto.citar('a"b', dialecto.SQLITE) == '"a""b"'
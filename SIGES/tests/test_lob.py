@@ -0,0 +1,32 @@
+"""Prefijo y largos de las columnas LOB en la grilla (lob.py)."""
+import sqlite3
+
+import dialecto
+import lob
+
+COLUMNAS = [{"nombre": "id", "tipo": "integer"}, {"nombre": "texto", "tipo": "text", "lob": True},
+            {"nombre": "datos", "tipo": "blob", "lob": True}]
+
+
+def test_valor_completo_se_decide_por_caracteres():
+    # nvarchar: DATALENGTH cuenta dos bytes por carácter y no debe marcarlo como recortado
+    assert str(lob.ValorLob("ñandú", 10, False, 5)) == "ñandú"
+    assert str(lob.ValorLob("ñan", 10, False, 5)) == "ñan... (10 bytes)"
+
+
+def test_grilla_en_sqlite():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER, texto TEXT, datos BLOB)")
+    conn.execute("INSERT INTO t VALUES (1, 'ñandú', x'0102'), (2, ?, NULL)", ("á" * 300,))
+    cursor = conn.execute(lob.consulta_grilla("t", COLUMNAS, 10, dialecto.SQLITE, largo_prefijo=10))
+    assert len(lob.descripcion_grilla(COLUMNAS, cursor.description)) == 3
+    filas = lob.armar_filas(COLUMNAS, cursor.fetchall())
+    assert [str(v) for v in filas[0]] == ["1", "ñandú", "<binario, 2 bytes>"]
+    assert str(filas[1][1]) == "á" * 10 + "... (600 bytes)"
+    assert filas[1][2] is None
+
+
+def test_consulta_sql_server_cuenta_caracteres_con_espacios_finales():
+    consulta = lob.consulta_grilla("t", COLUMNAS[:2], 10, dialecto.MSSQL)
+    assert "DATALENGTH(texto) AS texto__largo" in consulta
+    assert "LEN(CAST(texto AS varchar(max)) + 'x') - 1 AS texto__caracteres" in consulta
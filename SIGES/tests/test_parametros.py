@@ -0,0 +1,59 @@
+"""Parámetros con nombre y lectura de valores (parametros.py)."""
+from decimal import Decimal
+
+import pytest
+
+import parametros
+
+
+def test_enlaza_en_orden_de_aparicion():
+    sql, valores = parametros.enlazar("SELECT * FROM t WHERE a = :a AND b = @b OR a = :a", {"a": 1, "b": "x"})
+    assert sql == "SELECT * FROM t WHERE a = ? AND b = ? OR a = ?"
+    assert valores == (1, "x", 1)
+
+
+def test_ignora_cadenas_identificadores_y_comentarios():
+    sql = "SELECT ':a', [@b], \"@c\" -- :d\n/* @e */ FROM t WHERE x = :x"
+    assert parametros.nombres(sql) == ["x"]
+
+
+def test_variables_del_script_no_son_parametros():
+    sql = ("DECLARE @total int, @tope int;\n"
+           "SELECT @total = COUNT(*) FROM t WHERE id > @desde AND @@ROWCOUNT > 0;\n"
+           "EXEC p @limite = @tope, @otro = :valor")
+    assert parametros.nombres(sql) == ["desde", "valor"]
+
+
+def test_contexto_del_script_completo():
+    script = "DECLARE @x int = 1; SELECT * FROM t WHERE a = @x AND b = @y"
+    assert parametros.nombres("SELECT * FROM t WHERE a = @x AND b = @y", contexto=script) == ["y"]
+
+
+def test_falta_un_valor():
+    with pytest.raises(ValueError, match=":b"):
+        parametros.enlazar("SELECT :a, :b", {"a": 1})
+
+
+def test_solo_los_numeros_simples_se_convierten():
+    assert parametros.valor("") is None
+    assert parametros.valor(" 42 ") == 42
+    assert parametros.valor("-7") == -7
+    assert parametros.valor("0.50") == Decimal("0.50")
+    for texto in ("007", "1_000", "nan", "Infinity", "1e5", "+3", "2024-01-01", "abc"):
+        assert parametros.valor(texto) == texto
+
+
+def test_leer_valores():
+    valores = parametros.leer_valores("fecha=2024-01-01; :id=5\n@codigo=007; vacio=")
+    assert valores == {"fecha": "2024-01-01", "id": 5, "codigo": "007", "vacio": ""}
+    with pytest.raises(ValueError):
+        parametros.leer_valores("sin separador")
+
+
+def test_leer_conjuntos():
+    conjuntos = parametros.leer_conjuntos("1\n\n2\n", ["id"])
+    assert conjuntos == [{"id": 1}, {"id": 2}]
+    conjuntos = parametros.leer_conjuntos("a=1\nb=2; a=3", ["a", "b"], base={"b": 0})
+    assert conjuntos == [{"a": 1, "b": 0}, {"a": 3, "b": 2}]
+    with pytest.raises(ValueError, match="Línea 1"):
+        parametros.leer_conjuntos("b=2", ["a", "b"])
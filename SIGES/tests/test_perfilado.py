@@ -0,0 +1,24 @@
+"""Muestra de las tablas grandes en el perfil (perfilado.py)."""
+import sqlite3
+
+import dialecto
+import perfilado
+
+
+def test_muestra_sqlite_busca_solo_los_rowid_muestreados():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.executemany("INSERT INTO t (v) VALUES (?)", ((str(i % 7),) for i in range(5000)))
+    # Estimación de 5 millones con muestra de 1 millón: una fila de cada 5
+    desde, porcentaje = perfilado.origen("t", 5_000_000, dialecto.SQLITE)
+    assert porcentaje == 20.0
+    assert conn.execute(f"SELECT COUNT(*), COUNT(DISTINCT v) FROM {desde}").fetchone() == (1000, 7)
+    plan = " ".join(fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN SELECT COUNT(*) FROM {desde}"))
+    assert "SCAN t" not in plan and "rowid=?" in plan
+
+
+def test_muestra_de_tabla_vacia():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (v TEXT)")
+    desde, _ = perfilado.origen("t", 5_000_000, dialecto.SQLITE)
+    assert conn.execute(f"SELECT COUNT(*) FROM {desde}").fetchone() == (0,)
@@ -0,0 +1,16 @@
+"""Columnas visibles por tabla (proyecciones.py)."""
+import proyecciones
+
+COLUMNAS = [{"nombre": "id", "tipo": "int", "primaria": True}, {"nombre": "a", "tipo": "int"},
+            {"nombre": "b", "tipo": "int"}]
+
+
+def test_cada_sesion_del_servidor_tiene_su_eleccion():
+    ana = proyecciones.compartidas("mssql:srv/base", "ana")
+    beto = proyecciones.compartidas("mssql:srv/base", "beto")
+    assert ana is not beto and ana.ruta != beto.ruta
+    ana.guardar("t", ["b", "id", "a"], ["a"], {})
+    assert [c["nombre"] for c in ana.columnas("t", COLUMNAS)] == ["id", "b"]
+    assert [c["nombre"] for c in beto.columnas("t", COLUMNAS)] == ["id", "a", "b"]
+    # Escritorio: una sola elección por origen
+    assert proyecciones.compartidas("mssql:srv/base") is proyecciones.compartidas("mssql:srv/base", None)
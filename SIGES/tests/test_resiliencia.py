@@ -0,0 +1,117 @@
+"""Reintentos y cortacircuito (resiliencia.py) con los errores del driver simulado."""
+import pytest
+
+import driver_fallas
+import resiliencia
+
+
+def error_red():
+    return driver_fallas.ErrorSimulado("08S01", "[08S01] [Driver simulado] Communication link failure")
+
+
+def error_sintaxis():
+    return driver_fallas.ErrorSimulado("42000", "[42000] Incorrect syntax near 'FROM'")
+
+
+def fallar_veces(veces: int, error=error_red):
+    """Operación que falla `veces` veces y luego devuelve cuántas llamadas hubo."""
+    def operacion():
+        operacion.llamadas += 1
+        if operacion.llamadas <= veces:
+            raise error()
+        return operacion.llamadas
+
+    operacion.llamadas = 0
+    return operacion
+
+
+def test_clasifica_errores_del_driver():
+    assert resiliencia.es_transitorio(error_red())
+    assert resiliencia.es_transitorio(driver_fallas.ErrorSimulado("HYT00", "Timeout expired"))
+    assert not resiliencia.es_transitorio(error_sintaxis())
+    assert not resiliencia.es_transitorio(resiliencia.CircuitoAbierto(1))
+    conexion = resiliencia.ErrorConexion("No se pudo conectar")
+    conexion.__cause__ = driver_fallas.ErrorSimulado("28000", "Login failed for user 'ana'")
+    assert not resiliencia.es_transitorio(conexion)
+
+
+def test_reintenta_las_fallas_transitorias():
+    reintentos = []
+    resultado = resiliencia.reintentar(fallar_veces(2), intentos=3, espera_base=0,
+                                       al_reintentar=lambda n, e: reintentos.append(n))
+    assert resultado == 3
+    assert reintentos == [1, 2]
+
+
+def test_agotados_los_intentos_lanza_el_ultimo_error():
+    with pytest.raises(driver_fallas.ErrorSimulado):
+        resiliencia.reintentar(fallar_veces(5), intentos=3, espera_base=0)
+
+
+def test_no_reintenta_los_errores_permanentes():
+    operacion = fallar_veces(1, error_sintaxis)
+    with pytest.raises(driver_fallas.ErrorSimulado):
+        resiliencia.reintentar(operacion, intentos=3, espera_base=0)
+    assert operacion.llamadas == 1
+
+
+def test_circuito_se_abre_tras_el_umbral(monkeypatch):
+    reloj = [100.0]
+    monkeypatch.setattr(resiliencia.time, "monotonic", lambda: reloj[0])
+    circuito = resiliencia.Circuito(umbral=2, espera=1.0)
+    for _ in range(2):
+        circuito.antes()
+        circuito.falla(error_red())
+    assert circuito.estado == "abierto"
+    with pytest.raises(resiliencia.CircuitoAbierto):
+        circuito.antes()
+    # Pasada la espera deja un único intento de prueba
+    reloj[0] += 1.1
+    assert circuito.estado == "semiabierto"
+    circuito.antes()
+    with pytest.raises(resiliencia.CircuitoAbierto):
+        circuito.antes()
+    circuito.exito()
+    assert circuito.estado == "cerrado"
+    assert circuito.aperturas == 1
+
+
+def test_errores_permanentes_no_abren_el_circuito():
+    circuito = resiliencia.Circuito(umbral=2)
+    for _ in range(5):
+        circuito.falla(error_sintaxis())
+    assert circuito.estado == "cerrado"
+
+
+def test_la_espera_se_duplica_con_cada_prueba_fallida(monkeypatch):
+    reloj = [0.0]
+    monkeypatch.setattr(resiliencia.time, "monotonic", lambda: reloj[0])
+    circuito = resiliencia.Circuito(umbral=1, espera=1.0, espera_maxima=4.0)
+    circuito.falla(error_red())
+    esperas = []
+    for _ in range(4):
+        with pytest.raises(resiliencia.CircuitoAbierto) as abierto:
+            circuito.antes()
+        esperas.append(abierto.value.restante)
+        reloj[0] += abierto.value.restante
+        circuito.antes()  # intento de prueba
+        circuito.falla(error_red())
+    assert esperas == [1.0, 2.0, 4.0, 4.0]
+    # Un éxito vuelve a la espera inicial
+    reloj[0] += 4.0
+    circuito.antes()
+    circuito.exito()
+    circuito.falla(error_red())
+    with pytest.raises(resiliencia.CircuitoAbierto) as abierto:
+        circuito.antes()
+    assert abierto.value.restante == 1.0
+
+
+def test_reintentar_con_circuito_abierto_falla_de_inmediato():
+    circuito = resiliencia.Circuito(umbral=1, espera=60)
+    with pytest.raises(driver_fallas.ErrorSimulado):
+        resiliencia.reintentar(fallar_veces(1), intentos=1, circuito=circuito)
+    operacion = fallar_veces(0)
+    with pytest.raises(resiliencia.CircuitoAbierto):
+        resiliencia.reintentar(operacion, intentos=3, espera_base=0, circuito=circuito)
+    assert operacion.llamadas == 0
@@ -0,0 +1,47 @@
+"""Consultas guardadas con copia local atadas a su origen de datos (vistas_locales.py)."""
+import sqlite3
+
+import pytest
+
+import vistas_locales
+
+
+@pytest.fixture
+def servidores(directorio_local):
+    """Dos orígenes SQLite con la misma tabla y filas distintas."""
+    rutas = {}
+    for nombre, ids in (("uno", range(1, 4)), ("dos", range(100, 110))):
+        ruta = str(directorio_local / f"{nombre}.db")
+        conn = sqlite3.connect(ruta)
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in ids])
+        conn.commit()
+        conn.close()
+        rutas[nombre] = ruta
+    return rutas
+
+
+def test_solo_se_refresca_desde_su_origen(servidores, directorio_local):
+    actual = {"origen": "uno"}
+    vistas = vistas_locales.VistasLocales(
+        ruta=str(directorio_local / "vistas.db"),
+        conectar=lambda: sqlite3.connect(servidores[actual["origen"]]),
+        origen=lambda: actual["origen"],
+    )
+    vistas.guardar("ids", "SELECT id FROM t", materializar=True, intervalo_min=1, columna_marca="id")
+    assert vistas.refrescar("ids")["total"] == 3
+    assert vistas.vencidas() == []
+
+    # Cambio de perfil: la copia no recibe filas del otro servidor
+    actual["origen"] = "dos"
+    with pytest.raises(ValueError, match="otro origen"):
+        vistas.refrescar("ids")
+    consulta = vistas.obtener("ids")
+    assert not vistas.es_del_origen(consulta)
+    assert vistas.leer("ids")[1] == [(1,), (2,), (3,)]
+
+    # Al volver a guardarla en este origen, la copia se rehace desde él
+    vistas.guardar("ids", "SELECT id FROM t", materializar=True, intervalo_min=1, columna_marca="id")
+    resultado = vistas.refrescar("ids")
+    assert not resultado["incremental"]
+    assert resultado["total"] == 10